@@ -5,7 +5,7 @@ Système de gestion de la conformité ISO 27001
 
 import streamlit as st
 from auth import Auth
-from database import Database
+from database import get_database
 from utils.config import APP_NAME, APP_VERSION, GLOBAL_CSS, COLORS
 from utils.icons import get_sidebar_icon
 from logo import logo_config
@@ -68,7 +68,7 @@ st.markdown("""
 
 # Initialisation des modules
 auth = Auth()
-db = Database()
+db = get_database()
 
 # Initialisation automatique des données par défaut (pour Streamlit Cloud)
 if 'data_initialized' not in st.session_state:
@@ -98,6 +98,9 @@ if 'data_initialized' not in st.session_state:
 def main():
     """Fonction principale de l'application"""
     
+    # Poser ou retirer le cookie de session (après une connexion ou une déconnexion)
+    auth.sync_session_cookie()
+    
     # Vérifier l'authentification
     if not auth.is_authenticated():
         # Sur la page de connexion, masquer complètement la sidebar pour un affichage plein écran
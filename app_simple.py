@@ -5,7 +5,7 @@ Sans CSS complexe ni JavaScript
 
 import streamlit as st
 from auth import Auth
-from database import Database
+from database import get_database
 from utils.config import APP_NAME, APP_VERSION, COLORS
 from utils.icons import get_sidebar_icon
 from logo import logo_config
@@ -33,7 +33,7 @@ st.markdown(f"""
 
 # Initialisation des modules
 auth = Auth()
-db = Database()
+db = get_database()
 
 def main():
     """Fonction principale de l'application"""
@@ -4,20 +4,31 @@ Gère la connexion, déconnexion et vérification des rôles
 """
 
 import streamlit as st
-from database import Database
+from database import get_database
 from logo import logo_config
+from utils.login_guard import LoginBusy, LoginThrottled, get_login_guard
+from utils.routes import PREFIXE, routes_enabled, session_cookie_code
+from utils.sessions import SESSION_COOKIE, SESSION_PARAM, client_fingerprint, get_session_manager
 import hashlib
-import time
 import json
+import time
 import os
 from datetime import datetime, timedelta
+from math import ceil
+
+# Appel de la route du cookie de session depuis le navigateur (voir Auth.sync_session_cookie)
+_COOKIE_HTML = """<script>
+const action = __ACTION__;
+fetch(action.adresse, {method: action.methode, body: action.code || null, credentials: "same-origin"});
+</script>"""
 
 class Auth:
     def __init__(self):
         """Initialise le système d'authentification"""
-        self.db = Database()
+        self.db = get_database()
         self.session_key = "securite360_session"
         self.session_duration = 24  # Durée de session en heures
+        self.login_guard = get_login_guard()
         
         # Initialiser la session persistante
         self._init_persistent_session()
@@ -29,70 +40,108 @@ class Auth:
             st.session_state.user = None
     
     def _init_persistent_session(self):
-        """Initialise la session persistante simple"""
-        # Utiliser un fichier de session global pour cette application
-        self.session_file = os.path.join(os.path.dirname(__file__), '.session_data.json')
+        """Initialise la session persistante (jeton porté par un cookie HttpOnly, sessions en base)"""
+        self.sessions = get_session_manager(self.db)
         
         # Vérifier et restaurer une session existante
         if 'session_initialized' not in st.session_state:
             st.session_state.session_initialized = True
+            # Ancien fichier de session partagé par tous les navigateurs : ne plus s'y fier
+            ancien_fichier = os.path.join(os.path.dirname(__file__), '.session_data.json')
+            if os.path.exists(ancien_fichier):
+                try:
+                    os.remove(ancien_fichier)
+                except OSError:
+                    pass
             self._restore_session()
     
+    @staticmethod
+    def _client_ip():
+        """Adresse IP du client (None en accès local : la limitation par adresse est alors inactive)"""
+        ip = st.context.ip_address
+        return ip if isinstance(ip, str) else None
+    
+    def _client(self):
+        """Identité du client (adresse IP, navigateur) à laquelle la session est liée"""
+        return client_fingerprint(self._client_ip(), st.context.headers.get("User-Agent"))
+    
     def _restore_session(self):
-        """Restaure une session sauvegardée si elle existe et est valide"""
+        """Restaure la session du cookie si elle est valide pour ce client"""
+        # Jeton resté dans l'URL par une version précédente (historique, favoris) : il ne sert plus
+        ancien = st.query_params.get(SESSION_PARAM)
+        if ancien:
+            self._revoke(ancien)
+            del st.query_params[SESSION_PARAM]
+        token = st.context.cookies.get(SESSION_COOKIE)
+        if not token:
+            return False
         try:
-            if os.path.exists(self.session_file):
-                with open(self.session_file, 'r', encoding='utf-8') as f:
-                    session_data = json.load(f)
-                
-                # Vérifier si la session n'a pas expiré
-                created_time = datetime.fromisoformat(session_data.get('created_at', ''))
-                if datetime.now() - created_time < timedelta(hours=self.session_duration):
-                    # Vérifier que l'utilisateur existe toujours en base
-                    user_id = session_data.get('user_id')
-                    if user_id:
-                        db_user = self.db.get_user_by_id(user_id)
-                        if db_user:
-                            st.session_state.authenticated = True
-                            st.session_state.user = db_user
-                            return True
-                
-                # Session expirée ou utilisateur inexistant, supprimer le fichier
-                os.remove(self.session_file)
-        except Exception as e:
-            # En cas d'erreur, supprimer le fichier de session corrompu
-            if os.path.exists(self.session_file):
-                try:
-                    os.remove(self.session_file)
-                except:
-                    pass
+            user_id = self.sessions.resolve(token, self._client())
+            db_user = self.db.get_user_by_id(user_id) if user_id else None
+        except Exception:
+            db_user = None
+        if db_user:
+            st.session_state.authenticated = True
+            st.session_state.user = db_user
+            st.session_state.session_token = token
+            return True
         
+        # Session expirée, inconnue ou utilisateur supprimé
+        self._clear_session(token)
         return False
     
     def _save_session(self, user_data):
-        """Sauvegarde la session utilisateur dans un fichier"""
-        session_data = {
-            'user_id': user_data.get('id'),
-            'created_at': datetime.now().isoformat(),
-            'expires_at': (datetime.now() + timedelta(hours=self.session_duration)).isoformat()
-        }
+        """Ouvre une session persistante, gardée par le navigateur dans un cookie HttpOnly
         
+        Le jeton change à chaque connexion : celui d'une session précédente
+        de ce navigateur est révoqué. Sans les routes (application lancée
+        par app.py plutôt que serveur.py), la connexion ne vaut que pour l'onglet.
+        """
+        for ancien in {st.session_state.pop('session_token', None), st.context.cookies.get(SESSION_COOKIE)} - {None}:
+            self._revoke(ancien)
+        if not routes_enabled():
+            return
         try:
-            with open(self.session_file, 'w', encoding='utf-8') as f:
-                json.dump(session_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            # Silencieusement ignorer les erreurs de sauvegarde
-            pass
+            duree = timedelta(hours=self.session_duration)
+            token = self.sessions.create(user_data.get('id'), duree, self._client())
+        except Exception:
+            # La connexion reste valable pour cet onglet
+            return
+        st.session_state.session_token = token
+        st.session_state._cookie_session = ("POST", session_cookie_code(token, duree))
     
-    def _clear_session(self):
-        """Efface la session persistante"""
+    def _revoke(self, token):
+        """Révoque un jeton de ce client"""
         try:
-            if os.path.exists(self.session_file):
-                os.remove(self.session_file)
-        except Exception as e:
-            # Silencieusement ignorer les erreurs
+            self.sessions.revoke(token, self._client())
+        except Exception:
             pass
     
+    def _clear_session(self, token=None):
+        """Ferme la session persistante et fait retirer son cookie par le navigateur"""
+        self._revoke(token or st.session_state.pop('session_token', None))
+        if routes_enabled():
+            st.session_state._cookie_session = ("DELETE", "")
+    
+    def sync_session_cookie(self):
+        """
+        Fait poser ou retirer le cookie de session par le navigateur
+
+        Un cadre invisible de même origine appelle la route /api/session ;
+        le cookie HttpOnly n'est ensuite lisible que par le serveur.
+        """
+        action = st.session_state.get('_cookie_session')
+        if action is None:
+            return
+        methode, code = action
+        page = _COOKIE_HTML.replace("__ACTION__", json.dumps(
+            {'adresse': f"{PREFIXE}/session", 'methode': methode, 'code': code}))
+        if hasattr(st, "iframe"):
+            st.iframe(page, height=1)
+        else:
+            import streamlit.components.v1 as components
+            components.html(page, height=1)
+    
     def login_page(self):
         """Affiche la page de connexion en plein écran"""
         st.markdown("""
@@ -182,18 +231,24 @@ class Auth:
             
             if submit:
                 if username and password:
-                    user = self.db.verify_user(username, password)
-                    if user:
-                        st.session_state.authenticated = True
-                        st.session_state.user = user
-                        
-                        # Sauvegarder la session de façon persistante
-                        self._save_session(user)
-                        
-                        st.success("Connexion réussie!")
-                        st.rerun()
+                    try:
+                        user = self.login_guard.authenticate(self.db, username, password, self._client_ip())
+                    except LoginThrottled as e:
+                        st.error(f"Trop de tentatives échouées. Réessayez dans {ceil(e.attente)} secondes.")
+                    except LoginBusy:
+                        st.warning("Le service de connexion est très sollicité. Réessayez dans quelques secondes.")
                     else:
-                        st.error("Identifiant ou mot de passe incorrect")
+                        if user:
+                            st.session_state.authenticated = True
+                            st.session_state.user = user
+                            
+                            # Sauvegarder la session de façon persistante
+                            self._save_session(user)
+                            
+                            st.success("Connexion réussie!")
+                            st.rerun()
+                        else:
+                            st.error("Identifiant ou mot de passe incorrect")
                 else:
                     st.warning("Veuillez remplir tous les champs")
         
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Benchmark de concurrence lecture/écriture de la base Sécurité 360
+
+Compare le profil de stockage historique (journal rollback, aucune attente
+sur verrou) au profil par défaut (WAL, synchronous=NORMAL, busy_timeout et
+réessais) : plusieurs auditeurs mettent à jour des critères pendant que des
+lecteurs affichent le tableau de bord.
+
+Usage: python benchmark_database.py [--writers 4] [--readers 8] [--duration 5]
+"""
+
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database, DEFAULT_STORAGE_PROFILE, LEGACY_STORAGE_PROFILE, StorageProfile
+
+STATUTS = ['Conforme', 'Largement conforme', 'Partiellement conforme', 'Faiblement conforme', 'Non conforme']
+
+
+def run_scenario(db_path: str, profile: StorageProfile, writers: int, readers: int, duration: float) -> dict:
+    """Exécute lecteurs et écrivains en parallèle pendant `duration` secondes"""
+    db = Database(db_path, pool_size=writers + readers + 1, storage_profile=profile)
+    critere_ids = [c['id'] for c in db.get_all_criteres()]
+
+    counters = {'writes': 0, 'reads': 0, 'write_errors': 0, 'read_errors': 0}
+    lock = threading.Lock()
+    stop = threading.Event()
+
+    def writer(worker: int):
+        i = worker
+        while not stop.is_set():
+            critere_id = critere_ids[i % len(critere_ids)]
+            try:
+                db.update_critere(critere_id, STATUTS[i % len(STATUTS)], f"bench {worker}-{i}")
+                key = 'writes'
+            except Exception:
+                key = 'write_errors'
+            with lock:
+                counters[key] += 1
+            i += writers
+
+    def reader():
+        while not stop.is_set():
+            try:
+                db.get_conformity_stats()
+                db.get_all_criteres()
+                key = 'reads'
+            except Exception:
+                key = 'read_errors'
+            with lock:
+                counters[key] += 1
+
+    threads = [threading.Thread(target=writer, args=(w,)) for w in range(writers)]
+    threads += [threading.Thread(target=reader) for _ in range(readers)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    db.close()
+
+    counters['writes_per_s'] = counters['writes'] / elapsed
+    counters['reads_per_s'] = counters['reads'] / elapsed
+    return counters
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--duration', type=float, default=5.0)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        template = os.path.join(tmpdir, "template.db")
+        Database(template, storage_profile=LEGACY_STORAGE_PROFILE).close()
+
+        results = {}
+        for name, profile in [("Avant (rollback journal)", LEGACY_STORAGE_PROFILE),
+                              ("Après (WAL + busy_timeout)", DEFAULT_STORAGE_PROFILE)]:
+            db_path = os.path.join(tmpdir, f"{len(results)}.db")
+            shutil.copy2(template, db_path)
+            print(f"⏱️  {name} : {args.writers} écrivains, {args.readers} lecteurs, {args.duration:.0f} s...")
+            results[name] = run_scenario(db_path, profile, args.writers, args.readers, args.duration)
+
+    print()
+    print(f"{'Profil':<30} {'écritures/s':>12} {'lectures/s':>12} {'err. écriture':>14} {'err. lecture':>13}")
+    print("-" * 85)
+    for name, r in results.items():
+        print(f"{name:<30} {r['writes_per_s']:>12.1f} {r['reads_per_s']:>12.1f} "
+              f"{r['write_errors']:>14} {r['read_errors']:>13}")
+
+
+if __name__ == "__main__":
+    main()
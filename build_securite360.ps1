@@ -19,7 +19,7 @@ try {
 
 # Vérification des fichiers requis
 Write-Host "`n📁 Vérification des fichiers..." -ForegroundColor Blue
-$requiredFiles = @("launcher.py", "app.py", "Securite360.spec", "icone.ico", "requirements.txt")
+$requiredFiles = @("launcher.py", "serveur.py", "app.py", "Securite360.spec", "icone.ico", "requirements.txt")
 
 foreach ($file in $requiredFiles) {
     if (Test-Path $file) {
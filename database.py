@@ -5,149 +5,565 @@ Gère les utilisateurs, critères ISO 27001, audits et documents
 
 import sqlite3
 import bcrypt
+import hashlib
+import html
 import os
-from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+import re
+import random
+import threading
+import time
+import weakref
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from functools import wraps
+from typing import Callable, Iterator, List, Dict, Optional, Tuple
+
+import migrations
+
+# Version du schéma attendue (celle de la dernière migration de migrations.py)
+SCHEMA_VERSION = migrations.latest_version()
+
+# Pondération des statuts dans le taux de conformité (en %)
+STATUT_WEIGHTS = {
+    'Conforme': 100,
+    'Largement conforme': 80,
+    'Partiellement conforme': 50,
+    'Faiblement conforme': 30,
+    'Non conforme': 0,
+}
+
+# Statuts comptés comme conformes dans les taux par catégorie
+STATUTS_CONFORMES = ('Conforme', 'Largement conforme')
+
+# Début de période des agrégats dérivés de la série journalière
+ROLLUP_PERIODS = {
+    'semaine': "date(debut, '-6 days', 'weekday 1')",
+    'mois': "strftime('%Y-%m-01', debut)",
+}
+
+# Intervalle minimal entre deux rafraîchissements des agrégats déclenchés par une lecture (secondes)
+ROLLUP_REFRESH_INTERVAL = 300.0
+
+# Clés de tri des listes paginées (la dernière colonne, unique, départage les ex aequo)
+_AUDIT_KEYS = ("date_audit", "id")
+_DIRECTIVE_KEYS = ("date_creation", "id")
+_DOCUMENT_KEYS = ("date_creation", "id")
+_USER_COLUMNS = "id, username, role, created_at, last_login"
+
+# Requêtes d'import par lot (utils/importer.py) ; les critères existants sont
+# mis à jour par leur code, les audits et directives sont ajoutés
+IMPORT_SQL = {
+    'criteres': """
+        INSERT INTO criteres (code, titre, description, categorie, statut, commentaire, derniere_maj)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT (code) DO UPDATE SET
+            statut = excluded.statut,
+            commentaire = COALESCE(excluded.commentaire, commentaire),
+            derniere_maj = excluded.derniere_maj
+    """,
+    'audits': """
+        INSERT INTO audits (titre, date_audit, auditeur, statut, score, commentaires, created_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    """,
+    'directives': """
+        INSERT INTO directives (titre, description, type, efficacite, responsable, date_creation)
+        VALUES (?, ?, ?, ?, ?, ?)
+    """,
+}
+
+# Requêtes d'export (utils/exporter.py), dans l'ordre des listes de l'application
+EXPORT_QUERIES = {
+    'criteres': "SELECT * FROM criteres ORDER BY code",
+    'audits': "SELECT * FROM audits ORDER BY date_audit DESC, id DESC",
+    'directives': "SELECT * FROM directives ORDER BY date_creation DESC, id DESC",
+    'documents': "SELECT * FROM documents ORDER BY categorie, date_creation DESC, id DESC",
+    'users': "SELECT id, username, role, created_at, last_login FROM users ORDER BY id",
+    'critere_history': "SELECT * FROM critere_history ORDER BY id",
+    'suppressions': "SELECT * FROM suppressions ORDER BY id",
+}
+
+# Horodatage de dernière écriture par table exportable (export incrémental « depuis »)
+EXPORT_CHANGE_COLUMNS = {
+    'criteres': "derniere_maj",
+    'audits': "created_at",
+    'directives': "date_creation",
+    'documents': "COALESCE(derniere_modification, date_creation)",
+    'users': "COALESCE(last_login, created_at)",
+    'critere_history': "date_modification",
+    'suppressions': "date_suppression",
+}
+
+# Préfixe des références vers le magasin de preuves (criteres.preuve_path, documents.fichier_path)
+EVIDENCE_PREFIX = "sha256:"
+
+# Fichier des exigences ISO 27001 indexées par la recherche plein texte
+ISO_ANNEXE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "iso27001_annexe_a.json")
+
+# Registre des instances partagées par le processus, indexé par chemin de base
+_instances: Dict[str, "Database"] = {}
+_instances_lock = threading.Lock()
+
+# Fichiers déjà initialisés dans ce processus (évite de relire user_version)
+_bootstrapped_paths: set = set()
+_bootstrap_lock = threading.Lock()
+
+
+def _registry_key(db_path: str) -> Optional[str]:
+    """Clé de registre d'un chemin de base (None pour les bases en mémoire)"""
+    if db_path == ':memory:':
+        return None
+    return os.path.abspath(db_path)
+
+
+def get_database(db_path: str = "securite360.db") -> "Database":
+    """Retourne l'instance Database partagée par le processus pour ce fichier
+
+    Les reruns Streamlit et les différents modules (auth, pages) obtiennent
+    ainsi la même instance, sans refaire l'initialisation du schéma.
+    """
+    key = _registry_key(db_path) or db_path
+    with _instances_lock:
+        db = _instances.get(key)
+        if db is None:
+            db = Database(db_path)
+            _instances[key] = db
+        return db
+
+
+class StorageProfile:
+    """Réglages de stockage SQLite appliqués à chaque nouvelle connexion
+
+    Le profil par défaut active le journal WAL (les lecteurs ne bloquent plus
+    les écrivains), synchronous=NORMAL, un cache de page et un mmap élargis,
+    ainsi qu'un délai d'attente sur verrou complété par des réessais des
+    écritures avec backoff exponentiel.
+    """
+
+    def __init__(self, journal_mode: str = "WAL", synchronous: str = "NORMAL",
+                 mmap_size: int = 64 * 1024 * 1024, cache_size: int = -16000,
+                 busy_timeout_ms: int = 5000, write_retries: int = 5,
+                 retry_backoff: float = 0.05):
+        self.journal_mode = journal_mode
+        self.synchronous = synchronous
+        self.mmap_size = mmap_size
+        # Valeur négative : taille en KiB (convention SQLite)
+        self.cache_size = cache_size
+        self.busy_timeout_ms = busy_timeout_ms
+        self.write_retries = write_retries
+        self.retry_backoff = retry_backoff
+
+    def apply(self, conn: sqlite3.Connection):
+        """Applique les PRAGMA du profil à une connexion"""
+        conn.execute(f"PRAGMA busy_timeout = {int(self.busy_timeout_ms)}")
+        conn.execute(f"PRAGMA journal_mode = {self.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {self.synchronous}")
+        conn.execute(f"PRAGMA mmap_size = {int(self.mmap_size)}")
+        conn.execute(f"PRAGMA cache_size = {int(self.cache_size)}")
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Délai avant le réessai numéro `attempt` (backoff exponentiel avec gigue)"""
+        return self.retry_backoff * (2 ** attempt) * (0.5 + random.random())
+
+
+# Profil recommandé pour un serveur partagé par plusieurs utilisateurs
+DEFAULT_STORAGE_PROFILE = StorageProfile()
+
+# Comportement historique de SQLite (journal rollback, aucune attente sur verrou)
+LEGACY_STORAGE_PROFILE = StorageProfile(
+    journal_mode="DELETE",
+    synchronous="FULL",
+    mmap_size=0,
+    cache_size=-2000,
+    busy_timeout_ms=0,
+    write_retries=0,
+)
+
+
+def _weight_case_sql(column: str) -> str:
+    """Expression SQL donnant le poids (STATUT_WEIGHTS) du statut contenu dans `column`"""
+    cases = " ".join(f"WHEN '{statut}' THEN {poids}" for statut, poids in STATUT_WEIGHTS.items())
+    return f"CASE {column} {cases} ELSE 0 END"
+
+
+_CODE_PATTERN = re.compile(r"\d+(\.\d+)*")
+
+
+def _fts_query(text: str) -> str:
+    """Convertit une saisie libre en requête FTS5 (tous les termes, préfixe sur le dernier)
+
+    Chaque terme est cité pour neutraliser la syntaxe FTS5 (AND, NEAR, :, ...).
+    Seul le dernier terme, en cours de frappe, est suivi de * : un préfixe
+    fusionne les listes de tous les mots qui le prolongent, ce qui multiplie
+    les lignes à classer.
+    """
+    terms = ['"' + term.replace('"', '""') + '"' for term in re.findall(r"[\w.'-]+", text)]
+    if terms:
+        terms[-1] += "*"
+    return " ".join(terms)
+
+
+# Marqueurs des termes trouvés dans highlight()/snippet() : caractères de
+# contrôle absents du texte indexé, remplacés par <mark> après échappement
+_MARK_START, _MARK_END = "\x02", "\x03"
+
+
+def _highlighted_html(text: Optional[str]) -> Optional[str]:
+    """Échappe un extrait FTS5 pour l'affichage HTML, termes trouvés entre <mark>...</mark>"""
+    if text is None:
+        return None
+    return html.escape(text).replace(_MARK_START, "<mark>").replace(_MARK_END, "</mark>")
+
+
+def _is_locked_error(error: Exception) -> bool:
+    """Indique si une erreur SQLite est due à un verrou temporaire"""
+    message = str(error).lower()
+    return isinstance(error, sqlite3.OperationalError) and ("locked" in message or "busy" in message)
+
+
+def _retry_on_locked(method):
+    """Réessaie une écriture de Database quand la base est verrouillée"""
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        attempt = 0
+        while True:
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if not _is_locked_error(e) or attempt >= self.storage_profile.write_retries:
+                    raise
+                time.sleep(self.storage_profile.backoff_delay(attempt))
+                attempt += 1
+    return wrapper
+
+
+class ConnectionPool:
+    """Pool borné de connexions SQLite avec affinité par thread
+
+    Chaque thread réutilise la connexion qu'il a déjà empruntée (les appels
+    imbriqués partagent donc la même connexion). Une connexion rendue reste
+    attachée à son thread mais peut être réattribuée à un autre thread quand
+    le pool est plein ou que son thread propriétaire est terminé, ce qui est
+    le cas des threads de rerun Streamlit.
+    """
+
+    def __init__(self, db_path: str, max_size: int = 16, idle_timeout: float = 300.0,
+                 checkout_timeout: float = 30.0, profile: Optional[StorageProfile] = None):
+        self.db_path = db_path
+        self.profile = profile or DEFAULT_STORAGE_PROFILE
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self._cond = threading.Condition()
+        # id(connexion) -> emplacement {conn, owner, depth, last_used}
+        self._slots: Dict[int, Dict] = {}
+        # ident du thread -> id(connexion) empruntée
+        self._by_thread: Dict[int, int] = {}
+        self._counters = {
+            'created': 0,
+            'checkouts': 0,
+            'reused': 0,
+            'reassigned': 0,
+            'evicted': 0,
+            'waits': 0,
+            'timeouts': 0,
+        }
+
+    def _connect(self) -> sqlite3.Connection:
+        """Ouvre une connexion et applique une fois pour toutes sa configuration"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False,
+                               timeout=self.profile.busy_timeout_ms / 1000)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA temp_store = MEMORY")
+        self.profile.apply(conn)
+        return conn
+
+    def acquire(self) -> sqlite3.Connection:
+        """Emprunte une connexion pour le thread courant"""
+        thread = threading.current_thread()
+        ident = thread.ident
+        deadline = time.monotonic() + self.checkout_timeout
+
+        with self._cond:
+            self._counters['checkouts'] += 1
+
+            key = self._by_thread.get(ident)
+            if key is not None and key in self._slots:
+                slot = self._slots[key]
+                slot['depth'] += 1
+                self._counters['reused'] += 1
+                return slot['conn']
+
+            self._evict_idle_locked()
+
+            while True:
+                slot = self._take_idle_locked(orphans_only=True)
+                if slot is None and len(self._slots) < self.max_size:
+                    conn = self._connect()
+                    slot = {'conn': conn, 'owner': None, 'depth': 0, 'last_used': time.monotonic()}
+                    self._slots[id(conn)] = slot
+                    self._counters['created'] += 1
+                if slot is None:
+                    slot = self._take_idle_locked(orphans_only=False)
+                if slot is not None:
+                    slot['owner'] = weakref.ref(thread)
+                    slot['depth'] = 1
+                    self._by_thread[ident] = id(slot['conn'])
+                    return slot['conn']
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise sqlite3.OperationalError(
+                        f"Pool de connexions épuisé ({self.max_size} connexions en cours d'utilisation)"
+                    )
+                self._counters['waits'] += 1
+                self._cond.wait(remaining)
+
+    def _take_idle_locked(self, orphans_only: bool) -> Optional[Dict]:
+        """Détache une connexion libre (de préférence celle d'un thread terminé)"""
+        candidates = []
+        for slot in self._slots.values():
+            if slot['depth'] > 0:
+                continue
+            owner = slot['owner']() if slot['owner'] is not None else None
+            orphan = owner is None or not owner.is_alive()
+            if orphans_only and not orphan:
+                continue
+            candidates.append(slot)
+        if not candidates:
+            return None
+
+        slot = min(candidates, key=lambda s: s['last_used'])
+        owner = slot['owner']() if slot['owner'] is not None else None
+        if owner is not None and self._by_thread.get(owner.ident) == id(slot['conn']):
+            del self._by_thread[owner.ident]
+        if slot['owner'] is not None:
+            self._counters['reassigned'] += 1
+        return slot
+
+    def release(self, conn: sqlite3.Connection):
+        """Rend une connexion empruntée au pool"""
+        with self._cond:
+            slot = self._slots.get(id(conn))
+            if slot is None or slot['conn'] is not conn:
+                # Connexion inconnue (pool vidé entre-temps) : la fermer
+                conn.close()
+                return
+            slot['depth'] -= 1
+            if slot['depth'] > 0:
+                return
+            slot['depth'] = 0
+            # Ne jamais rendre une transaction en cours au pool
+            if conn.in_transaction:
+                conn.rollback()
+            slot['last_used'] = time.monotonic()
+            self._cond.notify()
+
+    def _evict_idle_locked(self):
+        """Ferme les connexions inutilisées depuis plus de idle_timeout"""
+        now = time.monotonic()
+        for key, slot in list(self._slots.items()):
+            if slot['depth'] == 0 and now - slot['last_used'] > self.idle_timeout:
+                self._drop_slot_locked(key)
+                self._counters['evicted'] += 1
+
+    def _drop_slot_locked(self, key: int):
+        slot = self._slots.pop(key)
+        for ident, conn_key in list(self._by_thread.items()):
+            if conn_key == key:
+                del self._by_thread[ident]
+        slot['conn'].close()
+
+    def evict_idle(self) -> int:
+        """Ferme les connexions inactives et retourne leur nombre"""
+        with self._cond:
+            before = self._counters['evicted']
+            self._evict_idle_locked()
+            return self._counters['evicted'] - before
+
+    def close_all(self):
+        """Ferme toutes les connexions libres ; les autres seront fermées à leur retour"""
+        with self._cond:
+            for key, slot in list(self._slots.items()):
+                if slot['depth'] == 0:
+                    self._drop_slot_locked(key)
+                else:
+                    # Oublier la connexion : release() la fermera
+                    del self._slots[key]
+            self._by_thread.clear()
+            self._cond.notify_all()
+
+    def stats(self) -> Dict:
+        """Statistiques d'utilisation du pool"""
+        with self._cond:
+            in_use = sum(1 for slot in self._slots.values() if slot['depth'] > 0)
+            return {
+                'max_size': self.max_size,
+                'size': len(self._slots),
+                'in_use': in_use,
+                'idle': len(self._slots) - in_use,
+                **self._counters,
+            }
+
 
 class Database:
-    def __init__(self, db_path: str = "securite360.db"):
-        """Initialise la connexion à la base de données"""
+    def __init__(self, db_path: str = "securite360.db", pool_size: int = 16,
+                 pool_idle_timeout: float = 300.0, storage_profile: Optional[StorageProfile] = None,
+                 hash_policy=None):
+        """Initialise la connexion à la base de données
+
+        `hash_policy` fixe l'algorithme et le coût des empreintes de mots de
+        passe (par défaut la politique calibrée du processus, voir
+        utils/password_policy.py).
+        """
         self.db_path = db_path
+        self.storage_profile = storage_profile or DEFAULT_STORAGE_PROFILE
+        if hash_policy is None:
+            from utils.password_policy import get_hash_policy
+            hash_policy = get_hash_policy()
+        self.hash_policy = hash_policy
         # connection persistante pour les bases en mémoire
         self._persistent_conn: sqlite3.Connection | None = None
+        self._pool: ConnectionPool | None = None
         if self.db_path == ':memory:':
             self._persistent_conn = sqlite3.connect(self.db_path, check_same_thread=False)
             self._persistent_conn.row_factory = sqlite3.Row
-        self.init_database()
+        else:
+            self._pool = ConnectionPool(self.db_path, max_size=pool_size, idle_timeout=pool_idle_timeout,
+                                        profile=self.storage_profile)
+        # Dernier rafraîchissement des agrégats de conformité demandé par une lecture
+        self._rollups_lock = threading.Lock()
+        self._rollups_refreshed_at: Optional[float] = None
+        self._bootstrap()
+
+    def _bootstrap(self):
+        """Initialise le schéma une seule fois par processus et par fichier
+
+        Sur une base déjà à jour, le coût se limite à une lecture de
+        PRAGMA user_version au démarrage du processus.
+        """
+        key = _registry_key(self.db_path)
+        if key is not None and key in _bootstrapped_paths:
+            return
+        with _bootstrap_lock:
+            if key is not None and key in _bootstrapped_paths:
+                return
+            self.init_database()
+            self.sync_iso_search_index()
+            if key is not None:
+                _bootstrapped_paths.add(key)
+
+    def get_schema_version(self) -> int:
+        """Lit la version du schéma enregistrée dans la base"""
+        conn = self.get_connection()
+        try:
+            return conn.execute("PRAGMA user_version").fetchone()[0]
+        finally:
+            self._close_conn(conn)
         
     def get_connection(self) -> sqlite3.Connection:
-        """Crée une connexion à la base de données"""
+        """Emprunte une connexion au pool (à rendre avec _close_conn)"""
         # Si une connexion persistante a été créée (ex: ':memory:'), la réutiliser
         if self._persistent_conn is not None:
             return self._persistent_conn
-        conn = sqlite3.connect(self.db_path, check_same_thread=False)
-        conn.row_factory = sqlite3.Row
-        return conn
+        return self._pool.acquire()
 
     def _close_conn(self, conn: sqlite3.Connection | None):
-        """Ferme la connexion seulement si ce n'est pas la connexion persistante"""
+        """Rend la connexion au pool, sauf s'il s'agit de la connexion persistante"""
         if conn is None:
             return
         if getattr(self, '_persistent_conn', None) is conn:
             return
-        conn.close()
+        if self._pool is not None:
+            self._pool.release(conn)
+        else:
+            conn.close()
+
+    def pool_stats(self) -> Dict:
+        """Statistiques du pool de connexions (vide pour une base en mémoire)"""
+        if self._pool is None:
+            return {}
+        return self._pool.stats()
+
+    def close(self):
+        """Ferme toutes les connexions ouvertes vers la base"""
+        if self._pool is not None:
+            self._pool.close_all()
+        if self._persistent_conn is not None:
+            self._persistent_conn.close()
+            self._persistent_conn = None
     
-    def init_database(self):
-        """Initialise les tables de la base de données"""
+    def init_database(self) -> List[int]:
+        """Applique les migrations de schéma en attente (voir migrations.py)
+
+        Retourne la liste des versions appliquées.
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cle = "theme"
-        valeur = "sombre"
-        cursor.execute("""
-    CREATE TABLE IF NOT EXISTS settings (
-        cle TEXT PRIMARY KEY,
-        valeur TEXT
-    )
-""")
-
-        cursor.execute("""
-            INSERT OR REPLACE INTO settings (cle, valeur)
-            VALUES (?, ?)
-        """, (cle, valeur))
-        conn.commit()
-        
-        # Table des utilisateurs
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                username TEXT UNIQUE NOT NULL,
-                password_hash TEXT NOT NULL,
-                role TEXT NOT NULL,
-                created_at TEXT NOT NULL,
-                last_login TEXT
-            )
-        """)
-        
-        # Table des critères ISO 27001
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS criteres (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                code TEXT UNIQUE NOT NULL,
-                titre TEXT NOT NULL,
-                description TEXT NOT NULL,
-                categorie TEXT NOT NULL,
-                statut TEXT DEFAULT 'Non conforme',
-                commentaire TEXT,
-                preuve_path TEXT,
-                derniere_maj TEXT
-            )
-        """)
-        
-        # Table des audits
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS audits (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titre TEXT NOT NULL,
-                date_audit TEXT NOT NULL,
-                auditeur TEXT NOT NULL,
-                statut TEXT NOT NULL,
-                score REAL,
-                rapport_path TEXT,
-                commentaires TEXT,
-                created_at TEXT NOT NULL
-            )
-        """)
-        
-        # Table des documents
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS documents (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titre TEXT NOT NULL,
-                categorie TEXT NOT NULL,
-                version TEXT NOT NULL,
-                fichier_path TEXT,
-                contenu TEXT,
-                auteur TEXT NOT NULL,
-                date_creation TEXT NOT NULL,
-                derniere_modification TEXT
-            )
-        """)
-        
-        # Note: la table `settings` est déjà créée ci-dessus; ne pas la recréer (évite doublon)
-        
-        # Table des directives
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS directives (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                titre TEXT NOT NULL,
-                description TEXT NOT NULL,
-                type TEXT NOT NULL,
-                efficacite TEXT DEFAULT 'Moyenne',
-                responsable TEXT,
-                date_creation TEXT NOT NULL
-            )
-        """)
+        try:
+            if migrations.is_current(conn):
+                return []
+            return migrations.migrate(conn, self)
+        finally:
+            self._close_conn(conn)
 
-        conn.commit()
+    def explain_query_plan(self, sql: str, params: Tuple = ()) -> List[str]:
+        """Retourne le plan d'exécution SQLite d'une requête (une ligne par étape)"""
+        conn = self.get_connection()
+        try:
+            return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+        finally:
+            self._close_conn(conn)
 
-        # Initialiser les utilisateurs par défaut (réutilise la même connexion)
-        self.init_default_users(conn)
+    def _keyset_page(self, table: str, keys: Tuple[str, ...], limit: int, after: Optional[Tuple] = None,
+                     where: str = "", params: Tuple = (), columns: str = "*",
+                     descending: bool = True) -> Tuple[List[Dict], Optional[Tuple]]:
+        """Page de résultats par pagination sur clé (seek)
 
-        # Initialiser les critères ISO 27001 (réutilise la même connexion)
-        self.init_iso_criteria(conn)
+        `keys` sont les colonnes de tri, la dernière étant unique (id) ; un
+        index sur ces colonnes dans cet ordre permet de reprendre directement
+        après `after`, quel que soit le rang de la page. Retourne les lignes
+        et le curseur de la page suivante (None sur la dernière page).
+        """
+        clauses = [where] if where else []
+        if after is not None:
+            placeholders = ", ".join("?" for _ in keys)
+            clauses.append(f"({', '.join(keys)}) {'<' if descending else '>'} ({placeholders})")
+            params = tuple(params) + tuple(after)
+        direction = "DESC" if descending else "ASC"
+        sql = f"SELECT {columns} FROM {table}"
+        if clauses:
+            sql += " WHERE " + " AND ".join(clauses)
+        sql += " ORDER BY " + ", ".join(f"{key} {direction}" for key in keys) + " LIMIT ?"
 
-        # Initialiser les paramètres par défaut (réutilise la même connexion)
-        self.init_default_settings(conn)
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(sql, tuple(params) + (limit + 1,)).fetchall()
+        finally:
+            self._close_conn(conn)
+        items = [dict(row) for row in rows[:limit]]
+        next_cursor = tuple(items[-1][key] for key in keys) if len(rows) > limit else None
+        return items, next_cursor
+
+    def _iter_keyset(self, table: str, keys: Tuple[str, ...], batch_size: int = 500, **kwargs) -> Iterator[Dict]:
+        """Parcourt une table par lots de `batch_size` lignes
+
+        La connexion est rendue au pool entre deux lots : un itérateur
+        abandonné en cours de route ne garde ni connexion ni transaction.
+        """
+        after = None
+        while True:
+            items, after = self._keyset_page(table, keys, batch_size, after, **kwargs)
+            yield from items
+            if after is None:
+                return
 
-        # Fermer la connexion ouverte pour l'initialisation
-        self._close_conn(conn)
-    
     def init_default_users(self, conn: sqlite3.Connection = None):
         """Initialise les utilisateurs par défaut
 
-        Si une connexion est fournie, elle est réutilisée (utile pour
-        init_database et les bases en mémoire). Si aucune connexion n'est
-        fournie, la méthode ouvrira et fermera sa propre connexion.
+        Si une connexion est fournie, elle est réutilisée sans commit (utile
+        pour la transaction de migration et les bases en mémoire). Si aucune
+        connexion n'est fournie, la méthode ouvrira, validera et fermera sa
+        propre connexion.
         """
         own_conn = conn is None
         if own_conn:
@@ -160,19 +576,25 @@ class Database:
             ("user01", "User@2025", "Utilisateur")
         ]
         
+        # Pendant la migration 1, les colonnes de politique de hachage n'existent
+        # pas encore : la migration 14 les renseigne d'après les empreintes
+        avec_politique = 'hash_cout' in {row[1] for row in cursor.execute("PRAGMA table_info(users)")}
+        
         for username, password, role in default_users:
             cursor.execute("SELECT id FROM users WHERE username = ?", (username,))
             if not cursor.fetchone():
-                password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
                 cursor.execute("""
                     INSERT INTO users (username, password_hash, role, created_at)
                     VALUES (?, ?, ?, ?)
-                """, (username, password_hash, role, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        
-        # Toujours committer les insertions, pas seulement pour own_conn
-        conn.commit()
+                """, (username, self.hash_policy.hash(password), role, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                if avec_politique:
+                    cursor.execute("UPDATE users SET hash_algorithme = ?, hash_cout = ? WHERE id = ?",
+                                   (self.hash_policy.algorithme, self.hash_policy.cout, cursor.lastrowid))
         
+        # Une connexion fournie appartient à l'appelant (transaction de migration) :
+        # c'est lui qui valide
         if own_conn:
+            conn.commit()
             self._close_conn(conn)
     
     def init_iso_criteria(self, conn: sqlite3.Connection = None):
@@ -301,10 +723,8 @@ class Database:
                 VALUES (?, ?, ?, ?, 'Non conforme', ?)
             """, (code, titre, description, categorie, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
         
-        # Toujours committer les insertions
-        conn.commit()
-        
         if own_conn:
+            conn.commit()
             self._close_conn(conn)
     
     def init_default_settings(self, conn: sqlite3.Connection = None):
@@ -328,79 +748,126 @@ class Database:
             if not cursor.fetchone():
                 cursor.execute("INSERT INTO settings (cle, valeur) VALUES (?, ?)", (cle, valeur))
         
-        # Toujours committer les insertions
-        conn.commit()
-        
         if own_conn:
+            conn.commit()
             self._close_conn(conn)
     
     # Méthodes pour les utilisateurs
-    def verify_user(self, username: str, password: str) -> Optional[Dict]:
-        """Vérifie les identifiants d'un utilisateur"""
+    def verify_user(self, username: str, password: str,
+                    check: Optional[Callable[[bytes, bytes], bool]] = None,
+                    rehash: Optional[Callable[[int, str], object]] = None) -> Optional[Dict]:
+        """
+        Vérifie les identifiants d'un utilisateur
+
+        `check(mot_de_passe, empreinte)` compare le mot de passe à son empreinte
+        bcrypt (par défaut bcrypt.checkpw) ; la connexion est rendue au pool
+        pendant cette comparaison, qui peut être longue. Une empreinte plus
+        faible que la politique de hachage est refaite après une vérification
+        réussie (une fois par utilisateur et par changement de politique) par
+        `rehash(user_id, mot_de_passe)`, par défaut rehash_password dans le
+        thread appelant.
+        """
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM users WHERE username = ?", (username,))
-        user = cursor.fetchone()
+        try:
+            user = conn.execute("SELECT * FROM users WHERE username = ?", (username,)).fetchone()
+        finally:
+            self._close_conn(conn)
         
-        if user and bcrypt.checkpw(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
-            cursor.execute("""
+        check = check or bcrypt.checkpw
+        if user and check(password.encode('utf-8'), user['password_hash'].encode('utf-8')):
+            self._record_login(user['id'])
+            if self.hash_policy.needs_rehash(user['hash_algorithme'], user['hash_cout']):
+                (rehash or self.rehash_password)(user['id'], password)
+            return dict(user)
+        return None
+    
+    @_retry_on_locked
+    def _record_login(self, user_id: int):
+        """Enregistre la date de dernière connexion d'un utilisateur"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
                 UPDATE users SET last_login = ? WHERE id = ?
-            """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), user['id']))
+            """, (datetime.now().strftime('%Y-%m-%d %H:%M:%S'), user_id))
             conn.commit()
+        finally:
+            self._close_conn(conn)
+    
+    def rehash_password(self, user_id: int, password: str):
+        """Refait l'empreinte d'un mot de passe (déjà vérifié) selon la politique de hachage"""
+        politique = self.hash_policy
+        password_hash = politique.hash(password)
+        self._save_password_hash(user_id, password_hash, politique.algorithme, politique.cout)
+    
+    @_retry_on_locked
+    def _save_password_hash(self, user_id: int, password_hash: str, algorithme: str, cout: int):
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                UPDATE users SET password_hash = ?, hash_algorithme = ?, hash_cout = ? WHERE id = ?
+            """, (password_hash, algorithme, cout, user_id))
+            conn.commit()
+        finally:
             self._close_conn(conn)
-            return dict(user)
-        
-        conn.close()
-        return None
     
     def get_all_users(self) -> List[Dict]:
         """Récupère tous les utilisateurs"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, username, role, created_at, last_login FROM users")
-        users = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return users
+        return list(self.iter_users())
+
+    def get_users_page(self, limit: int = 50, after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """Page d'utilisateurs triés par id, à partir du curseur `after`"""
+        return self._keyset_page("users", ("id",), limit, after, columns=_USER_COLUMNS, descending=False)
+
+    def iter_users(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Itère sur les utilisateurs par lots, sans tout charger en mémoire"""
+        return self._iter_keyset("users", ("id",), batch_size, columns=_USER_COLUMNS, descending=False)
     
     def add_user(self, username: str, password: str, role: str) -> bool:
         """Ajoute un nouvel utilisateur"""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
-            password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
             cursor.execute("""
-                INSERT INTO users (username, password_hash, role, created_at)
-                VALUES (?, ?, ?, ?)
-            """, (username, password_hash, role, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+                INSERT INTO users (username, password_hash, hash_algorithme, hash_cout, role, created_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (username, self.hash_policy.hash(password), self.hash_policy.algorithme, self.hash_policy.cout,
+                  role, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
             conn.commit()
-            self._close_conn(conn)
             return True
         except:
             return False
+        finally:
+            self._close_conn(conn)
     
     def delete_user(self, user_id: int) -> bool:
         """Supprime un utilisateur"""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute("DELETE FROM users WHERE id = ?", (user_id,))
+            cursor.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
             conn.commit()
-            conn.close()
             return True
         except:
             return False
+        finally:
+            self._close_conn(conn)
     
     def get_user_by_id(self, user_id: int) -> Optional[Dict]:
         """Récupère un utilisateur par son ID"""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute("SELECT * FROM users WHERE id = ?", (user_id,))
             user = cursor.fetchone()
-            conn.close()
             return dict(user) if user else None
         except:
             return None
+        finally:
+            self._close_conn(conn)
     
     # Méthodes pour les critères ISO
     def get_all_criteres(self) -> List[Dict]:
@@ -409,7 +876,7 @@ class Database:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM criteres ORDER BY code")
         criteres = [dict(row) for row in cursor.fetchall()]
-        conn.close()
+        self._close_conn(conn)
         return criteres
     
     def get_critere_by_id(self, critere_id: int) -> Optional[Dict]:
@@ -418,34 +885,159 @@ class Database:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM criteres WHERE id = ?", (critere_id,))
         critere = cursor.fetchone()
-        conn.close()
+        self._close_conn(conn)
         return dict(critere) if critere else None
     
+    @_retry_on_locked
     def update_critere(self, critere_id: int, statut: str, commentaire: str, preuve_path: str = None):
         """Met à jour un critère"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE criteres
-            SET statut = ?, commentaire = ?, preuve_path = ?, derniere_maj = ?
-            WHERE id = ?
-        """, (statut, commentaire, preuve_path, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), critere_id))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE criteres
+                SET statut = ?, commentaire = ?, preuve_path = ?, derniere_maj = ?
+                WHERE id = ?
+            """, (statut, commentaire, preuve_path, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), critere_id))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
     
-    def get_conformity_stats(self) -> Dict:
-        """Calcule les statistiques de conformité"""
+    @_retry_on_locked
+    def bulk_update_criteres(self, changes: List[Dict]) -> List[Dict]:
+        """Met à jour plusieurs critères dans une seule transaction
+
+        Chaque changement est un dictionnaire {'id', 'statut'[, 'commentaire',
+        'preuve_path']} ; un champ absent conserve la valeur actuelle, un champ
+        présent la remplace (une chaîne vide efface le commentaire).
+        Les changements invalides (statut inconnu, critère inexistant) sont
+        écartés, les autres appliqués par un seul executemany. Retourne un
+        résultat par changement, dans l'ordre : {'id', 'succes', 'erreur'}.
+        """
+        if not changes:
+            return []
         conn = self.get_connection()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT statut, COUNT(*) as count FROM criteres GROUP BY statut")
-        stats = {row['statut']: row['count'] for row in cursor.fetchall()}
-        
-        cursor.execute("SELECT COUNT(*) as total FROM criteres")
-        total = cursor.fetchone()['total']
-        
-        conn.close()
-        
+        try:
+            ids = list({change.get('id') for change in changes})
+            existing = set()
+            for start in range(0, len(ids), 500):
+                chunk = ids[start:start + 500]
+                existing.update(row[0] for row in conn.execute(
+                    f"SELECT id FROM criteres WHERE id IN ({', '.join('?' for _ in chunk)})", chunk
+                ))
+
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            results, rows = [], []
+            for change in changes:
+                critere_id, statut = change.get('id'), change.get('statut')
+                if critere_id not in existing:
+                    erreur = f"Critère {critere_id} introuvable"
+                elif statut not in STATUT_WEIGHTS:
+                    erreur = f"Statut invalide : {statut}"
+                else:
+                    erreur = None
+                    rows.append((statut, 'commentaire' in change, change.get('commentaire'),
+                                 'preuve_path' in change, change.get('preuve_path'), now, critere_id))
+                results.append({'id': critere_id, 'succes': erreur is None, 'erreur': erreur})
+
+            if rows:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany("""
+                    UPDATE criteres
+                    SET statut = ?,
+                        commentaire = CASE WHEN ? THEN ? ELSE commentaire END,
+                        preuve_path = CASE WHEN ? THEN ? ELSE preuve_path END,
+                        derniere_maj = ?
+                    WHERE id = ?
+                """, rows)
+                conn.commit()
+            return results
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._close_conn(conn)
+
+    def get_category_status_matrix(self) -> List[Tuple[str, str, int]]:
+        """Matrice catégorie × statut : tuples (categorie, statut, nombre)
+
+        Lue dans la table conformity_snapshot, maintenue par triggers à chaque
+        écriture sur criteres : le coût ne dépend pas du nombre de critères.
+        Les autres agrégats de conformité se calculent à partir de ce résultat.
+        """
+        return [(categorie, statut, nombre) for categorie, statut, nombre, _ in self.get_conformity_snapshot()]
+
+    def get_conformity_snapshot(self) -> List[Tuple[str, str, int, int]]:
+        """Instantané de conformité : tuples (categorie, statut, nombre, points pondérés)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute(
+                "SELECT categorie, statut, nombre, points FROM conformity_snapshot WHERE nombre > 0"
+            )
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def check_conformity_snapshot(self, rebuild: bool = True) -> bool:
+        """Vérifie l'instantané de conformité par rapport à la table criteres
+
+        Retourne True si l'instantané est cohérent. Sinon, et si `rebuild`
+        est vrai, il est reconstruit à partir de criteres dans une transaction.
+        """
+        points_sql = _weight_case_sql("IFNULL(statut, '')")
+        recount_sql = f"""
+            SELECT categorie, IFNULL(statut, ''), COUNT(*), SUM({points_sql})
+            FROM criteres
+            GROUP BY categorie, statut
+        """
+        conn = self.get_connection()
+        try:
+            expected = {tuple(row) for row in conn.execute(recount_sql).fetchall()}
+            actual = {tuple(row) for row in conn.execute(
+                "SELECT categorie, statut, nombre, points FROM conformity_snapshot WHERE nombre <> 0 OR points <> 0"
+            ).fetchall()}
+            if expected == actual:
+                return True
+            if rebuild:
+                conn.execute("DELETE FROM conformity_snapshot")
+                conn.execute(f"INSERT INTO conformity_snapshot (categorie, statut, nombre, points) {recount_sql}")
+                conn.commit()
+            return False
+        finally:
+            self._close_conn(conn)
+
+    def get_category_conformity_rates(self, matrix: List[Tuple[str, str, int]] = None) -> List[Tuple[str, int, int, float]]:
+        """Taux par catégorie : tuples (categorie, total, conformes, taux_pondere)
+
+        `conformes` compte les critères conformes ou largement conformes ;
+        `taux_pondere` applique la pondération de get_conformity_stats.
+        """
+        if matrix is None:
+            matrix = self.get_category_status_matrix()
+        by_category: Dict[str, List[float]] = {}
+        for categorie, statut, count in matrix:
+            totals = by_category.setdefault(categorie, [0, 0, 0])
+            totals[0] += count
+            if statut in STATUTS_CONFORMES:
+                totals[1] += count
+            totals[2] += count * STATUT_WEIGHTS.get(statut, 0)
+        return [
+            (categorie, total, conformes, round(points / total, 2) if total else 0.0)
+            for categorie, (total, conformes, points) in sorted(by_category.items())
+        ]
+
+    def get_conformity_stats(self, matrix: List[Tuple[str, str, int]] = None) -> Dict:
+        """Calcule les statistiques de conformité"""
+        if matrix is None:
+            matrix = self.get_category_status_matrix()
+
+        stats: Dict[str, int] = {}
+        for _, statut, count in matrix:
+            stats[statut] = stats.get(statut, 0) + count
+        total = sum(stats.values())
+
         # Calculer le taux de conformité avec pondération
         conforme = stats.get('Conforme', 0)
         largement_conforme = stats.get('Largement conforme', 0)
@@ -454,7 +1046,7 @@ class Database:
         non_conforme = stats.get('Non conforme', 0)
         
         # Pondération: Conforme=100%, Largement=80%, Partiellement=50%, Faiblement=30%, Non=0%
-        taux_pondere = (conforme * 100 + largement_conforme * 80 + partiellement_conforme * 50 + faiblement_conforme * 30) / total if total > 0 else 0
+        taux_pondere = sum(count * STATUT_WEIGHTS.get(statut, 0) for statut, count in stats.items()) / total if total > 0 else 0
         
         return {
             'conforme': conforme,
@@ -465,29 +1057,424 @@ class Database:
             'total': total,
             'taux_conformite': round(taux_pondere, 2)
         }
+
+    def get_criteres_by_statut(self, statut: str, limit: int = None) -> List[Dict]:
+        """Récupère les critères d'un statut donné (triés par code)"""
+        conn = self.get_connection()
+        try:
+            sql = "SELECT * FROM criteres WHERE statut = ? ORDER BY code"
+            params: Tuple = (statut,)
+            if limit is not None:
+                sql += " LIMIT ?"
+                params += (limit,)
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            self._close_conn(conn)
     
+    def get_critere_history(self, critere_id: int, limit: int = None) -> List[Dict]:
+        """Historique des changements de statut d'un critère (du plus récent au plus ancien)"""
+        conn = self.get_connection()
+        try:
+            sql = """
+                SELECT * FROM critere_history
+                WHERE critere_id = ?
+                ORDER BY date_modification DESC
+            """
+            params: Tuple = (critere_id,)
+            if limit is not None:
+                sql += " LIMIT ?"
+                params += (limit,)
+            return [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            self._close_conn(conn)
+
+    def refresh_conformity_rollups_if_stale(self, max_age: float = ROLLUP_REFRESH_INTERVAL) -> int:
+        """Rafraîchit les agrégats au plus une fois par `max_age` secondes et par processus
+
+        Destiné aux pages de consultation : les lecteurs ne se disputent pas
+        le verrou d'écriture, et un lecteur qui trouve un rafraîchissement en
+        cours dans un autre thread ne l'attend pas. Retourne le nombre de
+        lignes journalières écrites (0 si rien n'a été fait).
+        """
+        if not self._rollups_lock.acquire(blocking=False):
+            return 0
+        try:
+            now = time.monotonic()
+            if self._rollups_refreshed_at is not None and now - self._rollups_refreshed_at < max_age:
+                return 0
+            self._rollups_refreshed_at = now
+            return self.refresh_conformity_rollups()
+        finally:
+            self._rollups_lock.release()
+
+    @_retry_on_locked
+    def refresh_conformity_rollups(self, today: date = None) -> int:
+        """Met à jour les agrégats journaliers, hebdomadaires et mensuels
+
+        L'état de fin de journée est reconstruit à rebours depuis
+        l'instantané courant en retranchant les changements de critere_history
+        postérieurs : seuls les jours depuis le dernier agrégat sont recalculés
+        (le dernier jour inclus, qui a pu changer depuis). Retourne le nombre
+        de lignes journalières écrites, 0 si rien n'a changé.
+        """
+        today = today or date.today()
+        conn = self.get_connection()
+        try:
+            last_day = conn.execute(
+                "SELECT MAX(debut) FROM conformity_rollup WHERE periode = 'jour'"
+            ).fetchone()[0]
+            last_history_id = conn.execute("SELECT IFNULL(MAX(id), 0) FROM critere_history").fetchone()[0]
+            watermark = conn.execute(
+                "SELECT valeur FROM settings WHERE cle = 'conformity_rollup_history_id'"
+            ).fetchone()
+            if last_day == today.isoformat() and watermark and int(watermark[0]) == last_history_id:
+                return 0
+
+            conn.execute("BEGIN IMMEDIATE")
+            if last_day is None:
+                first_change = conn.execute("SELECT MIN(date_modification) FROM critere_history").fetchone()[0]
+                start = date.fromisoformat(first_change[:10]) if first_change else today
+            else:
+                start = date.fromisoformat(last_day)
+            start = min(start, today)
+
+            # Variations (total, conformes, points) par jour et par catégorie après `start`
+            deltas: Dict[date, Dict[str, List[int]]] = {}
+            changes = conn.execute("""
+                SELECT date_modification, categorie, ancien_statut, nouveau_statut
+                FROM critere_history
+                WHERE date_modification >= ?
+                ORDER BY date_modification
+            """, ((start + timedelta(days=1)).isoformat(),))
+            for modifie_le, categorie, ancien, nouveau in changes:
+                jour = min(date.fromisoformat(modifie_le[:10]), today + timedelta(days=1))
+                delta = deltas.setdefault(jour, {}).setdefault(categorie, [0, 0, 0])
+                for statut, sign in ((nouveau, 1), (ancien, -1)):
+                    if statut is not None:
+                        delta[0] += sign
+                        delta[1] += sign * (statut in STATUTS_CONFORMES)
+                        delta[2] += sign * STATUT_WEIGHTS.get(statut, 0)
+
+            state: Dict[str, List[int]] = {}
+            for categorie, statut, nombre, points in conn.execute(
+                "SELECT categorie, statut, nombre, points FROM conformity_snapshot"
+            ):
+                totals = state.setdefault(categorie, [0, 0, 0])
+                totals[0] += nombre
+                totals[1] += nombre * (statut in STATUTS_CONFORMES)
+                totals[2] += points
+
+            def rewind(jour: date):
+                for categorie, delta in deltas.get(jour, {}).items():
+                    totals = state.setdefault(categorie, [0, 0, 0])
+                    for i in range(3):
+                        totals[i] -= delta[i]
+
+            # Changements horodatés dans le futur : rattachés au lendemain, donc ignorés
+            rewind(today + timedelta(days=1))
+            rows = []
+            jour = today
+            while jour >= start:
+                rows.extend(
+                    ('jour', jour.isoformat(), categorie, *totals)
+                    for categorie, totals in state.items() if totals[0] > 0
+                )
+                rewind(jour)
+                jour -= timedelta(days=1)
+
+            conn.execute("DELETE FROM conformity_rollup WHERE periode = 'jour' AND debut >= ?", (start.isoformat(),))
+            conn.executemany("""
+                INSERT INTO conformity_rollup (periode, debut, categorie, total, conformes, points)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, rows)
+
+            # Semaines et mois : état du dernier jour connu de chaque période
+            for periode, debut_sql in ROLLUP_PERIODS.items():
+                period_start = conn.execute(
+                    f"SELECT {debut_sql} FROM (SELECT ? AS debut)", (start.isoformat(),)
+                ).fetchone()[0]
+                conn.execute(
+                    "DELETE FROM conformity_rollup WHERE periode = ? AND debut >= ?", (periode, period_start)
+                )
+                conn.execute(f"""
+                    INSERT INTO conformity_rollup (periode, debut, categorie, total, conformes, points)
+                    SELECT ?, periode_debut, categorie, total, conformes, points
+                    FROM (
+                        SELECT {debut_sql} AS periode_debut, categorie, total, conformes, points, MAX(debut)
+                        FROM conformity_rollup
+                        WHERE periode = 'jour' AND debut >= ?
+                        GROUP BY periode_debut, categorie
+                    )
+                """, (periode, period_start))
+
+            conn.execute("""
+                INSERT OR REPLACE INTO settings (cle, valeur)
+                VALUES ('conformity_rollup_history_id', ?)
+            """, (str(last_history_id),))
+            conn.commit()
+            return len(rows)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._close_conn(conn)
+
+    def get_conformity_trend(self, periode: str = 'mois', debut: str = None, fin: str = None,
+                             categorie: str = None) -> List[Tuple[str, int, int, float]]:
+        """Série temporelle de conformité : tuples (debut, total, conformes, taux_pondere)
+
+        `periode` vaut 'jour', 'semaine' ou 'mois' ; `debut` et `fin` (AAAA-MM-JJ)
+        bornent la plage, lue par intervalle sur la clé primaire de conformity_rollup.
+        Sans `categorie`, les catégories sont additionnées.
+        """
+        sql = """
+            SELECT debut, SUM(total), SUM(conformes), SUM(points)
+            FROM conformity_rollup
+            WHERE periode = ? AND debut >= ? AND debut <= ?
+        """
+        params: Tuple = (periode, debut or '0000-00-00', fin or '9999-12-31')
+        if categorie is not None:
+            sql += " AND categorie = ?"
+            params += (categorie,)
+        sql += " GROUP BY debut ORDER BY debut"
+        conn = self.get_connection()
+        try:
+            return [
+                (jour, total, conformes, round(points / total, 2) if total else 0.0)
+                for jour, total, conformes, points in conn.execute(sql, params).fetchall()
+            ]
+        finally:
+            self._close_conn(conn)
+
+    def get_conformity_rate_at(self, jour: str) -> Optional[float]:
+        """Taux de conformité pondéré à la fin du jour `jour` (dernier agrégat connu à cette date)"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT SUM(total), SUM(points)
+                FROM conformity_rollup
+                WHERE periode = 'jour' AND debut = (
+                    SELECT MAX(debut) FROM conformity_rollup WHERE periode = 'jour' AND debut <= ?
+                )
+            """, (jour,)).fetchone()
+            return round(row[1] / row[0], 2) if row and row[0] else None
+        finally:
+            self._close_conn(conn)
+
+    def sync_iso_search_index(self, commentaires: Dict[str, str] = None) -> bool:
+        """Indexe les commentaires ISO 27001 (iso27001_annexe_a.json) pour la recherche
+
+        Une empreinte du contenu est conservée dans settings : l'index n'est
+        réécrit que lorsque le fichier a changé. Retourne True s'il a été réécrit.
+        """
+        if commentaires is None:
+            from utils.iso_commentaires import load_commentaires
+            commentaires = load_commentaires(ISO_ANNEXE_PATH)
+        signature = hashlib.sha256(repr(sorted(commentaires.items())).encode("utf-8")).hexdigest()
+        if self.get_setting("search_iso_signature") == signature:
+            return False
+
+        rank = migrations.SEARCH_SOURCES.index('iso')
+        rows = [
+            (i * migrations.SEARCH_SOURCE_COUNT + rank, code, code, commentaire)
+            for i, (code, commentaire) in enumerate(sorted(commentaires.items()), start=1)
+        ]
+        conn = self.get_connection()
+        try:
+            conn.execute("DELETE FROM search_index WHERE source = 'iso'")
+            conn.executemany("""
+                INSERT INTO search_index (rowid, source, ref_id, code, titre, contenu)
+                VALUES (?, 'iso', ?, ?, '', ?)
+            """, rows)
+            conn.execute("""
+                INSERT OR REPLACE INTO settings (cle, valeur)
+                VALUES ('search_iso_signature', ?)
+            """, (signature,))
+            conn.commit()
+            return True
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._close_conn(conn)
+
+    def search(self, query: str, sources: Tuple[str, ...] = None, limit: int = 50) -> List[Dict]:
+        """Recherche plein texte classée (BM25) dans critères, documents, directives et exigences ISO
+
+        Retourne des dictionnaires (source, ref_id, code, titre, extrait, score),
+        du plus pertinent au moins pertinent ; `titre` et `extrait` sont du
+        HTML échappé où seuls les termes trouvés sont encadrés de <mark>...</mark>.
+
+        Le filtre par source fait partie de la requête MATCH : seules les
+        lignes des sources demandées sont classées. Le coût d'une recherche
+        croît avec le nombre de lignes qui correspondent à tous les termes
+        (environ 2,5 µs par ligne classée) : l'objectif de 10 ms tient
+        jusqu'à quelques milliers de lignes, au-delà (terme ou préfixe présent
+        dans presque tous les documents d'un grand corpus) il est dépassé.
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        is_code = _CODE_PATTERN.fullmatch(query.strip()) is not None
+        if is_code:
+            # Saisie d'un code (ex. « 5.1 ») : recherche limitée à la colonne code
+            match = f"code : ({match})"
+        else:
+            match = f"{{code titre contenu}} : ({match})"
+        if sources:
+            inconnues = set(sources) - set(migrations.SEARCH_SOURCES)
+            if inconnues:
+                raise ValueError(f"Sources de recherche inconnues : {', '.join(sorted(inconnues))}")
+            filtre = " OR ".join(f'"{source}"' for source in sources)
+            match = f"source : ({filtre}) AND {match}"
+        sql = """
+            SELECT source, ref_id, code,
+                   highlight(search_index, 3, ?, ?) AS titre,
+                   snippet(search_index, 4, ?, ?, '…', 16) AS extrait,
+                   rank AS score
+            FROM search_index
+            WHERE search_index MATCH ?
+        """
+        params: Tuple = (_MARK_START, _MARK_END, _MARK_START, _MARK_END, match)
+        if is_code:
+            # La correspondance exacte passe avant les codes de même préfixe
+            sql += " ORDER BY code = ? DESC, rank LIMIT ?"
+            params += (query.strip(), limit)
+        else:
+            sql += " ORDER BY rank LIMIT ?"
+            params += (limit,)
+        conn = self.get_connection()
+        try:
+            results = [dict(row) for row in conn.execute(sql, params).fetchall()]
+        finally:
+            self._close_conn(conn)
+        for result in results:
+            result['titre'] = _highlighted_html(result['titre'])
+            result['extrait'] = _highlighted_html(result['extrait'])
+        return results
+
+    @_retry_on_locked
+    def import_batch(self, kind: str, rows: List[Tuple]) -> int:
+        """Écrit un lot de lignes validées (voir IMPORT_SQL) dans une seule transaction
+
+        Chaque ligne se termine par l'horodatage d'écriture, ajouté ici.
+        Retourne le nombre de lignes écrites.
+        """
+        if not rows:
+            return 0
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(IMPORT_SQL[kind], [tuple(row) + (now,) for row in rows])
+            conn.commit()
+            return len(rows)
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._close_conn(conn)
+
+    @staticmethod
+    def _export_query(kind: str, since: Optional[str] = None) -> Tuple[str, tuple]:
+        """Requête d'export, restreinte aux lignes écrites depuis `since` si fourni"""
+        query = EXPORT_QUERIES[kind]
+        if since is None:
+            return query, ()
+        select, order = query.split(" ORDER BY ")
+        where = " AND " if " WHERE " in select else " WHERE "
+        return f"{select}{where}{EXPORT_CHANGE_COLUMNS[kind]} >= ? ORDER BY {order}", (since,)
+
+    @contextmanager
+    def export_cursor(self, kind: str, since: Optional[str] = None) -> Iterator[sqlite3.Cursor]:
+        """Curseur sur une table exportable (voir EXPORT_QUERIES), à lire par fetchmany
+
+        La connexion reste empruntée le temps du bloc `with` : l'export lit un
+        instantané cohérent de la table sans la charger en mémoire.
+
+        Args:
+            kind: Table exportée
+            since: Horodatage 'AAAA-MM-JJ HH:MM:SS' ; seules les lignes écrites
+                depuis (bornes incluses) sont renvoyées
+        """
+        conn = self.get_connection()
+        try:
+            yield conn.execute(*self._export_query(kind, since))
+        finally:
+            self._close_conn(conn)
+
+    @contextmanager
+    def export_snapshot(self, since: Optional[str] = None) -> Iterator[Tuple[Callable[[str], sqlite3.Cursor], str]]:
+        """Instantané de lecture commun à plusieurs tables exportées
+
+        Fournit une fonction kind -> curseur et l'horodatage de l'instantané ;
+        toutes les tables sont lues dans la même transaction, donc cohérentes
+        entre elles (historique et suppressions compris). L'horodatage est lu
+        par la requête qui ouvre l'instantané : une ligne validée pendant
+        l'export porte une date postérieure et sort au lot suivant.
+        """
+        conn = self.get_connection()
+        started = not conn.in_transaction
+        try:
+            if started:
+                conn.execute("BEGIN")
+            # Lire une table fige l'instantané (BEGIN seul ne lit rien)
+            instant = conn.execute(
+                "SELECT strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'), COUNT(*) FROM sqlite_master"
+            ).fetchone()[0]
+            yield (lambda kind: conn.execute(*self._export_query(kind, since))), instant
+        finally:
+            if started and conn.in_transaction:
+                conn.rollback()
+            self._close_conn(conn)
+
     # Méthodes pour les audits
-    def add_audit(self, titre: str, date_audit: str, auditeur: str, statut: str, score: float, commentaires: str) -> int:
+    @_retry_on_locked
+    def add_audit(self, titre: str, date_audit: str, auditeur: str, statut: str, score: float, commentaires: str,
+                  rapport_path: str = None) -> int:
         """Ajoute un nouvel audit"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO audits (titre, date_audit, auditeur, statut, score, commentaires, created_at)
-            VALUES (?, ?, ?, ?, ?, ?, ?)
-        """, (titre, date_audit, auditeur, statut, score, commentaires, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        audit_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return audit_id
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO audits (titre, date_audit, auditeur, statut, score, commentaires, rapport_path, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (titre, date_audit, auditeur, statut, score, commentaires, rapport_path,
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            audit_id = cursor.lastrowid
+            conn.commit()
+            return audit_id
+        finally:
+            self._close_conn(conn)
     
     def get_all_audits(self) -> List[Dict]:
         """Récupère tous les audits"""
+        return list(self.iter_audits())
+
+    def get_audits_page(self, limit: int = 20, after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """Page d'audits du plus récent au plus ancien, à partir du curseur `after`"""
+        return self._keyset_page("audits", _AUDIT_KEYS, limit, after)
+
+    def iter_audits(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Itère sur les audits par lots (exports), sans tout charger en mémoire"""
+        return self._iter_keyset("audits", _AUDIT_KEYS, batch_size)
+
+    def get_audit_summary(self) -> Dict:
+        """Nombre d'audits et statistiques des scores renseignés"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM audits ORDER BY date_audit DESC")
-        audits = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return audits
+        try:
+            row = conn.execute("""
+                SELECT COUNT(*) AS total, COUNT(NULLIF(score, 0)) AS notes,
+                       AVG(NULLIF(score, 0)) AS score_moyen,
+                       MAX(NULLIF(score, 0)) AS score_max,
+                       MIN(NULLIF(score, 0)) AS score_min
+                FROM audits
+            """).fetchone()
+            return dict(row)
+        finally:
+            self._close_conn(conn)
     
     def get_audit_by_id(self, audit_id: int) -> Optional[Dict]:
         """Récupère un audit par son ID"""
@@ -495,85 +1482,143 @@ class Database:
         cursor = conn.cursor()
         cursor.execute("SELECT * FROM audits WHERE id = ?", (audit_id,))
         audit = cursor.fetchone()
-        conn.close()
+        self._close_conn(conn)
         return dict(audit) if audit else None
     
     def delete_audit(self, audit_id: int) -> bool:
         """Supprime un audit par son ID"""
+        conn = None
         try:
             conn = self.get_connection()
             cursor = conn.cursor()
             cursor.execute("DELETE FROM audits WHERE id = ?", (audit_id,))
             conn.commit()
-            success = cursor.rowcount > 0
-            conn.close()
-            return success
+            return cursor.rowcount > 0
         except Exception as e:
             print(f"Erreur lors de la suppression de l'audit: {e}")
             return False
+        finally:
+            self._close_conn(conn)
     
     # Méthodes pour les documents
+    @_retry_on_locked
     def add_document(self, titre: str, categorie: str, version: str, contenu: str, auteur: str, fichier_path: str = None):
         """Ajoute un nouveau document"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-        cursor.execute("""
-            INSERT INTO documents (titre, categorie, version, fichier_path, contenu, auteur, date_creation, derniere_modification)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-        """, (titre, categorie, version, fichier_path, contenu, auteur, now, now))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            cursor.execute("""
+                INSERT INTO documents (titre, categorie, version, fichier_path, contenu, auteur, date_creation, derniere_modification)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, (titre, categorie, version, fichier_path, contenu, auteur, now, now))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
     
     def get_documents_by_category(self, categorie: str) -> List[Dict]:
         """Récupère les documents d'une catégorie"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM documents WHERE categorie = ? ORDER BY date_creation DESC", (categorie,))
-        docs = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return docs
+        return list(self.iter_documents(categorie))
+
+    def get_documents_page(self, categorie: str, limit: int = 20,
+                           after: Optional[Tuple] = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """Page de documents d'une catégorie, du plus récent au plus ancien"""
+        return self._keyset_page("documents", _DOCUMENT_KEYS, limit, after,
+                                 where="categorie = ?", params=(categorie,))
+
+    def iter_documents(self, categorie: str, batch_size: int = 500) -> Iterator[Dict]:
+        """Itère sur les documents d'une catégorie par lots"""
+        return self._iter_keyset("documents", _DOCUMENT_KEYS, batch_size,
+                                 where="categorie = ?", params=(categorie,))
     
+    @_retry_on_locked
     def update_document(self, doc_id: int, contenu: str, version: str):
         """Met à jour un document"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            UPDATE documents
-            SET contenu = ?, version = ?, derniere_modification = ?
-            WHERE id = ?
-        """, (contenu, version, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), doc_id))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE documents
+                SET contenu = ?, version = ?, derniere_modification = ?
+                WHERE id = ?
+            """, (contenu, version, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), doc_id))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
     
     # Méthodes pour les directives
+    @_retry_on_locked
     def add_directive(self, titre: str, description: str, type_dir: str, efficacite: str, responsable: str):
         """Ajoute une nouvelle directive"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("""
-            INSERT INTO directives (titre, description, type, efficacite, responsable, date_creation)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (titre, description, type_dir, efficacite, responsable, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO directives (titre, description, type, efficacite, responsable, date_creation)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (titre, description, type_dir, efficacite, responsable, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
     
     def get_all_directives(self) -> List[Dict]:
         """Récupère toutes les directives"""
+        return list(self.iter_directives())
+
+    @staticmethod
+    def _directive_filter(type_dir: str = None, efficacite: str = None) -> Tuple[str, Tuple]:
+        clauses, params = [], ()
+        if type_dir is not None:
+            clauses.append("type = ?")
+            params += (type_dir,)
+        if efficacite is not None:
+            clauses.append("efficacite = ?")
+            params += (efficacite,)
+        return " AND ".join(clauses), params
+
+    def get_directives_page(self, limit: int = 20, after: Optional[Tuple] = None, type_dir: str = None,
+                            efficacite: str = None) -> Tuple[List[Dict], Optional[Tuple]]:
+        """Page de directives (filtrées par type et/ou efficacité), des plus récentes aux plus anciennes"""
+        where, params = self._directive_filter(type_dir, efficacite)
+        return self._keyset_page("directives", _DIRECTIVE_KEYS, limit, after, where=where, params=params)
+
+    def iter_directives(self, batch_size: int = 500) -> Iterator[Dict]:
+        """Itère sur les directives par lots, sans tout charger en mémoire"""
+        return self._iter_keyset("directives", _DIRECTIVE_KEYS, batch_size)
+
+    def count_directives(self, type_dir: str = None, efficacite: str = None) -> int:
+        """Nombre de directives correspondant aux filtres"""
+        where, params = self._directive_filter(type_dir, efficacite)
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("SELECT * FROM directives ORDER BY date_creation DESC")
-        directives = [dict(row) for row in cursor.fetchall()]
-        conn.close()
-        return directives
+        try:
+            sql = "SELECT COUNT(*) FROM directives" + (f" WHERE {where}" if where else "")
+            return conn.execute(sql, params).fetchone()[0]
+        finally:
+            self._close_conn(conn)
+
+    def get_directive_breakdown(self) -> List[Tuple[str, str, int]]:
+        """Répartition des directives : tuples (type, efficacite, nombre)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("""
+                SELECT type, efficacite, COUNT(*)
+                FROM directives
+                GROUP BY type, efficacite
+            """)
+            return [tuple(row) for row in cursor.fetchall()]
+        finally:
+            self._close_conn(conn)
     
+    @_retry_on_locked
     def delete_directive(self, directive_id: int):
         """Supprime une directive"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        cursor.execute("DELETE FROM directives WHERE id = ?", (directive_id,))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM directives WHERE id = ?", (directive_id,))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
     
     # Méthodes pour les paramètres
     def get_setting(self, cle: str) -> Optional[str]:
@@ -582,17 +1627,428 @@ class Database:
         cursor = conn.cursor()
         cursor.execute("SELECT valeur FROM settings WHERE cle = ?", (cle,))
         result = cursor.fetchone()
-        conn.close()
+        self._close_conn(conn)
         return result['valeur'] if result else None
     
+    @_retry_on_locked
     def update_setting(self, cle: str, valeur: str):
         """Met à jour un paramètre"""
         conn = self.get_connection()
-        cursor = conn.cursor()
-        # Utiliser INSERT OR REPLACE pour créer ou mettre à jour la clé
-        cursor.execute("""
-            INSERT OR REPLACE INTO settings (cle, valeur)
-            VALUES (?, ?)
-        """, (cle, valeur))
-        conn.commit()
-        conn.close()
+        try:
+            cursor = conn.cursor()
+            # Utiliser INSERT OR REPLACE pour créer ou mettre à jour la clé
+            cursor.execute("""
+                INSERT OR REPLACE INTO settings (cle, valeur)
+                VALUES (?, ?)
+            """, (cle, valeur))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    # Méthodes pour les preuves (voir utils/evidence.py)
+    @_retry_on_locked
+    def add_evidence(self, sha256: str, taille: int, nom: str, type_mime: Optional[str] = None,
+                     depose_par: Optional[str] = None) -> bool:
+        """Enregistre les métadonnées d'une preuve ; False si l'empreinte est déjà connue
+
+        Un nouveau dépôt d'un contenu connu rafraîchit date_depot : la preuve
+        bénéficie à nouveau du délai de grâce de purge_unreferenced.
+        """
+        conn = self.get_connection()
+        try:
+            connue = conn.execute("SELECT 1 FROM preuves WHERE sha256 = ?", (sha256,)).fetchone() is not None
+            conn.execute("""
+                INSERT INTO preuves (sha256, taille, type_mime, nom, depose_par, date_depot)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(sha256) DO UPDATE SET date_depot = excluded.date_depot
+            """, (sha256, taille, type_mime, nom, depose_par, datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.commit()
+            return not connue
+        finally:
+            self._close_conn(conn)
+
+    def get_evidence(self, sha256: str) -> Optional[Dict]:
+        """Récupère les métadonnées d'une preuve par empreinte"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM preuves WHERE sha256 = ?", (sha256,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    def get_unreferenced_evidence(self, deposees_avant: Optional[str] = None) -> List[str]:
+        """Empreintes des preuves qui ne sont plus référencées (critères, documents, audits, paramètres)
+
+        Args:
+            deposees_avant: Horodatage ; ignore les dépôts plus récents (pas encore rattachés)
+        """
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f"""
+                SELECT sha256 FROM preuves
+                WHERE date_depot < ? AND '{EVIDENCE_PREFIX}' || sha256 NOT IN (
+                    SELECT preuve_path FROM criteres WHERE preuve_path IS NOT NULL
+                    UNION SELECT fichier_path FROM documents WHERE fichier_path IS NOT NULL
+                    UNION SELECT rapport_path FROM audits WHERE rapport_path IS NOT NULL
+                    UNION SELECT valeur FROM settings WHERE valeur IS NOT NULL
+                )
+            """, (deposees_avant or '9999-12-31',)).fetchall()
+            return [row[0] for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def delete_evidence(self, sha256: str) -> bool:
+        """Supprime les métadonnées d'une preuve, son texte extrait et son aperçu"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM preuves WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM preuves_extraits WHERE sha256 = ?", (sha256,))
+            conn.execute("DELETE FROM preuves_texte WHERE sha256 = ?", (sha256,))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    def get_pending_evidence(self, limit: int = 100) -> List[Dict]:
+        """Preuves pas encore traitées (aperçu, texte), des plus anciennes aux plus récentes"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT p.sha256, p.nom, p.type_mime
+                FROM preuves p
+                LEFT JOIN preuves_extraits e ON e.sha256 = p.sha256
+                WHERE e.sha256 IS NULL
+                ORDER BY p.date_depot
+                LIMIT ?
+            """, (limit,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def save_evidence_extract(self, sha256: str, nom: str, octets: int, pages: Optional[int] = None,
+                              texte: str = "", apercu: bool = False, erreur: Optional[str] = None):
+        """Enregistre le résultat du traitement d'une preuve (remplace le précédent)"""
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute("""
+                INSERT OR REPLACE INTO preuves_extraits
+                    (sha256, pages, octets, caracteres, apercu, erreur, date_traitement)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (sha256, pages, octets, len(texte), int(apercu), erreur,
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S')))
+            conn.execute("DELETE FROM preuves_texte WHERE sha256 = ?", (sha256,))
+            if texte:
+                conn.execute("INSERT INTO preuves_texte (sha256, nom, texte) VALUES (?, ?, ?)",
+                             (sha256, nom, texte))
+            conn.commit()
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        finally:
+            self._close_conn(conn)
+
+    def get_evidence_extract(self, sha256: str) -> Optional[Dict]:
+        """Résultat du traitement d'une preuve (pages, octets, apercu, erreur) ou None"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM preuves_extraits WHERE sha256 = ?", (sha256,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    def search_evidence(self, query: str, limit: int = 20) -> List[Dict]:
+        """Recherche plein texte dans le contenu des preuves
+
+        Retourne des dictionnaires (sha256, nom, extrait, score, criteres) ;
+        `criteres` liste les codes des critères auxquels la preuve est jointe,
+        `extrait` est du HTML échappé (termes trouvés entre <mark>...</mark>).
+        """
+        match = _fts_query(query)
+        if not match:
+            return []
+        conn = self.get_connection()
+        try:
+            rows = conn.execute(f"""
+                SELECT t.sha256, t.nom,
+                       snippet(preuves_texte, 2, ?, ?, '…', 16) AS extrait,
+                       t.rank AS score,
+                       (SELECT group_concat(c.code, ', ') FROM criteres c
+                        WHERE c.preuve_path = '{EVIDENCE_PREFIX}' || t.sha256) AS criteres
+                FROM preuves_texte t
+                WHERE preuves_texte MATCH ?
+                ORDER BY t.rank
+                LIMIT ?
+            """, (_MARK_START, _MARK_END, match, limit)).fetchall()
+        finally:
+            self._close_conn(conn)
+        results = [dict(row) for row in rows]
+        for result in results:
+            result['extrait'] = _highlighted_html(result['extrait'])
+        return results
+
+    # Méthodes pour les téléversements par morceaux (voir utils/uploads.py)
+    @_retry_on_locked
+    def create_upload(self, upload_id: str, nom: str, taille: int, sha256_attendu: Optional[str] = None,
+                      type_mime: Optional[str] = None, depose_par: Optional[str] = None):
+        """Enregistre un téléversement en cours"""
+        conn = self.get_connection()
+        try:
+            now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+            conn.execute("""
+                INSERT INTO televersements (id, nom, taille, sha256_attendu, type_mime, depose_par, recu, date_debut, date_maj)
+                VALUES (?, ?, ?, ?, ?, ?, 0, ?, ?)
+            """, (upload_id, nom, taille, sha256_attendu, type_mime, depose_par, now, now))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    def get_upload(self, upload_id: str) -> Optional[Dict]:
+        """Récupère un téléversement en cours"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM televersements WHERE id = ?", (upload_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    def find_upload(self, nom: str, taille: int, sha256_attendu: Optional[str] = None,
+                    depose_par: Optional[str] = None) -> Optional[Dict]:
+        """Téléversement interrompu correspondant au même fichier (le plus avancé)"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT * FROM televersements
+                WHERE depose_par IS ? AND nom = ? AND taille = ? AND sha256_attendu IS ?
+                ORDER BY recu DESC
+                LIMIT 1
+            """, (depose_par, nom, taille, sha256_attendu)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def advance_upload(self, upload_id: str, recu_avant: int, recu_apres: int) -> bool:
+        """Avance le nombre d'octets reçus si personne ne l'a modifié entre-temps"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("""
+                UPDATE televersements SET recu = ?, date_maj = ?
+                WHERE id = ? AND recu = ?
+            """, (recu_apres, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), upload_id, recu_avant))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def delete_upload(self, upload_id: str) -> bool:
+        """Supprime un téléversement (terminé ou abandonné)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM televersements WHERE id = ?", (upload_id,))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    def get_stale_uploads(self, avant: str) -> List[str]:
+        """Identifiants des téléversements sans activité depuis `avant`"""
+        conn = self.get_connection()
+        try:
+            return [row[0] for row in conn.execute(
+                "SELECT id FROM televersements WHERE date_maj < ?", (avant,)).fetchall()]
+        finally:
+            self._close_conn(conn)
+
+    # Méthodes pour la file des rapports PDF (voir utils/report_jobs.py)
+    @_retry_on_locked
+    def create_report_job(self, job_id: str, type_rapport: str, audit_id: Optional[int] = None,
+                          demande_par: Optional[str] = None, lot: Optional[str] = None):
+        """Enregistre une demande de rapport en attente (éventuellement rattachée à un lot)"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                INSERT INTO rapports_jobs (id, type, audit_id, statut, progression, demande_par, date_demande, lot)
+                VALUES (?, ?, ?, 'en_attente', 0, ?, ?, ?)
+            """, (job_id, type_rapport, audit_id, demande_par, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), lot))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    def get_report_job(self, job_id: str) -> Optional[Dict]:
+        """Récupère une demande de rapport"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM rapports_jobs WHERE id = ?", (job_id,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    def find_active_report_job(self, type_rapport: str, audit_id: Optional[int] = None,
+                               demande_par: Optional[str] = None) -> Optional[Dict]:
+        """Demande identique encore en attente ou en cours pour le même utilisateur"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("""
+                SELECT * FROM rapports_jobs
+                WHERE demande_par IS ? AND type = ? AND audit_id IS ? AND statut IN ('en_attente', 'en_cours')
+                ORDER BY date_demande DESC
+                LIMIT 1
+            """, (demande_par, type_rapport, audit_id)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    def get_report_jobs(self, demande_par: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Demandes de rapport les plus récentes (d'un utilisateur, ou de tous)"""
+        conn = self.get_connection()
+        try:
+            if demande_par is None:
+                rows = conn.execute("SELECT * FROM rapports_jobs ORDER BY date_demande DESC LIMIT ?",
+                                    (limit,)).fetchall()
+            else:
+                rows = conn.execute("""
+                    SELECT * FROM rapports_jobs WHERE demande_par = ?
+                    ORDER BY date_demande DESC LIMIT ?
+                """, (demande_par, limit)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    def get_report_batch(self, lot: str) -> List[Dict]:
+        """Demandes d'un lot, dans l'ordre de leur création"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("SELECT * FROM rapports_jobs WHERE lot = ? ORDER BY date_demande, audit_id",
+                                (lot,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    def get_interrupted_report_jobs(self) -> List[Dict]:
+        """Demandes restées en attente ou en cours (processus arrêté avant leur fin)"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT * FROM rapports_jobs WHERE statut IN ('en_attente', 'en_cours')
+                ORDER BY date_demande
+            """).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def set_report_job_progress(self, job_id: str, progression: float) -> bool:
+        """Passe une demande en cours et enregistre son avancement (sans effet si elle est terminée)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("""
+                UPDATE rapports_jobs
+                SET statut = 'en_cours', progression = MAX(progression, ?), date_debut = COALESCE(date_debut, ?)
+                WHERE id = ? AND statut IN ('en_attente', 'en_cours')
+            """, (progression, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def reset_report_job(self, job_id: str):
+        """Remet une demande interrompue en attente"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                UPDATE rapports_jobs SET statut = 'en_attente', progression = 0, date_debut = NULL
+                WHERE id = ?
+            """, (job_id,))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def finish_report_job(self, job_id: str, chemin: Optional[str] = None, taille: Optional[int] = None,
+                          erreur: Optional[str] = None):
+        """Clôt une demande : terminée (chemin du PDF) ou en échec (erreur)"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                UPDATE rapports_jobs
+                SET statut = ?, progression = ?, chemin = ?, taille = ?, erreur = ?, date_fin = ?
+                WHERE id = ?
+            """, ('echec' if erreur else 'termine', 0 if erreur else 1, chemin, taille, erreur,
+                  datetime.now().strftime('%Y-%m-%d %H:%M:%S'), job_id))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    def get_expired_report_jobs(self, avant: str) -> List[Dict]:
+        """Demandes terminées ou en échec avant `avant` (id, chemin)"""
+        conn = self.get_connection()
+        try:
+            rows = conn.execute("""
+                SELECT id, chemin FROM rapports_jobs
+                WHERE statut IN ('termine', 'echec') AND date_fin < ?
+            """, (avant,)).fetchall()
+            return [dict(row) for row in rows]
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def delete_report_job(self, job_id: str) -> bool:
+        """Supprime une demande de rapport"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM rapports_jobs WHERE id = ?", (job_id,))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    # Méthodes pour les sessions de connexion (voir utils/sessions.py)
+    @_retry_on_locked
+    def save_session(self, jeton_hash: str, user_id: int, date_expiration: str):
+        """Enregistre une session de connexion"""
+        conn = self.get_connection()
+        try:
+            conn.execute("""
+                INSERT OR REPLACE INTO sessions (jeton_hash, user_id, date_creation, date_expiration)
+                VALUES (?, ?, ?, ?)
+            """, (jeton_hash, user_id, datetime.now().strftime('%Y-%m-%d %H:%M:%S'), date_expiration))
+            conn.commit()
+        finally:
+            self._close_conn(conn)
+
+    def get_session(self, jeton_hash: str) -> Optional[Dict]:
+        """Récupère une session par empreinte de jeton (user_id, date_expiration)"""
+        conn = self.get_connection()
+        try:
+            row = conn.execute("SELECT * FROM sessions WHERE jeton_hash = ?", (jeton_hash,)).fetchone()
+            return dict(row) if row else None
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def delete_session(self, jeton_hash: str) -> bool:
+        """Supprime une session (déconnexion)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM sessions WHERE jeton_hash = ?", (jeton_hash,))
+            conn.commit()
+            return cursor.rowcount == 1
+        finally:
+            self._close_conn(conn)
+
+    @_retry_on_locked
+    def delete_expired_sessions(self, maintenant: str) -> int:
+        """Supprime les sessions expirées à `maintenant` ; retourne leur nombre"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.execute("DELETE FROM sessions WHERE date_expiration <= ?", (maintenant,))
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            self._close_conn(conn)
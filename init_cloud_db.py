@@ -4,7 +4,7 @@ Initialise automatiquement les utilisateurs et critères ISO 27001
 """
 
 import streamlit as st
-from database import Database
+from database import get_database
 
 def init_cloud_database():
     """Initialise la base de données sur Streamlit Cloud au premier lancement"""
@@ -13,7 +13,7 @@ def init_cloud_database():
         st.info("🔄 Initialisation de la base de données pour Streamlit Cloud...")
         
         try:
-            db = Database()
+            db = get_database()
             
             # Vérifier si des données existent
             conn = db.get_connection()
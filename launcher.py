@@ -131,7 +131,7 @@ class SplashScreen:
 
 def launch_streamlit(port):
     """Lance l'application Streamlit"""
-    app_path = get_resource_path('app.py')
+    app_path = get_resource_path('serveur.py')
     
     sys.argv = [
         "streamlit",
@@ -0,0 +1,586 @@
+"""
+Moteur de migrations du schéma SQLite pour Sécurité 360
+Applique des migrations ordonnées et idempotentes, suivies par PRAGMA user_version
+"""
+
+import sqlite3
+from typing import Callable, List, Optional
+
+
+class MigrationError(Exception):
+    """Erreur levée quand une migration échoue (la transaction est annulée)"""
+
+
+class Migration:
+    """Étape de migration : amène le schéma à la version `version`
+
+    `apply(conn, db)` reçoit la connexion de la transaction en cours et
+    l'instance Database (pour les données par défaut). Une migration ne doit
+    jamais appeler commit() et doit pouvoir être rejouée sans effet de bord
+    (CREATE ... IF NOT EXISTS, add_column_if_missing, INSERT OR IGNORE).
+    """
+
+    def __init__(self, version: int, description: str, apply: Callable):
+        self.version = version
+        self.description = description
+        self.apply = apply
+
+
+MIGRATIONS: List[Migration] = []
+
+
+def migration(version: int, description: str):
+    """Décorateur d'enregistrement d'une migration"""
+    def register(apply: Callable) -> Callable:
+        if any(m.version == version for m in MIGRATIONS):
+            raise ValueError(f"Migration {version} déjà enregistrée")
+        MIGRATIONS.append(Migration(version, description, apply))
+        MIGRATIONS.sort(key=lambda m: m.version)
+        return apply
+    return register
+
+
+def latest_version() -> int:
+    """Version cible du schéma (celle de la dernière migration)"""
+    return MIGRATIONS[-1].version if MIGRATIONS else 0
+
+
+def get_version(conn: sqlite3.Connection) -> int:
+    """Version du schéma enregistrée dans la base"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def is_current(conn: sqlite3.Connection) -> bool:
+    """Vérification rapide au démarrage : une seule lecture de PRAGMA"""
+    return get_version(conn) >= latest_version()
+
+
+def add_column_if_missing(conn: sqlite3.Connection, table: str, column: str, definition: str):
+    """Ajoute une colonne à une table si elle n'existe pas encore"""
+    columns = [row[1] for row in conn.execute(f"PRAGMA table_info({table})").fetchall()]
+    if column not in columns:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+
+
+def migrate(conn: sqlite3.Connection, db=None, target: Optional[int] = None) -> List[int]:
+    """Applique les migrations en attente dans une seule transaction
+
+    Retourne la liste des versions appliquées. La version est relue après
+    l'acquisition du verrou d'écriture, si bien que deux processus qui
+    démarrent en même temps n'appliquent pas deux fois la même migration.
+    """
+    target = latest_version() if target is None else target
+    if get_version(conn) >= target:
+        return []
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    applied = []
+    try:
+        current = get_version(conn)
+        for step in MIGRATIONS:
+            if current < step.version <= target:
+                step.apply(conn, db)
+                applied.append(step.version)
+        if applied:
+            conn.execute(f"PRAGMA user_version = {applied[-1]}")
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        raise MigrationError(f"Échec de la migration du schéma : {e}") from e
+
+    if applied:
+        # Mettre à jour les statistiques du planificateur après un changement de schéma
+        conn.execute("PRAGMA optimize")
+    return applied
+
+
+# ---------------------------------------------------------------------------
+# Migrations du schéma
+# ---------------------------------------------------------------------------
+
+@migration(1, "Tables de base et données par défaut")
+def _create_base_tables(conn: sqlite3.Connection, db):
+    cursor = conn.cursor()
+
+    # Table des paramètres
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS settings (
+            cle TEXT PRIMARY KEY,
+            valeur TEXT
+        )
+    """)
+    cursor.execute("""
+        INSERT OR REPLACE INTO settings (cle, valeur)
+        VALUES ('theme', 'sombre')
+    """)
+
+    # Table des utilisateurs
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT UNIQUE NOT NULL,
+            password_hash TEXT NOT NULL,
+            role TEXT NOT NULL,
+            created_at TEXT NOT NULL,
+            last_login TEXT
+        )
+    """)
+
+    # Table des critères ISO 27001
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS criteres (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            code TEXT UNIQUE NOT NULL,
+            titre TEXT NOT NULL,
+            description TEXT NOT NULL,
+            categorie TEXT NOT NULL,
+            statut TEXT DEFAULT 'Non conforme',
+            commentaire TEXT,
+            preuve_path TEXT,
+            derniere_maj TEXT
+        )
+    """)
+
+    # Table des audits
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS audits (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titre TEXT NOT NULL,
+            date_audit TEXT NOT NULL,
+            auditeur TEXT NOT NULL,
+            statut TEXT NOT NULL,
+            score REAL,
+            rapport_path TEXT,
+            commentaires TEXT,
+            created_at TEXT NOT NULL
+        )
+    """)
+
+    # Table des documents
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS documents (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titre TEXT NOT NULL,
+            categorie TEXT NOT NULL,
+            version TEXT NOT NULL,
+            fichier_path TEXT,
+            contenu TEXT,
+            auteur TEXT NOT NULL,
+            date_creation TEXT NOT NULL,
+            derniere_modification TEXT
+        )
+    """)
+
+    # Table des directives
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS directives (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            titre TEXT NOT NULL,
+            description TEXT NOT NULL,
+            type TEXT NOT NULL,
+            efficacite TEXT DEFAULT 'Moyenne',
+            responsable TEXT,
+            date_creation TEXT NOT NULL
+        )
+    """)
+
+    # Données par défaut (idempotentes, dans la même transaction)
+    if db is not None:
+        db.init_default_users(conn)
+        db.init_iso_criteria(conn)
+        db.init_default_settings(conn)
+
+
+@migration(2, "Index secondaires des chemins d'accès")
+def _create_access_path_indexes(conn: sqlite3.Connection, db):
+    # get_documents_by_category : filtre sur categorie, tri sur date_creation
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_documents_categorie_date ON documents(categorie, date_creation DESC)")
+    # get_all_audits : tri sur date_audit
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audits_date ON audits(date_audit DESC)")
+    # get_conformity_stats : regroupement sur statut (index couvrant)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_criteres_statut ON criteres(statut)")
+    # get_all_directives : tri sur date_creation
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_directives_date ON directives(date_creation DESC)")
+
+
+@migration(3, "Index des agrégats de conformité")
+def _create_conformity_matrix_index(conn: sqlite3.Connection, db):
+    # get_category_status_matrix : GROUP BY categorie, statut sans accès à la table
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_criteres_categorie_statut ON criteres(categorie, statut)")
+    # get_criteres_by_statut : filtre sur statut, tri sur code (remplace l'index sur statut seul)
+    conn.execute("DROP INDEX IF EXISTS idx_criteres_statut")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_criteres_statut_code ON criteres(statut, code)")
+
+
+# Pondération des statuts figée au moment de la migration 4 (voir database.STATUT_WEIGHTS)
+_POIDS_STATUT_SQL = """CASE {statut}
+    WHEN 'Conforme' THEN 100
+    WHEN 'Largement conforme' THEN 80
+    WHEN 'Partiellement conforme' THEN 50
+    WHEN 'Faiblement conforme' THEN 30
+    ELSE 0 END"""
+
+
+@migration(4, "Instantané de conformité maintenu par triggers")
+def _create_conformity_snapshot(conn: sqlite3.Connection, db):
+    # Compteurs par catégorie et statut, avec les points pondérés correspondants
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conformity_snapshot (
+            categorie TEXT NOT NULL,
+            statut TEXT NOT NULL,
+            nombre INTEGER NOT NULL DEFAULT 0,
+            points INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (categorie, statut)
+        ) WITHOUT ROWID
+    """)
+
+    new_points = _POIDS_STATUT_SQL.format(statut="IFNULL(NEW.statut, '')")
+    old_points = _POIDS_STATUT_SQL.format(statut="IFNULL(OLD.statut, '')")
+    increment = f"""
+        INSERT INTO conformity_snapshot (categorie, statut, nombre, points)
+        VALUES (NEW.categorie, IFNULL(NEW.statut, ''), 1, {new_points})
+        ON CONFLICT (categorie, statut) DO UPDATE
+        SET nombre = nombre + 1, points = points + excluded.points;
+    """
+    decrement = f"""
+        UPDATE conformity_snapshot
+        SET nombre = nombre - 1, points = points - ({old_points})
+        WHERE categorie = OLD.categorie AND statut = IFNULL(OLD.statut, '');
+    """
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_snapshot_insert
+        AFTER INSERT ON criteres
+        BEGIN {increment} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_snapshot_delete
+        AFTER DELETE ON criteres
+        BEGIN {decrement} END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_snapshot_update
+        AFTER UPDATE OF statut, categorie ON criteres
+        WHEN OLD.statut IS NOT NEW.statut OR OLD.categorie IS NOT NEW.categorie
+        BEGIN {decrement} {increment} END
+    """)
+
+    # Alimenter l'instantané à partir des critères existants
+    conn.execute("DELETE FROM conformity_snapshot")
+    conn.execute(f"""
+        INSERT INTO conformity_snapshot (categorie, statut, nombre, points)
+        SELECT categorie, IFNULL(statut, ''), COUNT(*), SUM({_POIDS_STATUT_SQL.format(statut="IFNULL(statut, '')")})
+        FROM criteres
+        GROUP BY categorie, statut
+    """)
+
+
+@migration(5, "Historique des statuts et agrégats périodiques")
+def _create_conformity_history(conn: sqlite3.Connection, db):
+    # Journal des changements de statut ; ancien_statut NULL = critère créé,
+    # nouveau_statut NULL = critère supprimé (ou sorti de la catégorie)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS critere_history (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            critere_id INTEGER NOT NULL,
+            categorie TEXT NOT NULL,
+            ancien_statut TEXT,
+            nouveau_statut TEXT,
+            date_modification TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_critere_history_date ON critere_history(date_modification)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_critere_history_critere ON critere_history(critere_id, date_modification)")
+
+    now = "strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime')"
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_history_insert
+        AFTER INSERT ON criteres
+        BEGIN
+            INSERT INTO critere_history (critere_id, categorie, ancien_statut, nouveau_statut, date_modification)
+            VALUES (NEW.id, NEW.categorie, NULL, IFNULL(NEW.statut, ''), {now});
+        END
+    """)
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_history_delete
+        AFTER DELETE ON criteres
+        BEGIN
+            INSERT INTO critere_history (critere_id, categorie, ancien_statut, nouveau_statut, date_modification)
+            VALUES (OLD.id, OLD.categorie, IFNULL(OLD.statut, ''), NULL, {now});
+        END
+    """)
+    # Un changement de catégorie est journalisé comme une sortie puis une entrée
+    conn.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_criteres_history_update
+        AFTER UPDATE OF statut, categorie ON criteres
+        WHEN OLD.statut IS NOT NEW.statut OR OLD.categorie IS NOT NEW.categorie
+        BEGIN
+            INSERT INTO critere_history (critere_id, categorie, ancien_statut, nouveau_statut, date_modification)
+            SELECT OLD.id, OLD.categorie, IFNULL(OLD.statut, ''), NULL, {now}
+            WHERE OLD.categorie IS NOT NEW.categorie;
+            INSERT INTO critere_history (critere_id, categorie, ancien_statut, nouveau_statut, date_modification)
+            VALUES (NEW.id, NEW.categorie,
+                    CASE WHEN OLD.categorie IS NEW.categorie THEN IFNULL(OLD.statut, '') END,
+                    IFNULL(NEW.statut, ''), {now});
+        END
+    """)
+
+    # État de fin de période par catégorie (periode : 'jour', 'semaine' ou 'mois')
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS conformity_rollup (
+            periode TEXT NOT NULL,
+            debut TEXT NOT NULL,
+            categorie TEXT NOT NULL,
+            total INTEGER NOT NULL,
+            conformes INTEGER NOT NULL,
+            points INTEGER NOT NULL,
+            PRIMARY KEY (periode, debut, categorie)
+        ) WITHOUT ROWID
+    """)
+
+
+@migration(6, "Index de pagination par clé (tri + id)")
+def _create_keyset_indexes(conn: sqlite3.Connection, db):
+    # Pagination par clé : l'id départage les lignes de même date, dans l'ordre de l'index
+    conn.execute("DROP INDEX IF EXISTS idx_audits_date")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_audits_date_id ON audits(date_audit DESC, id DESC)")
+    conn.execute("DROP INDEX IF EXISTS idx_directives_date")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_directives_date_id ON directives(date_creation DESC, id DESC)")
+    conn.execute("DROP INDEX IF EXISTS idx_documents_categorie_date")
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_documents_categorie_date_id ON documents(categorie, date_creation DESC, id DESC)"
+    )
+    # get_directive_breakdown : regroupement sur type et efficacité (index couvrant)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_directives_type_efficacite ON directives(type, efficacite)")
+
+
+# Sources de l'index plein texte ; rowid = id * SEARCH_SOURCE_COUNT + rang de la source,
+# ce qui permet aux triggers de retrouver la ligne indexée sans parcourir l'index
+SEARCH_SOURCES = ('critere', 'document', 'directive', 'iso')
+SEARCH_SOURCE_COUNT = len(SEARCH_SOURCES)
+
+# Colonnes indexées par source : (code, titre, contenu) ; `code` porte le code du
+# critère, la catégorie du document ou le type de la directive
+_SEARCH_COLUMNS = {
+    'critere': ("{t}code", "{t}titre", "{t}description || char(10) || IFNULL({t}commentaire, '')"),
+    'document': ("{t}categorie", "{t}titre", "IFNULL({t}contenu, '')"),
+    'directive': ("{t}type", "{t}titre", "{t}description || char(10) || IFNULL({t}responsable, '')"),
+}
+_SEARCH_TABLES = {'critere': 'criteres', 'document': 'documents', 'directive': 'directives'}
+
+
+@migration(7, "Index de recherche plein texte (FTS5)")
+def _create_search_index(conn: sqlite3.Connection, db):
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(
+            source UNINDEXED,
+            ref_id UNINDEXED,
+            code,
+            titre,
+            contenu,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    # Classement BM25 : le code et le titre pèsent plus que le contenu
+    conn.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 5.0, 1.0)')")
+
+    for source, table in _SEARCH_TABLES.items():
+        rank = SEARCH_SOURCES.index(source)
+        code, titre, contenu = (c.format(t="NEW.") for c in _SEARCH_COLUMNS[source])
+        insert = f"""
+            INSERT INTO search_index (rowid, source, ref_id, code, titre, contenu)
+            VALUES (NEW.id * {SEARCH_SOURCE_COUNT} + {rank}, '{source}', NEW.id, {code}, {titre}, {contenu});
+        """
+        delete = f"DELETE FROM search_index WHERE rowid = OLD.id * {SEARCH_SOURCE_COUNT} + {rank};"
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_insert AFTER INSERT ON {table} BEGIN {insert} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_delete AFTER DELETE ON {table} BEGIN {delete} END")
+        conn.execute(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_search_update AFTER UPDATE ON {table} BEGIN {delete} {insert} END")
+
+    # Indexer les lignes existantes
+    _fill_search_index(conn)
+
+
+def _fill_search_index(conn: sqlite3.Connection):
+    """Indexe les lignes existantes des tables critères, documents et directives"""
+    for source, table in _SEARCH_TABLES.items():
+        rank = SEARCH_SOURCES.index(source)
+        code, titre, contenu = (c.format(t="") for c in _SEARCH_COLUMNS[source])
+        conn.execute(f"DELETE FROM search_index WHERE source = '{source}'")
+        conn.execute(f"""
+            INSERT INTO search_index (rowid, source, ref_id, code, titre, contenu)
+            SELECT id * {SEARCH_SOURCE_COUNT} + {rank}, '{source}', id, {code}, {titre}, {contenu}
+            FROM {table}
+        """)
+
+
+@migration(8, "Magasin de preuves adressé par contenu")
+def _create_evidence_store(conn: sqlite3.Connection, db):
+    # Un fichier par empreinte SHA-256 ; les critères, documents et paramètres
+    # y font référence par 'sha256:<empreinte>' (voir utils/evidence.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS preuves (
+            sha256 TEXT PRIMARY KEY,
+            taille INTEGER NOT NULL,
+            type_mime TEXT,
+            nom TEXT NOT NULL,
+            depose_par TEXT,
+            date_depot TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+
+
+@migration(9, "Téléversements par morceaux reprenables")
+def _create_upload_spool(conn: sqlite3.Connection, db):
+    # Un téléversement en cours par ligne ; recu = octets déjà écrits dans le spool
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS televersements (
+            id TEXT PRIMARY KEY,
+            nom TEXT NOT NULL,
+            taille INTEGER NOT NULL,
+            sha256_attendu TEXT,
+            type_mime TEXT,
+            depose_par TEXT,
+            recu INTEGER NOT NULL DEFAULT 0,
+            date_debut TEXT NOT NULL,
+            date_maj TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_televersements_reprise ON televersements(depose_par, nom, taille)")
+
+
+@migration(10, "Aperçus et texte extrait des preuves")
+def _create_evidence_extracts(conn: sqlite3.Connection, db):
+    # Résultat du traitement d'une preuve (voir utils/evidence_pipeline.py) ;
+    # erreur non NULL = traitement échoué, pour ne pas le relancer en boucle
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS preuves_extraits (
+            sha256 TEXT PRIMARY KEY,
+            pages INTEGER,
+            octets INTEGER NOT NULL,
+            caracteres INTEGER NOT NULL DEFAULT 0,
+            apercu INTEGER NOT NULL DEFAULT 0,
+            erreur TEXT,
+            date_traitement TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    # Texte des preuves, interrogeable en plein texte
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS preuves_texte USING fts5(
+            sha256 UNINDEXED,
+            nom,
+            texte,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+
+
+@migration(11, "File de génération des rapports PDF")
+def _create_report_jobs(conn: sqlite3.Connection, db):
+    # Une demande de rapport par ligne (voir utils/report_jobs.py) ;
+    # statut : en_attente, en_cours, termine, echec ; chemin = PDF sur disque
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS rapports_jobs (
+            id TEXT PRIMARY KEY,
+            type TEXT NOT NULL,
+            audit_id INTEGER,
+            statut TEXT NOT NULL DEFAULT 'en_attente',
+            progression REAL NOT NULL DEFAULT 0,
+            chemin TEXT,
+            taille INTEGER,
+            erreur TEXT,
+            demande_par TEXT,
+            date_demande TEXT NOT NULL,
+            date_debut TEXT,
+            date_fin TEXT
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rapports_jobs_demandeur ON rapports_jobs(demande_par, date_demande)")
+
+
+@migration(12, "Lots de rapports d'audit")
+def _add_report_batches(conn: sqlite3.Connection, db):
+    # Demandes générées ensemble (rapports de tous les audits), regroupées dans une archive ZIP
+    add_column_if_missing(conn, "rapports_jobs", "lot", "TEXT")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_rapports_jobs_lot ON rapports_jobs(lot) WHERE lot IS NOT NULL")
+
+
+@migration(13, "Sessions de connexion par navigateur")
+def _create_sessions(conn: sqlite3.Connection, db):
+    # Une ligne par session de navigateur, indexée par l'empreinte SHA-256 du jeton
+    # (le jeton lui-même n'est jamais stocké, voir utils/sessions.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sessions (
+            jeton_hash TEXT PRIMARY KEY,
+            user_id INTEGER NOT NULL,
+            date_creation TEXT NOT NULL,
+            date_expiration TEXT NOT NULL
+        ) WITHOUT ROWID
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_expiration ON sessions(date_expiration)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_user ON sessions(user_id)")
+
+
+@migration(14, "Algorithme et coût de hachage des mots de passe")
+def _add_password_hash_policy(conn: sqlite3.Connection, db):
+    # Politique sous laquelle chaque empreinte a été produite (voir utils/password_policy.py) ;
+    # les empreintes bcrypt existantes ('$2b$12$...') portent leur coût
+    add_column_if_missing(conn, "users", "hash_algorithme", "TEXT")
+    add_column_if_missing(conn, "users", "hash_cout", "INTEGER")
+    conn.execute("""
+        UPDATE users SET hash_algorithme = 'bcrypt', hash_cout = CAST(substr(password_hash, 5, 2) AS INTEGER)
+        WHERE hash_algorithme IS NULL AND password_hash GLOB '$2[abxy]$[0-9][0-9]$*'
+    """)
+
+
+@migration(15, "Index de recherche filtrable par source")
+def _index_search_source(conn: sqlite3.Connection, db):
+    # La source devient une colonne indexée : le filtre par source se fait dans
+    # MATCH et seules les lignes des sources demandées sont classées (BM25).
+    # Les triggers de synchronisation restent en place, l'index est reconstruit.
+    conn.execute("DROP TABLE IF EXISTS search_index")
+    conn.execute("""
+        CREATE VIRTUAL TABLE search_index USING fts5(
+            source,
+            ref_id UNINDEXED,
+            code,
+            titre,
+            contenu,
+            tokenize = 'unicode61 remove_diacritics 2',
+            prefix = '2 3'
+        )
+    """)
+    conn.execute("INSERT INTO search_index (search_index, rank) VALUES ('rank', 'bm25(0.0, 0.0, 10.0, 5.0, 1.0)')")
+    _fill_search_index(conn)
+    # Exigences ISO réindexées au démarrage (voir Database.sync_iso_search_index)
+    conn.execute("DELETE FROM settings WHERE cle = 'search_iso_signature'")
+
+
+# Tables dont les suppressions sont journalisées pour l'export incrémental
+TABLES_SUPPRIMABLES = ('criteres', 'audits', 'directives', 'documents', 'users')
+
+
+@migration(16, "Journal des suppressions (export incrémental)")
+def _create_deletion_log(conn: sqlite3.Connection, db):
+    # Une ligne supprimée n'a plus d'horodatage à comparer à la borne « depuis » :
+    # chaque suppression laisse une trace (table, id) exportée avec le lot incrémental
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS suppressions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            table_nom TEXT NOT NULL,
+            ref_id INTEGER NOT NULL,
+            date_suppression TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_suppressions_date ON suppressions(date_suppression)")
+    for table in TABLES_SUPPRIMABLES:
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_suppression
+            AFTER DELETE ON {table}
+            BEGIN
+                INSERT INTO suppressions (table_nom, ref_id, date_suppression)
+                VALUES ('{table}', OLD.id, strftime('%Y-%m-%d %H:%M:%S', 'now', 'localtime'));
+            END
+        """)
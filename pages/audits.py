@@ -4,11 +4,15 @@ Planification et suivi des audits internes
 """
 
 import streamlit as st
-from utils.helpers import display_page_header, format_date
-from utils.config import COLORS
+from utils.helpers import display_page_header, format_date, paginate, display_evidence_download, drop_file_select, ingest_evidence, chunked_upload
+from utils.evidence import EvidenceError
+from utils.config import COLORS, STATUTS_AUDIT
 from utils.charts import create_audit_timeline
 from datetime import datetime
 
+# Nombre d'audits affichés sur la chronologie
+TIMELINE_SIZE = 100
+
 def show(auth, db):
     """Affiche la page de gestion des audits"""
     
@@ -18,17 +22,17 @@ def show(auth, db):
         "Planification et suivi des audits de conformité ISO 27001"
     )
     
-    # Récupérer les audits
-    audits = db.get_all_audits()
+    # Récupérer le résumé des audits (la liste est paginée)
+    summary = db.get_audit_summary()
     
     # Tabs
     tab1, tab2, tab3 = st.tabs(["📋 Liste des audits", "📊 Chronologie", "➕ Nouvel audit"])
     
     with tab1:
-        st.markdown(f"###  Audits réalisés ({len(audits)})")
+        st.markdown(f"###  Audits réalisés ({summary['total']})")
         
-        if audits:
-            for audit in audits:
+        if summary['total']:
+            for audit in paginate("audits", db.get_audits_page):
                 score = audit.get('score', 0)
                 score_color = COLORS['success'] if score >= 80 else COLORS['warning'] if score >= 50 else COLORS['danger']
                 
@@ -69,6 +73,8 @@ def show(auth, db):
                             st.markdown("**Commentaires:**")
                             st.info(audit['commentaires'])
                         
+                        display_evidence_download(db, audit.get('rapport_path'), f"rapport_{audit['id']}")
+                        
                         # Actions (si permissions)
                         if auth.has_role("Auditeur"):
                             col_action1, col_action2 = st.columns(2)
@@ -106,33 +112,30 @@ def show(auth, db):
     with tab2:
         st.markdown("###  Chronologie des audits")
         
-        if audits:
-            # Graphique de chronologie
-            fig = create_audit_timeline(audits)
+        if summary['total']:
+            # Graphique de chronologie (audits les plus récents)
+            recent_audits, _ = db.get_audits_page(limit=TIMELINE_SIZE)
+            fig = create_audit_timeline(recent_audits)
             st.plotly_chart(fig, use_container_width=True)
             
-            # Statistiques
-            scores = [a.get('score', 0) for a in audits if a.get('score')]
-            if scores:
-                avg_score = sum(scores) / len(scores)
-                max_score = max(scores)
-                min_score = min(scores)
-                
+            # Statistiques (calculées par la base sur tous les audits)
+            if summary['notes']:
                 col1, col2, col3, col4 = st.columns(4)
                 
                 with col1:
-                    st.metric("Score moyen", f"{avg_score:.1f}%")
+                    st.metric("Score moyen", f"{summary['score_moyen']:.1f}%")
                 with col2:
-                    st.metric("Score maximum", f"{max_score:.1f}%")
+                    st.metric("Score maximum", f"{summary['score_max']:.1f}%")
                 with col3:
-                    st.metric("Score minimum", f"{min_score:.1f}%")
+                    st.metric("Score minimum", f"{summary['score_min']:.1f}%")
                 with col4:
-                    st.metric("Nombre d'audits", len(audits))
+                    st.metric("Nombre d'audits", summary['total'])
                 
-                # Tendance
+                # Tendance : dernier audit noté par rapport au précédent
                 st.markdown("<br>", unsafe_allow_html=True)
+                scores = [a['score'] for a in recent_audits if a.get('score')]
                 if len(scores) >= 2:
-                    tendance = scores[-1] - scores[-2]
+                    tendance = scores[0] - scores[1]
                     tendance_text = "En hausse ↗" if tendance > 0 else "En baisse ↘" if tendance < 0 else "Stable →"
                     tendance_color = COLORS['success'] if tendance > 0 else COLORS['danger'] if tendance < 0 else COLORS['info']
                     
@@ -178,7 +181,7 @@ def show(auth, db):
                 with col1:
                     statut = st.selectbox(
                         "Statut *",
-                        ['Planifié', 'En cours', 'Terminé', 'Reporté']
+                        STATUTS_AUDIT
                     )
                 
                 with col2:
@@ -194,6 +197,15 @@ def show(auth, db):
                     placeholder="Notes sur l'audit, points d'attention, recommandations..."
                 )
                 
+                rapport = st.file_uploader(
+                    "Rapport ou dossier de preuves (optionnel)",
+                    type=['pdf', 'docx', 'xlsx', 'zip', 'jpg', 'png'],
+                    help="Jusqu'à 20 Mo ; au-delà, utilisez l'envoi par morceaux ou le dossier de dépôt du serveur"
+                )
+                televerse_rapport = chunked_upload(db, "televersement_rapport_audit",
+                                                   ['pdf', 'docx', 'xlsx', 'zip', 'jpg', 'png'], user['username'])
+                depot_rapport = drop_file_select(db, key="depot_rapport_audit")
+                
                 # Checklist d'audit
                 st.markdown("####  Checklist d'audit (optionnel)")
                 
@@ -217,13 +229,20 @@ def show(auth, db):
                 
                 if submit:
                     if titre and date_audit and auditeur and statut:
+                        try:
+                            rapport_path = ingest_evidence(db, rapport, depot_rapport, user['username'],
+                                                           televerse_rapport)
+                        except EvidenceError as e:
+                            st.error(f"❌ {e}")
+                            st.stop()
                         audit_id = db.add_audit(
                             titre=titre,
                             date_audit=date_audit.strftime('%Y-%m-%d'),
                             auditeur=auditeur,
                             statut=statut,
                             score=score,
-                            commentaires=commentaires
+                            commentaires=commentaires,
+                            rapport_path=rapport_path
                         )
                         st.success(f"✅ Audit créé avec succès! (ID: {audit_id})")
                         st.rerun()
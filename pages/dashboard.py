@@ -24,9 +24,21 @@ def show(auth, db):
 
     
     # Récupérer les données filtrées
-    stats = db.get_conformity_stats()
-    criteres = db.get_all_criteres()
-    audits = db.get_all_audits()
+    matrix = db.get_category_status_matrix()
+    stats = db.get_conformity_stats(matrix)
+    category_rates = db.get_category_conformity_rates(matrix)
+    audit_summary = db.get_audit_summary()
+    audits, _ = db.get_audits_page(limit=3)
+    
+    # Séries historiques (agrégats mis à jour de façon incrémentale, au plus toutes les 5 minutes)
+    db.refresh_conformity_rollups_if_stale()
+    today = datetime.now().date()
+    taux_semestre = db.get_conformity_rate_at((today - timedelta(days=182)).isoformat())
+    taux_mois = db.get_conformity_rate_at((today.replace(day=1) - timedelta(days=1)).isoformat())
+    monthly_trend = db.get_conformity_trend('mois', debut=(today - timedelta(days=365)).replace(day=1).isoformat())
+    if taux_semestre is None and monthly_trend:
+        # Historique plus court qu'un semestre : évolution depuis le premier agrégat
+        taux_semestre = monthly_trend[0][3]
     
     # === SECTION 2: INDICATEURS CLÉS GLOBAUX ===
     st.markdown(f"""
@@ -124,7 +136,7 @@ def show(auth, db):
     with kpi_col4:
         display_stat_card(
             "Audits cette période",
-            str(len(audits)),
+            str(audit_summary['total']),
             get_kpi_icon("audits"),
             COLORS['primary']
         )
@@ -133,13 +145,13 @@ def show(auth, db):
     kpi_col5, kpi_col6, kpi_col7, kpi_col8 = st.columns(4)
     
     with kpi_col5:
-        # Évolution (simulée pour l'exemple)
-        evolution = "+5.2%"
+        # Évolution du taux pondéré sur six mois
+        ecart = stats['taux_conformite'] - taux_semestre if taux_semestre is not None else None
         display_stat_card(
             "Évolution semestrielle",
-            evolution,
+            f"{ecart:+.1f}%" if ecart is not None else "—",
             get_kpi_icon("evolution_semestrielle"),
-            COLORS['success']
+            COLORS['success'] if ecart is None or ecart >= 0 else COLORS['danger']
         )
     
     with kpi_col6:
@@ -254,7 +266,7 @@ def show(auth, db):
             <h4 style="color: {COLORS['text']}; margin-top: 0; font-size: 1.1rem; font-weight: 500;">Performance par domaine de sécurité</h4>
         """, unsafe_allow_html=True)
         
-        fig_bar = create_category_bar_chart(criteres)
+        fig_bar = create_category_bar_chart(matrix)
         st.plotly_chart(fig_bar, use_container_width=True, config={'displayModeBar': False}, key="category_performance_bar")
         
         st.markdown("</div>", unsafe_allow_html=True)
@@ -265,13 +277,8 @@ def show(auth, db):
             <h4 style="color: {COLORS['text']}; margin-top: 0; font-size: 1.1rem; font-weight: 500;">Scores par catégorie</h4>
         """, unsafe_allow_html=True)
         
-        # Calculer les stats par catégorie
-        categories = ['Organisationnelle', 'Personnel', 'Physique', 'Technologique']
-        
-        for cat in categories:
-            cat_criteres = [c for c in criteres if c['categorie'] == cat]
-            total_cat = len(cat_criteres)
-            conforme_cat = len([c for c in cat_criteres if c['statut'] in ['Conforme', 'Largement conforme']])
+        # Stats par catégorie (agrégées par la base)
+        for cat, total_cat, conforme_cat, _ in category_rates:
             percentage = round((conforme_cat / total_cat * 100) if total_cat > 0 else 0, 1)
             
             # Couleur basée sur le score
@@ -305,7 +312,7 @@ def show(auth, db):
     </div>
     """, unsafe_allow_html=True)
     
-    # Graphique temporel (simulé pour l'exemple)
+    # Graphique temporel (agrégats mensuels de conformity_rollup)
     trend_col1, trend_col2 = st.columns(2)
     
     with trend_col1:
@@ -318,10 +325,10 @@ def show(auth, db):
         import plotly.express as px
         import pandas as pd
         
-        # Données simulées d'évolution
+        # Taux de fin de mois sur les douze derniers mois
         trend_data = pd.DataFrame({
-            'Mois': ['Jan', 'Fév', 'Mar', 'Avr', 'Mai', 'Jun'],
-            'Score': [65, 68, 72, 75, 78, stats['taux_conformite']]
+            'Mois': [datetime.strptime(debut, '%Y-%m-%d').strftime('%m/%Y') for debut, _, _, _ in monthly_trend],
+            'Score': [taux for _, _, _, taux in monthly_trend]
         })
         
         fig_trend = px.line(trend_data, x='Mois', y='Score', 
@@ -350,8 +357,10 @@ def show(auth, db):
         """, unsafe_allow_html=True)
         
         # Métriques de performance
+        amelioration = stats['taux_conformite'] - taux_mois if taux_mois is not None else None
         performance_metrics = [
-            {"label": "Amélioration ce mois", "value": "+5.2%", "icon": "", "color": COLORS['success']},
+            {"label": "Amélioration ce mois", "value": f"{amelioration:+.1f}%" if amelioration is not None else "—",
+             "icon": "", "color": COLORS['success'] if amelioration is None or amelioration >= 0 else COLORS['danger']},
             {"label": "Délai moyen correction", "value": "12 jours", "icon": "", "color": COLORS['info']},
             {"label": "Audits planifiés", "value": "3", "icon": "", "color": COLORS['warning']},
             {"label": "Actions en cours", "value": "8", "icon": "", "color": COLORS['primary']}
@@ -392,8 +401,8 @@ def show(auth, db):
         """, unsafe_allow_html=True)
         
         # Analyser les critères critiques
-        non_conformes = [c for c in criteres if c['statut'] == 'Non conforme']
-        faiblement_conformes = [c for c in criteres if c['statut'] == 'Faiblement conforme']
+        non_conformes = stats['non_conforme']
+        faiblement_conformes = stats['faiblement_conforme']
         
         if non_conformes:
             st.markdown(f"""
@@ -402,7 +411,7 @@ def show(auth, db):
                 <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
                     <span style="font-size: 1.2rem; margin-right: 0.5rem;">🔴</span>
                     <span style="color: {COLORS['danger']}; font-weight: bold;">
-                        {len(non_conformes)} critère(s) non conforme(s)
+                        {non_conformes} critère(s) non conforme(s)
                     </span>
                 </div>
                 <p style="color: {COLORS['text_secondary']}; font-size: 0.85rem; margin: 0;">
@@ -422,7 +431,7 @@ def show(auth, db):
                 <div style="display: flex; align-items: center; margin-bottom: 0.5rem;">
                     <span style="font-size: 1.2rem; margin-right: 0.5rem;">🟡</span>
                     <span style="color: {COLORS['warning']}; font-weight: bold;">
-                        {len(faiblement_conformes)} critère(s) faiblement conforme(s)
+                        {faiblement_conformes} critère(s) faiblement conforme(s)
                     </span>
                 </div>
                 <p style="color: {COLORS['text_secondary']}; font-size: 0.85rem; margin: 0;">
@@ -456,7 +465,7 @@ def show(auth, db):
         """, unsafe_allow_html=True)
         
         if audits:
-            for i, audit in enumerate(audits[:3]):  # Afficher les 3 derniers audits
+            for i, audit in enumerate(audits):  # Afficher les 3 derniers audits
                 score_color = COLORS['success'] if audit.get('score', 0) >= 80 else COLORS['warning'] if audit.get('score', 0) >= 50 else COLORS['danger']
                 
                 st.markdown(f"""
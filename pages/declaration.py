@@ -3,12 +3,20 @@ Page de déclaration d'applicabilité - Sécurité 360
 Gestion des critères ISO 27001 Annexe A
 """
 
+import html
+
 import streamlit as st
-from utils.helpers import display_page_header, get_statut_badge, get_categorie_icon, filter_criteres
+from utils.helpers import (display_page_header, get_statut_badge, get_categorie_icon, filter_criteres,
+                           export_to_csv, display_evidence_download, drop_file_select, ingest_evidence,
+                           chunked_upload)
 from utils.config import COLORS, CATEGORIES_ISO, STATUTS_CONFORMITE
 from utils.iso_commentaires import get_commentaire
+from utils.evidence import EvidenceStore, EvidenceError
 import pandas as pd
 
+# Nombre maximal de résultats de la recherche plein texte
+SEARCH_LIMIT = 200
+
 def show(auth, db):
     """Affiche la page de déclaration d'applicabilité"""
     
@@ -47,18 +55,55 @@ def show(auth, db):
     with col3:
         recherche = st.text_input(
             "Rechercher",
-            placeholder="Code, titre ou description...",
+            placeholder="Code, titre, description, commentaire ou exigence ISO...",
             key="recherche"
         )
     
     # Appliquer les filtres
     filters = {
         'categorie': filtre_categorie,
-        'statut': filtre_statut,
-        'recherche': recherche
+        'statut': filtre_statut
     }
     criteres_filtres = filter_criteres(criteres, filters)
     
+    # Recherche plein texte (index FTS5) : résultats classés par pertinence
+    extraits = {}
+    if recherche:
+        rangs = {}
+        for rang, resultat in enumerate(db.search(recherche, sources=('critere', 'iso'), limit=SEARCH_LIMIT)):
+            rangs.setdefault(resultat['code'], rang)
+            if '<mark>' in resultat['extrait']:
+                extraits.setdefault(resultat['code'], resultat['extrait'])
+        criteres_filtres = sorted(
+            (c for c in criteres_filtres if c['code'] in rangs),
+            key=lambda c: rangs[c['code']]
+        )
+        
+        autres_resultats = db.search(recherche, sources=('document', 'directive'), limit=10)
+        if autres_resultats:
+            with st.expander(f"🔎 {len(autres_resultats)} résultat(s) dans les documents et directives"):
+                for resultat in autres_resultats:
+                    source = "Document" if resultat['source'] == 'document' else "Directive"
+                    st.markdown(f"""
+                    <p style="color: {COLORS['text']}; margin: 0 0 0.5rem 0;">
+                        <strong>{source} · {resultat['titre']}</strong> ({html.escape(resultat['code'] or '')})<br>
+                        <span style="color: {COLORS['text_secondary']}; font-size: 0.85rem;">{resultat['extrait']}</span>
+                    </p>
+                    """, unsafe_allow_html=True)
+        
+        # Contenu des preuves jointes (texte extrait en arrière-plan)
+        resultats_preuves = db.search_evidence(recherche, limit=10)
+        if resultats_preuves:
+            with st.expander(f"📎 {len(resultats_preuves)} résultat(s) dans le contenu des preuves"):
+                for resultat in resultats_preuves:
+                    criteres_lies = f" — critère(s) {html.escape(resultat['criteres'])}" if resultat['criteres'] else ""
+                    st.markdown(f"""
+                    <p style="color: {COLORS['text']}; margin: 0 0 0.5rem 0;">
+                        <strong>{html.escape(resultat['nom'])}</strong>{criteres_lies}<br>
+                        <span style="color: {COLORS['text_secondary']}; font-size: 0.85rem;">{resultat['extrait']}</span>
+                    </p>
+                    """, unsafe_allow_html=True)
+    
     # Statistiques des critères filtrés
     st.markdown(f"""
     <div style="background-color: {COLORS['surface']}; padding: 1rem; border-radius: 8px; margin-bottom: 1rem;">
@@ -73,7 +118,16 @@ def show(auth, db):
     with col1:
         st.markdown(f"### 📋 Liste des critères")
     with col2:
-        vue_mode = st.radio("Vue", ["Cartes", "Tableau"], horizontal=True, label_visibility="collapsed")
+        vues = ["Cartes", "Tableau"] + (["Édition groupée"] if auth.has_role("Auditeur") else [])
+        vue_mode = st.radio("Vue", vues, horizontal=True, label_visibility="collapsed")
+    
+    # Résultat de la dernière édition groupée (conservé à travers le rerun)
+    bilan = st.session_state.pop("bilan_edition_groupee", None)
+    if bilan:
+        erreurs = [r for r in bilan if not r['succes']]
+        st.success(f"✅ {len(bilan) - len(erreurs)} critère(s) mis à jour en une seule transaction")
+        for r in erreurs:
+            st.error(f"❌ {r['erreur']}")
     
     # Affichage selon le mode
     if vue_mode == "Cartes":
@@ -103,6 +157,14 @@ def show(auth, db):
                 </div>
                 """, unsafe_allow_html=True)
                 
+                # Passage correspondant à la recherche
+                if critere['code'] in extraits:
+                    st.markdown(f"""
+                    <p style="color: {COLORS['text_secondary']}; font-size: 0.85rem; margin: 0.5rem 0 0 0;">
+                        🔎 {extraits[critere['code']]}
+                    </p>
+                    """, unsafe_allow_html=True)
+                
                 # Récupérer et afficher le commentaire ISO 27001
                 commentaire_iso = get_commentaire(critere['code'])
                 if commentaire_iso:
@@ -134,13 +196,15 @@ def show(auth, db):
                 # Afficher la preuve si présente
                 preuve = critere.get('preuve_path', '')
                 if preuve:
+                    preuve_info = EvidenceStore(db).info(preuve)
                     st.markdown(f"""
                     <div style="margin-top: 0.5rem; padding: 0.5rem; background-color: {COLORS['surface']}; border-radius: 6px;">
                         <p style="color: {COLORS['text_secondary']}; font-size: 0.75rem; margin: 0;">
-                            � <span style="color: {COLORS['accent']}; font-weight: 600;">Preuve jointe:</span> {preuve}
+                            � <span style="color: {COLORS['accent']}; font-weight: 600;">Preuve jointe:</span> {preuve_info['nom'] if preuve_info else preuve}
                         </p>
                     </div>
                     """, unsafe_allow_html=True)
+                    display_evidence_download(db, preuve, f"preuve_{critere['id']}")
                 
                 # Options d'édition (si permissions)
                 if auth.has_role("Auditeur"):
@@ -159,8 +223,13 @@ def show(auth, db):
                             fichier_preuve = st.file_uploader(
                                 "Preuve (optionnel)",
                                 type=['pdf', 'docx', 'jpg', 'png'],
-                                key=f"preuve_{critere['id']}"
+                                key=f"preuve_{critere['id']}",
+                                help="Jusqu'à 20 Mo ; au-delà, utilisez l'envoi par morceaux"
                             )
+                            televerse_preuve = chunked_upload(db, f"televersement_preuve_{critere['id']}",
+                                                              ['pdf', 'docx', 'jpg', 'png'],
+                                                              auth.get_current_user()['username'])
+                            depot_preuve = drop_file_select(db, key=f"depot_preuve_{critere['id']}")
                         
                         commentaire = st.text_area(
                             "Commentaire",
@@ -170,22 +239,34 @@ def show(auth, db):
                         )
                         
                         if st.button(" Enregistrer", key=f"save_{critere['id']}"):
-                            preuve_path = None
-                            if fichier_preuve:
-                                # Sauvegarder le fichier (simulation)
-                                preuve_path = f"preuves/{fichier_preuve.name}"
-                            
-                            db.update_critere(
-                                critere['id'],
-                                nouveau_statut,
-                                commentaire,
-                                preuve_path
-                            )
-                            st.success("✅ Critère mis à jour avec succès!")
-                            st.rerun()
+                            # Conserver la preuve actuelle si aucun fichier n'est déposé
+                            preuve_path = critere.get('preuve_path')
+                            try:
+                                if fichier_preuve or depot_preuve or televerse_preuve:
+                                    preuve_path = ingest_evidence(
+                                        db,
+                                        fichier_preuve,
+                                        depot_preuve,
+                                        auth.get_current_user()['username'],
+                                        televerse_preuve
+                                    )
+                                
+                                db.update_critere(
+                                    critere['id'],
+                                    nouveau_statut,
+                                    commentaire,
+                                    preuve_path
+                                )
+                                st.success("✅ Critère mis à jour avec succès!")
+                                st.rerun()
+                            except EvidenceError as e:
+                                st.error(f"❌ {e}")
                 
                 st.markdown("<br>", unsafe_allow_html=True)
     
+    elif vue_mode == "Édition groupée":
+        show_bulk_edit(db, criteres_filtres)
+    
     else:
         # Affichage en tableau
         df_data = []
@@ -210,10 +291,9 @@ def show(auth, db):
             )
             
             # Export CSV
-            csv = df.to_csv(index=False, encoding='utf-8-sig')
             st.download_button(
                 label="📥 Exporter en CSV",
-                data=csv,
+                data=export_to_csv(df_data, "declaration_applicabilite.csv"),
                 file_name="declaration_applicabilite.csv",
                 mime="text/csv"
             )
@@ -242,4 +322,73 @@ def show(auth, db):
         st.metric("Partiellement conformes", stats['partiellement_conforme'])
     
     with col4:
-        st.metric("Non conformes", stats['non_conforme'])
\ No newline at end of file
+        st.metric("Non conformes", stats['non_conforme'])
+
+def show_bulk_edit(db, criteres):
+    """Édition de plusieurs critères appliquée en un seul lot (une transaction, un rerun)"""
+    if not criteres:
+        st.info("Aucun critère à afficher")
+        return
+    
+    # Affecter un même statut à une sélection de critères
+    with st.form("statut_selection"):
+        st.markdown("#### Appliquer un statut à une sélection")
+        col1, col2 = st.columns([3, 1])
+        with col1:
+            selection = st.multiselect(
+                "Critères",
+                [c['id'] for c in criteres],
+                format_func=lambda critere_id: next(f"{c['code']} - {c['titre']}" for c in criteres if c['id'] == critere_id)
+            )
+        with col2:
+            statut_selection = st.selectbox("Nouveau statut", STATUTS_CONFORMITE)
+        commentaire_selection = st.text_input("Commentaire (optionnel, remplace le commentaire existant)")
+        if st.form_submit_button("Appliquer à la sélection", type="primary"):
+            if selection:
+                # Sans commentaire saisi, les commentaires existants sont conservés
+                commentaire = {'commentaire': commentaire_selection} if commentaire_selection else {}
+                changes = [
+                    {'id': critere_id, 'statut': statut_selection, **commentaire}
+                    for critere_id in selection
+                ]
+                st.session_state["bilan_edition_groupee"] = db.bulk_update_criteres(changes)
+                st.rerun()
+            else:
+                st.warning("Sélectionnez au moins un critère")
+    
+    # Modifier statuts et commentaires directement dans le tableau
+    st.markdown("#### Modifier le tableau")
+    originaux = pd.DataFrame([
+        {
+            'id': c['id'],
+            'Code': c['code'],
+            'Titre': c['titre'],
+            'Statut': c['statut'],
+            'Commentaire': c.get('commentaire') or ''
+        }
+        for c in criteres
+    ])
+    edites = st.data_editor(
+        originaux,
+        key="edition_groupee",
+        use_container_width=True,
+        height=600,
+        hide_index=True,
+        disabled=['id', 'Code', 'Titre'],
+        column_config={
+            'id': None,
+            'Statut': st.column_config.SelectboxColumn("Statut", options=STATUTS_CONFORMITE, required=True),
+            'Commentaire': st.column_config.TextColumn("Commentaire")
+        }
+    )
+    
+    # Une cellule vidée vaut None dans le tableau édité : le commentaire est effacé
+    edites['Commentaire'] = edites['Commentaire'].fillna('')
+    modifies = edites[(edites['Statut'] != originaux['Statut']) | (edites['Commentaire'] != originaux['Commentaire'])]
+    if st.button(f"💾 Enregistrer {len(modifies)} modification(s)", disabled=modifies.empty, type="primary"):
+        changes = [
+            {'id': int(row['id']), 'statut': row['Statut'], 'commentaire': row['Commentaire']}
+            for _, row in modifies.iterrows()
+        ]
+        st.session_state["bilan_edition_groupee"] = db.bulk_update_criteres(changes)
+        st.rerun()
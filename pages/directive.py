@@ -4,7 +4,7 @@ Gestion des mesures techniques et organisationnelles
 """
 
 import streamlit as st
-from utils.helpers import display_page_header
+from utils.helpers import display_page_header, paginate
 from utils.config import COLORS, TYPES_DIRECTIVES, NIVEAUX_EFFICACITE
 from utils.charts import create_directive_effectiveness_chart
 
@@ -17,14 +17,15 @@ def show(auth, db):
         "Gestion des mesures techniques et organisationnelles"
     )
     
-    # Récupérer les directives
-    directives = db.get_all_directives()
+    # Récupérer la répartition des directives (la liste est paginée)
+    breakdown = db.get_directive_breakdown()
+    total_directives = sum(count for _, _, count in breakdown)
     
     # Tabs
     tab1, tab2, tab3 = st.tabs(["📋 Liste des directives", "📊 Analyse", "➕ Nouvelle directive"])
     
     with tab1:
-        st.markdown(f"###  Directives actives ({len(directives)})")
+        st.markdown(f"###  Directives actives ({total_directives})")
         
         # Filtres
         col1, col2 = st.columns(2)
@@ -33,12 +34,14 @@ def show(auth, db):
         with col2:
             filtre_efficacite = st.selectbox("Efficacité", ['Tous'] + NIVEAUX_EFFICACITE)
         
-        # Appliquer les filtres
-        directives_filtrees = directives
-        if filtre_type != 'Tous':
-            directives_filtrees = [d for d in directives_filtrees if d['type'] == filtre_type]
-        if filtre_efficacite != 'Tous':
-            directives_filtrees = [d for d in directives_filtrees if d['efficacite'] == filtre_efficacite]
+        # Appliquer les filtres (dans la requête)
+        type_dir = filtre_type if filtre_type != 'Tous' else None
+        efficacite = filtre_efficacite if filtre_efficacite != 'Tous' else None
+        directives_filtrees = paginate(
+            "directives",
+            lambda limit, after: db.get_directives_page(limit, after, type_dir=type_dir, efficacite=efficacite),
+            filters=(type_dir, efficacite)
+        )
         
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -88,23 +91,24 @@ def show(auth, db):
     with tab2:
         st.markdown("###  Analyse des directives")
         
-        if directives:
+        if total_directives:
+            types_count = {}
+            efficacite_counts = {}
+            for t, eff, count in breakdown:
+                types_count[t] = types_count.get(t, 0) + count
+                efficacite_counts[eff] = efficacite_counts.get(eff, 0) + count
+            
             # Graphique d'efficacité
-            fig = create_directive_effectiveness_chart(directives)
+            fig = create_directive_effectiveness_chart(efficacite_counts)
             st.plotly_chart(fig, use_container_width=True)
             
             # Statistiques
             col1, col2, col3, col4 = st.columns(4)
             
-            types_count = {}
-            for d in directives:
-                t = d['type']
-                types_count[t] = types_count.get(t, 0) + 1
-            
             with col1:
-                st.metric("Total directives", len(directives))
+                st.metric("Total directives", total_directives)
             with col2:
-                efficaces = len([d for d in directives if d['efficacite'] == 'Élevée'])
+                efficaces = efficacite_counts.get('Élevée', 0)
                 st.metric("Efficacité élevée", efficaces)
             with col3:
                 techniques = types_count.get('Technique', 0)
@@ -118,7 +122,7 @@ def show(auth, db):
             st.markdown("#### Répartition par type")
             
             for type_dir, count in types_count.items():
-                percentage = (count / len(directives)) * 100
+                percentage = (count / total_directives) * 100
                 st.markdown(f"""
                 <div style="margin-bottom: 0.5rem;">
                     <div style="display: flex; justify-content: space-between; margin-bottom: 0.3rem;">
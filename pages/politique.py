@@ -4,7 +4,8 @@ Gestion de la politique de sécurité de l'information
 """
 
 import streamlit as st
-from utils.helpers import display_page_header, format_date
+from utils.helpers import display_page_header, format_date, display_evidence_download, drop_file_select, ingest_evidence, chunked_upload
+from utils.evidence import EvidenceError
 from utils.config import COLORS
 from datetime import datetime
 
@@ -48,6 +49,9 @@ def show(auth, db):
                 </div>
                 """, unsafe_allow_html=True)
             
+            # Fichier joint
+            display_evidence_download(db, doc_actuel.get('fichier_path'), f"politique_{doc_actuel['id']}")
+            
             # Actions (si permissions)
             if auth.has_role("Admin"):
                 st.markdown("<br>", unsafe_allow_html=True)
@@ -78,6 +82,7 @@ def show(auth, db):
                 with st.expander(f"Version {doc['version']} - {format_date(doc['date_creation'])}"):
                     st.markdown(f"**Auteur:** {doc['auteur']}")
                     st.markdown(f"**Dernière modification:** {format_date(doc['derniere_modification'])}")
+                    display_evidence_download(db, doc.get('fichier_path'), f"politique_historique_{doc['id']}")
                     st.markdown("---")
                     st.markdown(doc.get('contenu', 'Aucun contenu'))
         else:
@@ -193,8 +198,10 @@ Date : [Date d'approbation]"""
                 fichier_joint = st.file_uploader(
                     "Fichier joint (optionnel)",
                     type=['pdf', 'docx'],
-                    help="Vous pouvez joindre une version PDF ou Word du document"
+                    help="Vous pouvez joindre une version PDF ou Word du document (jusqu'à 20 Mo ; au-delà, utilisez l'envoi par morceaux)"
                 )
+                televerse_joint = chunked_upload(db, "televersement_politique", ['pdf', 'docx'], user['username'])
+                depot_joint = drop_file_select(db, key="depot_politique")
                 
                 col1, col2 = st.columns(2)
                 with col1:
@@ -205,8 +212,13 @@ Date : [Date d'approbation]"""
                 if submit:
                     if titre and version and contenu:
                         fichier_path = None
-                        if fichier_joint:
-                            fichier_path = f"documents/{fichier_joint.name}"
+                        if fichier_joint or depot_joint or televerse_joint:
+                            try:
+                                fichier_path = ingest_evidence(db, fichier_joint, depot_joint, user['username'],
+                                                               televerse_joint)
+                            except EvidenceError as e:
+                                st.error(f"❌ {e}")
+                                st.stop()
                         
                         db.add_document(
                             titre=titre,
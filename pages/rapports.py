@@ -4,10 +4,9 @@ Export et historique des rapports de conformité
 """
 
 import streamlit as st
-from utils.helpers import display_page_header, format_date
+from utils.helpers import display_page_header, format_date, format_file_size, display_report_job, display_report_batch
 from utils.config import COLORS
-from utils.pdf_generator import PDFGenerator
-from datetime import datetime
+from utils.report_jobs import get_report_queue, ReportError, TYPES
 
 def show(auth, db):
     """Affiche la page de génération de rapports"""
@@ -118,6 +117,9 @@ def show(auth, db):
         "Génération et export des rapports de conformité"
     )
     
+    user = auth.get_current_user()
+    queue = get_report_queue(db)
+    
     # Tabs
     tab1, tab2 = st.tabs(["📊 Générer un rapport", "📚 Historique"])
     
@@ -304,26 +306,21 @@ def show(auth, db):
             
             st.markdown("<br>", unsafe_allow_html=True)
             
-            # Bouton de génération
+            detail = st.checkbox(
+                "Inclure l'annexe détaillée (tous les critères et leurs commentaires)",
+                help="Rapport volumineux pour les grands périmètres : il est écrit directement sur disque"
+            )
+            
+            # Bouton de génération : le rapport est mis en page en arrière-plan
             if st.button("📥 Générer le rapport PDF", type="primary", use_container_width=True):
-                with st.spinner("Génération du rapport en cours..."):
-                    try:
-                        pdf_generator = PDFGenerator()
-                        pdf_data = pdf_generator.generate_conformity_report(stats, criteres)
-                        
-                        filename = f"rapport_conformite_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-                        
-                        st.download_button(
-                            label="📥 Télécharger le rapport PDF",
-                            data=pdf_data,
-                            file_name=filename,
-                            mime="application/pdf",
-                            use_container_width=True
-                        )
-                        
-                        st.success("✅ Rapport généré avec succès!")
-                    except Exception as e:
-                        st.error(f"❌ Erreur lors de la génération du rapport: {str(e)}")
+                try:
+                    st.session_state['rapport_job_conformite'] = queue.submit(
+                        'conformite_detaille' if detail else 'conformite', demande_par=user['username']
+                    )
+                except ReportError as e:
+                    st.error(f"❌ Erreur lors de la génération du rapport: {str(e)}")
+            
+            display_report_job(queue, st.session_state.get('rapport_job_conformite'), "rapport_conformite")
         
         elif type_rapport == "Rapport d'audit":
             st.markdown(f"""
@@ -355,26 +352,32 @@ def show(auth, db):
                         </div>
                         """, unsafe_allow_html=True)
                         
+                        jobs_audit = st.session_state.setdefault('rapport_jobs_audit', {})
                         if st.button("📥 Générer le rapport d'audit PDF", type="primary", use_container_width=True):
-                            with st.spinner("Génération du rapport en cours..."):
-                                try:
-                                    pdf_generator = PDFGenerator()
-                                    criteres = db.get_all_criteres()
-                                    pdf_data = pdf_generator.generate_audit_report(audit, criteres)
-                                    
-                                    filename = f"rapport_audit_{audit_id}_{datetime.now().strftime('%Y%m%d')}.pdf"
-                                    
-                                    st.download_button(
-                                        label="📥 Télécharger le rapport d'audit PDF",
-                                        data=pdf_data,
-                                        file_name=filename,
-                                        mime="application/pdf",
-                                        use_container_width=True
-                                    )
-                                    
-                                    st.success("✅ Rapport d'audit généré avec succès!")
-                                except Exception as e:
-                                    st.error(f"❌ Erreur lors de la génération: {str(e)}")
+                            try:
+                                jobs_audit[audit_id] = queue.submit('audit', audit_id, demande_par=user['username'])
+                            except ReportError as e:
+                                st.error(f"❌ Erreur lors de la génération: {str(e)}")
+                        
+                        display_report_job(queue, jobs_audit.get(audit_id), f"rapport_audit_{audit_id}")
+                
+                # Génération groupée (campagne trimestrielle) : un processus par rapport, archive ZIP
+                st.markdown("#### 📦 Rapports de plusieurs audits")
+                titres = {a['id']: f"{a['titre']} - {format_date(a['date_audit'])}" for a in audits}
+                selection = st.multiselect(
+                    "Audits à inclure",
+                    list(titres.keys()),
+                    default=list(titres.keys()),
+                    format_func=lambda i: titres[i]
+                )
+                if st.button(f"📦 Générer les {len(selection)} rapports d'audit (ZIP)", use_container_width=True,
+                             disabled=not selection):
+                    try:
+                        st.session_state['rapport_lot_audits'] = queue.submit_batch(selection, demande_par=user['username'])
+                    except ReportError as e:
+                        st.error(f"❌ Erreur lors de la génération: {str(e)}")
+                
+                display_report_batch(queue, st.session_state.get('rapport_lot_audits'), titres, "rapport_lot_audits")
             else:
                 st.info("Aucun audit disponible pour générer un rapport")
         
@@ -391,14 +394,12 @@ def show(auth, db):
             categories = ['Organisationnelle', 'Personnel', 'Physique', 'Technologique']
             selected_cat = st.selectbox("Sélectionner une catégorie", categories)
             
-            criteres = db.get_all_criteres()
-            criteres_cat = [c for c in criteres if c['categorie'] == selected_cat]
-            
-            # Statistiques de la catégorie
-            total_cat = len(criteres_cat)
-            conforme_cat = len([c for c in criteres_cat if c['statut'] == 'Conforme'])
-            partiel_cat = len([c for c in criteres_cat if c['statut'] == 'Partiellement conforme'])
-            non_conforme_cat = len([c for c in criteres_cat if c['statut'] == 'Non conforme'])
+            # Statistiques de la catégorie (matrice agrégée par la base)
+            counts_cat = {statut: count for cat, statut, count in db.get_category_status_matrix() if cat == selected_cat}
+            total_cat = sum(counts_cat.values())
+            conforme_cat = counts_cat.get('Conforme', 0)
+            partiel_cat = counts_cat.get('Partiellement conforme', 0)
+            non_conforme_cat = counts_cat.get('Non conforme', 0)
             taux_cat = round((conforme_cat / total_cat * 100) if total_cat > 0 else 0, 2)
             
             col1, col2, col3, col4 = st.columns(4)
@@ -427,22 +428,22 @@ def show(auth, db):
             </div>
             """, unsafe_allow_html=True)
             
-            criteres = db.get_all_criteres()
-            non_conformes = [c for c in criteres if c['statut'] == 'Non conforme']
-            partiels = [c for c in criteres if c['statut'] == 'Partiellement conforme']
+            stats = db.get_conformity_stats()
+            non_conformes = stats['non_conforme']
+            partiels = stats['partiellement_conforme']
             
             col1, col2 = st.columns(2)
             with col1:
-                st.metric("Critères non conformes", len(non_conformes))
+                st.metric("Critères non conformes", non_conformes)
             with col2:
-                st.metric("Critères partiellement conformes", len(partiels))
+                st.metric("Critères partiellement conformes", partiels)
             
             st.markdown("<br>", unsafe_allow_html=True)
             
             if non_conformes or partiels:
                 # Afficher un aperçu
                 with st.expander("👁️ Aperçu des non-conformités"):
-                    for nc in non_conformes[:5]:
+                    for nc in db.get_criteres_by_statut('Non conforme', limit=5):
                         st.markdown(f"- **{nc['code']}**: {nc['titre']}")
                 
                 if st.button("📥 Générer le rapport des non-conformités", type="primary", use_container_width=True):
@@ -453,51 +454,42 @@ def show(auth, db):
     with tab2:
         st.markdown("### 📚 Historique des rapports")
         
-        st.info("L'historique des rapports générés sera affiché ici (fonctionnalité à implémenter)")
+        rapports = queue.jobs(demande_par=None if auth.has_role('Admin') else user['username'])
         
-        # Exemple d'historique (simulation)
-        rapports_exemple = [
-            {
-                "titre": "Rapport de conformité global",
-                "date": "2025-01-15",
-                "type": "PDF",
-                "auteur": "admin",
-                "taille": "245 KB"
-            },
-            {
-                "titre": "Rapport d'audit Q4 2024",
-                "date": "2024-12-20",
-                "type": "PDF",
-                "auteur": "audit01",
-                "taille": "189 KB"
-            },
-            {
-                "titre": "Rapport par catégorie - Technologique",
-                "date": "2024-12-15",
-                "type": "PDF",
-                "auteur": "admin",
-                "taille": "156 KB"
-            }
-        ]
+        if not rapports:
+            st.info("Aucun rapport généré pour le moment")
+        
+        statuts = {
+            'en_attente': "En attente",
+            'en_cours': "En cours",
+            'termine': "PDF",
+            'echec': "Échec"
+        }
         
-        for rapport in rapports_exemple:
+        for rapport in rapports:
+            titre = TYPES.get(rapport['type'], rapport['type'])
+            if rapport['type'] == 'audit':
+                titre += f" #{rapport['audit_id']}"
+            taille = format_file_size(rapport['taille']) if rapport['taille'] else "-"
             st.markdown(f"""
             <div style="background-color: {COLORS['surface']}; padding: 1rem; border-radius: 8px; margin-bottom: 0.5rem;">
                 <div style="display: flex; justify-content: space-between; align-items: center;">
                     <div>
-                        <p style="color: {COLORS['text']}; font-weight: bold; margin: 0;">{rapport['titre']}</p>
+                        <p style="color: {COLORS['text']}; font-weight: bold; margin: 0;">{titre}</p>
                         <p style="color: {COLORS['text_secondary']}; font-size: 0.85rem; margin: 0.3rem 0 0 0;">
-                            {format_date(rapport['date'])} | Par: {rapport['auteur']} | {rapport['taille']}
+                            {format_date(rapport['date_demande'])} | Par: {rapport['demande_par'] or '-'} | {taille}
                         </p>
                     </div>
                     <div>
                         <span style="background-color: {COLORS['primary']}; color: white; padding: 0.3rem 0.6rem; border-radius: 12px; font-size: 0.8rem;">
-                            {rapport['type']}
+                            {statuts.get(rapport['statut'], rapport['statut'])}
                         </span>
                     </div>
                 </div>
             </div>
             """, unsafe_allow_html=True)
+            if rapport['statut'] == 'termine':
+                display_report_job(queue, rapport['id'], f"historique_{rapport['id']}")
     
     # Aide
     with st.expander("ℹ️ Aide sur les rapports"):
@@ -3,6 +3,9 @@ Page des paramètres - Sécurité 360
 Configuration du système (Admin uniquement)
 """
 
+import os
+import sqlite3
+
 import streamlit as st
 from utils.helpers import display_page_header
 from utils.config import COLORS, APP_NAME, APP_VERSION
@@ -53,9 +56,19 @@ def show(auth, db):
                 db.update_setting("theme_color", theme_color)
                 
                 if logo_file:
-                    # Sauvegarder le logo (simulation)
-                    logo_path = f"assets/{logo_file.name}"
-                    db.update_setting("logo_path", logo_path)
+                    from utils.evidence import EvidenceStore, EvidenceError
+                    try:
+                        logo_path = EvidenceStore(db).put(
+                            logo_file,
+                            logo_file.name,
+                            logo_file.type,
+                            auth.get_current_user()['username'],
+                            taille_max=2 * 1024 * 1024
+                        )
+                        db.update_setting("logo_path", logo_path)
+                    except EvidenceError as e:
+                        st.error(f"❌ {e}")
+                        st.stop()
                 
                 st.success("✅ Paramètres d'apparence enregistrés!")
                 st.rerun()
@@ -147,7 +160,33 @@ def show(auth, db):
             if st.form_submit_button("💾 Enregistrer la configuration", use_container_width=True, type="primary"):
                 st.success("✅ Configuration système enregistrée!")
                 st.info("Note: Certains paramètres nécessitent un redémarrage pour prendre effet")
-    
+
+        st.markdown("#### Vérification des connexions")
+        from utils.login_guard import get_login_guard
+        stats_connexions = get_login_guard().stats()
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("En attente", stats_connexions['waiting'],
+                      help=f"File limitée à {stats_connexions['file_max']} vérifications")
+        with col2:
+            st.metric("En cours", f"{stats_connexions['running']} / {stats_connexions['workers']}")
+        with col3:
+            st.metric("Attente moyenne", f"{stats_connexions['wait_avg'] * 1000:.0f} ms",
+                      help=f"Maximum : {stats_connexions['wait_max'] * 1000:.0f} ms")
+        with col4:
+            st.metric("Refusées (saturation)", stats_connexions['rejected'] + stats_connexions['timeouts'])
+        if stats_connexions['attempts_without_ip']:
+            st.warning(
+                f"⚠️ Limitation par adresse IP inactive pour {stats_connexions['attempts_without_ip']} "
+                f"tentative(s) sur {stats_connexions['attempts']} : adresse du client inconnue. "
+                "C'est le cas en accès local ou derrière un proxy sur la même machine ; "
+                "seule la limitation par identifiant s'applique alors."
+            )
+        politique = db.hash_policy
+        if politique.latence is not None:
+            st.caption(f"Empreintes des mots de passe : {politique.algorithme}, coût {politique.cout} "
+                       f"(≈ {politique.latence * 1000:.0f} ms par vérification, calibré au démarrage)")
+
     with tab3:
         st.markdown("### 💾 Sauvegarde et restauration")
         
@@ -161,35 +200,51 @@ def show(auth, db):
         </div>
         """, unsafe_allow_html=True)
         
+        from utils.backup import (create_backup, restore_backup, list_backups, backup_dir,
+                                  BackupError, RETENTION)
+        from utils.helpers import format_file_size
+        
+        dossier_sauvegardes = backup_dir(db)
+        
         col1, col2 = st.columns(2)
         
         with col1:
             if st.button("📥 Sauvegarder la base de données", use_container_width=True, type="primary"):
-                import sqlite3
-                import shutil
-                from datetime import datetime
-                
+                barre = st.progress(0.0, text="Copie de la base en cours...")
                 try:
-                    # Créer une copie de la base de données
-                    backup_filename = f"backup_securite360_{datetime.now().strftime('%Y%m%d_%H%M%S')}.db"
-                    shutil.copy2("securite360.db", backup_filename)
+                    # Copie à chaud par pages, contrôlée puis compressée
+                    chemin = create_backup(db, dossier_sauvegardes,
+                                           progress=lambda fraction: barre.progress(fraction))
+                    barre.empty()
                     
-                    with open(backup_filename, 'rb') as f:
+                    with open(chemin, 'rb') as f:
                         st.download_button(
                             label="📥 Télécharger la sauvegarde",
                             data=f,
-                            file_name=backup_filename,
-                            mime="application/octet-stream",
+                            file_name=os.path.basename(chemin),
+                            mime="application/gzip",
                             use_container_width=True
                         )
                     
-                    st.success(f"✅ Sauvegarde créée: {backup_filename}")
-                except Exception as e:
+                    st.success(f"✅ Sauvegarde créée: {os.path.basename(chemin)}")
+                except (BackupError, OSError, sqlite3.Error) as e:
+                    barre.empty()
                     st.error(f"❌ Erreur lors de la sauvegarde: {str(e)}")
         
+        sauvegardes = list_backups(dossier_sauvegardes)
+        
         with col2:
             st.markdown("**Dernière sauvegarde:**")
-            st.info("Aucune sauvegarde enregistrée")
+            if sauvegardes:
+                derniere = sauvegardes[0]
+                st.info(f"{derniere['date'].strftime('%d/%m/%Y %H:%M:%S')} ({format_file_size(derniere['taille'])})")
+            else:
+                st.info("Aucune sauvegarde enregistrée")
+        
+        st.caption(
+            f"Rétention : une sauvegarde par jour sur {RETENTION['jours']} jours, "
+            f"par semaine sur {RETENTION['semaines']} semaines et par mois sur {RETENTION['mois']} mois"
+        )
         
         st.markdown("<br>", unsafe_allow_html=True)
         
@@ -198,24 +253,77 @@ def show(auth, db):
             <h4 style="color: {COLORS['text']}; margin-top: 0;">Restauration de la base de données</h4>
             <p style="color: {COLORS['text_secondary']};">
                 Restaurez une sauvegarde précédente. <strong>Attention:</strong> Cette opération 
-                remplacera toutes les données actuelles.
+                remplacera toutes les données actuelles (une sauvegarde de sécurité est créée avant).
             </p>
         </div>
         """, unsafe_allow_html=True)
         
-        uploaded_backup = st.file_uploader(
-            "Sélectionner un fichier de sauvegarde",
-            type=['db'],
-            help="Fichier .db généré par l'outil de sauvegarde"
-        )
+        origine = st.radio("Source", ["Sauvegarde enregistrée", "Fichier"], horizontal=True)
+        source_restauration = None
+        if origine == "Sauvegarde enregistrée":
+            if sauvegardes:
+                choix = st.selectbox(
+                    "Sélectionner une sauvegarde",
+                    sauvegardes,
+                    format_func=lambda s: f"{s['date'].strftime('%d/%m/%Y %H:%M:%S')} — {format_file_size(s['taille'])}"
+                )
+                source_restauration = choix['chemin']
+            else:
+                st.info("Aucune sauvegarde enregistrée")
+        else:
+            uploaded_backup = st.file_uploader(
+                "Sélectionner un fichier de sauvegarde",
+                type=['db', 'gz'],
+                help="Fichier .db ou .db.gz généré par l'outil de sauvegarde"
+            )
+            source_restauration = uploaded_backup
         
-        if uploaded_backup:
-            st.warning("⚠️ La restauration écrasera toutes les données actuelles. Cette action est irréversible.")
+        if source_restauration is not None:
+            st.warning("⚠️ La restauration écrasera toutes les données actuelles.")
             
             col1, col2 = st.columns([1, 3])
             with col1:
                 if st.button("♻️ Restaurer", type="primary", use_container_width=True):
-                    st.error("Fonction de restauration désactivée pour des raisons de sécurité dans cette démo")
+                    try:
+                        with st.spinner("Contrôle et restauration de la sauvegarde..."):
+                            securite = restore_backup(db, source_restauration, dossier_sauvegardes)
+                        st.success("✅ Base de données restaurée")
+                        if securite:
+                            st.info(f"Données précédentes sauvegardées : {os.path.basename(securite)}")
+                    except (BackupError, OSError, sqlite3.Error) as e:
+                        st.error(f"❌ Restauration impossible : {str(e)}")
+        
+        # Maintenance des indicateurs
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(f"""
+        <div style="background-color: {COLORS['surface']}; padding: 1.5rem; border-radius: 12px; margin-bottom: 1rem;">
+            <h4 style="color: {COLORS['text']}; margin-top: 0;">Indicateurs de conformité</h4>
+            <p style="color: {COLORS['text_secondary']};">
+                Vérifie que l'instantané utilisé par le tableau de bord correspond aux critères
+                et le reconstruit si nécessaire.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        if st.button("🔎 Vérifier et reconstruire les indicateurs", use_container_width=True):
+            if db.check_conformity_snapshot():
+                st.success("✅ Indicateurs de conformité cohérents")
+            else:
+                st.warning("⚠️ Indicateurs incohérents : reconstruits à partir des critères")
+        
+        if st.button("🧹 Nettoyer les pièces jointes", use_container_width=True,
+                     help="Supprime les téléversements abandonnés et les fichiers qui ne sont plus référencés"):
+            from utils.uploads import UploadSpool
+            spool = UploadSpool(db)
+            abandonnes = spool.purge_stale()
+            orphelins = spool.store.purge_unreferenced()
+            st.success(f"✅ {abandonnes} téléversement(s) abandonné(s) et {orphelins} fichier(s) non référencé(s) supprimés")
+        
+        if st.button("🖼️ Analyser les pièces jointes en attente", use_container_width=True,
+                     help="Génère en arrière-plan les aperçus et le texte consultable des preuves pas encore traitées"):
+            from utils.evidence_pipeline import get_pipeline
+            planifiees = get_pipeline(db).submit_pending()
+            st.success(f"✅ {planifiees} pièce(s) jointe(s) planifiée(s) pour analyse")
         
         # Export CSV
         st.markdown("<br>", unsafe_allow_html=True)
@@ -228,17 +336,15 @@ def show(auth, db):
         </div>
         """, unsafe_allow_html=True)
         
+        from utils.exporter import export_table_csv, export_bundle
+        
         col1, col2, col3 = st.columns(3)
         
         with col1:
             if st.button("📊 Exporter les critères", use_container_width=True):
-                criteres = db.get_all_criteres()
-                import pandas as pd
-                df = pd.DataFrame(criteres)
-                csv = df.to_csv(index=False, encoding='utf-8-sig')
                 st.download_button(
                     "📥 Télécharger CSV",
-                    csv,
+                    export_table_csv(db, 'criteres'),
                     "criteres_export.csv",
                     "text/csv",
                     use_container_width=True
@@ -246,13 +352,9 @@ def show(auth, db):
         
         with col2:
             if st.button("📋 Exporter les audits", use_container_width=True):
-                audits = db.get_all_audits()
-                import pandas as pd
-                df = pd.DataFrame(audits)
-                csv = df.to_csv(index=False, encoding='utf-8-sig')
                 st.download_button(
                     "📥 Télécharger CSV",
-                    csv,
+                    export_table_csv(db, 'audits'),
                     "audits_export.csv",
                     "text/csv",
                     use_container_width=True
@@ -260,17 +362,84 @@ def show(auth, db):
         
         with col3:
             if st.button("⚙️ Exporter les directives", use_container_width=True):
-                directives = db.get_all_directives()
-                import pandas as pd
-                df = pd.DataFrame(directives)
-                csv = df.to_csv(index=False, encoding='utf-8-sig')
                 st.download_button(
                     "📥 Télécharger CSV",
-                    csv,
+                    export_table_csv(db, 'directives'),
                     "directives_export.csv",
                     "text/csv",
                     use_container_width=True
                 )
+        
+        # Lot Parquet de toutes les tables (outils décisionnels)
+        st.markdown("<br>", unsafe_allow_html=True)
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            depuis = st.text_input(
+                "Modifications depuis (optionnel)",
+                placeholder="AAAA-MM-JJ HH:MM:SS",
+                help="Reprendre la valeur « genere_le » du manifest du lot précédent pour un export incrémental (les suppressions sont listées dans suppressions.parquet)"
+            )
+        with col2:
+            st.markdown("<br>", unsafe_allow_html=True)
+            if st.button("📦 Exporter le lot Parquet", use_container_width=True):
+                from datetime import datetime
+                try:
+                    lot = export_bundle(db, since=depuis or None)
+                    suffixe = "incremental" if depuis else "complet"
+                    st.download_button(
+                        "📥 Télécharger ZIP",
+                        lot,
+                        f"securite360_{suffixe}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.zip",
+                        "application/zip",
+                        use_container_width=True
+                    )
+                except ValueError as e:
+                    st.error(f"Export impossible : {e}")
+        
+        # Import en masse
+        st.markdown("<br>", unsafe_allow_html=True)
+        st.markdown(f"""
+        <div style="background-color: {COLORS['surface']}; padding: 1.5rem; border-radius: 12px; margin-bottom: 1rem;">
+            <h4 style="color: {COLORS['text']}; margin-top: 0;">Import de données</h4>
+            <p style="color: {COLORS['text_secondary']};">
+                Importez des critères, audits ou directives depuis un fichier CSV ou XLSX
+                (une ligne d'en-tête avec les noms de colonnes). Les critères existants
+                sont mis à jour d'après leur code.
+            </p>
+        </div>
+        """, unsafe_allow_html=True)
+        
+        from utils.importer import import_file, COLONNES_REQUISES
+        
+        types_import = {"Critères": "criteres", "Audits": "audits", "Directives": "directives"}
+        col1, col2 = st.columns([1, 2])
+        with col1:
+            type_import = types_import[st.selectbox("Données à importer", list(types_import))]
+            st.caption(f"Colonnes obligatoires : {', '.join(COLONNES_REQUISES[type_import])}")
+        with col2:
+            fichier_import = st.file_uploader("Fichier", type=['csv', 'xlsx'], key="fichier_import")
+        
+        if fichier_import and st.button("📤 Importer", use_container_width=True, type="primary"):
+            barre = st.progress(0.0, text="Import en cours...")
+            
+            def avancement(lignes, fraction):
+                barre.progress(fraction if fraction is not None else 0.0, text=f"{lignes} ligne(s) traitée(s)")
+            
+            try:
+                bilan = import_file(db, type_import, fichier_import, fichier_import.name, progress=avancement)
+            except ValueError as e:
+                barre.empty()
+                st.error(f"❌ {e}")
+            else:
+                barre.progress(1.0, text=f"{bilan.lignes} ligne(s) traitée(s)")
+                st.success(f"✅ {bilan.importees} ligne(s) importée(s) sur {bilan.lignes}")
+                if bilan.erreurs_total:
+                    st.warning(f"⚠️ {bilan.erreurs_total} ligne(s) rejetée(s)")
+                    st.dataframe(
+                        [{"Ligne": ligne, "Erreur": message} for ligne, message in bilan.erreurs],
+                        use_container_width=True,
+                        hide_index=True
+                    )
     
     with tab4:
         st.markdown("### Gestion de l'abonnement et licences")
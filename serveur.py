@@ -0,0 +1,10 @@
+"""
+Serveur de Sécurité 360 : pages Streamlit (app.py) et routes de téléchargement
+Lancement : streamlit run serveur.py
+"""
+
+import streamlit as st
+
+from utils.routes import routes
+
+app = st.App("app.py", routes=routes())
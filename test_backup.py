@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests de la sauvegarde à chaud et de la restauration (utils/backup.py)
+"""
+
+import gzip
+import io
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.backup import (create_backup, restore_backup, list_backups, prune_backups,
+                          select_backups_to_keep, check_integrity, BackupError)
+
+
+def test_hot_backup_during_writes():
+    """Sauvegarde par pages pendant des écritures concurrentes"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(os.path.join(tmp, "base.db"))
+        db.import_batch('audits', [(f"Audit {i}", "2025-03-01", "audit01", "Terminé", 50, "x" * 200)
+                                   for i in range(3000)])
+        arret = threading.Event()
+        ecritures = []
+
+        def ecrivain():
+            while not arret.is_set():
+                ecritures.append(db.add_directive("Mesure", "Pendant la sauvegarde", "Technique", "Moyenne", "RSSI"))
+
+        thread = threading.Thread(target=ecrivain)
+        thread.start()
+        try:
+            fractions = []
+            chemin = create_backup(db, os.path.join(tmp, "sauvegardes"), pages=8, progress=fractions.append)
+        finally:
+            arret.set()
+            thread.join()
+
+        assert chemin.endswith(".db.gz") and fractions[-1] == 1.0
+        assert ecritures, "Les écritures concurrentes doivent progresser pendant la copie"
+        copie = os.path.join(tmp, "copie.db")
+        with gzip.open(chemin, 'rb') as source, open(copie, 'wb') as sortie:
+            sortie.write(source.read())
+        assert check_integrity(copie) == []
+        conn = sqlite3.connect(copie)
+        assert conn.execute("SELECT COUNT(*) FROM audits").fetchone()[0] == 3000
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+        conn.close()
+        assert [s['chemin'] for s in list_backups(os.path.join(tmp, "sauvegardes"))] == [chemin]
+        db.close()
+    print("✅ Sauvegarde à chaud pendant des écritures")
+
+
+def test_retention_schedule():
+    """Rétention : dernière sauvegarde de chaque jour, semaine et mois"""
+    maintenant = datetime(2025, 6, 30, 23, 0)
+    sauvegardes = [{'chemin': str(h), 'date': maintenant - timedelta(hours=12 * h)} for h in range(400)]
+    gardees = select_backups_to_keep(sauvegardes, {'jours': 3, 'semaines': 2, 'mois': 2})
+    dates = [s['date'] for s in gardees]
+    assert dates[0] == maintenant
+    # 3 jours (30, 29, 28 juin) ; le lundi 30 ouvre une semaine, le dimanche 29 clôt la
+    # précédente ; 31 mai pour le mois précédent
+    assert [d.date().isoformat() for d in dates] == ["2025-06-30", "2025-06-29", "2025-06-28", "2025-05-31"]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for jours in range(10):
+            quand = (maintenant - timedelta(days=jours)).strftime("%Y%m%d_%H%M%S")
+            open(os.path.join(tmp, f"securite360_{quand}.db.gz"), 'wb').close()
+        open(os.path.join(tmp, "autre_fichier.txt"), 'wb').close()
+        supprimees = prune_backups(tmp, {'jours': 3, 'semaines': 0, 'mois': 0})
+        assert len(supprimees) == 7 and len(list_backups(tmp)) == 3
+        assert os.path.exists(os.path.join(tmp, "autre_fichier.txt"))
+    print("✅ Politique de rétention")
+
+
+def test_restore_replaces_data_atomically():
+    """Restauration contrôlée, précédée d'une sauvegarde de sécurité"""
+    with tempfile.TemporaryDirectory() as tmp:
+        dossier = os.path.join(tmp, "sauvegardes")
+        db = Database(os.path.join(tmp, "base.db"))
+        db.update_critere(1, "Conforme", "Avant sauvegarde")
+        chemin = create_backup(db, dossier)
+
+        db.update_critere(1, "Non conforme", "Après sauvegarde")
+        db.add_audit("Audit à perdre", "2025-03-01", "audit01", "Terminé", 10, "")
+
+        try:
+            restore_backup(db, io.BytesIO(b"pas une base"), dossier)
+            assert False, "Un fichier invalide aurait dû être refusé"
+        except BackupError:
+            pass
+        vide = sqlite3.connect(os.path.join(tmp, "vide.db"))
+        vide.execute("CREATE TABLE t (x)")
+        vide.close()
+        try:
+            restore_backup(db, os.path.join(tmp, "vide.db"), dossier)
+            assert False, "Une base étrangère aurait dû être refusée"
+        except BackupError as e:
+            assert "Table manquante" in str(e)
+        assert db.get_critere_by_id(1)['commentaire'] == "Après sauvegarde"
+
+        with open(chemin, 'rb') as fichier:
+            securite = restore_backup(db, fichier, dossier)
+        assert db.get_critere_by_id(1)['commentaire'] == "Avant sauvegarde"
+        assert db.get_audit_summary()['total'] == 0
+        assert db.check_conformity_snapshot(rebuild=False)
+
+        # Une connexion ouverte ailleurs voit aussi les données restaurées
+        autre = sqlite3.connect(os.path.join(tmp, "base.db"))
+        assert autre.execute("SELECT commentaire FROM criteres WHERE id = 1").fetchone()[0] == "Avant sauvegarde"
+        autre.close()
+
+        # La sauvegarde de sécurité contient l'état remplacé
+        restore_backup(db, securite, dossier, safety_backup=False)
+        assert db.get_critere_by_id(1)['commentaire'] == "Après sauvegarde"
+        assert not [f for f in os.listdir(dossier) if f.endswith((".tmp", ".db"))]
+        db.close()
+    print("✅ Restauration atomique")
+
+
+if __name__ == "__main__":
+    test_hot_backup_during_writes()
+    test_retention_schedule()
+    test_restore_replaces_data_atomically()
+    print("🎉 Tous les tests de sauvegarde sont passés")
@@ -0,0 +1,493 @@
+#!/usr/bin/env python3
+"""
+Tests de la couche base de données de Sécurité 360
+Vérifie l'initialisation du schéma, le registre d'instances, le pool de connexions
+et le profil de stockage
+"""
+
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import database
+import migrations
+from database import Database, ConnectionPool, StorageProfile, get_database, SCHEMA_VERSION
+
+
+def _temp_db_path(tmpdir: str) -> str:
+    return os.path.join(tmpdir, "test_securite360.db")
+
+
+def test_schema_version_marker():
+    """Une base initialisée porte la version du schéma"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(_temp_db_path(tmpdir))
+        assert db.get_schema_version() == SCHEMA_VERSION
+        assert len(db.get_all_criteres()) == 93
+        print("✅ Marqueur de version du schéma présent")
+
+
+def test_bootstrap_runs_once():
+    """Les instances suivantes ne relancent pas l'initialisation"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = _temp_db_path(tmpdir)
+        Database(path)
+
+        calls = []
+        original = migrations.migrate
+        migrations.migrate = lambda conn, db=None, target=None: calls.append(db)
+        try:
+            Database(path)
+            # Nouveau processus simulé : le marqueur user_version suffit
+            database._bootstrapped_paths.discard(os.path.abspath(path))
+            Database(path)
+        finally:
+            migrations.migrate = original
+
+        assert calls == []
+        print("✅ Initialisation du schéma exécutée une seule fois")
+
+
+def test_registry_shares_instances():
+    """get_database retourne la même instance pour un même fichier"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = _temp_db_path(tmpdir)
+        first = get_database(path)
+        second = get_database(os.path.join(tmpdir, ".", "test_securite360.db"))
+        assert first is second
+        database._instances.clear()
+        print("✅ Registre d'instances partagé par fichier")
+
+
+def test_memory_databases_are_independent():
+    """Chaque base en mémoire est initialisée séparément"""
+    first = Database(":memory:")
+    second = Database(":memory:")
+    first.update_setting("company_name", "Alpha")
+    assert second.get_setting("company_name") == "Sécurité 360"
+    assert first.get_schema_version() == SCHEMA_VERSION
+    print("✅ Bases en mémoire indépendantes")
+
+
+def test_existing_database_gets_indexes():
+    """Une base en version 1 reçoit les index au démarrage suivant"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = _temp_db_path(tmpdir)
+        Database(path).close()
+        conn = sqlite3.connect(path)
+        for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND name LIKE 'idx_%'").fetchall():
+            conn.execute(f"DROP INDEX {name}")
+        conn.execute("PRAGMA user_version = 1")
+        conn.commit()
+        conn.close()
+
+        database._bootstrapped_paths.discard(os.path.abspath(path))
+        db = Database(path)
+        assert db.get_schema_version() == SCHEMA_VERSION
+        assert any("idx_audits_date" in step for step in db.explain_query_plan("SELECT * FROM audits ORDER BY date_audit DESC"))
+        db.close()
+        print("✅ Index ajoutés à une base existante")
+
+
+def test_failed_migration_is_rolled_back():
+    """Une migration en échec annule toute la transaction"""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn, target=2)
+    version = migrations.get_version(conn)
+
+    def broken(conn, db):
+        conn.execute("CREATE TABLE migration_partielle (id INTEGER)")
+        raise RuntimeError("échec simulé")
+
+    step = migrations.Migration(version + 1, "Migration en échec", broken)
+    migrations.MIGRATIONS.append(step)
+    try:
+        migrations.migrate(conn)
+        assert False, "La migration aurait dû échouer"
+    except migrations.MigrationError:
+        pass
+    finally:
+        migrations.MIGRATIONS.remove(step)
+
+    assert migrations.get_version(conn) == version
+    tables = [row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")]
+    assert "migration_partielle" not in tables
+    conn.close()
+    print("✅ Migration en échec annulée")
+
+
+def test_migrations_are_idempotent():
+    """Rejouer les migrations sur un schéma existant ne change rien"""
+    conn = sqlite3.connect(":memory:")
+    migrations.migrate(conn)
+    schema = conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall()
+    conn.execute("PRAGMA user_version = 0")
+    migrations.migrate(conn)
+    assert conn.execute("SELECT sql FROM sqlite_master ORDER BY name").fetchall() == schema
+    assert migrations.is_current(conn)
+    conn.close()
+    print("✅ Migrations idempotentes")
+
+
+def test_conformity_aggregates_match_python_counts():
+    """Les agrégats SQL correspondent au comptage sur tous les critères"""
+    db = Database(":memory:")
+    for critere_id, statut in [(1, "Conforme"), (2, "Largement conforme"), (40, "Partiellement conforme"),
+                               (50, "Faiblement conforme"), (60, "Conforme")]:
+        db.update_critere(critere_id, statut, "")
+    criteres = db.get_all_criteres()
+
+    expected = {}
+    for c in criteres:
+        expected[(c['categorie'], c['statut'])] = expected.get((c['categorie'], c['statut']), 0) + 1
+    matrix = db.get_category_status_matrix()
+    assert {(cat, statut): count for cat, statut, count in matrix} == expected
+
+    rates = {cat: (total, conformes, taux) for cat, total, conformes, taux in db.get_category_conformity_rates(matrix)}
+    assert rates["Organisationnelle"][:2] == (37, 2)
+    assert rates["Organisationnelle"][2] == round(180 / 37, 2)
+
+    stats = db.get_conformity_stats(matrix)
+    assert stats['total'] == len(criteres) == 93
+    assert stats['conforme'] == 2
+    assert stats['taux_conformite'] == round((200 + 80 + 50 + 30) / 93, 2)
+    print("✅ Agrégats de conformité calculés par la base")
+
+
+def test_conformity_snapshot_follows_writes():
+    """L'instantané de conformité suit les écritures et se reconstruit si besoin"""
+    db = Database(":memory:")
+    assert db.check_conformity_snapshot(rebuild=False)
+
+    db.update_critere(1, "Conforme", "")
+    db.update_critere(1, "Largement conforme", "")
+    db.update_critere(2, "Conforme", "")
+    assert db.check_conformity_snapshot(rebuild=False)
+    snapshot = {(cat, statut): (nombre, points) for cat, statut, nombre, points in db.get_conformity_snapshot()}
+    assert snapshot[("Organisationnelle", "Largement conforme")] == (1, 80)
+    assert snapshot[("Organisationnelle", "Conforme")] == (1, 100)
+
+    conn = db.get_connection()
+    conn.execute("UPDATE conformity_snapshot SET nombre = 0, points = 0")
+    conn.commit()
+    db._close_conn(conn)
+    assert db.get_conformity_stats()['total'] == 0
+    assert not db.check_conformity_snapshot()
+    assert db.check_conformity_snapshot(rebuild=False)
+    assert db.get_conformity_stats()['total'] == 93
+    print("✅ Instantané de conformité cohérent")
+
+
+def test_conformity_rollups_follow_history():
+    """Les agrégats périodiques reconstruisent l'historique des statuts"""
+    from datetime import date
+    db = Database(":memory:")
+
+    def backdate(critere_id, statut, when):
+        db.update_critere(critere_id, statut, "")
+        conn = db.get_connection()
+        conn.execute("UPDATE critere_history SET date_modification = ? WHERE id = "
+                     "(SELECT MAX(id) FROM critere_history WHERE critere_id = ?)", (when, critere_id))
+        conn.commit()
+        db._close_conn(conn)
+
+    backdate(1, "Conforme", "2025-01-10 10:00:00")
+    backdate(2, "Conforme", "2025-03-05 09:30:00")
+    assert [h['nouveau_statut'] for h in db.get_critere_history(1)] == ["Conforme"]
+
+    today = date(2025, 3, 31)
+    assert db.refresh_conformity_rollups(today) > 0
+    assert db.refresh_conformity_rollups(today) == 0
+    assert db.get_conformity_rate_at("2025-01-09") is None
+    assert db.get_conformity_rate_at("2025-02-15") == round(100 / 93, 2)
+    monthly = db.get_conformity_trend("mois")
+    assert [(debut, taux) for debut, _, _, taux in monthly] == [
+        ("2025-01-01", round(100 / 93, 2)), ("2025-02-01", round(100 / 93, 2)), ("2025-03-01", round(200 / 93, 2))]
+    assert db.get_conformity_trend("semaine", debut="2025-03-03", fin="2025-03-03")[0][2] == 2
+
+    # Rafraîchissement incrémental : seul le dernier jour est recalculé (une ligne par catégorie)
+    backdate(3, "Conforme", "2025-03-31 12:00:00")
+    assert db.refresh_conformity_rollups(today) == 4
+    assert db.get_conformity_rate_at("2025-03-30") == round(200 / 93, 2)
+    assert db.get_conformity_trend("mois", debut="2025-03-01")[-1][3] == round(300 / 93, 2)
+    assert db.get_conformity_trend("jour", categorie="Organisationnelle")[-1][1:3] == (37, 3)
+
+    # Depuis une page de consultation : au plus un rafraîchissement par intervalle
+    fresh = Database(":memory:")
+    assert fresh.refresh_conformity_rollups_if_stale() > 0
+    fresh.update_critere(1, "Conforme", "")
+    assert fresh.refresh_conformity_rollups_if_stale() == 0
+    assert fresh.refresh_conformity_rollups_if_stale(max_age=0) > 0
+    print("✅ Agrégats historiques de conformité")
+
+
+def test_keyset_pagination_walks_all_rows():
+    """La pagination par clé parcourt toutes les lignes, ex aequo compris, sans doublon"""
+    db = Database(":memory:")
+    for i in range(23):
+        db.add_audit(f"Audit {i}", f"2025-01-{i % 4 + 1:02d}", "audit01", "Terminé", 50, "")
+        db.add_directive(f"Directive {i}", "", "Technique" if i % 2 else "Organisationnelle", "Moyenne", "RSSI")
+
+    seen, after, pages = [], None, 0
+    while True:
+        page, after = db.get_audits_page(limit=5, after=after)
+        seen.extend(page)
+        pages += 1
+        if after is None:
+            break
+    assert pages == 5
+    assert [a['id'] for a in seen] == [a['id'] for a in sorted(
+        seen, key=lambda a: (a['date_audit'], a['id']), reverse=True)]
+    assert sorted(a['id'] for a in seen) == list(range(1, 24))
+    assert [a['id'] for a in db.iter_audits(batch_size=4)] == [a['id'] for a in seen]
+
+    page, after = db.get_directives_page(limit=20, type_dir="Technique")
+    assert len(page) == 11 and after is None
+    assert db.count_directives(type_dir="Technique", efficacite="Moyenne") == 11
+    assert sorted(db.get_directive_breakdown()) == [("Organisationnelle", "Moyenne", 12), ("Technique", "Moyenne", 11)]
+    assert "password_hash" not in db.get_users_page(limit=1)[0][0]
+    print("✅ Pagination par clé complète et ordonnée")
+
+
+def test_full_text_search_follows_writes():
+    """La recherche plein texte suit les écritures et classe les résultats"""
+    db = Database(":memory:")
+    assert [r['code'] for r in db.search("inventaire actifs", sources=("critere",))] == ["5.9"]
+    assert db.search("inventaire", sources=("iso",))[0]['ref_id'] == "5.9"
+    assert "<mark>" in db.search("inventaire")[0]['titre']
+    assert db.search("5.1")[0]['code'] == "5.1"
+    assert db.search('AND "NEAR(') == [] and db.search("   ") == []
+
+    db.update_critere(1, "Conforme", "Revue annuelle par le comité de pilotage")
+    assert [r['code'] for r in db.search("comite pilotage")] == ["5.1"]
+    db.update_critere(1, "Conforme", "")
+    assert db.search("pilotage") == []
+
+    db.add_document("Charte télétravail", "Charte", "1.0", "Le VPN est obligatoire hors des locaux.", "admin")
+    resultat = db.search("vpn obligatoire")[0]
+    assert (resultat['source'], resultat['code']) == ("document", "Charte")
+    assert resultat['extrait'].startswith("Le <mark>VPN</mark> est <mark>obligatoire</mark>")
+    # Préfixe accepté sur le terme en cours de frappe seulement ; le nom d'une
+    # source n'est pas un terme recherché
+    assert db.search("vpn oblig") and not db.search("vp obligatoire")
+    assert db.search("document", sources=("document",)) == []
+    try:
+        db.search("vpn", sources=("fichiers",))
+        assert False, "source inconnue acceptée"
+    except ValueError:
+        pass
+
+    # Contenu saisi par les utilisateurs : échappé, seuls les marqueurs restent du HTML
+    db.add_document("<script>alert(1)</script>", "Note", "1.0", "Pare-feu <img src=x onerror=alert(1)>", "admin")
+    resultat = db.search("pare-feu")[0]
+    assert "<script>" not in resultat['titre'] and "&lt;script&gt;" in resultat['titre']
+    assert "<img" not in resultat['extrait'] and "&lt;img" in resultat['extrait'] and "<mark>" in resultat['extrait']
+
+    db.add_directive("Bastion d'administration", "Accès SSH via bastion", "Technique", "Élevée", "RSSI")
+    directive_id = db.search("bastion")[0]['ref_id']
+    db.delete_directive(directive_id)
+    assert db.search("bastion") == []
+
+    assert not db.sync_iso_search_index()
+    assert db.sync_iso_search_index({"5.1": "Exigence réécrite"})
+    assert [r['ref_id'] for r in db.search("réécrite")] == ["5.1"]
+    assert db.search("inventaire", sources=("iso",)) == []
+    print("✅ Recherche plein texte synchronisée et classée")
+
+
+def test_full_text_search_is_fast_on_large_corpus():
+    """La recherche reste rapide sur un corpus documentaire volumineux"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(_temp_db_path(tmpdir))
+        vocabulaire = [f"terme{i}" for i in range(5000)]
+        conn = db.get_connection()
+        try:
+            conn.executemany(
+                "INSERT INTO documents (titre, categorie, version, contenu, auteur, date_creation) "
+                "VALUES (?, 'Politique', '1.0', ?, 'admin', '2025-01-01 00:00:00')",
+                [(f"Politique {i}", " ".join(vocabulaire[(i * 7 + k * 13) % 5000] for k in range(200)))
+                 for i in range(5000)],
+            )
+            conn.commit()
+        finally:
+            db._close_conn(conn)
+
+        def mesurer(**options):
+            durees = []
+            for i in range(20):
+                started = time.perf_counter()
+                resultats = db.search(f"terme{i * 97} terme{i * 97 + 13}", **options)
+                durees.append((time.perf_counter() - started) * 1000)
+            return sorted(durees)[len(durees) // 2], resultats
+
+        elapsed_ms, resultats = mesurer()
+        assert resultats
+        # Recherche limitée aux critères : les documents ne sont pas classés
+        criteres_ms, resultats = mesurer(sources=('critere', 'iso'))
+        assert all(r['source'] in ('critere', 'iso') for r in resultats)
+        db.close()
+        assert elapsed_ms < 10, f"recherche trop lente : {elapsed_ms:.1f} ms"
+        assert criteres_ms < 2, f"recherche des critères trop lente : {criteres_ms:.1f} ms"
+        print(f"✅ Recherche plein texte en {elapsed_ms:.2f} ms sur 5000 documents "
+              f"({criteres_ms:.2f} ms limitée aux critères)")
+
+
+def test_bulk_update_criteres_single_transaction():
+    """La mise à jour groupée applique les changements valides et rapporte chaque ligne"""
+    db = Database(":memory:")
+    db.update_critere(2, "Partiellement conforme", "Commentaire conservé")
+    results = db.bulk_update_criteres([
+        {'id': 1, 'statut': "Conforme", 'commentaire': "Atelier du 12/03"},
+        {'id': 2, 'statut': "Largement conforme"},
+        {'id': 3, 'statut': "Inconnu"},
+        {'id': 9999, 'statut': "Conforme"},
+    ])
+    assert [r['succes'] for r in results] == [True, True, False, False]
+    assert "Statut invalide" in results[2]['erreur'] and "introuvable" in results[3]['erreur']
+    assert db.get_critere_by_id(1)['commentaire'] == "Atelier du 12/03"
+    assert db.get_critere_by_id(2)['statut'] == "Largement conforme"
+    assert db.get_critere_by_id(2)['commentaire'] == "Commentaire conservé"
+    assert db.get_critere_by_id(3)['statut'] == "Non conforme"
+    assert db.check_conformity_snapshot(rebuild=False)
+    assert len(db.get_critere_history(1)) == 1
+    # Commentaire absent : conservé ; chaîne vide : effacé
+    db.bulk_update_criteres([{'id': 1, 'statut': "Conforme", 'commentaire': ""}])
+    assert db.get_critere_by_id(1)['commentaire'] == ""
+    assert db.get_critere_by_id(2)['commentaire'] == "Commentaire conservé"
+    assert db.bulk_update_criteres([]) == []
+    print("✅ Mise à jour groupée des critères")
+
+
+def test_pool_reuses_thread_connection():
+    """Les emprunts imbriqués d'un même thread partagent la connexion"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(_temp_db_path(tmpdir))
+        outer = db.get_connection()
+        inner = db.get_connection()
+        assert outer is inner
+        db._close_conn(inner)
+        db._close_conn(outer)
+
+        db.get_all_criteres()
+        db.get_conformity_stats()
+        stats = db.pool_stats()
+        assert stats['size'] == 1
+        assert stats['in_use'] == 0
+        db.close()
+        print("✅ Connexion réutilisée par le thread")
+
+
+def test_pool_is_bounded_and_reassigns_idle_connections():
+    """Le pool ne dépasse pas sa taille et recycle les connexions libres"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = ConnectionPool(_temp_db_path(tmpdir), max_size=2, checkout_timeout=0.2)
+        barrier = threading.Barrier(2)
+        held = []
+
+        def hold():
+            held.append(pool.acquire())
+            barrier.wait()
+
+        threads = [threading.Thread(target=hold) for _ in range(2)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Les deux connexions sont toujours empruntées : le pool est épuisé
+        try:
+            pool.acquire()
+            assert False, "Le pool aurait dû être épuisé"
+        except Exception as e:
+            assert "épuisé" in str(e)
+
+        for conn in held:
+            pool.release(conn)
+
+        # Les threads propriétaires sont terminés : leurs connexions sont recyclées
+        conn = pool.acquire()
+        assert conn in held
+        pool.release(conn)
+
+        stats = pool.stats()
+        assert stats['created'] == 2
+        assert stats['timeouts'] == 1
+        assert stats['reassigned'] == 1
+        pool.close_all()
+        print("✅ Pool borné avec réattribution des connexions libres")
+
+
+def test_pool_evicts_idle_connections():
+    """Les connexions inactives au-delà du délai sont fermées"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        pool = ConnectionPool(_temp_db_path(tmpdir), idle_timeout=0)
+        pool.release(pool.acquire())
+        assert pool.evict_idle() == 1
+        assert pool.stats()['size'] == 0
+        print("✅ Éviction des connexions inactives")
+
+
+def test_storage_profile_enables_wal():
+    """Le profil par défaut active le journal WAL et le busy_timeout"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(_temp_db_path(tmpdir))
+        conn = db.get_connection()
+        try:
+            assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+            assert conn.execute("PRAGMA synchronous").fetchone()[0] == 1  # NORMAL
+            assert conn.execute("PRAGMA busy_timeout").fetchone()[0] == 5000
+        finally:
+            db._close_conn(conn)
+        db.close()
+        print("✅ Profil de stockage WAL appliqué")
+
+
+def test_locked_writes_are_retried():
+    """Une écriture bloquée par un verrou est réessayée avec backoff"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = _temp_db_path(tmpdir)
+        profile = StorageProfile(busy_timeout_ms=0, write_retries=8, retry_backoff=0.02)
+        db = Database(path, storage_profile=profile)
+
+        blocker = sqlite3.connect(path, timeout=0, check_same_thread=False)
+        blocker.execute("BEGIN IMMEDIATE")
+        timer = threading.Timer(0.1, blocker.rollback)
+        timer.start()
+        started = time.monotonic()
+        db.update_critere(1, "Conforme", "Vérifié")
+        timer.join()
+        blocker.close()
+
+        assert time.monotonic() - started >= 0.1
+        assert db.get_critere_by_id(1)['statut'] == "Conforme"
+        assert db.pool_stats()['in_use'] == 0
+        db.close()
+        print("✅ Écriture réessayée après libération du verrou")
+
+
+if __name__ == "__main__":
+    test_schema_version_marker()
+    test_bootstrap_runs_once()
+    test_registry_shares_instances()
+    test_memory_databases_are_independent()
+    test_existing_database_gets_indexes()
+    test_failed_migration_is_rolled_back()
+    test_migrations_are_idempotent()
+    test_conformity_aggregates_match_python_counts()
+    test_conformity_snapshot_follows_writes()
+    test_conformity_rollups_follow_history()
+    test_keyset_pagination_walks_all_rows()
+    test_full_text_search_follows_writes()
+    test_full_text_search_is_fast_on_large_corpus()
+    test_bulk_update_criteres_single_transaction()
+    test_pool_reuses_thread_connection()
+    test_pool_is_bounded_and_reassigns_idle_connections()
+    test_pool_evicts_idle_connections()
+    test_storage_profile_enables_wal()
+    test_locked_writes_are_retried()
+    print("🎉 Tous les tests base de données sont passés")
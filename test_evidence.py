@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Tests du magasin de preuves adressé par contenu (utils/evidence.py)
+"""
+
+import hashlib
+import io
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.evidence import EvidenceStore, EvidenceError, is_evidence_ref
+
+
+def test_put_deduplicates_by_sha256():
+    """Un même contenu déposé plusieurs fois n'est stocké qu'une fois"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        store = EvidenceStore(db, tmp)
+        contenu = os.urandom(3 * 1024 * 1024 + 17)
+        sha256 = hashlib.sha256(contenu).hexdigest()
+
+        refs = [store.put(io.BytesIO(contenu), f"certificat_{i}.pdf", "application/pdf", "admin") for i in range(5)]
+        assert set(refs) == {f"sha256:{sha256}"} and is_evidence_ref(refs[0])
+        assert os.path.exists(os.path.join(tmp, sha256[:2], sha256[2:4], sha256))
+        fichiers = [f for _, _, noms in os.walk(tmp) for f in noms]
+        assert fichiers == [sha256]
+
+        info = store.info(refs[0])
+        assert (info['nom'], info['taille'], info['type_mime']) == ("certificat_0.pdf", len(contenu), "application/pdf")
+        with store.open(refs[0]) as fichier:
+            assert fichier.read() == contenu
+
+        try:
+            store.put(io.BytesIO(b"x" * 2048), "gros.bin", taille_max=1024)
+            assert False, "Le fichier trop volumineux aurait dû être refusé"
+        except EvidenceError:
+            pass
+        assert os.listdir(os.path.join(tmp, "tmp")) == []
+    print("✅ Dédoublonnage par SHA-256")
+
+
+def test_purge_unreferenced():
+    """Seules les preuves qui ne sont plus référencées sont purgées"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        store = EvidenceStore(db, tmp)
+        gardee = store.put(io.BytesIO(b"certificat ISO"), "iso.pdf")
+        orpheline = store.put(io.BytesIO(b"ancienne preuve"), "ancienne.pdf")
+        db.update_critere(1, "Conforme", "", gardee)
+        db.update_critere(2, "Conforme", "", gardee)
+
+        assert store.purge_unreferenced() == 0, "Les dépôts récents sont épargnés"
+        assert store.purge_unreferenced(delai=timedelta(seconds=-1)) == 1
+        assert store.info(orpheline) is None and store.info(gardee) is not None
+        try:
+            store.open(orpheline)
+            assert False, "La preuve purgée ne doit plus être lisible"
+        except EvidenceError:
+            pass
+
+        # Contenu ancien déposé à nouveau : le délai de grâce repart de zéro
+        ancienne = store.put(io.BytesIO(b"preuve d'un audit passe"), "audit.pdf")
+        conn = db.get_connection()
+        conn.execute("UPDATE preuves SET date_depot = '2020-01-01 00:00:00'")
+        conn.commit()
+        assert store.put(io.BytesIO(b"preuve d'un audit passe"), "audit.pdf") == ancienne
+        assert store.purge_unreferenced() == 0 and store.info(ancienne) is not None
+    print("✅ Purge des preuves non référencées")
+
+
+if __name__ == "__main__":
+    test_put_deduplicates_by_sha256()
+    test_purge_unreferenced()
+    print("🎉 Tous les tests du magasin de preuves sont passés")
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Tests du traitement en arrière-plan des preuves (utils/evidence_pipeline.py)
+"""
+
+import io
+import os
+import sys
+import tempfile
+import zipfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.evidence import EvidenceStore
+from utils.evidence_pipeline import EvidencePipeline, extract, cache_dir, thumbnail_path, Image
+
+
+def _docx(texte: str) -> bytes:
+    contenu = io.BytesIO()
+    with zipfile.ZipFile(contenu, 'w') as archive:
+        archive.writestr('word/document.xml',
+                         f'<w:document><w:body><w:p><w:r><w:t>{texte}</w:t></w:r></w:p></w:body></w:document>')
+        archive.writestr('docProps/app.xml', '<Properties><Pages>3</Pages></Properties>')
+    return contenu.getvalue()
+
+
+def _pdf(pages: int) -> bytes:
+    from reportlab.pdfgen import canvas
+
+    contenu = io.BytesIO()
+    document = canvas.Canvas(contenu)
+    for i in range(pages):
+        document.drawString(72, 720, f"Rapport d'audit, page {i + 1}")
+        document.showPage()
+    document.save()
+    return contenu.getvalue()
+
+
+def test_pipeline_extracts_in_worker_processes():
+    """Aperçus, pages et texte produits hors du processus principal, puis consultables"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        store = EvidenceStore(db, tmp)
+        refs = {
+            'note': store.put(io.BytesIO("Procédure de <b>chiffrement</b> des sauvegardes".encode()), "note.txt", "text/plain"),
+            'charte': store.put(io.BytesIO(_docx("Charte d&apos;utilisation du poste de travail")), "charte.docx"),
+            'rapport': store.put(io.BytesIO(_pdf(4)), "rapport.pdf", "application/pdf"),
+        }
+        if Image is not None:
+            image = io.BytesIO()
+            Image.new('RGB', (1600, 900), 'navy').save(image, 'PNG')
+            image.seek(0)
+            refs['photo'] = store.put(image, "salle_serveurs.png", "image/png")
+        db.update_critere(1, "Conforme", "", refs['note'])
+
+        pipeline = EvidencePipeline(db, store, workers=2)
+        try:
+            assert pipeline.submit_pending() == len(refs)
+            assert pipeline.wait(timeout=120)
+        finally:
+            pipeline.shutdown()
+        assert db.get_pending_evidence() == []
+
+        sha = {nom: ref.split(':', 1)[1] for nom, ref in refs.items()}
+        rapport = db.get_evidence_extract(sha['rapport'])
+        assert (rapport['pages'], rapport['erreur']) == (4, None)
+        charte = db.get_evidence_extract(sha['charte'])
+        assert (charte['pages'], charte['erreur']) == (3, None)
+        if 'photo' in sha:
+            photo = db.get_evidence_extract(sha['photo'])
+            assert photo['apercu'] == 1
+            with Image.open(thumbnail_path(store, sha['photo'])) as apercu:
+                assert max(apercu.size) <= 256
+
+        resultats = db.search_evidence("chiffrement")
+        assert [(r['nom'], r['criteres']) for r in resultats] == [("note.txt", "5.1")]
+        assert "<mark>" in resultats[0]['extrait']
+        assert db.search_evidence("poste travail")[0]['nom'] == "charte.docx"
+        # Texte extrait d'un fichier déposé : échappé avant affichage
+        assert "<b>" not in resultats[0]['extrait'] and "&lt;b&gt;" in resultats[0]['extrait']
+
+        # Suppression d'une preuve : son texte n'est plus consultable
+        db.delete_evidence(sha['charte'])
+        assert db.search_evidence("charte") == []
+    print("✅ Traitement des preuves dans le pool de processus")
+
+
+def test_extract_uses_disk_cache():
+    """Un contenu déjà traité n'est pas relu (cache par empreinte)"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        store = EvidenceStore(db, tmp)
+        ref = store.put(io.BytesIO(b"journal d'acces"), "acces.log")
+        sha256 = ref.split(':', 1)[1]
+        chemin = store.path(sha256)
+
+        premier = extract(chemin, "acces.log", None, cache_dir(store), sha256)
+        os.remove(chemin)
+        second = extract(chemin, "autre_nom.log", None, cache_dir(store), sha256)
+        assert premier == second and second['texte'] == "journal d'acces"
+    print("✅ Cache disque des extractions")
+
+
+if __name__ == "__main__":
+    test_pipeline_extracts_in_worker_processes()
+    test_extract_uses_disk_cache()
+    print("🎉 Tous les tests du traitement des preuves sont passés")
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+"""
+Tests de l'export CSV (utils/exporter.py)
+Vérifie l'écriture par lots depuis un curseur et l'aller-retour avec l'import
+"""
+
+import csv
+import io
+import json
+import zipfile
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.exporter import export_table_csv, write_dicts_csv, export_bundle, pa
+from utils.importer import import_file
+
+
+def test_export_audits_streams_all_rows():
+    """Export par lots : BOM, en-tête et toutes les lignes"""
+    db = Database(":memory:")
+    db.import_batch('audits', [(f"Audit {i}", "2025-03-01", "audit01", "Terminé", i % 101, "RAS")
+                               for i in range(2500)])
+    fichier = export_table_csv(db, 'audits', chunk_size=1000)
+    contenu = fichier.getvalue()
+    assert contenu.startswith(b"\xef\xbb\xbf")
+    lignes = list(csv.reader(io.StringIO(contenu.decode('utf-8-sig'))))
+    assert lignes[0][:3] == ['id', 'titre', 'date_audit']
+    assert len(lignes) == 2501
+    print("✅ Export CSV des audits par lots")
+
+
+def test_export_users_excludes_password_hash():
+    """Les empreintes de mot de passe ne sont jamais exportées"""
+    db = Database(":memory:")
+    entete = export_table_csv(db, 'users').getvalue().decode('utf-8-sig').splitlines()[0]
+    assert 'username' in entete and 'password' not in entete
+    print("✅ Export des utilisateurs sans mot de passe")
+
+
+def test_export_criteres_round_trip():
+    """Un export de critères se réimporte sans erreur"""
+    db = Database(":memory:")
+    db.update_critere(1, "Conforme", "Vérifié; avec \"guillemets\"")
+    fichier = export_table_csv(db, 'criteres')
+
+    copie = Database(":memory:")
+    bilan = import_file(copie, 'criteres', fichier, "criteres_export.csv")
+    assert (bilan.importees, bilan.erreurs_total) == (93, 0)
+    critere = copie.get_critere_by_id(1)
+    assert (critere['statut'], critere['commentaire']) == ("Conforme", "Vérifié; avec \"guillemets\"")
+    print("✅ Aller-retour export/import des critères")
+
+
+def test_write_dicts_csv_from_generator():
+    """Les dictionnaires sont écrits au fil d'un générateur"""
+    out = io.BytesIO()
+    total = write_dicts_csv(({'Code': str(i), 'Statut': 'Conforme'} for i in range(3)), out)
+    assert total == 3
+    assert out.getvalue().decode('utf-8-sig').splitlines() == ["Code,Statut", "0,Conforme", "1,Conforme", "2,Conforme"]
+
+    vide = io.BytesIO()
+    assert write_dicts_csv([], vide, columns=['Code']) == 0
+    assert vide.getvalue().decode('utf-8-sig').splitlines() == ["Code"]
+    print("✅ Export CSV depuis un générateur")
+
+
+def _lire_lot(lot):
+    import pyarrow.parquet as pq
+    archive = zipfile.ZipFile(lot)
+    manifest = json.loads(archive.read("manifest.json"))
+    tables = {nom[:-len(".parquet")]: pq.read_table(io.BytesIO(archive.read(nom)))
+              for nom in archive.namelist() if nom.endswith(".parquet")}
+    return manifest, tables
+
+
+def test_parquet_bundle_is_typed():
+    """Le lot Parquet contient toutes les tables avec des colonnes typées"""
+    if pa is None:
+        print("⚠️ pyarrow absent : export Parquet non testé")
+        return
+    db = Database(":memory:")
+    db.add_audit("Audit annuel", "2025-03-14", "audit01", "Terminé", 87.5, "RAS")
+    db.update_critere(1, "Conforme", "Vérifié")
+    manifest, tables = _lire_lot(export_bundle(db, chunk_size=10))
+
+    assert manifest['depuis'] is None
+    assert manifest['tables']['criteres'] == 93 and manifest['tables']['critere_history'] == 1
+    assert tables['criteres'].num_rows == 93
+    assert 'password_hash' not in tables['users'].column_names
+    audits = tables['audits']
+    assert audits.schema.field('id').type == pa.int64()
+    assert audits.schema.field('score').type == pa.float64()
+    assert audits.schema.field('date_audit').type == pa.date32()
+    assert pa.types.is_timestamp(audits.schema.field('created_at').type)
+    assert str(audits.column('date_audit')[0]) == "2025-03-14"
+    print("✅ Lot Parquet typé")
+
+
+def test_parquet_bundle_since_only_exports_changes():
+    """L'export incrémental ne contient que les lignes écrites depuis la borne"""
+    if pa is None:
+        return
+    db = Database(":memory:")
+    conn = db.get_connection()
+    conn.execute("UPDATE criteres SET derniere_maj = '2020-01-01 00:00:00'")
+    conn.execute("UPDATE users SET created_at = '2020-01-01 00:00:00', last_login = NULL")
+    conn.commit()
+    audit_id = db.add_audit("Audit annulé", "2025-03-14", "audit01", "Planifié", 0, "")
+    conn.execute("UPDATE audits SET created_at = '2020-01-01 00:00:00'")
+    conn.commit()
+    complet, _ = _lire_lot(export_bundle(db))
+    assert complet['suppressions'] == 0
+
+    db.update_critere(5, "Conforme", "Revu")
+    db.add_directive("MFA", "Double authentification", "Technique", "Élevée", "RSSI")
+    db.delete_audit(audit_id)
+    manifest, tables = _lire_lot(export_bundle(db, since=complet['genere_le']))
+
+    assert manifest['depuis'] == complet['genere_le']
+    assert manifest['tables'] == {'criteres': 1, 'audits': 0, 'directives': 1, 'documents': 0,
+                                  'users': 0, 'critere_history': 1}
+    assert tables['criteres'].column('id').to_pylist() == [5]
+    assert tables['critere_history'].column('critere_id').to_pylist() == [5]
+    # La suppression de l'audit part dans le lot sous forme de trace
+    assert manifest['suppressions'] == 1
+    assert tables['suppressions'].column('table_nom').to_pylist() == ['audits']
+    assert tables['suppressions'].column('ref_id').to_pylist() == [audit_id]
+    assert pa.types.is_timestamp(tables['suppressions'].schema.field('date_suppression').type)
+
+    try:
+        export_bundle(db, since="hier")
+        assert False, "Une borne invalide aurait dû être refusée"
+    except ValueError:
+        pass
+    print("✅ Lot Parquet incrémental")
+
+
+if __name__ == "__main__":
+    test_export_audits_streams_all_rows()
+    test_export_users_excludes_password_hash()
+    test_export_criteres_round_trip()
+    test_write_dicts_csv_from_generator()
+    test_parquet_bundle_is_typed()
+    test_parquet_bundle_since_only_exports_changes()
+    print("🎉 Tous les tests d'export sont passés")
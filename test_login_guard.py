@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+"""
+Tests de la protection de la page de connexion (utils/login_guard.py)
+"""
+
+import os
+import sys
+import threading
+import time
+
+import bcrypt
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.login_guard import (LoginGuard, LoginThrottle, LoginThrottled, LoginBusy,
+                               PasswordVerifier)
+
+
+def test_passwords_verified_in_bounded_pool():
+    """Les vérifications passent par le pool ; au-delà de la file, elles sont refusées"""
+    db = Database(":memory:")
+    guard = LoginGuard(PasswordVerifier(workers=2, file_max=2))
+    try:
+        appelant = threading.get_ident()
+        threads = []
+        original = guard.verifier._executer
+        guard.verifier._executer = lambda *args: threads.append(threading.get_ident()) or original(*args)
+        user = guard.authenticate(db, "audit01", "Audit@2025", "10.0.0.1")
+        assert user['username'] == "audit01" and threads and appelant not in threads
+        assert db.get_user_by_id(user['id'])['last_login']
+        assert guard.authenticate(db, "audit01", "mauvais", "10.0.0.1") is None
+        assert guard.authenticate(db, "inconnu", "mauvais") is None
+        stats = guard.stats()
+        assert (stats['submitted'], stats['completed'], stats['waiting'], stats['running']) == (2, 2, 0, 0)
+    finally:
+        guard.verifier.shutdown()
+
+    # Nouvelle empreinte (politique renforcée) : calculée dans le pool, pas par l'appelant
+    from utils.password_policy import HashPolicy
+    db = Database(":memory:", hash_policy=HashPolicy(4))
+    db.hash_policy = HashPolicy(5)
+    guard = LoginGuard(PasswordVerifier(workers=1))
+    appels = []
+    original = db.rehash_password
+    db.rehash_password = lambda *args: appels.append(threading.get_ident()) or original(*args)
+    try:
+        assert guard.authenticate(db, "user01", "User@2025")
+    finally:
+        guard.verifier.shutdown()
+    assert appels and appelant not in appels and guard.stats()['rehashed'] == 1
+    user = next(u for u in db.get_all_users() if u['username'] == "user01")
+    conn = db.get_connection()
+    assert conn.execute("SELECT hash_cout FROM users WHERE id = ?", (user['id'],)).fetchone()[0] == 5
+    db._close_conn(conn)
+
+    # Pool occupé : une vérification de trop est refusée sans être mise en file
+    verifier = PasswordVerifier(workers=1, file_max=0)
+    bloque = threading.Event()
+    verifier._executor.submit(bloque.wait)
+    empreinte = bcrypt.hashpw(b"secret", bcrypt.gensalt(4))
+    try:
+        attente = threading.Thread(target=lambda: verifier.check(b"secret", empreinte))
+        attente.start()
+        while verifier.stats()['waiting'] == 0:
+            time.sleep(0.01)
+        verifier.check(b"secret", empreinte)
+        assert False, "vérification acceptée malgré une file pleine"
+    except LoginBusy:
+        assert verifier.stats()['rejected'] == 1
+    finally:
+        bloque.set()
+        attente.join()
+        verifier.shutdown()
+    assert verifier.stats()['completed'] == 1 and verifier.stats()['wait_max'] > 0
+    print("✅ Vérification des mots de passe dans un pool borné")
+
+
+def test_throttle_backoff_per_user_and_ip():
+    """Attente doublée à chaque échec au-delà du seuil, par identifiant et par adresse"""
+    maintenant = [1000.0]
+    throttle = LoginThrottle(seuil=3, base=1.0, maximum=8.0, fenetre=60, horloge=lambda: maintenant[0])
+    assert [throttle.failure("audit01") for _ in range(7)] == [0, 0, 1, 2, 4, 8, 8]
+    assert throttle.retry_after("audit01") == 8 and throttle.retry_after("user01") == 0
+    maintenant[0] += 8
+    assert throttle.retry_after("audit01") == 0
+    # Sans nouvel échec pendant la fenêtre, le compteur repart de zéro
+    maintenant[0] += 60
+    assert throttle.failure("audit01") == 0
+
+    limite = LoginThrottle(seuil=1, entrees_max=2, horloge=lambda: maintenant[0])
+    for cle in ("a", "b", "c"):
+        limite.failure(cle)
+    assert list(limite._entrees) == ["b", "c"]
+
+    db = Database(":memory:")
+    guard = LoginGuard(PasswordVerifier(workers=1),
+                       LoginThrottle(seuil=2, horloge=lambda: maintenant[0]),
+                       LoginThrottle(seuil=3, horloge=lambda: maintenant[0]))
+    try:
+        for _ in range(2):
+            assert guard.authenticate(db, "audit01", "mauvais", "10.0.0.1") is None
+        # Identifiant bloqué, y compris avec le bon mot de passe : aucun hachage effectué
+        try:
+            guard.authenticate(db, "audit01", "Audit@2025", "10.0.0.2")
+            assert False, "tentative acceptée pendant l'attente"
+        except LoginThrottled as e:
+            assert e.attente == 1.0
+        assert guard.stats()['submitted'] == 2 and guard.retry_after(" AUDIT01") > 0
+
+        # Adresse bloquée pour tous les identifiants
+        assert guard.authenticate(db, "user01", "mauvais", "10.0.0.1") is None
+        assert guard.retry_after("user01", "10.0.0.1") > 0 and guard.retry_after("user01", "10.0.0.3") == 0
+
+        maintenant[0] += 1
+        assert guard.authenticate(db, "audit01", "Audit@2025", "10.0.0.2")
+        assert guard.retry_after("audit01") == 0
+
+        # Sans adresse (accès local) : limité par identifiant seulement, et signalé par stats()
+        for i in range(4):
+            assert guard.authenticate(db, f"inconnu{i}", "mauvais") is None
+        assert guard.stats()['attempts_without_ip'] == 4 and guard.stats()['attempts'] == 9
+    finally:
+        guard.verifier.shutdown()
+    print("✅ Limitation des tentatives de connexion")
+
+
+if __name__ == "__main__":
+    test_passwords_verified_in_bounded_pool()
+    test_throttle_backoff_per_user_and_ip()
+    print("🎉 Tous les tests de la protection de connexion sont passés")
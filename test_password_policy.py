@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""
+Tests de la politique de hachage des mots de passe (utils/password_policy.py)
+"""
+
+import os
+import sqlite3
+import sys
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+import migrations
+from database import Database
+from utils.password_policy import HashPolicy
+
+
+def _hash_user(db, username):
+    conn = db.get_connection()
+    try:
+        return dict(conn.execute("SELECT password_hash, hash_algorithme, hash_cout FROM users WHERE username = ?",
+                                 (username,)).fetchone())
+    finally:
+        db._close_conn(conn)
+
+
+def test_cost_calibrated_to_target_latency():
+    """Le coût retenu est le plus élevé qui tient dans la latence visée, dans les bornes"""
+    assert HashPolicy.calibrate(cible=1e-9, cout_min=5, cout_max=14).cout == 5
+    assert HashPolicy.calibrate(cible=1e9, cout_min=5, cout_max=14).cout == 14
+    politique = HashPolicy.calibrate(cible=0.05, cout_min=4, cout_max=31)
+    assert 4 <= politique.cout < 31 and politique.latence <= 0.05 * 1.5
+    assert politique.hash("secret").startswith(f"$2b${politique.cout:02d}$")
+
+    assert not politique.needs_rehash("bcrypt", politique.cout)
+    assert not politique.needs_rehash("bcrypt", politique.cout + 1)
+    assert politique.needs_rehash("bcrypt", politique.cout - 1)
+    assert politique.needs_rehash(None, None) and politique.needs_rehash("argon2id", 99)
+    print("✅ Calibrage du coût de hachage")
+
+
+def test_rehash_on_login_when_policy_strengthens():
+    """Une empreinte plus faible que la politique est refaite à la connexion réussie"""
+    db = Database(":memory:", hash_policy=HashPolicy(4))
+    assert _hash_user(db, "audit01")['hash_cout'] == 4
+    assert db.add_user("nouveau", "Nouveau@2025", "Utilisateur")
+    assert _hash_user(db, "nouveau")['hash_cout'] == 4
+
+    db.hash_policy = HashPolicy(5)
+    assert db.verify_user("audit01", "mauvais") is None
+    assert _hash_user(db, "audit01")['hash_cout'] == 4
+    assert db.verify_user("audit01", "Audit@2025")
+    apres = _hash_user(db, "audit01")
+    assert (apres['hash_algorithme'], apres['hash_cout']) == ("bcrypt", 5)
+    assert apres['password_hash'].startswith("$2b$05$")
+    assert db.verify_user("audit01", "Audit@2025")
+    assert _hash_user(db, "audit01") == apres
+
+    # Politique plus faible (machine plus lente) : l'empreinte garde son coût
+    db.hash_policy = HashPolicy(4)
+    assert db.verify_user("audit01", "Audit@2025")
+    assert _hash_user(db, "audit01") == apres
+    print("✅ Nouvelle empreinte à la connexion")
+
+
+def test_migration_records_existing_hash_costs():
+    """La migration renseigne l'algorithme et le coût des empreintes existantes"""
+    db = Database(":memory:", hash_policy=HashPolicy(4))
+    conn = sqlite3.connect(":memory:")
+    conn.row_factory = sqlite3.Row
+    migrations.migrate(conn, db, target=13)
+    conn.execute("INSERT INTO users (username, password_hash, role, created_at) VALUES (?, ?, ?, ?)",
+                 ("ancien", HashPolicy(6).hash("Ancien@2020"), "Utilisateur", "2020-01-01 00:00:00"))
+    conn.execute("INSERT INTO users (username, password_hash, role, created_at) VALUES (?, ?, ?, ?)",
+                 ("inconnu", "sha256:abcdef", "Utilisateur", "2020-01-01 00:00:00"))
+    conn.commit()
+    migrations.migrate(conn, db)
+    couts = {row['username']: (row['hash_algorithme'], row['hash_cout'])
+             for row in conn.execute("SELECT username, hash_algorithme, hash_cout FROM users")}
+    assert couts['ancien'] == ("bcrypt", 6) and couts['audit01'] == ("bcrypt", 4)
+    assert couts['inconnu'] == (None, None)
+    print("✅ Migration des empreintes existantes")
+
+
+if __name__ == "__main__":
+    test_cost_calibrated_to_target_latency()
+    test_rehash_on_login_when_policy_strengthens()
+    test_migration_records_existing_hash_costs()
+    print("🎉 Tous les tests de la politique de hachage sont passés")
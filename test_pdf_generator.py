@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests du générateur de rapports PDF et de son cache (utils/pdf_generator.py)
+"""
+
+import os
+import re
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils import pdf_generator
+from utils.pdf_generator import PDFGenerator, ReportCache, report_fingerprint, _StoryStream
+
+
+def test_cached_report_reused_until_data_changes():
+    """Un rapport n'est refait que si ses données changent"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        cache = ReportCache(tmp)
+        stats, criteres = db.get_conformity_stats(), db.get_all_criteres()
+
+        premier = PDFGenerator(cache=cache).generate_conformity_report(stats, criteres)
+        assert premier.startswith(b"%PDF-")
+        avancement = []
+        second = PDFGenerator(progress=avancement.append, cache=cache).generate_conformity_report(stats, criteres)
+        assert second is premier and avancement == [1.0]
+
+        # Nouveau processus (mémoire vide) : le rapport est relu depuis le disque
+        assert PDFGenerator(cache=ReportCache(tmp)).generate_conformity_report(stats, criteres) == premier
+
+        cle = report_fingerprint('conformite', stats=stats, criteres=criteres)
+        db.update_critere(criteres[0]['id'], "Non conforme", "Écart relevé en audit")
+        assert report_fingerprint('conformite', stats=db.get_conformity_stats(),
+                                  criteres=db.get_all_criteres()) != cle
+        assert report_fingerprint('audit', 1, audit={'id': 1}, criteres=criteres) != \
+            report_fingerprint('audit', 2, audit={'id': 1}, criteres=criteres)
+    print("✅ Cache des rapports par empreinte des données")
+
+
+def test_cache_evicts_least_recently_used():
+    """Mémoire et disque évincent les rapports les moins récemment utilisés"""
+    with tempfile.TemporaryDirectory() as tmp:
+        cache = ReportCache(tmp, memoire_max=250, disque_max=250)
+        for i, cle in enumerate(("a", "b")):
+            cache.put(cle, bytes(100))
+            os.utime(os.path.join(tmp, f"{cle}.pdf"), (time.time() - 100 + i, time.time() - 100 + i))
+        assert cache.get("a") is not None
+        cache.put("c", bytes(100))
+
+        assert list(cache._memoire) == ["a", "c"]
+        assert sorted(os.listdir(tmp)) == ["a.pdf", "c.pdf"]
+        assert cache.get("b") is None
+
+        destination = os.path.join(tmp, "copie.pdf")
+        assert cache.copy_to("c", destination) and os.path.getsize(destination) == 100
+        assert not cache.copy_to("b", destination)
+    print("✅ Éviction LRU du cache des rapports")
+
+
+def test_detailed_report_streamed_to_file():
+    """L'annexe détaillée est mise en page par lots et écrite directement dans un fichier"""
+    criteres = [{'code': f"A.{i}", 'titre': f"Mesure {i} & <contrôle>", 'categorie': 'Technologique',
+                 'statut': 'Non conforme' if i % 3 else 'Conforme', 'commentaire': "Écart constaté. " * 10}
+                for i in range(300)]
+    stats = {'taux_conformite': 33, 'total': 300, 'conforme': 100, 'partiellement_conforme': 0, 'non_conforme': 200}
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, "rapport.pdf")
+        avancement = []
+        taille = PDFGenerator(progress=avancement.append).write_conformity_report(stats, criteres, chemin, detail=True)
+        with open(chemin, 'rb') as fichier:
+            contenu = fichier.read()
+        assert contenu.startswith(b"%PDF-") and len(contenu) == taille
+        assert len(re.findall(rb"/Type /Page\b", contenu)) > 10
+        assert avancement == sorted(avancement) and 0.5 < avancement[-1] <= 1.0
+        assert os.listdir(tmp) == ["rapport.pdf"]
+
+    # La story ne garde jamais plus d'un lot d'éléments
+    flux = _StoryStream(iter(range(100)), 10)
+    vus, taille_max = [], 0
+    while len(flux):
+        taille_max = max(taille_max, list.__len__(flux))
+        vus.append(flux[0])
+        del flux[0]
+    assert vus == list(range(100)) and taille_max <= 10 and flux.consumed() == 100
+    print("✅ Rapport détaillé écrit en flux")
+
+
+def test_detailed_report_written_in_parts():
+    """L'annexe est mise en page par parties, assemblées sur disque en un PDF lisible"""
+    from pypdf import PdfReader
+
+    criteres = [{'code': f"A.{i}", 'titre': f"Mesure {i}", 'categorie': 'Organisationnelle',
+                 'statut': 'Conforme', 'commentaire': "Vérifié sur pièce. " * 8} for i in range(300)]
+    stats = {'taux_conformite': 100, 'total': 300, 'conforme': 300, 'partiellement_conforme': 0, 'non_conforme': 0}
+    tableaux_par_partie = pdf_generator.TABLEAUX_PAR_PARTIE
+    pdf_generator.TABLEAUX_PAR_PARTIE = 2
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            chemin = os.path.join(tmp, "rapport.pdf")
+            avancement = []
+            taille = PDFGenerator(progress=avancement.append).write_conformity_report(stats, criteres, chemin,
+                                                                                    detail=True)
+            assert os.path.getsize(chemin) == taille and os.listdir(tmp) == ["rapport.pdf"]
+            assert avancement == sorted(avancement) and avancement[-1] == 1.0
+
+            # Synthèse puis 4 parties d'annexe (8 tableaux), dans l'ordre, arbre de pages unique
+            lecteur = PdfReader(chemin, strict=True)
+            textes = [page.extract_text() for page in lecteur.pages]
+            assert "RAPPORT DE CONFORMITÉ" in textes[0]
+            annexe = next(i for i, texte in enumerate(textes) if "ANNEXE" in texte)
+            codes = [int(code) for texte in textes[annexe:] for code in re.findall(r"A\.(\d+)", texte)]
+            assert codes == list(range(300))
+            assert "Document confidentiel" in textes[-1]
+            assert all(page['/Parent'].indirect_reference == lecteur.trailer['/Root'].raw_get('/Pages')
+                       for page in lecteur.pages)
+    finally:
+        pdf_generator.TABLEAUX_PAR_PARTIE = tableaux_par_partie
+    print("✅ Rapport détaillé assemblé par parties")
+
+
+if __name__ == "__main__":
+    test_cached_report_reused_until_data_changes()
+    test_cache_evicts_least_recently_used()
+    test_detailed_report_streamed_to_file()
+    test_detailed_report_written_in_parts()
+    print("🎉 Tous les tests du générateur PDF sont passés")
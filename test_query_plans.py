@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Tests des plans d'exécution des requêtes de Sécurité 360
+Vérifie via EXPLAIN QUERY PLAN que chaque chemin d'accès de Database utilise
+un index, sans tri temporaire ni parcours complet de table
+"""
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+
+# (méthode, requête, paramètres, index attendu) — requêtes identiques à celles de database.py
+ACCESS_PATHS = [
+    ("get_all_criteres", "SELECT * FROM criteres ORDER BY code", (), "sqlite_autoindex_criteres_1"),
+    ("get_critere_by_id", "SELECT * FROM criteres WHERE id = ?", (1,), "INTEGER PRIMARY KEY"),
+    # Table d'instantané bornée (catégories × statuts) : son parcours complet est attendu
+    ("get_conformity_snapshot", "SELECT categorie, statut, nombre, points FROM conformity_snapshot WHERE nombre > 0", (),
+     "SCAN conformity_snapshot"),
+    ("check_conformity_snapshot",
+     "SELECT categorie, IFNULL(statut, ''), COUNT(*) FROM criteres GROUP BY categorie, statut", (),
+     "idx_criteres_categorie_statut"),
+    ("get_criteres_by_statut", "SELECT * FROM criteres WHERE statut = ? ORDER BY code", ("Non conforme",),
+     "idx_criteres_statut_code"),
+    ("get_critere_history",
+     "SELECT * FROM critere_history WHERE critere_id = ? ORDER BY date_modification DESC", (1,),
+     "idx_critere_history_critere"),
+    ("refresh_conformity_rollups",
+     "SELECT date_modification, categorie, ancien_statut, nouveau_statut FROM critere_history "
+     "WHERE date_modification >= ? ORDER BY date_modification", ("2025-01-01",),
+     "idx_critere_history_date"),
+    ("get_conformity_trend",
+     "SELECT debut, SUM(total), SUM(conformes), SUM(points) FROM conformity_rollup "
+     "WHERE periode = ? AND debut >= ? AND debut <= ? GROUP BY debut ORDER BY debut",
+     ("mois", "2025-01-01", "2025-12-31"), "PRIMARY KEY"),
+    ("get_audits_page", "SELECT * FROM audits ORDER BY date_audit DESC, id DESC LIMIT ?", (21,), "idx_audits_date_id"),
+    ("get_audits_page (suite)",
+     "SELECT * FROM audits WHERE (date_audit, id) < (?, ?) ORDER BY date_audit DESC, id DESC LIMIT ?",
+     ("2025-06-01", 100, 21), "idx_audits_date_id"),
+    ("get_audit_by_id", "SELECT * FROM audits WHERE id = ?", (1,), "INTEGER PRIMARY KEY"),
+    ("get_documents_page",
+     "SELECT * FROM documents WHERE categorie = ? AND (date_creation, id) < (?, ?) "
+     "ORDER BY date_creation DESC, id DESC LIMIT ?", ("Politique", "2025-01-01 00:30:00", 100, 21),
+     "idx_documents_categorie_date_id"),
+    ("get_directives_page",
+     "SELECT * FROM directives WHERE (date_creation, id) < (?, ?) ORDER BY date_creation DESC, id DESC LIMIT ?",
+     ("2025-01-01 00:30:00", 100, 21), "idx_directives_date_id"),
+    ("get_directive_breakdown", "SELECT type, efficacite, COUNT(*) FROM directives GROUP BY type, efficacite", (),
+     "idx_directives_type_efficacite"),
+    ("search",
+     "SELECT source, ref_id, rank FROM search_index WHERE search_index MATCH ? ORDER BY rank LIMIT ?",
+     ('"politique"*', 50), "VIRTUAL TABLE INDEX"),
+    ("get_users_page",
+     "SELECT id, username, role, created_at, last_login FROM users WHERE (id) > (?) ORDER BY id ASC LIMIT ?",
+     (10, 51), "INTEGER PRIMARY KEY"),
+    ("verify_user", "SELECT * FROM users WHERE username = ?", ("audit01",), "sqlite_autoindex_users_1"),
+    ("get_setting", "SELECT valeur FROM settings WHERE cle = ?", ("theme",), "sqlite_autoindex_settings_1"),
+]
+
+
+def assert_indexed_plan(db: Database, name: str, sql: str, params: tuple, expected_index: str):
+    """Échoue si le plan contient un tri temporaire ou un parcours sans index"""
+    plan = db.explain_query_plan(sql, params)
+    for step in plan:
+        assert "USE TEMP B-TREE" not in step, f"{name}: tri temporaire ({plan})"
+        if step.startswith("SCAN") and step != expected_index:
+            # Une table virtuelle (FTS5) interrogée via son propre index n'est pas un parcours complet
+            assert "USING" in step or "VIRTUAL TABLE INDEX" in step, f"{name}: parcours complet sans index ({plan})"
+    assert any(expected_index in step for step in plan), f"{name}: index {expected_index} non utilisé ({plan})"
+    return plan
+
+
+def _seed(db: Database, count: int):
+    """Ajoute suffisamment de lignes pour que le planificateur ait des statistiques réalistes"""
+    conn = db.get_connection()
+    try:
+        conn.executemany(
+            "INSERT INTO audits (titre, date_audit, auditeur, statut, score, commentaires, created_at) "
+            "VALUES (?, ?, 'audit01', 'Terminé', 80, '', '2025-01-01 00:00:00')",
+            [(f"Audit {i}", f"2025-{i % 12 + 1:02d}-{i % 28 + 1:02d}") for i in range(count)],
+        )
+        conn.executemany(
+            "INSERT INTO documents (titre, categorie, version, contenu, auteur, date_creation) "
+            "VALUES (?, ?, '1.0', '', 'admin', ?)",
+            [(f"Doc {i}", ["Politique", "Procédure", "Charte"][i % 3], f"2025-01-01 00:{i % 60:02d}:00")
+             for i in range(count)],
+        )
+        conn.executemany(
+            "INSERT INTO directives (titre, description, type, responsable, date_creation) "
+            "VALUES (?, '', 'Technique', 'RSSI', ?)",
+            [(f"Directive {i}", f"2025-01-01 00:{i % 60:02d}:00") for i in range(count)],
+        )
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        db._close_conn(conn)
+
+
+def test_access_paths_use_indexes():
+    """Tous les chemins d'accès utilisent un index"""
+    with tempfile.TemporaryDirectory() as tmpdir:
+        db = Database(os.path.join(tmpdir, "plans.db"))
+        _seed(db, 3000)
+        for name, sql, params, expected_index in ACCESS_PATHS:
+            plan = assert_indexed_plan(db, name, sql, params, expected_index)
+            print(f"✅ {name:28} {' | '.join(plan)}")
+        db.close()
+
+
+if __name__ == "__main__":
+    test_access_paths_use_indexes()
+    print("🎉 Tous les plans d'exécution sont indexés")
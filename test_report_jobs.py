@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""
+Tests de la file de génération des rapports PDF (utils/report_jobs.py)
+"""
+
+import os
+import sys
+import tempfile
+import zipfile
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.report_jobs import ReportQueue, ReportError, TERMINE, ECHEC, EN_ATTENTE, download_name
+
+
+def test_reports_generated_in_worker_processes():
+    """Les rapports sont produits hors du processus principal, suivis en base et servis depuis le disque"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        audit_id = db.add_audit("Audit annuel", "2025-03-01", "audit01", "Terminé", 82.5, "RAS")
+        queue = ReportQueue(db, tmp, workers=2)
+        try:
+            conformite = queue.submit('conformite', demande_par="admin")
+            audit = queue.submit('audit', audit_id, demande_par="admin")
+            # Double clic : la demande en cours est réutilisée
+            assert queue.submit('conformite', demande_par="admin") == conformite
+            assert queue.wait(timeout=120)
+        finally:
+            queue.shutdown()
+
+        for job_id in (conformite, audit):
+            job = queue.status(job_id)
+            assert (job['statut'], job['progression'], job['erreur']) == (TERMINE, 1, None)
+            assert job['date_debut'] and job['date_fin']
+            with queue.open(job_id) as pdf:
+                assert pdf.read(5) == b"%PDF-"
+            assert os.path.getsize(job['chemin']) == job['taille']
+        # Mêmes données : servi depuis le cache, sans passer par le pool
+        relance = queue.submit('conformite', demande_par="admin")
+        assert relance != conformite and queue.status(relance)['statut'] == TERMINE
+        with queue.open(relance) as pdf, queue.open(conformite) as original:
+            assert pdf.read() == original.read()
+        assert queue._executor is None
+        assert download_name(queue.status(audit)).startswith(f"rapport_audit_{audit_id}_")
+        assert [j['id'] for j in queue.jobs("admin")] and queue.jobs("autre") == []
+
+        # Audit inconnu : refusé avant d'être mis en file
+        try:
+            queue.submit('audit', 9999, demande_par="admin")
+            assert False, "audit inconnu accepté"
+        except ReportError:
+            pass
+    print("✅ Génération des rapports dans le pool de processus")
+
+
+def test_interrupted_jobs_resumed_and_expired_purged():
+    """Une demande interrompue par un arrêt est relancée ; les rapports expirés sont supprimés"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        db.create_report_job("interrompue", 'conformite', demande_par="admin")
+        db.set_report_job_progress("interrompue", 0.4)
+        db.create_report_job("orpheline", 'audit', 4242, demande_par="admin")
+        assert db.get_report_job("interrompue")['statut'] != EN_ATTENTE
+
+        queue = ReportQueue(db, tmp, workers=1)
+        try:
+            assert queue.resume_interrupted() == 1
+            assert queue.wait(timeout=120)
+        finally:
+            queue.shutdown()
+        assert queue.status("interrompue")['statut'] == TERMINE
+        assert queue.status("orpheline")['statut'] == ECHEC
+
+        chemin = queue.status("interrompue")['chemin']
+        assert queue.purge_expired(timedelta(days=7)) == 0
+        assert queue.purge_expired(timedelta(seconds=-1)) == 2
+        assert not os.path.exists(chemin) and queue.jobs() == []
+    print("✅ Reprise des demandes interrompues et purge des rapports expirés")
+
+
+def test_batch_of_audit_reports_bundled_in_zip():
+    """Rapports de plusieurs audits produits en parallèle, suivis par audit et regroupés en ZIP"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        audit_ids = [db.add_audit(f"Audit T{i}", f"2025-0{i}-15", "audit01", "Terminé", 70 + i, "") for i in range(1, 4)]
+        queue = ReportQueue(db, tmp, workers=3)
+        try:
+            lot = queue.submit_batch(demande_par="admin")
+            assert sorted(job['audit_id'] for job in queue.batch(lot)) == audit_ids
+            assert queue.wait(timeout=120)
+        finally:
+            queue.shutdown()
+
+        assert [job['statut'] for job in queue.batch(lot)] == [TERMINE] * 3
+        chemin = queue.bundle(lot)
+        with zipfile.ZipFile(chemin) as archive:
+            noms = archive.namelist()
+            assert len(noms) == 3 and all(archive.read(nom).startswith(b"%PDF-") for nom in noms)
+        assert {nom.split('_')[2] for nom in noms} == {str(i) for i in audit_ids}
+
+        # Audit en échec : signalé dans l'archive plutôt qu'omis silencieusement
+        db.create_report_job("echoue", 'audit', 99, "admin", lot="lot_partiel")
+        db.finish_report_job("echoue", erreur="ValueError: données invalides")
+        with zipfile.ZipFile(queue.bundle("lot_partiel")) as archive:
+            assert archive.namelist() == ["erreurs.txt"]
+            assert "Audit 99 : ValueError" in archive.read("erreurs.txt").decode()
+        try:
+            queue.submit_batch([4242])
+            assert False, "lot vide accepté"
+        except ReportError:
+            pass
+    print("✅ Lot de rapports d'audit regroupé en ZIP")
+
+
+if __name__ == "__main__":
+    test_reports_generated_in_worker_processes()
+    test_interrupted_jobs_resumed_and_expired_purged()
+    test_batch_of_audit_reports_bundled_in_zip()
+    print("🎉 Tous les tests de la file des rapports sont passés")
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Tests des routes HTTP servies à côté des pages (utils/routes.py)
+L'application Starlette est appelée directement (protocole ASGI), sans serveur
+"""
+
+import asyncio
+import hashlib
+import io
+import json
+import os
+import sys
+import tempfile
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.evidence import EvidenceStore
+from utils.routes import (RangeNotSatisfiable, _activations, _televersements, _tickets, parse_range, routes,
+                          upload_object)
+from utils.sessions import client_fingerprint
+from utils.uploads import UploadSpool
+
+NAVIGATEUR = "Mozilla/5.0 (test)"
+
+
+def _application():
+    from starlette.applications import Starlette
+    return Starlette(routes=routes())
+
+
+def _requete(app, methode, chemin, entetes=None, ip="10.0.0.5", corps=b""):
+    """Exécute une requête ASGI ; retourne (statut, en-têtes, corps)"""
+    entetes = {"user-agent": NAVIGATEUR, **{k.lower(): v for k, v in (entetes or {}).items()}}
+    chemin, _, requete = chemin.partition("?")
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': methode, 'scheme': 'http', 'path': chemin, 'raw_path': chemin.encode(),
+        'query_string': requete.encode(), 'root_path': "", 'client': (ip, 50000), 'server': ("testserver", 80),
+        'headers': [(k.encode('latin-1'), v.encode('latin-1')) for k, v in entetes.items()],
+    }
+    recu = []
+    envoye = False
+
+    async def receive():
+        nonlocal envoye
+        if not envoye:
+            envoye = True
+            return {'type': 'http.request', 'body': corps, 'more_body': False}
+        await asyncio.sleep(3600)
+
+    async def send(message):
+        recu.append(message)
+
+    asyncio.run(app(scope, receive, send))
+    debut = recu[0]
+    reponse = {k.decode('latin-1').lower(): v.decode('latin-1') for k, v in debut['headers']}
+    contenu = b"".join(m.get('body', b"") for m in recu[1:])
+    return debut['status'], reponse, contenu
+
+
+def test_parse_range():
+    """Plages simples, suffixes, plages ignorées et plages hors du fichier"""
+    assert parse_range(None, 100) is None
+    assert parse_range("bytes=0-9", 100) == (0, 9)
+    assert parse_range("bytes=90-", 100) == (90, 99)
+    assert parse_range("bytes=90-500", 100) == (90, 99)
+    assert parse_range("bytes=-10", 100) == (90, 99)
+    assert parse_range("bytes=-500", 100) == (0, 99)
+    # Plusieurs plages, autre unité ou syntaxe invalide : fichier entier
+    assert parse_range("bytes=0-1,5-6", 100) is None
+    assert parse_range("items=0-1", 100) is None
+    assert parse_range("bytes=9-2", 100) is None
+    for entete in ("bytes=100-", "bytes=-0"):
+        try:
+            parse_range(entete, 100)
+            assert False, f"{entete} aurait dû être refusée"
+        except RangeNotSatisfiable:
+            pass
+    print("✅ Lecture de l'en-tête Range")
+
+
+def test_evidence_download_streams_ranges():
+    """Une preuve est servie entière ou par plage (206), pour le client du ticket seulement"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        store = EvidenceStore(db, tmp)
+        contenu = os.urandom(3 * 1024 * 1024 + 5)
+        ref = store.put(io.BytesIO(contenu), "procès-verbal.pdf", "application/pdf")
+        objet = {'ouvrir': partial(store.open, ref), 'nom': "procès-verbal.pdf", 'type_mime': "application/pdf"}
+        ticket = _tickets.issue(objet, client_fingerprint("10.0.0.5", NAVIGATEUR))
+        app = _application()
+        chemin = f"/api/telechargement/{ticket}/proces-verbal.pdf"
+
+        statut, entetes, corps = _requete(app, "GET", chemin)
+        assert statut == 200 and corps == contenu
+        assert entetes['accept-ranges'] == "bytes" and entetes['content-length'] == str(len(contenu))
+        assert entetes['content-type'] == "application/pdf"
+        assert "filename*=UTF-8''proc%C3%A8s-verbal.pdf" in entetes['content-disposition']
+
+        # Reprise au milieu du fichier
+        debut = 2 * 1024 * 1024 + 3
+        statut, entetes, corps = _requete(app, "GET", chemin, {'Range': f"bytes={debut}-"})
+        assert statut == 206 and corps == contenu[debut:]
+        assert entetes['content-range'] == f"bytes {debut}-{len(contenu) - 1}/{len(contenu)}"
+
+        statut, entetes, corps = _requete(app, "GET", chemin, {'Range': "bytes=10-19", 'If-Range': entetes['etag']})
+        assert statut == 206 and corps == contenu[10:20]
+        # Fichier changé depuis (autre ETag) : envoyé en entier
+        statut, _, corps = _requete(app, "GET", chemin, {'Range': "bytes=10-19", 'If-Range': '"autre"'})
+        assert statut == 200 and len(corps) == len(contenu)
+
+        statut, entetes, _ = _requete(app, "GET", chemin, {'Range': f"bytes={len(contenu)}-"})
+        assert statut == 416 and entetes['content-range'] == f"bytes */{len(contenu)}"
+
+        statut, entetes, corps = _requete(app, "HEAD", chemin)
+        assert statut == 200 and corps == b"" and entetes['content-length'] == str(len(contenu))
+
+        # Ticket présenté par un autre client, ou inconnu
+        assert _requete(app, "GET", chemin, ip="10.0.0.6")[0] == 404
+        assert _requete(app, "GET", chemin, {'User-Agent': "curl/8.0"})[0] == 404
+        assert _requete(app, "GET", "/api/telechargement/inconnu/x.pdf")[0] == 404
+
+        # Preuve retirée du magasin depuis l'émission du ticket
+        os.remove(store.path(ref.split(':', 1)[1]))
+        assert _requete(app, "GET", chemin)[0] == 404
+    print("✅ Téléchargement de preuve en flux avec reprise")
+
+
+def test_loopback_matches_streamlit_client():
+    """En local, l'adresse de bouclage compte comme « pas d'adresse », comme st.context.ip_address"""
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin_fichier = os.path.join(tmp, "rapport.pdf")
+        with open(chemin_fichier, 'wb') as f:
+            f.write(b"%PDF-1.4 rapport")
+        objet = {'ouvrir': partial(open, chemin_fichier, 'rb'), 'nom': "rapport.pdf", 'type_mime': "application/pdf"}
+        ticket = _tickets.issue(objet, client_fingerprint(None, NAVIGATEUR))
+        statut, _, corps = _requete(_application(), "GET", f"/api/telechargement/{ticket}/rapport.pdf", ip="127.0.0.1")
+        assert statut == 200 and corps == b"%PDF-1.4 rapport"
+    print("✅ Client local reconnu")
+
+
+def test_browser_upload_goes_through_spool():
+    """Un fichier envoyé par morceaux depuis le navigateur arrive dans le magasin, avec reprise"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db = Database(":memory:")
+        objet = upload_object(db, "audit01", ['pdf'])
+        objet['spool'] = UploadSpool(db, EvidenceStore(db, tmp))
+        ticket = _televersements.issue(objet, client_fingerprint("10.0.0.5", NAVIGATEUR))
+        app = _application()
+        base = f"/api/televersement/{ticket}"
+        contenu = os.urandom(1024 * 1024 + 123)
+
+        def ouvrir(**donnees):
+            corps = json.dumps({'nom': "dossier.pdf", 'taille': len(contenu), **donnees}).encode()
+            statut, _, reponse = _requete(app, "POST", base, {'Content-Type': "application/json"}, corps=corps)
+            return statut, json.loads(reponse)
+
+        def envoyer(upload_id, offset, morceau, **entetes):
+            statut, _, reponse = _requete(app, "PUT", f"{base}/{upload_id}?offset={offset}",
+                                          {'Content-Length': str(len(morceau)), **entetes}, corps=morceau)
+            return statut, json.loads(reponse)
+
+        statut, upload = ouvrir()
+        assert statut == 200 and upload['recu'] == 0 and upload['morceau'] > 0
+        morceau = contenu[:500000]
+        assert envoyer(upload['id'], 0, morceau, **{'X-Morceau-Sha256': hashlib.sha256(morceau).hexdigest()}) \
+            == (200, {'recu': 500000})
+        # Morceau abîmé en route, ou qui laisserait un trou : refusés
+        assert envoyer(upload['id'], 500000, contenu[500000:600000], **{'X-Morceau-Sha256': "0" * 64})[0] == 400
+        assert envoyer(upload['id'], 600000, contenu[600000:700000])[0] == 400
+
+        # Reprise après rechargement de la page : même identifiant, envoi à partir du dernier octet reçu
+        statut, repris = ouvrir(id=upload['id'])
+        assert statut == 200 and (repris['id'], repris['recu']) == (upload['id'], 500000)
+        assert envoyer(upload['id'], 500000, contenu[500000:])[1] == {'recu': len(contenu)}
+        # Un autre utilisateur ne reprend pas ce téléversement
+        autre = upload_object(db, "user01", ['pdf'])
+        autre['spool'] = objet['spool']
+        ticket_autre = _televersements.issue(autre, client_fingerprint("10.0.0.5", NAVIGATEUR))
+        assert _requete(app, "POST", f"/api/televersement/{ticket_autre}/{upload['id']}/fin")[0] == 400
+
+        statut, _, reponse = _requete(app, "POST", f"{base}/{upload['id']}/fin")
+        assert statut == 200
+        ref = f"sha256:{hashlib.sha256(contenu).hexdigest()}"
+        assert json.loads(reponse)['ref'] == ref and objet['fichier']['ref'] == ref
+        with objet['spool'].store.open(ref) as fichier:
+            assert fichier.read() == contenu
+
+        # Type non accepté, ticket d'un autre client
+        corps = json.dumps({'nom': "script.exe", 'taille': 10}).encode()
+        assert _requete(app, "POST", base, corps=corps)[0] == 400
+        assert _requete(app, "POST", base, ip="10.0.0.6", corps=corps)[0] == 404
+    print("✅ Téléversement par morceaux depuis le navigateur")
+
+
+def test_session_cookie_set_from_activation_code():
+    """Le cookie de session (HttpOnly) est posé contre un code à usage unique, pour le client du code"""
+    app = _application()
+    client = client_fingerprint("10.0.0.5", NAVIGATEUR)
+    code = _activations.issue({'token': "jeton-de-session", 'max_age': 3600}, client)
+    # Code présenté par un autre client : refusé, et toujours utilisable par le bon
+    assert _requete(app, "POST", "/api/session", ip="10.0.0.6", corps=code.encode())[0] == 404
+
+    statut, entetes, _ = _requete(app, "POST", "/api/session", corps=code.encode())
+    assert statut == 204
+    cookie = entetes['set-cookie']
+    assert cookie.startswith("securite360_session=jeton-de-session;")
+    assert "HttpOnly" in cookie and "SameSite=strict" in cookie and "Max-Age=3600" in cookie
+    assert "Secure" not in cookie
+    # Usage unique
+    assert _requete(app, "POST", "/api/session", corps=code.encode())[0] == 404
+    assert _requete(app, "POST", "/api/session")[0] == 404
+
+    # Derrière un proxy HTTPS, le cookie n'est envoyé qu'en HTTPS
+    code = _activations.issue({'token': "autre-jeton", 'max_age': 3600}, client)
+    _, entetes, _ = _requete(app, "POST", "/api/session", {'X-Forwarded-Proto': "https"}, corps=code.encode())
+    assert "Secure" in entetes['set-cookie']
+
+    statut, entetes, _ = _requete(app, "DELETE", "/api/session")
+    assert statut == 204 and "Max-Age=0" in entetes['set-cookie']
+    print("✅ Cookie de session posé sans passer par l'URL")
+
+
+if __name__ == "__main__":
+    test_parse_range()
+    test_evidence_download_streams_ranges()
+    test_loopback_matches_streamlit_client()
+    test_browser_upload_goes_through_spool()
+    test_session_cookie_set_from_activation_code()
+    print("🎉 Tous les tests des routes sont passés")
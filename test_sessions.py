@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Tests des sessions de connexion persistantes (utils/sessions.py)
+"""
+
+import os
+import sys
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.sessions import (SessionManager, SessionStore, LRUSessionStore, SQLiteSessionStore, token_hash,
+                            client_fingerprint, get_session_manager)
+
+
+def test_session_lifecycle():
+    """Création, restauration, révocation et expiration des sessions"""
+    db = Database(":memory:")
+    auditeur = next(u for u in db.get_all_users() if u['username'] == "audit01")
+    sessions = SessionManager(LRUSessionStore(SQLiteSessionStore(db)))
+
+    token = sessions.create(auditeur['id'])
+    assert sessions.resolve(token) == auditeur['id']
+    # Seule l'empreinte du jeton est enregistrée
+    assert db.get_session(token) is None and db.get_session(token_hash(token))['user_id'] == auditeur['id']
+    assert sessions.resolve("jeton-inconnu") is None and sessions.resolve(None) is None
+
+    # Chaque navigateur a sa propre session
+    autre = sessions.create(auditeur['id'])
+    sessions.revoke(token)
+    assert sessions.resolve(token) is None and sessions.resolve(autre) == auditeur['id']
+
+    expire = sessions.create(auditeur['id'], timedelta(seconds=-1))
+    assert sessions.resolve(expire) is None and db.get_session(token_hash(expire)) is None
+
+    # Jeton lié au client : copié vers une autre adresse ou un autre navigateur, il ne vaut rien
+    poste = client_fingerprint("10.0.0.5", "Firefox/128.0")
+    lie = sessions.create(auditeur['id'], client=poste)
+    assert sessions.resolve(lie, poste) == auditeur['id']
+    assert sessions.resolve(lie) is None
+    assert sessions.resolve(lie, client_fingerprint("203.0.113.7", "Firefox/128.0")) is None
+    assert sessions.resolve(lie, client_fingerprint("10.0.0.5", "curl/8.0")) is None
+    sessions.revoke(lie, poste)
+    assert sessions.resolve(lie, poste) is None
+
+    # Suppression de l'utilisateur : ses sessions disparaissent avec lui
+    assert db.add_user("temp", "Temp@2025", "Utilisateur")
+    user_id = next(u['id'] for u in db.get_all_users() if u['username'] == "temp")
+    temp = SessionManager(SQLiteSessionStore(db)).create(user_id)
+    db.delete_user(user_id)
+    assert db.get_session(token_hash(temp)) is None
+
+    try:
+        SessionStore()
+        assert False, "interface instanciée"
+    except TypeError:
+        pass
+    manager = get_session_manager(db)
+    assert manager.db is db and get_session_manager(db) is manager
+    print("✅ Cycle de vie des sessions")
+
+
+def test_cache_and_sweep():
+    """Le cache LRU évite la base ; la purge supprime les sessions expirées"""
+    db = Database(":memory:")
+    store = LRUSessionStore(SQLiteSessionStore(db), taille=2)
+    sessions = SessionManager(store, intervalle_purge=timedelta(hours=1))
+    jetons = [sessions.create(1) for _ in range(3)]
+    assert list(store._cache) == [token_hash(j) for j in jetons[1:]]
+
+    # Session en cache : servie sans lecture en base
+    lectures = []
+    original = db.get_session
+    db.get_session = lambda cle: lectures.append(cle) or original(cle)
+    assert sessions.resolve(jetons[2]) == 1 and lectures == []
+    assert sessions.resolve(jetons[0]) == 1 and lectures == [token_hash(jetons[0])]
+    db.get_session = original
+
+    for i in range(2):
+        store.put(f"expiree{i}", 1, datetime.now() - timedelta(minutes=1))
+    assert sessions.sweep() == 2
+    assert all(sessions.resolve(j) == 1 for j in jetons)
+    assert not any(cle.startswith("expiree") for cle in store._cache)
+    print("✅ Cache et purge des sessions")
+
+
+if __name__ == "__main__":
+    test_session_lifecycle()
+    test_cache_and_sweep()
+    print("🎉 Tous les tests des sessions sont passés")
@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Tests des téléversements par morceaux reprenables (utils/uploads.py)
+"""
+
+import hashlib
+import io
+import os
+import sys
+import tempfile
+from datetime import timedelta
+
+sys.path.insert(0, os.path.dirname(__file__))
+
+from database import Database
+from utils.evidence import EvidenceStore, EvidenceError
+from utils.uploads import UploadSpool
+
+
+def _spool(tmp):
+    db = Database(os.path.join(tmp, "base.db"))
+    return db, UploadSpool(db, EvidenceStore(db, os.path.join(tmp, "preuves")))
+
+
+def test_chunks_resume_after_interruption():
+    """Les morceaux reçus survivent à une interruption ; la reprise continue à l'octet près"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db, spool = _spool(tmp)
+        contenu = os.urandom(5 * 1000 + 123)
+        sha256 = hashlib.sha256(contenu).hexdigest()
+
+        upload = spool.start("classeur_audit.zip", len(contenu), sha256, "application/zip", "audit01")
+        assert spool.write_chunk(upload['id'], 0, contenu[:1000]) == 1000
+        assert spool.write_chunk(upload['id'], 1000, contenu[1000:2000]) == 2000
+        # Morceau renvoyé (réponse perdue) : ignoré ; chevauchement : seule la fin est écrite
+        assert spool.write_chunk(upload['id'], 0, contenu[:1000]) == 2000
+        assert spool.write_chunk(upload['id'], 1500, contenu[1500:2500]) == 2500
+        try:
+            spool.write_chunk(upload['id'], 4000, contenu[4000:5000])
+            assert False, "Un morceau laissant un trou aurait dû être refusé"
+        except EvidenceError:
+            pass
+
+        # Redémarrage simulé : nouvelle instance, même fichier
+        db.close()
+        db, spool = _spool(tmp)
+        repris = spool.start("classeur_audit.zip", len(contenu), sha256, "application/zip", "audit01")
+        assert (repris['id'], repris['recu']) == (upload['id'], 2500)
+        try:
+            spool.finish(repris['id'])
+            assert False, "Un téléversement incomplet ne peut pas être finalisé"
+        except EvidenceError:
+            pass
+
+        ref = spool.ingest(io.BytesIO(contenu), "classeur_audit.zip", len(contenu), sha256,
+                           "application/zip", "audit01", chunk_size=1000)
+        assert ref == f"sha256:{sha256}"
+        with spool.store.open(ref) as fichier:
+            assert fichier.read() == contenu
+        assert spool.store.info(ref)['nom'] == "classeur_audit.zip"
+        assert db.get_upload(upload['id']) is None
+        assert os.listdir(spool.root) == []
+        db.close()
+    print("✅ Téléversement reprenable")
+
+
+def test_resume_requires_same_content():
+    """Sans empreinte attendue, un fichier différent de même nom et même taille repart de zéro"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db, spool = _spool(tmp)
+        ancien, nouveau = b"A" * 3000, b"B" * 3000
+        upload = spool.start("rapport.pdf", 3000, depose_par="audit01")
+        spool.write_chunk(upload['id'], 0, ancien[:1000])
+
+        # Même fichier : reprise ; fichier différent : l'ancien spool est abandonné
+        assert spool.start("rapport.pdf", 3000, depose_par="audit01", source=io.BytesIO(ancien))['recu'] == 1000
+        assert spool.start("rapport.pdf", 3000, depose_par="audit01")['id'] != upload['id']
+        assert db.get_upload(upload['id']) is None
+
+        upload = spool.start("rapport.pdf", 3000, depose_par="audit01")
+        spool.write_chunk(upload['id'], 0, ancien[:1000])
+        ref = spool.ingest(io.BytesIO(nouveau), "rapport.pdf", 3000, depose_par="audit01", chunk_size=1000)
+        assert ref == f"sha256:{hashlib.sha256(nouveau).hexdigest()}"
+        assert db.get_upload(upload['id']) is None and os.listdir(spool.root) == []
+        db.close()
+    print("✅ Reprise limitée au même contenu")
+
+
+def test_checksum_mismatch_is_rejected():
+    """Un fichier dont l'empreinte ne correspond pas n'entre pas dans le magasin"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db, spool = _spool(tmp)
+        contenu = b"journal d'evenements" * 100
+        try:
+            spool.ingest(io.BytesIO(contenu), "logs.txt", len(contenu), sha256="0" * 64, chunk_size=256)
+            assert False, "Une somme de contrôle incorrecte aurait dû être refusée"
+        except EvidenceError as e:
+            assert "Somme de contrôle" in str(e)
+        assert os.listdir(spool.root) == []
+        assert db.get_unreferenced_evidence() == []
+
+        try:
+            spool.start("enorme.iso", 10 * 1024 * 1024, taille_max=1024 * 1024)
+            assert False, "Un fichier trop volumineux aurait dû être refusé"
+        except EvidenceError:
+            pass
+        db.close()
+    print("✅ Vérification de la somme de contrôle")
+
+
+def test_stale_uploads_are_purged():
+    """Les téléversements abandonnés libèrent leur spool"""
+    with tempfile.TemporaryDirectory() as tmp:
+        db, spool = _spool(tmp)
+        upload = spool.start("video.mp4", 100)
+        spool.write_chunk(upload['id'], 0, b"x" * 10)
+        assert spool.purge_stale() == 0
+        assert spool.purge_stale(delai=timedelta(seconds=-1)) == 1
+        assert db.get_upload(upload['id']) is None and os.listdir(spool.root) == []
+        db.close()
+    print("✅ Purge des téléversements abandonnés")
+
+
+if __name__ == "__main__":
+    test_chunks_resume_after_interruption()
+    test_resume_requires_same_content()
+    test_checksum_mismatch_is_rejected()
+    test_stale_uploads_are_purged()
+    print("🎉 Tous les tests de téléversement sont passés")
@@ -0,0 +1,316 @@
+"""
+Sauvegarde et restauration à chaud de la base Sécurité 360
+Copie par pages avec l'API backup de SQLite, compression gzip en flux,
+contrôle d'intégrité, rétention et restauration atomique
+"""
+
+import gzip
+import io
+import os
+import shutil
+import sqlite3
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, IO, List, Optional, Union
+
+# Nombre de pages copiées à chaque étape (les écrivains reprennent la main entre deux étapes)
+PAGES_PAR_ETAPE = 256
+
+# Pause entre deux étapes de copie (secondes)
+PAUSE_ENTRE_ETAPES = 0.0
+
+# Taille des blocs de compression / décompression
+BLOC = 1024 * 1024
+
+# Rétention : nombre de sauvegardes conservées par période (la plus récente de chaque période)
+RETENTION = {'jours': 7, 'semaines': 4, 'mois': 12}
+
+# Préfixe et extension des fichiers de sauvegarde
+PREFIXE = "securite360_"
+EXTENSION = ".db.gz"
+FORMAT_HORODATAGE = "%Y%m%d_%H%M%S"
+
+# Tables attendues dans une sauvegarde Sécurité 360
+TABLES_REQUISES = ('users', 'criteres', 'audits', 'documents', 'directives', 'settings')
+
+_ENTETE_SQLITE = b"SQLite format 3\x00"
+_ENTETE_GZIP = b"\x1f\x8b"
+
+
+class BackupError(Exception):
+    """Sauvegarde invalide ou opération de sauvegarde/restauration impossible"""
+
+
+def backup_dir(db) -> str:
+    """Dossier des sauvegardes : « sauvegardes » à côté du fichier de base"""
+    base = os.getcwd() if db.db_path == ':memory:' else os.path.dirname(os.path.abspath(db.db_path))
+    return os.path.join(base, "sauvegardes")
+
+
+def check_integrity(path: str) -> List[str]:
+    """
+    Contrôle l'intégrité d'un fichier SQLite et la présence des tables de l'application
+
+    Returns:
+        Liste des problèmes détectés (vide si la base est saine)
+    """
+    try:
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+    except sqlite3.Error as e:
+        return [f"Base illisible : {e}"]
+    try:
+        problemes = [row[0] for row in conn.execute("PRAGMA integrity_check").fetchall() if row[0] != 'ok']
+        tables = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        problemes += [f"Table manquante : {t}" for t in TABLES_REQUISES if t not in tables]
+        return problemes
+    except sqlite3.DatabaseError as e:
+        return [f"Base illisible : {e}"]
+    finally:
+        conn.close()
+
+
+def create_backup(db, directory: Optional[str] = None, pages: int = PAGES_PAR_ETAPE,
+                  pause: float = PAUSE_ENTRE_ETAPES,
+                  progress: Optional[Callable[[float], None]] = None,
+                  retention: Optional[Dict[str, int]] = RETENTION) -> str:
+    """
+    Sauvegarde la base à chaud dans un fichier compressé
+
+    La copie passe par Connection.backup, `pages` pages à la fois : les
+    écritures concurrentes restent possibles et la copie obtenue est un
+    instantané cohérent (jamais un fichier « déchiré »). La copie est
+    contrôlée (PRAGMA integrity_check) avant d'être compressée en flux, puis
+    publiée sous son nom définitif par un renommage atomique.
+
+    Args:
+        db: Instance Database
+        directory: Dossier de destination (par défaut backup_dir(db))
+        pages: Nombre de pages copiées par étape
+        pause: Pause entre deux étapes (secondes)
+        progress: Fonction appelée avec la fraction copiée (0 à 1)
+        retention: Politique de rétention appliquée ensuite (None pour tout garder)
+
+    Returns:
+        Chemin du fichier .db.gz créé
+    """
+    directory = directory or backup_dir(db)
+    os.makedirs(directory, exist_ok=True)
+    horodatage = datetime.now().strftime(FORMAT_HORODATAGE)
+    chemin = os.path.join(directory, f"{PREFIXE}{horodatage}{EXTENSION}")
+    suffixe = 1
+    while os.path.exists(chemin):
+        chemin = os.path.join(directory, f"{PREFIXE}{horodatage}_{suffixe}{EXTENSION}")
+        suffixe += 1
+
+    fd, copie = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    try:
+        def etape(status, remaining, total):
+            if progress and total:
+                progress((total - remaining) / total)
+
+        source = db.get_connection()
+        try:
+            destination = sqlite3.connect(copie)
+            try:
+                source.backup(destination, pages=pages, progress=etape, sleep=pause)
+                # Fichier autonome, sans journal WAL à côté
+                destination.execute("PRAGMA journal_mode = DELETE")
+            finally:
+                destination.close()
+        finally:
+            db._close_conn(source)
+
+        problemes = check_integrity(copie)
+        if problemes:
+            raise BackupError("Sauvegarde corrompue : " + "; ".join(problemes[:5]))
+
+        temporaire = chemin + ".tmp"
+        try:
+            with open(copie, 'rb') as entree, gzip.open(temporaire, 'wb', compresslevel=6) as sortie:
+                shutil.copyfileobj(entree, sortie, BLOC)
+            os.replace(temporaire, chemin)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+    finally:
+        os.remove(copie)
+
+    if progress:
+        progress(1.0)
+    if retention:
+        prune_backups(directory, retention)
+    return chemin
+
+
+def _date_sauvegarde(nom: str) -> Optional[datetime]:
+    if not (nom.startswith(PREFIXE) and nom.endswith(EXTENSION)):
+        return None
+    horodatage = nom[len(PREFIXE):-len(EXTENSION)][:len("AAAAMMJJ_HHMMSS")]
+    try:
+        return datetime.strptime(horodatage, FORMAT_HORODATAGE)
+    except ValueError:
+        return None
+
+
+def list_backups(directory: str) -> List[Dict]:
+    """
+    Liste les sauvegardes d'un dossier, de la plus récente à la plus ancienne
+
+    Returns:
+        Liste de dictionnaires (nom, chemin, date, taille en octets)
+    """
+    if not os.path.isdir(directory):
+        return []
+    sauvegardes = []
+    for nom in os.listdir(directory):
+        quand = _date_sauvegarde(nom)
+        if quand is None:
+            continue
+        chemin = os.path.join(directory, nom)
+        sauvegardes.append({'nom': nom, 'chemin': chemin, 'date': quand, 'taille': os.path.getsize(chemin)})
+    return sorted(sauvegardes, key=lambda s: (s['date'], s['nom']), reverse=True)
+
+
+def _periode(quand: datetime, unite: str):
+    if unite == 'jours':
+        return quand.date()
+    if unite == 'semaines':
+        return quand.isocalendar()[:2]
+    return (quand.year, quand.month)
+
+
+def select_backups_to_keep(sauvegardes: List[Dict], retention: Dict[str, int]) -> List[Dict]:
+    """
+    Applique une rétention grand-père/père/fils
+
+    Conserve la plus récente sauvegarde de chacun des `retention['jours']`
+    derniers jours, `retention['semaines']` dernières semaines et
+    `retention['mois']` derniers mois ayant une sauvegarde. La sauvegarde la
+    plus récente est toujours conservée.
+    """
+    gardees = {}
+    for unite, nombre in retention.items():
+        periodes = []
+        for sauvegarde in sauvegardes:
+            periode = _periode(sauvegarde['date'], unite)
+            if periode in periodes:
+                continue
+            if len(periodes) >= nombre:
+                break
+            periodes.append(periode)
+            gardees[sauvegarde['chemin']] = sauvegarde
+    if sauvegardes:
+        gardees[sauvegardes[0]['chemin']] = sauvegardes[0]
+    return [s for s in sauvegardes if s['chemin'] in gardees]
+
+
+def prune_backups(directory: str, retention: Dict[str, int] = RETENTION) -> List[str]:
+    """
+    Supprime les sauvegardes hors de la politique de rétention
+
+    Returns:
+        Chemins des fichiers supprimés
+    """
+    sauvegardes = list_backups(directory)
+    gardees = {s['chemin'] for s in select_backups_to_keep(sauvegardes, retention)}
+    supprimees = []
+    for sauvegarde in sauvegardes:
+        if sauvegarde['chemin'] not in gardees:
+            os.remove(sauvegarde['chemin'])
+            supprimees.append(sauvegarde['chemin'])
+    return supprimees
+
+
+def _decompresser(source: IO[bytes], destination: str):
+    """Copie une sauvegarde (.db ou .db.gz) dans un fichier SQLite, par blocs"""
+    entete = source.read(len(_ENTETE_SQLITE))
+    if entete.startswith(_ENTETE_GZIP):
+        flux = gzip.GzipFile(fileobj=_Prefixe(entete, source), mode='rb')
+    elif entete == _ENTETE_SQLITE:
+        flux = _Prefixe(entete, source)
+    else:
+        raise BackupError("Format de sauvegarde non reconnu (fichier SQLite .db ou .db.gz attendu)")
+    try:
+        with open(destination, 'wb') as sortie:
+            shutil.copyfileobj(flux, sortie, BLOC)
+    except (OSError, EOFError) as e:
+        raise BackupError(f"Sauvegarde illisible : {e}")
+
+
+class _Prefixe(io.RawIOBase):
+    """Flux qui relit les octets d'en-tête déjà consommés avant le reste du fichier"""
+
+    def __init__(self, prefixe: bytes, suite: IO[bytes]):
+        self._prefixe = prefixe
+        self._suite = suite
+
+    def readable(self):
+        return True
+
+    def readinto(self, tampon):
+        if self._prefixe:
+            n = min(len(tampon), len(self._prefixe))
+            tampon[:n] = self._prefixe[:n]
+            self._prefixe = self._prefixe[n:]
+            return n
+        donnees = self._suite.read(len(tampon))
+        tampon[:len(donnees)] = donnees
+        return len(donnees)
+
+
+def restore_backup(db, source: Union[str, IO[bytes]], directory: Optional[str] = None,
+                   safety_backup: bool = True) -> Optional[str]:
+    """
+    Restaure une sauvegarde à la place des données actuelles
+
+    La sauvegarde est d'abord décompressée dans un fichier de travail et
+    contrôlée (intégrité et tables de l'application). Les données actuelles
+    sont sauvegardées, puis remplacées en une seule transaction par l'API
+    backup : les autres connexions voient l'ancienne base ou la nouvelle,
+    jamais un état intermédiaire, et un échec laisse la base intacte.
+    Le schéma restauré est ensuite migré à la version courante.
+
+    Args:
+        db: Instance Database
+        source: Chemin ou fichier binaire (.db ou .db.gz)
+        directory: Dossier des sauvegardes (par défaut backup_dir(db))
+        safety_backup: Sauvegarder les données actuelles avant de les remplacer
+
+    Returns:
+        Chemin de la sauvegarde de sécurité (None si désactivée)
+    """
+    directory = directory or backup_dir(db)
+    os.makedirs(directory, exist_ok=True)
+    fd, travail = tempfile.mkstemp(suffix=".db", dir=directory)
+    os.close(fd)
+    try:
+        if isinstance(source, str):
+            with open(source, 'rb') as fichier:
+                _decompresser(fichier, travail)
+        else:
+            _decompresser(source, travail)
+
+        problemes = check_integrity(travail)
+        if problemes:
+            raise BackupError("Sauvegarde refusée : " + "; ".join(problemes[:5]))
+
+        securite = create_backup(db, directory, retention=None) if safety_backup else None
+
+        restauree = sqlite3.connect(travail)
+        try:
+            cible = db.get_connection()
+            try:
+                # pages=-1 : copie complète en une seule transaction d'écriture
+                restauree.backup(cible, pages=-1)
+            finally:
+                db._close_conn(cible)
+        finally:
+            restauree.close()
+    finally:
+        os.remove(travail)
+
+    db.init_database()
+    db.sync_iso_search_index()
+    return securite
+
@@ -5,7 +5,7 @@ Utilise Plotly pour créer des visualisations interactives
 
 import plotly.graph_objects as go
 import plotly.express as px
-from typing import Dict, List
+from typing import Dict, List, Tuple
 from utils.config import COLORS, PLOTLY_LAYOUT, PLOTLY_CONFIG
 
 def create_conformity_gauge(percentage: float, title: str = "Taux de conformité") -> go.Figure:
@@ -112,12 +112,13 @@ def create_conformity_pie_chart(stats: Dict) -> go.Figure:
     
     return fig
 
-def create_category_bar_chart(criteres: List[Dict]) -> go.Figure:
+def create_category_bar_chart(matrix: List[Tuple[str, str, int]]) -> go.Figure:
     """
     Crée un graphique linéaire par catégorie
     
     Args:
-        criteres: Liste des critères
+        matrix: Matrice catégorie × statut (tuples categorie, statut, nombre)
+                retournée par Database.get_category_status_matrix
     
     Returns:
         Figure Plotly
@@ -125,12 +126,10 @@ def create_category_bar_chart(criteres: List[Dict]) -> go.Figure:
     categories = {}
     statuts_list = ['Conforme', 'Largement conforme', 'Partiellement conforme', 'Faiblement conforme', 'Non conforme']
     
-    for critere in criteres:
-        cat = critere['categorie']
-        statut = critere['statut']
+    for cat, statut, count in matrix:
         if cat not in categories:
             categories[cat] = {s: 0 for s in statuts_list}
-        categories[cat][statut] = categories[cat].get(statut, 0) + 1
+        categories[cat][statut] = categories[cat].get(statut, 0) + count
     
     cat_names = list(categories.keys())
     conforme = [categories[cat]['Conforme'] for cat in cat_names]
@@ -279,17 +278,17 @@ def create_audit_timeline(audits: List[Dict]) -> go.Figure:
     
     return fig
 
-def create_directive_effectiveness_chart(directives: List[Dict]) -> go.Figure:
+def create_directive_effectiveness_chart(efficacite_counts: Dict[str, int]) -> go.Figure:
     """
     Crée un graphique d'efficacité des directives
     
     Args:
-        directives: Liste des directives
+        efficacite_counts: Nombre de directives par niveau d'efficacité
     
     Returns:
         Figure Plotly
     """
-    if not directives:
+    if not efficacite_counts:
         fig = go.Figure()
         fig.add_annotation(
             text="Aucune directive disponible",
@@ -300,11 +299,6 @@ def create_directive_effectiveness_chart(directives: List[Dict]) -> go.Figure:
         fig.update_layout(**PLOTLY_LAYOUT, height=300)
         return fig
     
-    efficacite_counts = {}
-    for directive in directives:
-        eff = directive.get('efficacite', 'Moyenne')
-        efficacite_counts[eff] = efficacite_counts.get(eff, 0) + 1
-    
     labels = list(efficacite_counts.keys())
     values = list(efficacite_counts.values())
     
@@ -40,6 +40,9 @@ CATEGORIES_ISO = [
     'Technologique'
 ]
 
+# Statuts d'audit
+STATUTS_AUDIT = ['Planifié', 'En cours', 'Terminé', 'Reporté']
+
 # Rôles utilisateur
 ROLES = ['Admin', 'Auditeur', 'Utilisateur']
 
@@ -0,0 +1,156 @@
+"""
+Magasin de preuves adressé par contenu (SHA-256)
+Un fichier déposé est haché au fil de la lecture, stocké une seule fois
+sous preuves/<ab>/<cd>/<empreinte> et référencé par 'sha256:<empreinte>'
+"""
+
+import hashlib
+import os
+import re
+import tempfile
+from datetime import datetime, timedelta
+from typing import IO, Optional
+
+from database import EVIDENCE_PREFIX
+
+# Taille des blocs lus, hachés et écrits
+BLOC = 1024 * 1024
+
+# Taille maximale d'un fichier de preuve (octets)
+TAILLE_MAX = 50 * 1024 * 1024
+
+_EMPREINTE = re.compile(r"[0-9a-f]{64}")
+
+
+class EvidenceError(Exception):
+    """Preuve introuvable, invalide ou trop volumineuse"""
+
+
+def evidence_dir(db) -> str:
+    """Dossier du magasin : « preuves » à côté du fichier de base"""
+    base = os.getcwd() if db.db_path == ':memory:' else os.path.dirname(os.path.abspath(db.db_path))
+    return os.path.join(base, "preuves")
+
+
+def is_evidence_ref(ref: Optional[str]) -> bool:
+    """Indique si une valeur (preuve_path, fichier_path...) référence le magasin"""
+    return bool(ref) and ref.startswith(EVIDENCE_PREFIX) and bool(_EMPREINTE.fullmatch(ref[len(EVIDENCE_PREFIX):]))
+
+
+class EvidenceStore:
+    """Fichiers de preuve dédoublonnés par empreinte SHA-256, métadonnées dans la table preuves"""
+
+    def __init__(self, db, root: Optional[str] = None):
+        self.db = db
+        self.root = root or evidence_dir(db)
+
+    def path(self, sha256: str) -> str:
+        """Chemin du fichier, réparti sur deux niveaux de sous-dossiers"""
+        if not _EMPREINTE.fullmatch(sha256):
+            raise EvidenceError(f"Empreinte invalide : {sha256}")
+        return os.path.join(self.root, sha256[:2], sha256[2:4], sha256)
+
+    def put(self, fileobj: IO[bytes], nom: str, type_mime: Optional[str] = None,
+            depose_par: Optional[str] = None, taille_max: int = TAILLE_MAX) -> str:
+        """
+        Dépose un fichier dans le magasin
+
+        Le contenu est lu par blocs, haché et écrit dans un fichier temporaire ;
+        s'il est déjà présent, le temporaire est supprimé, sinon il est publié
+        sous son empreinte par un renommage atomique.
+
+        Args:
+            fileobj: Fichier binaire (ex: fichier téléversé Streamlit), lu depuis sa position courante
+            nom: Nom d'origine (conservé pour le premier dépôt d'un contenu)
+            type_mime: Type MIME déclaré
+            depose_par: Utilisateur à l'origine du dépôt
+            taille_max: Taille maximale acceptée
+
+        Returns:
+            Référence 'sha256:<empreinte>' à enregistrer dans preuve_path / fichier_path
+        """
+        temporaires = os.path.join(self.root, "tmp")
+        os.makedirs(temporaires, exist_ok=True)
+        empreinte = hashlib.sha256()
+        taille = 0
+        fd, temporaire = tempfile.mkstemp(dir=temporaires)
+        try:
+            with os.fdopen(fd, 'wb') as sortie:
+                while True:
+                    bloc = fileobj.read(BLOC)
+                    if not bloc:
+                        break
+                    taille += len(bloc)
+                    if taille > taille_max:
+                        raise EvidenceError(f"Fichier trop volumineux (maximum {taille_max // (1024 * 1024)} Mo)")
+                    empreinte.update(bloc)
+                    sortie.write(bloc)
+                sortie.flush()
+                os.fsync(sortie.fileno())
+        except BaseException:
+            os.remove(temporaire)
+            raise
+        return self.adopt(temporaire, empreinte.hexdigest(), taille, nom, type_mime, depose_par)
+
+    def adopt(self, chemin: str, sha256: str, taille: int, nom: str, type_mime: Optional[str] = None,
+              depose_par: Optional[str] = None) -> str:
+        """
+        Fait entrer dans le magasin un fichier déjà haché (déplacé, jamais copié)
+
+        Le fichier doit se trouver sur le même système de fichiers que le
+        magasin : il est renommé sous son empreinte, ou supprimé si ce contenu
+        est déjà présent.
+
+        Returns:
+            Référence 'sha256:<empreinte>'
+        """
+        try:
+            destination = self.path(sha256)
+            if os.path.exists(destination):
+                os.remove(chemin)
+            else:
+                os.makedirs(os.path.dirname(destination), exist_ok=True)
+                os.replace(chemin, destination)
+        except BaseException:
+            if os.path.exists(chemin):
+                os.remove(chemin)
+            raise
+
+        self.db.add_evidence(sha256, taille, os.path.basename(nom), type_mime, depose_par)
+        return EVIDENCE_PREFIX + sha256
+
+    def _sha256(self, ref: str) -> str:
+        if not is_evidence_ref(ref):
+            raise EvidenceError(f"Référence de preuve invalide : {ref}")
+        return ref[len(EVIDENCE_PREFIX):]
+
+    def info(self, ref: str) -> Optional[dict]:
+        """Métadonnées d'une preuve (nom, taille, type_mime...) ou None"""
+        if not is_evidence_ref(ref):
+            return None
+        return self.db.get_evidence(self._sha256(ref))
+
+    def open(self, ref: str) -> IO[bytes]:
+        """Ouvre le fichier d'une preuve en lecture binaire"""
+        try:
+            return open(self.path(self._sha256(ref)), 'rb')
+        except FileNotFoundError:
+            raise EvidenceError(f"Preuve introuvable : {ref}")
+
+    def purge_unreferenced(self, delai: timedelta = timedelta(hours=1)) -> int:
+        """
+        Supprime les preuves qui ne sont plus référencées ; retourne leur nombre
+
+        Les dépôts de moins de `delai` sont épargnés : leur référence peut ne
+        pas encore être enregistrée (fichier déposé, formulaire en cours).
+        """
+        limite = (datetime.now() - delai).strftime('%Y-%m-%d %H:%M:%S')
+        supprimees = 0
+        for sha256 in self.db.get_unreferenced_evidence(limite):
+            try:
+                os.remove(self.path(sha256))
+            except FileNotFoundError:
+                pass
+            self.db.delete_evidence(sha256)
+            supprimees += 1
+        return supprimees
@@ -0,0 +1,286 @@
+"""
+Traitement en arrière-plan des preuves déposées
+Aperçus (images, PDF) et extraction de texte dans un pool de processus,
+résultats mis en cache sur disque par empreinte SHA-256
+"""
+
+import html
+import json
+import multiprocessing
+import os
+import re
+import threading
+import time
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, wait as attendre
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional
+
+from utils.evidence import EvidenceStore
+
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+try:
+    import pypdf
+except ImportError:
+    pypdf = None
+
+try:
+    import pypdfium2
+except ImportError:
+    pypdfium2 = None
+
+# Nombre de processus de traitement
+WORKERS = 2
+
+# Taille maximale des aperçus (pixels)
+TAILLE_APERCU = (256, 256)
+
+# Nombre maximal de caractères extraits par preuve
+MAX_CARACTERES = 1_000_000
+
+# Version des extracteurs : la changer invalide le cache disque
+VERSION_EXTRACTEURS = 1
+
+EXTENSIONS_IMAGES = {'png', 'jpg', 'jpeg', 'gif', 'bmp', 'tif', 'tiff', 'webp'}
+EXTENSIONS_TEXTE = {'txt', 'csv', 'log', 'md', 'json', 'xml', 'yaml', 'yml', 'ini', 'conf'}
+
+_PAGE_PDF = re.compile(rb"/Type\s*/Page(?![a-zA-Z])")
+_BLOC = 1024 * 1024
+
+
+def cache_dir(store: EvidenceStore) -> str:
+    """Dossier du cache des aperçus et résultats, à côté des preuves"""
+    return os.path.join(store.root, "apercus")
+
+
+def _cache_paths(cache: str, sha256: str):
+    dossier = os.path.join(cache, sha256[:2])
+    return os.path.join(dossier, f"{sha256}.json"), os.path.join(dossier, f"{sha256}.png")
+
+
+def thumbnail_path(store: EvidenceStore, sha256: str) -> Optional[str]:
+    """Chemin de l'aperçu d'une preuve, s'il a été généré"""
+    chemin = _cache_paths(cache_dir(store), sha256)[1]
+    return chemin if os.path.exists(chemin) else None
+
+
+def _extension(nom: str) -> str:
+    return nom.lower().rsplit('.', 1)[-1] if '.' in nom else ''
+
+
+def _image(chemin: str, apercu: str) -> Dict:
+    if Image is None:
+        return {'pages': 1}
+    with Image.open(chemin) as image:
+        pages = getattr(image, 'n_frames', 1)
+        image.thumbnail(TAILLE_APERCU)
+        image.convert('RGB').save(apercu, 'PNG', optimize=True)
+    return {'pages': pages, 'apercu': True}
+
+
+def _compter_pages_pdf(chemin: str) -> int:
+    """Compte les objets /Type /Page par lecture en flux (sans bibliothèque PDF)"""
+    chevauchement = 32
+    pages = 0
+    reste = b""
+    with open(chemin, 'rb') as fichier:
+        while True:
+            bloc = fichier.read(_BLOC)
+            tampon = reste + bloc
+            limite = len(tampon) if not bloc else len(tampon) - chevauchement
+            pages += sum(1 for m in _PAGE_PDF.finditer(tampon) if m.start() < limite)
+            if not bloc:
+                return pages
+            reste = tampon[limite:]
+
+
+def _pdf(chemin: str, apercu: str) -> Dict:
+    resultat: Dict = {}
+    if pypdf is not None:
+        lecteur = pypdf.PdfReader(chemin)
+        resultat['pages'] = len(lecteur.pages)
+        morceaux, total = [], 0
+        for page in lecteur.pages:
+            texte = page.extract_text() or ""
+            morceaux.append(texte)
+            total += len(texte)
+            if total >= MAX_CARACTERES:
+                break
+        resultat['texte'] = "\n".join(morceaux)
+    else:
+        resultat['pages'] = _compter_pages_pdf(chemin)
+
+    if pypdfium2 is not None and Image is not None:
+        document = pypdfium2.PdfDocument(chemin)
+        try:
+            if len(document):
+                image = document[0].render(scale=0.5).to_pil()
+                image.thumbnail(TAILLE_APERCU)
+                image.convert('RGB').save(apercu, 'PNG', optimize=True)
+                resultat['apercu'] = True
+        finally:
+            document.close()
+    return resultat
+
+
+def _docx(chemin: str) -> Dict:
+    with zipfile.ZipFile(chemin) as archive:
+        xml = archive.read('word/document.xml').decode('utf-8', 'replace')
+        pages = None
+        if 'docProps/app.xml' in archive.namelist():
+            match = re.search(r"<Pages>(\d+)</Pages>", archive.read('docProps/app.xml').decode('utf-8', 'replace'))
+            pages = int(match.group(1)) if match else None
+    xml = re.sub(r"</w:p>", "\n", xml)
+    texte = html.unescape(re.sub(r"<[^>]+>", "", xml))
+    return {'pages': pages, 'texte': texte}
+
+
+def _texte(chemin: str) -> Dict:
+    with open(chemin, 'rb') as fichier:
+        donnees = fichier.read(MAX_CARACTERES * 4)
+    return {'texte': donnees.decode('utf-8', 'replace')}
+
+
+def extract(chemin: str, nom: str, type_mime: Optional[str], cache: str, sha256: str) -> Dict:
+    """
+    Traite une preuve : aperçu, nombre de pages, texte (exécuté dans un processus du pool)
+
+    Le résultat est mis en cache sur disque sous l'empreinte du contenu : une
+    preuve déjà traitée (même déposée sous un autre nom) n'est pas relue.
+
+    Returns:
+        Dictionnaire (pages, octets, texte, apercu, erreur)
+    """
+    fichier_cache, apercu = _cache_paths(cache, sha256)
+    try:
+        with open(fichier_cache, encoding='utf-8') as f:
+            resultat = json.load(f)
+        if resultat.get('version') == VERSION_EXTRACTEURS:
+            return resultat
+    except (OSError, ValueError):
+        pass
+
+    os.makedirs(os.path.dirname(fichier_cache), exist_ok=True)
+    resultat = {'version': VERSION_EXTRACTEURS, 'pages': None, 'octets': os.path.getsize(chemin),
+                'texte': "", 'apercu': False, 'erreur': None}
+    extension = _extension(nom)
+    try:
+        if extension in EXTENSIONS_IMAGES or (type_mime or '').startswith('image/'):
+            resultat.update(_image(chemin, apercu))
+        elif extension == 'pdf' or type_mime == 'application/pdf':
+            resultat.update(_pdf(chemin, apercu))
+        elif extension == 'docx':
+            resultat.update(_docx(chemin))
+        elif extension in EXTENSIONS_TEXTE or (type_mime or '').startswith('text/'):
+            resultat.update(_texte(chemin))
+    except Exception as e:
+        resultat['erreur'] = f"{type(e).__name__}: {e}"
+    resultat['texte'] = (resultat['texte'] or "")[:MAX_CARACTERES]
+
+    temporaire = f"{fichier_cache}.{os.getpid()}.tmp"
+    with open(temporaire, 'w', encoding='utf-8') as f:
+        json.dump(resultat, f, ensure_ascii=False)
+    os.replace(temporaire, fichier_cache)
+    return resultat
+
+
+class EvidencePipeline:
+    """
+    File de traitement des preuves dans un pool de processus
+
+    submit() rend la main immédiatement ; le résultat est enregistré en base
+    (preuves_extraits, preuves_texte) depuis le thread de rappel du pool.
+    Les processus sont démarrés par « spawn » pour ne pas dupliquer les
+    threads du serveur Streamlit.
+    """
+
+    def __init__(self, db, store: Optional[EvidenceStore] = None, workers: int = WORKERS):
+        self.db = db
+        self.store = store or EvidenceStore(db)
+        self.workers = workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+        self._en_cours: Dict[str, Future] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.workers,
+                                                 mp_context=multiprocessing.get_context('spawn'))
+        return self._executor
+
+    def submit(self, sha256: str) -> Optional[Future]:
+        """Planifie le traitement d'une preuve (sans effet si elle est déjà en cours)"""
+        info = self.db.get_evidence(sha256)
+        if info is None:
+            return None
+        with self._lock:
+            future = self._en_cours.get(sha256)
+            if future is not None:
+                return future
+            future = self._pool().submit(extract, self.store.path(sha256), info['nom'], info['type_mime'],
+                                         cache_dir(self.store), sha256)
+            self._en_cours[sha256] = future
+        future.add_done_callback(lambda f: self._enregistrer(sha256, info['nom'], f))
+        return future
+
+    def submit_pending(self, limit: int = 100) -> int:
+        """Planifie les preuves jamais traitées ; retourne leur nombre"""
+        pending = self.db.get_pending_evidence(limit)
+        for preuve in pending:
+            self.submit(preuve['sha256'])
+        return len(pending)
+
+    def _enregistrer(self, sha256: str, nom: str, future: Future):
+        try:
+            resultat = future.result()
+            self.db.save_evidence_extract(sha256, nom, resultat['octets'], resultat['pages'],
+                                          resultat['texte'], resultat['apercu'], resultat['erreur'])
+        except BrokenProcessPool:
+            # Processus tué (mémoire, arrêt) : pool recréé au prochain submit, preuve laissée en attente
+            with self._lock:
+                self._executor = None
+        except Exception as e:
+            taille = (self.db.get_evidence(sha256) or {}).get('taille', 0)
+            self.db.save_evidence_extract(sha256, nom, taille, erreur=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._en_cours.pop(sha256, None)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin des traitements en cours et de leur enregistrement ; False si le délai expire"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                futures = list(self._en_cours.values())
+            if not futures:
+                return True
+            restant = None if limite is None else limite - time.monotonic()
+            if restant is not None and restant <= 0:
+                return False
+            attendre(futures, timeout=0.05 if restant is None else min(restant, 0.05))
+
+    def shutdown(self):
+        """Arrête le pool après les traitements en cours"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+
+# Pipelines partagés par le processus, indexés par dossier de preuves
+_pipelines: Dict[str, EvidencePipeline] = {}
+_pipelines_lock = threading.Lock()
+
+
+def get_pipeline(db) -> EvidencePipeline:
+    """Pipeline partagé par le processus pour la base (et le magasin) donnés"""
+    store = EvidenceStore(db)
+    with _pipelines_lock:
+        pipeline = _pipelines.get(store.root)
+        if pipeline is None or pipeline.db is not db:
+            pipeline = EvidencePipeline(db, store)
+            _pipelines[store.root] = pipeline
+        return pipeline
@@ -0,0 +1,217 @@
+"""
+Export des données de Sécurité 360 sans DataFrame intermédiaire
+Écrit le CSV directement depuis un curseur SQLite, par lots, ainsi qu'un
+lot Parquet typé et compressé de toutes les tables (complet ou incrémental)
+"""
+
+import csv
+import io
+import json
+import zipfile
+from datetime import datetime
+from typing import Dict, IO, Iterable, List, Optional
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# Nombre de lignes lues à chaque fetchmany
+CHUNK_SIZE = 1000
+
+# Tables du lot Parquet (l'historique des statuts est vide tant qu'aucun critère n'a changé)
+BUNDLE_TABLES = ['criteres', 'audits', 'directives', 'documents', 'users', 'critere_history']
+
+# Journal des suppressions (table_nom, ref_id) exporté avec chaque lot
+BUNDLE_SUPPRESSIONS = 'suppressions'
+
+# Format des horodatages stockés en base
+TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Colonnes non textuelles : nom -> type Arrow (les autres colonnes sont des chaînes)
+COLONNES_ENTIERES = {'id', 'critere_id', 'ref_id'}
+COLONNES_DECIMALES = {'score'}
+COLONNES_HORODATEES = {'derniere_maj', 'created_at', 'last_login', 'date_creation',
+                       'derniere_modification', 'date_modification', 'date_suppression'}
+COLONNES_DATES = {'date_audit'}
+
+
+def _csv_writer(out: IO[bytes]):
+    """Écrivain CSV UTF-8 avec BOM (attendu par Excel) au-dessus d'un flux binaire"""
+    text = io.TextIOWrapper(out, encoding='utf-8-sig', newline='', write_through=True)
+    return text, csv.writer(text)
+
+
+def write_csv(cursor, out: IO[bytes], chunk_size: int = CHUNK_SIZE) -> int:
+    """
+    Écrit le résultat d'un curseur SQLite en CSV, lot par lot
+
+    Args:
+        cursor: Curseur exécuté (les noms de colonnes viennent de cursor.description)
+        out: Flux binaire de destination (laissé ouvert)
+        chunk_size: Nombre de lignes lues à chaque fetchmany
+
+    Returns:
+        Nombre de lignes écrites (hors en-tête)
+    """
+    text, writer = _csv_writer(out)
+    try:
+        writer.writerow([column[0] for column in cursor.description])
+        total = 0
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                return total
+            writer.writerows(rows)
+            total += len(rows)
+    finally:
+        text.detach()
+
+
+def write_dicts_csv(rows: Iterable[Dict], out: IO[bytes], columns: Optional[List[str]] = None) -> int:
+    """
+    Écrit des dictionnaires en CSV au fil de l'itération (liste ou générateur)
+
+    Args:
+        rows: Lignes à écrire
+        out: Flux binaire de destination (laissé ouvert)
+        columns: Colonnes à écrire (par défaut celles de la première ligne)
+
+    Returns:
+        Nombre de lignes écrites (hors en-tête)
+    """
+    text, writer = _csv_writer(out)
+    try:
+        total = 0
+        for row in rows:
+            if columns is None:
+                columns = list(row.keys())
+            if total == 0:
+                writer.writerow(columns)
+            writer.writerow([row.get(column) for column in columns])
+            total += 1
+        if total == 0 and columns:
+            writer.writerow(columns)
+        return total
+    finally:
+        text.detach()
+
+
+def export_table_csv(db, kind: str, chunk_size: int = CHUNK_SIZE) -> io.BytesIO:
+    """
+    Exporte une table en CSV (voir database.EXPORT_QUERIES)
+
+    Args:
+        db: Instance Database
+        kind: 'criteres', 'audits', 'directives', 'documents' ou 'users'
+        chunk_size: Nombre de lignes lues à chaque fetchmany
+
+    Returns:
+        Flux binaire positionné au début, prêt pour st.download_button
+    """
+    out = io.BytesIO()
+    with db.export_cursor(kind) as cursor:
+        write_csv(cursor, out, chunk_size)
+    out.seek(0)
+    return out
+
+
+def _arrow_column(name: str, values: tuple):
+    """Convertit une colonne SQLite en tableau Arrow typé (dates invalides -> null)"""
+    if name in COLONNES_ENTIERES:
+        return pa.array(values, type=pa.int64())
+    if name in COLONNES_DECIMALES:
+        return pa.array(values, type=pa.float64())
+    texte = pa.array(values, type=pa.string())
+    if name in COLONNES_HORODATEES:
+        return pc.strptime(texte, format=TIMESTAMP_FORMAT, unit='s', error_is_null=True)
+    if name in COLONNES_DATES:
+        return pc.strptime(pc.utf8_slice_codeunits(texte, 0, 10), format='%Y-%m-%d',
+                           unit='s', error_is_null=True).cast(pa.date32())
+    return texte
+
+
+def _arrow_schema(names: List[str]):
+    def type_of(name: str):
+        if name in COLONNES_ENTIERES:
+            return pa.int64()
+        if name in COLONNES_DECIMALES:
+            return pa.float64()
+        if name in COLONNES_HORODATEES:
+            return pa.timestamp('s')
+        if name in COLONNES_DATES:
+            return pa.date32()
+        return pa.string()
+    return pa.schema([(name, type_of(name)) for name in names])
+
+
+def write_parquet(cursor, out: IO[bytes], chunk_size: int = CHUNK_SIZE, compression: str = 'zstd') -> int:
+    """
+    Écrit le résultat d'un curseur SQLite en Parquet, un groupe de lignes par lot
+
+    Args:
+        cursor: Curseur exécuté
+        out: Flux binaire de destination
+        chunk_size: Nombre de lignes lues à chaque fetchmany
+        compression: Codec Parquet ('zstd', 'snappy', 'gzip'...)
+
+    Returns:
+        Nombre de lignes écrites
+    """
+    names = [column[0] for column in cursor.description]
+    schema = _arrow_schema(names)
+    total = 0
+    with pq.ParquetWriter(out, schema, compression=compression) as writer:
+        while True:
+            rows = cursor.fetchmany(chunk_size)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_batch(pa.record_batch(
+                [_arrow_column(name, values) for name, values in zip(names, columns)], schema=schema))
+            total += len(rows)
+    return total
+
+
+def export_bundle(db, since: Optional[str] = None, chunk_size: int = CHUNK_SIZE) -> io.BytesIO:
+    """
+    Exporte toutes les tables en fichiers Parquet réunis dans une archive ZIP
+
+    L'archive contient un fichier <table>.parquet par table, le journal des
+    suppressions (suppressions.parquet : table_nom, ref_id, date_suppression)
+    et un manifest.json (nombre de lignes, nombre de suppressions, borne
+    `depuis` et horodatage `genere_le`). Pour un export incrémental, repasser
+    `genere_le` comme `since` à l'export suivant : la borne est incluse, les
+    lignes en double se dédoublonnent par id, et les lignes listées dans les
+    suppressions sont à retirer.
+
+    Args:
+        db: Instance Database
+        since: Horodatage 'AAAA-MM-JJ HH:MM:SS' ; None pour un export complet
+        chunk_size: Nombre de lignes lues à chaque fetchmany
+
+    Returns:
+        Archive ZIP positionnée au début, prête pour st.download_button
+    """
+    if pa is None:
+        raise ValueError("L'export Parquet nécessite le paquet pyarrow")
+    if since is not None:
+        since = datetime.strptime(since.strip(), TIMESTAMP_FORMAT).strftime(TIMESTAMP_FORMAT)
+
+    manifest = {'genere_le': None, 'depuis': since, 'format': 'parquet', 'tables': {}}
+    out = io.BytesIO()
+    # Parquet est déjà compressé : l'archive stocke les fichiers tels quels
+    with zipfile.ZipFile(out, 'w', compression=zipfile.ZIP_STORED) as archive:
+        # Horodatage de l'instantané lu : rien de validé pendant l'export n'est perdu
+        with db.export_snapshot(since) as (export, genere_le):
+            manifest['genere_le'] = genere_le
+            for kind in BUNDLE_TABLES:
+                with archive.open(f"{kind}.parquet", 'w') as fichier:
+                    manifest['tables'][kind] = write_parquet(export(kind), fichier, chunk_size)
+            with archive.open(f"{BUNDLE_SUPPRESSIONS}.parquet", 'w') as fichier:
+                manifest[BUNDLE_SUPPRESSIONS] = write_parquet(export(BUNDLE_SUPPRESSIONS), fichier, chunk_size)
+        archive.writestr("manifest.json", json.dumps(manifest, ensure_ascii=False, indent=2))
+    out.seek(0)
+    return out
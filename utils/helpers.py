@@ -6,7 +6,7 @@ Fournit des fonctions helper pour diverses opérations
 import streamlit as st
 from datetime import datetime
 from utils.config import COLORS, STATUTS_CONFORMITE
-from typing import Dict, List, Optional
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
 
 def format_date(date_str: str, format_type: str = 'short') -> str:
     """
@@ -224,24 +224,23 @@ def filter_criteres(criteres: List[Dict], filters: Dict) -> List[Dict]:
     
     return filtered
 
-def export_to_csv(data: List[Dict], filename: str) -> bytes:
+def export_to_csv(data: Iterable[Dict], filename: str) -> bytes:
     """
-    Exporte des données en format CSV
+    Exporte des données en format CSV (UTF-8 avec BOM)
     
     Args:
-        data: Liste de dictionnaires à exporter
+        data: Dictionnaires à exporter (liste ou générateur, ex: db.iter_audits())
         filename: Nom du fichier
     
     Returns:
         Données CSV en bytes
     """
-    import pandas as pd
     import io
+    from utils.exporter import write_dicts_csv
     
-    df = pd.DataFrame(data)
-    csv_buffer = io.StringIO()
-    df.to_csv(csv_buffer, index=False, encoding='utf-8-sig')
-    return csv_buffer.getvalue().encode('utf-8-sig')
+    buffer = io.BytesIO()
+    write_dicts_csv(data, buffer)
+    return buffer.getvalue()
 
 def validate_password_strength(password: str) -> tuple:
     """
@@ -292,6 +291,48 @@ def create_download_button(data: bytes, filename: str, label: str, mime_type: st
         use_container_width=True
     )
 
+def paginate(key: str, fetch_page: Callable[[int, Optional[Tuple]], Tuple[List[Dict], Optional[Tuple]]],
+             page_size: int = 20, filters: Tuple = ()) -> List[Dict]:
+    """
+    Affiche la navigation Précédent / Suivant et retourne la page courante
+    
+    Args:
+        key: Identifiant unique de la liste dans la session
+        fetch_page: Fonction (limit, after) -> (lignes, curseur suivant), ex. db.get_audits_page
+        page_size: Nombre de lignes par page
+        filters: Filtres appliqués ; un changement ramène à la première page
+    
+    Returns:
+        Lignes de la page courante
+    """
+    # Pile des curseurs des pages visitées : seule la page affichée est lue en base
+    state = st.session_state.setdefault(f"pagination_{key}", {"cursors": [None], "filters": filters})
+    if state["filters"] != filters:
+        state.update(cursors=[None], filters=filters)
+    
+    items, next_cursor = fetch_page(page_size, state["cursors"][-1])
+    while not items and len(state["cursors"]) > 1:
+        # Page vidée (suppression) : revenir à la précédente
+        state["cursors"].pop()
+        items, next_cursor = fetch_page(page_size, state["cursors"][-1])
+    
+    page = len(state["cursors"])
+    if page > 1 or next_cursor is not None:
+        col_prev, col_page, col_next = st.columns([1, 2, 1])
+        with col_prev:
+            if st.button("← Précédent", key=f"{key}_prev", disabled=page == 1, use_container_width=True):
+                state["cursors"].pop()
+                st.rerun()
+        with col_page:
+            st.markdown(f"<p style='text-align: center; color: {COLORS['text_secondary']};'>Page {page}</p>",
+                        unsafe_allow_html=True)
+        with col_next:
+            if st.button("Suivant →", key=f"{key}_next", disabled=next_cursor is None, use_container_width=True):
+                state["cursors"].append(next_cursor)
+                st.rerun()
+    
+    return items
+
 def get_categorie_icon(categorie: str) -> str:
     """
     Retourne une icône pour une catégorie de critère
@@ -308,4 +349,398 @@ def get_categorie_icon(categorie: str) -> str:
         'Physique': '🔒',
         'Technologique': '💻'
     }
-    return icons.get(categorie, '📋')
\ No newline at end of file
+    return icons.get(categorie, '📋')
+
+def display_evidence_download(db, ref: Optional[str], key: str):
+    """
+    Affiche une pièce jointe du magasin de preuves avec son lien de téléchargement
+
+    Le fichier est servi en flux par la route de téléchargement (voir
+    utils/routes.py), avec reprise : il n'est jamais chargé dans la session.
+    Sans les routes (application lancée par app.py), il n'est lu qu'à la
+    demande, le temps d'un rerun, par un bouton Streamlit.
+
+    Args:
+        db: Instance Database
+        ref: Référence 'sha256:...' (les anciens chemins sont affichés tels quels)
+        key: Clé Streamlit unique
+    """
+    from functools import partial
+    from utils.evidence import EvidenceStore, EvidenceError, is_evidence_ref
+    from utils.routes import download_url, routes_enabled
+
+    if not ref:
+        return
+    if not is_evidence_ref(ref):
+        st.caption(f"📎 {ref} (fichier non conservé)")
+        return
+
+    store = EvidenceStore(db)
+    info = store.info(ref)
+    if info is None:
+        st.caption("📎 Pièce jointe introuvable")
+        return
+
+    from utils.evidence_pipeline import thumbnail_path
+
+    sha256 = info['sha256']
+    extrait = db.get_evidence_extract(sha256)
+    apercu = thumbnail_path(store, sha256) if extrait and extrait['apercu'] else None
+    if apercu:
+        st.image(apercu, width=128)
+    details = [format_file_size(info['taille'])]
+    if extrait is None:
+        details.append("analyse en cours")
+    elif extrait['pages']:
+        details.append(f"{extrait['pages']} page(s)")
+    libelle = f"📎 {info['nom']} ({', '.join(details)})"
+    if routes_enabled():
+        st.link_button(libelle, download_url(f"preuve:{sha256}", partial(store.open, ref), info['nom'],
+                                             info.get('type_mime')))
+        return
+    if not st.session_state.pop(f"telecharger_{key}", False):
+        if st.button(libelle, key=f"preparer_{key}"):
+            st.session_state[f"telecharger_{key}"] = True
+            st.rerun()
+        return
+    # Le fichier n'est lu que pour ce rerun : le drapeau est déjà retiré
+    try:
+        with store.open(ref) as fichier:
+            st.download_button(
+                f"📥 Télécharger {info['nom']}",
+                fichier,
+                file_name=info['nom'],
+                mime=info.get('type_mime') or "application/octet-stream",
+                on_click="ignore",
+                key=f"download_{key}"
+            )
+    except EvidenceError as e:
+        st.error(str(e))
+
+def drop_file_select(db, key: str) -> Optional[Dict]:
+    """
+    Sélection d'un fichier volumineux copié dans le dossier de dépôt du serveur
+
+    Ces fichiers ne transitent pas par le navigateur : ils sont lus par
+    morceaux depuis le disque, sans être chargés dans la session.
+
+    Returns:
+        Fichier choisi (nom, chemin, taille) ou None
+    """
+    from utils.uploads import list_drop_files
+
+    fichiers = list_drop_files(db)
+    if not fichiers:
+        return None
+    return st.selectbox(
+        "… ou fichier volumineux du dossier de dépôt",
+        [None] + fichiers,
+        format_func=lambda f: "Aucun" if f is None else f"{f['nom']} ({format_file_size(f['taille'])})",
+        key=key
+    )
+
+
+# Téléverseur par morceaux (voir chunked_upload) : les morceaux partent du
+# navigateur vers la route de téléversement, l'identifiant du téléversement
+# est gardé dans localStorage pour reprendre un envoi interrompu
+_TELEVERSEUR_HTML = """
+<div style="font-family: sans-serif; font-size: 14px; color: #f1f5f9;">
+  <div style="margin-bottom: 0.4rem;" id="libelle"></div>
+  <input type="file" id="fichier">
+  <progress id="avancement" max="1" value="0" style="width: 100%; display: none;"></progress>
+  <div id="message" style="margin-top: 0.3rem;"></div>
+</div>
+<script>
+const CONFIG = __CONFIG__;
+const champ = document.getElementById('fichier');
+const avancement = document.getElementById('avancement');
+const message = document.getElementById('message');
+document.getElementById('libelle').textContent = CONFIG.libelle;
+champ.accept = CONFIG.types.map(t => '.' + t).join(',');
+
+async function empreinte(morceau) {
+  if (!(window.crypto && crypto.subtle)) return null;
+  const somme = await crypto.subtle.digest('SHA-256', await morceau.arrayBuffer());
+  return Array.from(new Uint8Array(somme)).map(o => o.toString(16).padStart(2, '0')).join('');
+}
+
+async function appeler(adresse, options) {
+  const reponse = await fetch(adresse, options);
+  const corps = await reponse.json().catch(() => ({}));
+  if (!reponse.ok) throw new Error(corps.erreur || reponse.statusText);
+  return corps;
+}
+
+async function envoyer(adresse, morceau) {
+  const entetes = {'Content-Type': 'application/octet-stream'};
+  const somme = await empreinte(morceau);
+  if (somme) entetes['X-Morceau-Sha256'] = somme;
+  for (let essai = 1; ; essai++) {
+    try {
+      return (await appeler(adresse, {method: 'PUT', headers: entetes, body: morceau})).recu;
+    } catch (e) {
+      if (essai >= 5) throw e;
+      await new Promise(r => setTimeout(r, 1000 * essai));
+    }
+  }
+}
+
+champ.addEventListener('change', async () => {
+  const fichier = champ.files[0];
+  if (!fichier) return;
+  const cle = 'securite360_televersement:' + [fichier.name, fichier.size, fichier.lastModified].join(':');
+  champ.disabled = true;
+  avancement.style.display = 'block';
+  message.textContent = 'Envoi...';
+  try {
+    const televersement = await appeler(CONFIG.adresse, {
+      method: 'POST',
+      headers: {'Content-Type': 'application/json'},
+      body: JSON.stringify({nom: fichier.name, taille: fichier.size, type_mime: fichier.type,
+                            id: localStorage.getItem(cle)})
+    });
+    localStorage.setItem(cle, televersement.id);
+    let recu = televersement.recu;
+    while (recu < fichier.size) {
+      const morceau = fichier.slice(recu, Math.min(recu + televersement.morceau, fichier.size));
+      recu = await envoyer(`${CONFIG.adresse}/${televersement.id}?offset=${recu}`, morceau);
+      avancement.value = recu / fichier.size;
+      message.textContent = `Envoi... ${Math.floor(100 * recu / fichier.size)} %`;
+    }
+    message.textContent = 'Vérification du fichier...';
+    await appeler(`${CONFIG.adresse}/${televersement.id}/fin`, {method: 'POST'});
+    localStorage.removeItem(cle);
+    avancement.value = 1;
+    message.textContent = `✅ ${fichier.name} reçu : enregistrez pour l'associer`;
+  } catch (e) {
+    message.textContent = `❌ ${e.message} (choisir à nouveau le fichier reprend l'envoi)`;
+    champ.disabled = false;
+    champ.value = '';
+  }
+});
+</script>
+"""
+
+
+def chunked_upload(db, key: str, types: List[str], depose_par: Optional[str],
+                   libelle: str = "… ou fichier volumineux, envoyé par morceaux") -> Optional[Dict]:
+    """
+    Téléversement par morceaux depuis le navigateur, pour les fichiers volumineux
+
+    Le fichier est découpé dans le navigateur et envoyé à la route de
+    téléversement (voir utils/routes.py), qui écrit chaque morceau dans le
+    spool sur disque : il ne passe jamais par la mémoire de la session. Un
+    envoi interrompu reprend au dernier morceau reçu quand le même fichier
+    est choisi à nouveau. Sans les routes (application lancée par app.py),
+    rien n'est affiché.
+
+    Args:
+        db: Instance Database
+        key: Clé unique du téléverseur dans la page
+        types: Extensions acceptées
+        depose_par: Utilisateur
+        libelle: Libellé affiché au-dessus du sélecteur
+
+    Returns:
+        Fichier reçu (ref, nom, taille, cle) à passer à ingest_evidence, ou None
+    """
+    import json
+    from utils.routes import routes_enabled, upload_url
+
+    if not routes_enabled():
+        return None
+    adresse, objet = upload_url(key, db, depose_par, types)
+    page = _TELEVERSEUR_HTML.replace("__CONFIG__", json.dumps(
+        {'adresse': adresse, 'types': types, 'libelle': libelle}, ensure_ascii=False))
+    # Cadre de même origine que l'application (appels aux routes, localStorage)
+    if hasattr(st, "iframe"):
+        st.iframe(page, height=100)
+    else:
+        import streamlit.components.v1 as components
+        components.html(page, height=100)
+    if objet['fichier'] is None:
+        return None
+    st.caption(f"📎 {objet['fichier']['nom']} ({format_file_size(objet['fichier']['taille'])}) prêt à être enregistré")
+    return {**objet['fichier'], 'cle': key}
+
+
+def ingest_evidence(db, fichier=None, depot: Optional[Dict] = None, depose_par: Optional[str] = None,
+                    televerse: Optional[Dict] = None) -> Optional[str]:
+    """
+    Fait entrer un fichier dans le magasin de preuves par morceaux, avec barre de progression
+
+    Args:
+        db: Instance Database
+        fichier: Fichier téléversé Streamlit (prioritaire)
+        depot: Fichier du dossier de dépôt (voir drop_file_select), retiré du dépôt une fois importé
+        depose_par: Utilisateur
+        televerse: Fichier déjà reçu par morceaux (voir chunked_upload) ; son
+            téléverseur est remis à zéro
+
+    Returns:
+        Référence 'sha256:...' ou None si aucun fichier ; lève EvidenceError en cas d'échec
+        (un import interrompu reprend là où il s'était arrêté)
+    """
+    import mimetypes
+    import os
+    from utils.uploads import UploadSpool
+
+    from utils.evidence_pipeline import get_pipeline
+
+    if fichier is None and depot is None:
+        if televerse is None:
+            return None
+        # Déjà dans le magasin : le téléverseur repart d'un nouveau ticket
+        from utils.routes import forget_ticket
+        forget_ticket(f"televersement:{televerse['cle']}")
+        get_pipeline(db).submit(televerse['ref'].split(':', 1)[1])
+        return televerse['ref']
+    spool = UploadSpool(db)
+    barre = st.progress(0.0, text="Import du fichier...")
+    try:
+        def avancer(fraction):
+            barre.progress(fraction, text=f"Import du fichier... {fraction:.0%}")
+
+        if fichier is not None:
+            ref = spool.ingest(fichier, fichier.name, fichier.size, type_mime=fichier.type,
+                               depose_par=depose_par, progress=avancer)
+        else:
+            with open(depot['chemin'], 'rb') as source:
+                ref = spool.ingest(source, depot['nom'], depot['taille'],
+                                   type_mime=mimetypes.guess_type(depot['nom'])[0],
+                                   depose_par=depose_par, progress=avancer)
+            os.remove(depot['chemin'])
+    finally:
+        barre.empty()
+
+    # Aperçu et texte extraits en arrière-plan, hors du cycle de la page
+    get_pipeline(db).submit(ref.split(':', 1)[1])
+    return ref
+
+
+@st.fragment(run_every=1.0)
+def _follow_report_job(queue, job_id: str):
+    """Avancement d'une demande de rapport, rafraîchi chaque seconde jusqu'à sa fin"""
+    job = queue.status(job_id)
+    if job is None or job['statut'] not in ('en_attente', 'en_cours'):
+        st.rerun()
+    if job['statut'] == 'en_attente':
+        st.progress(0.0, text="En attente d'un processus de génération...")
+    else:
+        st.progress(job['progression'], text=f"Génération du rapport... {job['progression']:.0%}")
+
+
+def display_report_job(queue, job_id: Optional[str], key: str):
+    """
+    Affiche une demande de rapport : avancement, puis lien de téléchargement
+
+    Le PDF est servi en flux par la route de téléchargement (voir
+    utils/routes.py) ; sans les routes, par un bouton Streamlit.
+
+    Args:
+        queue: File des rapports (voir utils/report_jobs.py)
+        job_id: Identifiant de la demande (rien n'est affiché si None)
+        key: Clé Streamlit unique
+    """
+    from functools import partial
+    from utils.report_jobs import ReportError, download_name
+    from utils.routes import download_url, routes_enabled
+
+    job = queue.status(job_id) if job_id else None
+    if job is None:
+        return
+    if job['statut'] in ('en_attente', 'en_cours'):
+        _follow_report_job(queue, job_id)
+    elif job['statut'] == 'termine' and routes_enabled():
+        st.link_button(
+            f"📥 Télécharger le rapport PDF ({format_file_size(job['taille'] or 0)})",
+            download_url(f"rapport:{job_id}", partial(queue.open, job_id), download_name(job), "application/pdf"),
+            use_container_width=True
+        )
+    elif job['statut'] == 'termine':
+        try:
+            with queue.open(job_id) as pdf:
+                st.download_button(
+                    f"📥 Télécharger le rapport PDF ({format_file_size(job['taille'] or 0)})",
+                    pdf,
+                    file_name=download_name(job),
+                    mime="application/pdf",
+                    use_container_width=True,
+                    key=f"download_{key}"
+                )
+        except ReportError as e:
+            st.warning(str(e))
+    else:
+        st.error(f"❌ Erreur lors de la génération du rapport: {job['erreur']}")
+
+
+def _report_batch_lines(jobs: List[Dict], titres: Dict[int, str]):
+    """Une ligne d'avancement par audit d'un lot de rapports"""
+    for job in jobs:
+        titre = titres.get(job['audit_id'], f"Audit #{job['audit_id']}")
+        if job['statut'] == 'termine':
+            st.caption(f"✅ {titre}")
+        elif job['statut'] == 'echec':
+            st.caption(f"❌ {titre} : {job['erreur']}")
+        else:
+            st.progress(job['progression'], text=titre)
+
+
+@st.fragment(run_every=1.0)
+def _follow_report_batch(queue, lot: str, titres: Dict[int, str]):
+    """Avancement d'un lot de rapports, rafraîchi chaque seconde jusqu'à sa fin"""
+    jobs = queue.batch(lot)
+    en_cours = [job for job in jobs if job['statut'] in ('en_attente', 'en_cours')]
+    if not en_cours:
+        st.rerun()
+    faits = len(jobs) - len(en_cours)
+    st.progress(faits / len(jobs), text=f"{faits} / {len(jobs)} rapports générés")
+    _report_batch_lines(jobs, titres)
+
+
+def display_report_batch(queue, lot: Optional[str], titres: Dict[int, str], key: str):
+    """
+    Affiche un lot de rapports d'audit : avancement par audit, puis archive ZIP
+
+    L'archive est servie en flux par la route de téléchargement (voir
+    utils/routes.py) ; sans les routes, par un bouton Streamlit.
+
+    Args:
+        queue: File des rapports (voir utils/report_jobs.py)
+        lot: Identifiant du lot (rien n'est affiché si None)
+        titres: Titre de chaque audit, par identifiant
+        key: Clé Streamlit unique
+    """
+    import os
+    from functools import partial
+    from utils.report_jobs import ReportError
+    from utils.routes import download_url, routes_enabled
+
+    jobs = queue.batch(lot) if lot else []
+    if not jobs:
+        return
+    if any(job['statut'] in ('en_attente', 'en_cours') for job in jobs):
+        _follow_report_batch(queue, lot, titres)
+        return
+    echecs = [job for job in jobs if job['statut'] == 'echec']
+    if echecs:
+        _report_batch_lines(echecs, titres)
+    try:
+        chemin = queue.bundle(lot)
+        libelle = f"📦 Télécharger les {len(jobs) - len(echecs)} rapports (ZIP, {format_file_size(os.path.getsize(chemin))})"
+        nom = f"rapports_audits_{jobs[0]['date_demande'][:10]}.zip"
+        if routes_enabled():
+            st.link_button(libelle, download_url(f"lot:{lot}", partial(open, chemin, 'rb'), nom, "application/zip"),
+                           use_container_width=True)
+            return
+        with open(chemin, 'rb') as archive:
+            st.download_button(
+                libelle,
+                archive,
+                file_name=nom,
+                mime="application/zip",
+                use_container_width=True,
+                key=f"download_{key}"
+            )
+    except (ReportError, OSError) as e:
+        st.warning(str(e))
@@ -0,0 +1,298 @@
+"""
+Import en masse de critères, audits et directives depuis un fichier CSV ou XLSX
+Lecture ligne à ligne, validation et écriture par lots en transactions
+"""
+
+import csv
+import io
+import itertools
+import unicodedata
+from datetime import date, datetime
+from typing import Callable, Dict, IO, Iterator, List, Optional, Tuple
+
+from utils.config import STATUTS_CONFORMITE, CATEGORIES_ISO, STATUTS_AUDIT, TYPES_DIRECTIVES, NIVEAUX_EFFICACITE
+
+try:
+    import openpyxl
+except ImportError:
+    openpyxl = None
+
+# Taille des lots écrits dans une même transaction
+CHUNK_SIZE = 500
+
+# Nombre maximal d'erreurs conservées dans le rapport (les suivantes sont seulement comptées)
+MAX_ERREURS = 1000
+
+# Colonnes reconnues par type d'import : nom normalisé -> colonne, avec synonymes
+COLONNES = {
+    'criteres': {
+        'code': 'code', 'titre': 'titre', 'description': 'description', 'categorie': 'categorie',
+        'statut': 'statut', 'commentaire': 'commentaire',
+    },
+    'audits': {
+        'titre': 'titre', 'date_audit': 'date_audit', 'date': 'date_audit', 'auditeur': 'auditeur',
+        'statut': 'statut', 'score': 'score', 'commentaires': 'commentaires', 'commentaire': 'commentaires',
+    },
+    'directives': {
+        'titre': 'titre', 'description': 'description', 'type': 'type', 'efficacite': 'efficacite',
+        'responsable': 'responsable',
+    },
+}
+
+# Colonnes obligatoires dans l'en-tête
+COLONNES_REQUISES = {
+    'criteres': ['code', 'statut'],
+    'audits': ['titre', 'date_audit', 'auditeur', 'statut'],
+    'directives': ['titre', 'description', 'type'],
+}
+
+
+class ImportReport:
+    """Bilan d'un import : lignes lues, lignes importées et erreurs par ligne"""
+
+    def __init__(self):
+        self.lignes = 0
+        self.importees = 0
+        self.erreurs: List[Tuple[int, str]] = []
+        self.erreurs_total = 0
+
+    def add_error(self, ligne: int, message: str):
+        self.erreurs_total += 1
+        if len(self.erreurs) < MAX_ERREURS:
+            self.erreurs.append((ligne, message))
+
+
+def _normaliser(valeur: str) -> str:
+    """Minuscules, sans accents ni espaces superflus (« Date d'audit » -> « date_d'audit »)"""
+    sans_accents = unicodedata.normalize('NFKD', str(valeur)).encode('ascii', 'ignore').decode('ascii')
+    return "_".join(sans_accents.strip().lower().split())
+
+
+def _choix(valeurs: List[str]) -> Dict[str, str]:
+    return {_normaliser(v): v for v in valeurs}
+
+
+# Valeurs autorisées, comparées sans casse ni accents
+_STATUTS = _choix(STATUTS_CONFORMITE)
+_CATEGORIES = _choix(CATEGORIES_ISO)
+_STATUTS_AUDIT = _choix(STATUTS_AUDIT)
+_TYPES = _choix(TYPES_DIRECTIVES)
+_EFFICACITES = _choix(NIVEAUX_EFFICACITE)
+
+
+def iter_csv_rows(fileobj: IO[bytes]) -> Iterator[List]:
+    """
+    Lit un CSV ligne à ligne (UTF-8, avec ou sans BOM ; séparateur , ; ou tabulation)
+
+    Args:
+        fileobj: Fichier binaire (ex: fichier téléversé Streamlit)
+
+    Returns:
+        Itérateur sur les lignes (la première est l'en-tête)
+    """
+    text = io.TextIOWrapper(fileobj, encoding='utf-8-sig', newline='')
+    entete = text.readline()
+    # Seul le séparateur est déduit de l'en-tête : sans guillemets, le Sniffer
+    # désactiverait le doublement ("") des guillemets dans les valeurs
+    try:
+        delimiter = csv.Sniffer().sniff(entete, delimiters=',;\t').delimiter
+    except csv.Error:
+        delimiter = ','
+    try:
+        yield from csv.reader(itertools.chain([entete], text), csv.excel, delimiter=delimiter)
+    finally:
+        # Ne pas fermer le fichier de l'appelant avec le wrapper
+        text.detach()
+
+
+def iter_xlsx_rows(fileobj: IO[bytes]) -> Iterator[List]:
+    """
+    Lit la première feuille d'un classeur XLSX ligne à ligne (mode lecture seule)
+
+    Args:
+        fileobj: Fichier binaire
+
+    Returns:
+        Itérateur sur les lignes (la première est l'en-tête)
+    """
+    if openpyxl is None:
+        raise ValueError("L'import XLSX nécessite le paquet openpyxl")
+    workbook = openpyxl.load_workbook(fileobj, read_only=True, data_only=True)
+    try:
+        for row in workbook.worksheets[0].iter_rows(values_only=True):
+            yield ["" if value is None else value for value in row]
+    finally:
+        workbook.close()
+
+
+def iter_file_rows(fileobj: IO[bytes], filename: str) -> Iterator[List]:
+    """Choisit le lecteur selon l'extension du fichier (.csv ou .xlsx)"""
+    extension = filename.lower().rsplit('.', 1)[-1]
+    if extension == 'csv':
+        return iter_csv_rows(fileobj)
+    if extension == 'xlsx':
+        return iter_xlsx_rows(fileobj)
+    raise ValueError(f"Format non pris en charge : .{extension} (CSV ou XLSX attendu)")
+
+
+def _texte(valeur) -> str:
+    return str(valeur).strip() if valeur is not None else ""
+
+
+def _valeur_autorisee(valeur, choix: Dict[str, str], libelle: str) -> str:
+    canonique = choix.get(_normaliser(_texte(valeur)))
+    if canonique is None:
+        raise ValueError(f"{libelle} invalide : « {_texte(valeur)} » (attendu : {', '.join(choix.values())})")
+    return canonique
+
+
+def _date(valeur) -> str:
+    if isinstance(valeur, (datetime, date)):
+        return valeur.strftime('%Y-%m-%d')
+    texte = _texte(valeur)
+    if not texte:
+        raise ValueError("Champ obligatoire manquant : date_audit")
+    for fmt in ('%Y-%m-%d', '%d/%m/%Y', '%Y-%m-%d %H:%M:%S'):
+        try:
+            return datetime.strptime(texte, fmt).strftime('%Y-%m-%d')
+        except ValueError:
+            continue
+    raise ValueError(f"Date invalide : « {texte} » (AAAA-MM-JJ ou JJ/MM/AAAA)")
+
+
+def _score(valeur) -> float:
+    texte = _texte(valeur).rstrip('%').replace(',', '.').strip()
+    if not texte:
+        return 0.0
+    try:
+        score = float(texte)
+    except ValueError:
+        raise ValueError(f"Score invalide : « {_texte(valeur)} »")
+    if not 0 <= score <= 100:
+        raise ValueError(f"Score hors limites : {score} (0 à 100)")
+    return score
+
+
+def _obligatoire(row: Dict, colonne: str) -> str:
+    valeur = _texte(row.get(colonne))
+    if not valeur:
+        raise ValueError(f"Champ obligatoire manquant : {colonne}")
+    return valeur
+
+
+def validate_row(kind: str, row: Dict, codes_existants: set = frozenset()) -> Tuple:
+    """
+    Valide et convertit une ligne en paramètres pour Database.import_batch
+
+    Args:
+        kind: 'criteres', 'audits' ou 'directives'
+        row: Valeurs de la ligne, indexées par colonne
+        codes_existants: Codes des critères déjà en base (mis à jour plutôt que créés)
+
+    Returns:
+        Tuple de valeurs (sans l'horodatage) ; lève ValueError si la ligne est invalide
+    """
+    if kind == 'criteres':
+        code = _obligatoire(row, 'code')
+        statut = _valeur_autorisee(row.get('statut'), _STATUTS, "Statut")
+        commentaire = _texte(row.get('commentaire')) or None
+        if code in codes_existants:
+            return (code, "", "", "", statut, commentaire)
+        categorie = _valeur_autorisee(row.get('categorie'), _CATEGORIES, "Catégorie")
+        return (code, _obligatoire(row, 'titre'), _obligatoire(row, 'description'), categorie, statut, commentaire)
+
+    if kind == 'audits':
+        return (
+            _obligatoire(row, 'titre'),
+            _date(row.get('date_audit')),
+            _obligatoire(row, 'auditeur'),
+            _valeur_autorisee(row.get('statut'), _STATUTS_AUDIT, "Statut"),
+            _score(row.get('score')),
+            _texte(row.get('commentaires')),
+        )
+
+    if kind == 'directives':
+        efficacite = row.get('efficacite')
+        return (
+            _obligatoire(row, 'titre'),
+            _obligatoire(row, 'description'),
+            _valeur_autorisee(row.get('type'), _TYPES, "Type"),
+            _valeur_autorisee(efficacite, _EFFICACITES, "Efficacité") if _texte(efficacite) else 'Moyenne',
+            _texte(row.get('responsable')) or "Non assigné",
+        )
+
+    raise ValueError(f"Type d'import inconnu : {kind}")
+
+
+def import_file(db, kind: str, fileobj: IO[bytes], filename: str, chunk_size: int = CHUNK_SIZE,
+                progress: Optional[Callable[[int, Optional[float]], None]] = None) -> ImportReport:
+    """
+    Importe un fichier CSV/XLSX ligne à ligne, par lots de `chunk_size` lignes
+
+    Seul le lot en cours est gardé en mémoire : chaque lot valide est écrit
+    dans sa propre transaction, les lignes invalides sont écartées et
+    rapportées avec leur numéro de ligne dans le fichier.
+
+    Args:
+        db: Instance Database
+        kind: 'criteres', 'audits' ou 'directives'
+        fileobj: Fichier binaire
+        filename: Nom du fichier (détermine le format)
+        chunk_size: Nombre de lignes par transaction
+        progress: Fonction appelée après chaque lot avec (lignes lues, fraction lue ou None)
+
+    Returns:
+        Bilan de l'import
+    """
+    if kind not in COLONNES:
+        raise ValueError(f"Type d'import inconnu : {kind}")
+
+    report = ImportReport()
+    # Avancement estimé d'après la position dans le fichier (CSV uniquement)
+    taille = _taille(fileobj) if filename.lower().endswith('.csv') else 0
+    rows = iter_file_rows(fileobj, filename)
+    entete = next(rows, None)
+    if entete is None:
+        raise ValueError("Fichier vide")
+    colonnes = [COLONNES[kind].get(_normaliser(nom)) for nom in entete]
+    manquantes = [c for c in COLONNES_REQUISES[kind] if c not in colonnes]
+    if manquantes:
+        raise ValueError(f"Colonnes obligatoires absentes : {', '.join(manquantes)}")
+
+    codes_existants = {c['code'] for c in db.get_all_criteres()} if kind == 'criteres' else set()
+
+    def ecrire(lot: List[Tuple]):
+        report.importees += db.import_batch(kind, lot)
+        if progress:
+            progress(report.lignes, min(fileobj.tell() / taille, 1.0) if taille else None)
+
+    lot: List[Tuple] = []
+    for numero, valeurs in enumerate(rows, start=2):
+        if not any(_texte(v) for v in valeurs):
+            continue
+        report.lignes += 1
+        row = {colonne: valeur for colonne, valeur in zip(colonnes, valeurs) if colonne}
+        try:
+            lot.append(validate_row(kind, row, codes_existants))
+        except ValueError as e:
+            report.add_error(numero, str(e))
+            continue
+        if kind == 'criteres':
+            codes_existants.add(lot[-1][0])
+        if len(lot) >= chunk_size:
+            ecrire(lot)
+            lot = []
+    ecrire(lot)
+    return report
+
+
+def _taille(fileobj: IO[bytes]) -> int:
+    """Taille du fichier en octets (0 si inconnue), sans déplacer la position de lecture"""
+    try:
+        position = fileobj.tell()
+        fileobj.seek(0, io.SEEK_END)
+        taille = fileobj.tell()
+        fileobj.seek(position)
+        return taille
+    except (AttributeError, OSError):
+        return 0
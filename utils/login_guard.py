@@ -0,0 +1,312 @@
+"""
+Protection de la page de connexion
+Vérification des mots de passe (bcrypt) dans un pool de threads borné, hors
+du thread du script Streamlit, et limitation des tentatives par identifiant
+et par adresse IP avec une attente qui double à chaque échec
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FutureTimeout
+from typing import Callable, Dict, Optional
+
+import bcrypt
+
+# Threads de vérification : bcrypt libère le GIL, mais chaque vérification
+# occupe un cœur ; on en laisse au moins la moitié aux reruns des sessions
+WORKERS = max(1, (os.cpu_count() or 2) // 2)
+
+# Vérifications en attente au-delà desquelles une tentative est refusée
+FILE_MAX = 16
+
+# Attente maximale d'une vérification (secondes)
+DELAI_VERIFICATION = 10.0
+
+# Échecs tolérés sans attente, par identifiant puis par adresse IP
+# (plusieurs utilisateurs peuvent partager une adresse derrière un proxy)
+SEUIL_IDENTIFIANT = 3
+SEUIL_IP = 10
+
+# Attente après le premier échec au-delà du seuil, doublée à chaque échec suivant (secondes)
+ATTENTE_BASE = 1.0
+ATTENTE_MAX = 300.0
+
+# Les échecs sont oubliés après cette durée sans nouvel échec (secondes)
+FENETRE = 15 * 60
+
+# Nombre maximal d'identifiants ou d'adresses suivis
+ENTREES_MAX = 10_000
+
+
+class LoginError(Exception):
+    """Tentative de connexion refusée avant vérification du mot de passe"""
+
+
+class LoginThrottled(LoginError):
+    """Trop d'échecs récents : nouvelle tentative possible dans `attente` secondes"""
+
+    def __init__(self, attente: float):
+        super().__init__(f"Nouvelle tentative possible dans {attente:.0f} s")
+        self.attente = attente
+
+
+class LoginBusy(LoginError):
+    """File de vérification saturée"""
+
+
+class PasswordVerifier:
+    """
+    Vérifications bcrypt dans un pool de threads borné
+
+    Au plus `workers` vérifications en parallèle et `file_max` en attente :
+    au-delà, la tentative est refusée (LoginBusy) plutôt que d'empiler du
+    travail CPU. Les nouvelles empreintes (changement de politique de
+    hachage) passent par le même pool. Les compteurs et les temps d'attente
+    sont exposés par stats().
+    """
+
+    def __init__(self, workers: int = WORKERS, file_max: int = FILE_MAX):
+        self.workers = workers
+        self.file_max = file_max
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        self._places = threading.BoundedSemaphore(workers + file_max)
+        self._lock = threading.Lock()
+        self._en_attente = 0
+        self._en_cours = 0
+        self._counters = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'timeouts': 0,
+            'rehashed': 0,
+            'rehash_skipped': 0,
+        }
+        self._attente_totale = 0.0
+        self._attente_max = 0.0
+        self._duree_totale = 0.0
+
+    def _soumettre(self, fonction: Callable, *args) -> Future:
+        """Met une tâche en file s'il reste une place (lève LoginBusy sinon)"""
+        if not self._places.acquire(blocking=False):
+            raise LoginBusy("Trop de connexions en cours")
+        with self._lock:
+            self._counters['submitted'] += 1
+            self._en_attente += 1
+        try:
+            future = self._executor.submit(self._executer, fonction, args, time.monotonic())
+        except BaseException:
+            with self._lock:
+                self._en_attente -= 1
+            self._places.release()
+            raise
+        future.add_done_callback(lambda _: self._places.release())
+        return future
+
+    def check(self, password: bytes, password_hash: bytes, timeout: float = DELAI_VERIFICATION) -> bool:
+        """Équivalent de bcrypt.checkpw exécuté dans le pool (lève LoginBusy si saturé)"""
+        try:
+            future = self._soumettre(bcrypt.checkpw, password, password_hash)
+        except LoginBusy:
+            with self._lock:
+                self._counters['rejected'] += 1
+            raise
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            with self._lock:
+                self._counters['timeouts'] += 1
+            raise LoginBusy("Vérification du mot de passe trop longue")
+
+    def rehash(self, db, user_id: int, password: str) -> bool:
+        """
+        Refait en arrière-plan, dans le pool, l'empreinte d'un mot de passe vérifié
+
+        Sans attendre le résultat ; si le pool est saturé, rien n'est fait
+        (l'empreinte sera refaite à une prochaine connexion).
+        """
+        try:
+            self._soumettre(db.rehash_password, user_id, password)
+        except LoginBusy:
+            with self._lock:
+                self._counters['rehash_skipped'] += 1
+            return False
+        with self._lock:
+            self._counters['rehashed'] += 1
+        return True
+
+    def _executer(self, fonction: Callable, args: tuple, soumis: float):
+        debut = time.monotonic()
+        with self._lock:
+            self._en_attente -= 1
+            self._en_cours += 1
+            self._attente_totale += debut - soumis
+            self._attente_max = max(self._attente_max, debut - soumis)
+        try:
+            return fonction(*args)
+        finally:
+            with self._lock:
+                self._en_cours -= 1
+                self._counters['completed'] += 1
+                self._duree_totale += time.monotonic() - debut
+
+    def stats(self) -> Dict:
+        """Statistiques de la file de vérification (durées en secondes)"""
+        with self._lock:
+            demarrees = self._counters['submitted'] - self._en_attente
+            terminees = self._counters['completed']
+            return {
+                'workers': self.workers,
+                'file_max': self.file_max,
+                'waiting': self._en_attente,
+                'running': self._en_cours,
+                **self._counters,
+                'wait_avg': self._attente_totale / demarrees if demarrees else 0.0,
+                'wait_max': self._attente_max,
+                'duration_avg': self._duree_totale / terminees if terminees else 0.0,
+            }
+
+    def shutdown(self):
+        """Arrête le pool après les vérifications en cours"""
+        self._executor.shutdown(wait=True)
+
+
+class LoginThrottle:
+    """
+    Limitation des échecs de connexion par clé (identifiant ou adresse IP)
+
+    Après `seuil` échecs, chaque nouvel échec impose une attente de
+    `base * 2^(échecs - seuil)` secondes, plafonnée à `maximum`. Les clés
+    sans échec depuis `fenetre` secondes sont oubliées, et au plus
+    `entrees_max` clés sont suivies (les plus anciennes sont oubliées).
+    """
+
+    def __init__(self, seuil: int, base: float = ATTENTE_BASE, maximum: float = ATTENTE_MAX,
+                 fenetre: float = FENETRE, entrees_max: int = ENTREES_MAX,
+                 horloge: Callable[[], float] = time.monotonic):
+        self.seuil = seuil
+        self.base = base
+        self.maximum = maximum
+        self.fenetre = fenetre
+        self.entrees_max = entrees_max
+        self._horloge = horloge
+        self._lock = threading.Lock()
+        # clé -> [échecs, fin de l'attente, dernier échec], du plus ancien échec au plus récent
+        self._entrees: "OrderedDict[str, list]" = OrderedDict()
+
+    def _oublier_anciennes(self, maintenant: float):
+        while self._entrees:
+            cle, (_, _, dernier) = next(iter(self._entrees.items()))
+            if maintenant - dernier < self.fenetre and len(self._entrees) <= self.entrees_max:
+                break
+            del self._entrees[cle]
+
+    def retry_after(self, cle: str) -> float:
+        """Secondes avant la prochaine tentative autorisée pour `cle` (0 si aucune attente)"""
+        with self._lock:
+            maintenant = self._horloge()
+            self._oublier_anciennes(maintenant)
+            entree = self._entrees.get(cle)
+            return max(0.0, entree[1] - maintenant) if entree else 0.0
+
+    def failure(self, cle: str) -> float:
+        """Enregistre un échec ; retourne l'attente imposée avant la tentative suivante"""
+        with self._lock:
+            maintenant = self._horloge()
+            self._oublier_anciennes(maintenant)
+            entree = self._entrees.pop(cle, None) or [0, 0.0, 0.0]
+            entree[0] += 1
+            attente = 0.0
+            if entree[0] >= self.seuil:
+                attente = min(self.base * 2 ** (entree[0] - self.seuil), self.maximum)
+            entree[1] = maintenant + attente
+            entree[2] = maintenant
+            self._entrees[cle] = entree
+            self._oublier_anciennes(maintenant)
+            return attente
+
+    def reset(self, cle: str):
+        """Oublie les échecs de `cle` (connexion réussie)"""
+        with self._lock:
+            self._entrees.pop(cle, None)
+
+
+class LoginGuard:
+    """
+    Connexion protégée : limitation des tentatives puis vérification dans le pool
+
+    Une tentative sans adresse IP (accès local, ou proxy sur la même
+    machine : Streamlit ne donne pas l'adresse de bouclage) n'est limitée
+    que par identifiant ; ces tentatives sont comptées dans stats().
+    """
+
+    def __init__(self, verifier: Optional[PasswordVerifier] = None,
+                 par_identifiant: Optional[LoginThrottle] = None,
+                 par_ip: Optional[LoginThrottle] = None):
+        self.verifier = verifier or PasswordVerifier()
+        self.par_identifiant = par_identifiant or LoginThrottle(SEUIL_IDENTIFIANT)
+        self.par_ip = par_ip or LoginThrottle(SEUIL_IP)
+        self._lock = threading.Lock()
+        self._tentatives = 0
+        self._sans_ip = 0
+
+    @staticmethod
+    def _cle(username: str) -> str:
+        # Variantes de casse et espaces comptent pour le même identifiant
+        return username.strip().casefold()
+
+    def retry_after(self, username: str, ip: Optional[str] = None) -> float:
+        """Secondes avant la prochaine tentative autorisée pour cet identifiant et cette adresse"""
+        attente = self.par_identifiant.retry_after(self._cle(username))
+        if ip:
+            attente = max(attente, self.par_ip.retry_after(ip))
+        return attente
+
+    def authenticate(self, db, username: str, password: str, ip: Optional[str] = None) -> Optional[Dict]:
+        """
+        Vérifie des identifiants
+
+        Returns:
+            L'utilisateur, ou None si les identifiants sont incorrects
+
+        Raises:
+            LoginThrottled: trop d'échecs récents, mot de passe non vérifié
+            LoginBusy: file de vérification saturée (pas compté comme un échec)
+        """
+        with self._lock:
+            self._tentatives += 1
+            if not ip:
+                self._sans_ip += 1
+        attente = self.retry_after(username, ip)
+        if attente > 0:
+            raise LoginThrottled(attente)
+
+        user = db.verify_user(username, password, check=self.verifier.check,
+                              rehash=lambda user_id, mot_de_passe: self.verifier.rehash(db, user_id, mot_de_passe))
+        if user:
+            self.par_identifiant.reset(self._cle(username))
+            return user
+        self.par_identifiant.failure(self._cle(username))
+        if ip:
+            self.par_ip.failure(ip)
+        return None
+
+    def stats(self) -> Dict:
+        """Statistiques de la file de vérification et des tentatives (dont celles sans adresse IP)"""
+        with self._lock:
+            tentatives = {'attempts': self._tentatives, 'attempts_without_ip': self._sans_ip}
+        return {**self.verifier.stats(), **tentatives}
+
+
+_guard: Optional[LoginGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_login_guard() -> LoginGuard:
+    """Protection de connexion partagée par toutes les sessions du processus"""
+    global _guard
+    with _guard_lock:
+        if _guard is None:
+            _guard = LoginGuard()
+        return _guard
@@ -0,0 +1,85 @@
+"""
+Politique de hachage des mots de passe
+Coût bcrypt calibré au démarrage sur une latence cible, enregistré avec
+l'algorithme pour chaque utilisateur ; une empreinte plus faible que la
+politique courante est refaite à la connexion réussie suivante
+"""
+
+import math
+import threading
+import time
+from typing import Optional
+
+import bcrypt
+
+ALGORITHME = "bcrypt"
+
+# Durée visée pour un hachage (secondes)
+LATENCE_CIBLE = 0.25
+
+# Bornes du coût bcrypt (chaque unité double le travail) ; le minimum est
+# le coût par défaut de bcrypt.gensalt(), utilisé avant la calibration
+COUT_MIN = 12
+COUT_MAX = 16
+
+# Coût utilisé pour la mesure de calibrage, et nombre de mesures
+COUT_MESURE = 8
+MESURES = 3
+
+
+def _mesurer(cout: int) -> float:
+    debut = time.perf_counter()
+    bcrypt.hashpw(b"calibrage", bcrypt.gensalt(cout))
+    return time.perf_counter() - debut
+
+
+class HashPolicy:
+    """Algorithme et coût appliqués aux nouvelles empreintes de mots de passe"""
+
+    def __init__(self, cout: int, algorithme: str = ALGORITHME, latence: Optional[float] = None):
+        self.algorithme = algorithme
+        self.cout = cout
+        # Durée estimée d'un hachage à ce coût (None si non mesurée)
+        self.latence = latence
+
+    @classmethod
+    def calibrate(cls, cible: float = LATENCE_CIBLE, cout_min: int = COUT_MIN,
+                  cout_max: int = COUT_MAX) -> "HashPolicy":
+        """
+        Politique au coût le plus élevé dont le hachage prend au plus `cible`
+        secondes sur cette machine, dans les bornes [cout_min, cout_max]
+
+        La mesure se fait à un coût faible puis est extrapolée (quelques
+        dizaines de millisecondes au démarrage).
+        """
+        duree = min(_mesurer(COUT_MESURE) for _ in range(MESURES))
+        cout = COUT_MESURE + math.floor(math.log2(cible / duree)) if duree > 0 else cout_max
+        cout = max(cout_min, min(cout_max, cout))
+        return cls(cout, latence=duree * 2 ** (cout - COUT_MESURE))
+
+    def hash(self, password: str) -> str:
+        """Empreinte d'un mot de passe selon la politique"""
+        return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(self.cout)).decode('utf-8')
+
+    def needs_rehash(self, algorithme: Optional[str], cout: Optional[int]) -> bool:
+        """
+        Indique si une empreinte (algorithme, coût) doit être refaite
+
+        Seules les empreintes plus faibles que la politique sont refaites :
+        sur une machine plus lente, les empreintes existantes gardent leur
+        coût plutôt que d'être affaiblies.
+        """
+        return algorithme != self.algorithme or cout is None or cout < self.cout
+
+
+_policy: Optional[HashPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_hash_policy() -> HashPolicy:
+    """Politique du processus, calibrée lors du premier appel"""
+    global _policy
+    with _policy_lock:
+        if _policy is None:
+            _policy = HashPolicy.calibrate()
+        return _policy
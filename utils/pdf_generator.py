@@ -9,14 +9,360 @@ from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.units import cm
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from collections import OrderedDict
 from datetime import datetime
-from typing import Dict, List
+from typing import Callable, Dict, Iterable, Iterator, List, Optional
+from xml.sax.saxutils import escape
+import hashlib
 import io
+import itertools
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+# Version de la mise en page : la changer invalide les rapports en cache
+VERSION_RAPPORTS = 1
+
+# Taille maximale du cache des rapports en mémoire et sur disque (octets)
+CACHE_MEMOIRE_MAX = 32 * 1024 * 1024
+CACHE_DISQUE_MAX = 512 * 1024 * 1024
+
+# Nombre d'éléments de la story gardés en mémoire pendant la mise en page
+FLOWABLES_PAR_LOT = 20
+
+# Nombre de critères par tableau de l'annexe détaillée
+LIGNES_PAR_TABLEAU = 40
+
+# Nombre de tableaux de l'annexe mis en page dans chaque partie d'un rapport écrit sur disque
+TABLEAUX_PAR_PARTIE = 25
+
+# Ordre de grandeur du nombre d'éléments d'un rapport de conformité hors annexe
+ELEMENTS_SYNTHESE = 40
+
+
+def report_fingerprint(type_rapport: str, audit_id: Optional[int] = None, **donnees) -> str:
+    """
+    Empreinte des entrées d'un rapport : type, audit et contenu des données
+
+    Toute modification d'un critère ou d'un audit (statut, commentaire,
+    date de modification...) change l'empreinte, donc la clé du cache.
+    """
+    contenu = json.dumps([VERSION_RAPPORTS, type_rapport, audit_id, donnees],
+                         sort_keys=True, default=str, ensure_ascii=False)
+    return hashlib.sha256(contenu.encode('utf-8')).hexdigest()
+
+
+class ReportCache:
+    """
+    Cache LRU des rapports PDF, indexé par empreinte des données
+
+    Deux niveaux : les rapports récents en mémoire, tous les rapports sur
+    disque (un fichier par empreinte, l'heure de modification sert d'heure
+    de dernier accès). Chaque niveau évince les rapports les moins
+    récemment utilisés au-delà de sa taille maximale.
+    """
+
+    def __init__(self, directory: Optional[str] = None, memoire_max: int = CACHE_MEMOIRE_MAX,
+                 disque_max: int = CACHE_DISQUE_MAX):
+        self.directory = directory
+        self.memoire_max = memoire_max
+        self.disque_max = disque_max
+        self._memoire: "OrderedDict[str, bytes]" = OrderedDict()
+        self._taille_memoire = 0
+        self._lock = threading.Lock()
+
+    def _chemin(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.pdf")
+
+    def _memoriser(self, key: str, pdf: bytes):
+        if len(pdf) > self.memoire_max:
+            return
+        with self._lock:
+            if key in self._memoire:
+                self._taille_memoire -= len(self._memoire.pop(key))
+            self._memoire[key] = pdf
+            self._taille_memoire += len(pdf)
+            while self._taille_memoire > self.memoire_max:
+                _, ancien = self._memoire.popitem(last=False)
+                self._taille_memoire -= len(ancien)
+
+    def path(self, key: str) -> Optional[str]:
+        """Fichier du rapport en cache sur disque (marqué comme utilisé), ou None"""
+        if self.directory is None:
+            return None
+        chemin = self._chemin(key)
+        try:
+            os.utime(chemin)
+        except FileNotFoundError:
+            return None
+        return chemin
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Contenu du rapport en cache, depuis la mémoire puis le disque, ou None"""
+        with self._lock:
+            pdf = self._memoire.get(key)
+            if pdf is not None:
+                self._memoire.move_to_end(key)
+        if pdf is not None:
+            # Le fichier sur disque est marqué comme utilisé lui aussi
+            self.path(key)
+            return pdf
+        chemin = self.path(key)
+        if chemin is None:
+            return None
+        try:
+            with open(chemin, 'rb') as fichier:
+                pdf = fichier.read()
+        except FileNotFoundError:
+            return None
+        self._memoriser(key, pdf)
+        return pdf
+
+    def put(self, key: str, pdf: bytes):
+        """Met un rapport en cache (mémoire et disque)"""
+        self._memoriser(key, pdf)
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        fd, temporaire = tempfile.mkstemp(suffix=".tmp", dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as fichier:
+                fichier.write(pdf)
+            os.replace(temporaire, self._chemin(key))
+        except BaseException:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+            raise
+        self._evincer()
+
+    def put_file(self, key: str, chemin: str):
+        """Met en cache sur disque un rapport déjà écrit dans un fichier (lien physique, copie à défaut)"""
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        temporaire = f"{self._chemin(key)}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            try:
+                os.link(chemin, temporaire)
+            except OSError:
+                shutil.copyfile(chemin, temporaire)
+            os.replace(temporaire, self._chemin(key))
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        self._evincer()
+
+    def copy_to(self, key: str, destination: str) -> bool:
+        """
+        Copie un rapport en cache vers `destination` (lien physique, copie à défaut)
+
+        Returns:
+            False si le rapport n'est pas en cache
+        """
+        source = self.path(key)
+        if source is None:
+            return False
+        temporaire = f"{destination}.{os.getpid()}.tmp"
+        try:
+            try:
+                os.link(source, temporaire)
+            except FileNotFoundError:
+                return False
+            except OSError:
+                shutil.copyfile(source, temporaire)
+            os.replace(temporaire, destination)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        return True
+
+    def _evincer(self):
+        """Supprime les rapports les moins récemment utilisés au-delà de la taille maximale du disque"""
+        fichiers = []
+        for entree in os.scandir(self.directory):
+            if entree.name.endswith(".pdf") and entree.is_file():
+                infos = entree.stat()
+                fichiers.append((infos.st_mtime, infos.st_size, entree.path))
+        total = sum(taille for _, taille, _ in fichiers)
+        for _, taille, chemin in sorted(fichiers):
+            if total <= self.disque_max:
+                break
+            try:
+                os.remove(chemin)
+            except FileNotFoundError:
+                pass
+            total -= taille
+
+
+def _references(valeur, ignorer: Optional[str] = None) -> Iterator[int]:
+    """Numéros des objets indirects référencés par une valeur PDF (hors clé `ignorer`)"""
+    from pypdf.generic import IndirectObject
+
+    if isinstance(valeur, IndirectObject):
+        yield valeur.idnum
+    elif isinstance(valeur, dict):
+        for cle, element in dict.items(valeur):
+            if cle != ignorer:
+                yield from _references(element)
+    elif isinstance(valeur, list):
+        for element in list.__iter__(valeur):
+            yield from _references(element)
+
+
+def _renumeroter(valeur, numeros: Dict[int, int], ignorer: Optional[str] = None):
+    """Remplace sur place les références par les numéros de l'assemblage (hors clé `ignorer`)"""
+    from pypdf.generic import IndirectObject
+
+    if isinstance(valeur, IndirectObject):
+        return IndirectObject(numeros[valeur.idnum], 0, None)
+    if isinstance(valeur, dict):
+        for cle, element in list(dict.items(valeur)):
+            if cle != ignorer:
+                dict.__setitem__(valeur, cle, _renumeroter(element, numeros))
+    elif isinstance(valeur, list):
+        for i, element in enumerate(list.__iter__(valeur)):
+            list.__setitem__(valeur, i, _renumeroter(element, numeros))
+    return valeur
+
+
+def join_pdfs(parties: Iterable[str], destination: str) -> int:
+    """
+    Assemble des PDF bout à bout dans `destination`, sans charger le document entier
+
+    Les parties sont lues une à une : les objets de leurs pages (contenus,
+    polices, images) sont recopiés tels quels, renumérotés, dans le fichier
+    de sortie, puis la partie est oubliée. Seuls la position de chaque
+    objet et le numéro de chaque page sont gardés jusqu'à l'écriture de
+    l'arbre des pages et de la table des références croisées.
+
+    Returns:
+        Nombre de pages
+    """
+    from array import array
+    from pypdf import PdfReader
+    from pypdf.generic import IndirectObject, NameObject
+
+    arbre, catalogue = 1, 2
+    positions = array('Q', [0, 0])
+    pages = array('Q')
+    with open(destination, 'wb') as sortie:
+        sortie.write(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+        for partie in parties:
+            with open(partie, 'rb') as fichier:
+                lecteur = PdfReader(fichier)
+                pages_partie = [page.indirect_reference.idnum for page in lecteur.pages]
+                est_page = set(pages_partie)
+                # Objets atteints depuis les pages (le lien /Parent vers l'arbre d'origine est ignoré)
+                numeros: Dict[int, int] = {}
+                ordre = []
+                a_visiter = list(reversed(pages_partie))
+                while a_visiter:
+                    numero = a_visiter.pop()
+                    if numero in numeros:
+                        continue
+                    numeros[numero] = len(positions) + len(ordre) + 1
+                    ordre.append(numero)
+                    objet = lecteur.get_object(numero)
+                    a_visiter.extend(_references(objet, '/Parent' if numero in est_page else None))
+                pages.extend(numeros[numero] for numero in pages_partie)
+
+                for numero in ordre:
+                    objet = lecteur.get_object(numero)
+                    if numero in est_page:
+                        dict.__setitem__(objet, NameObject('/Parent'), IndirectObject(arbre, 0, None))
+                        objet = _renumeroter(objet, numeros, '/Parent')
+                    else:
+                        objet = _renumeroter(objet, numeros)
+                    positions.append(sortie.tell())
+                    sortie.write(f"{numeros[numero]} 0 obj\n".encode())
+                    objet.write_to_stream(sortie)
+                    sortie.write(b"\nendobj\n")
+
+        positions[arbre - 1] = sortie.tell()
+        sortie.write(f"{arbre} 0 obj\n<< /Type /Pages /Count {len(pages)} /Kids [".encode())
+        for numero in pages:
+            sortie.write(f" {numero} 0 R".encode())
+        sortie.write(b" ] >>\nendobj\n")
+        positions[catalogue - 1] = sortie.tell()
+        sortie.write(f"{catalogue} 0 obj\n<< /Type /Catalog /Pages {arbre} 0 R >>\nendobj\n".encode())
+
+        debut_xref = sortie.tell()
+        sortie.write(f"xref\n0 {len(positions) + 1}\n0000000000 65535 f \n".encode())
+        for position in positions:
+            sortie.write(f"{position:010d} 00000 n \n".encode())
+        sortie.write(f"trailer\n<< /Size {len(positions) + 1} /Root {catalogue} 0 R >>\n"
+                     f"startxref\n{debut_xref}\n%%EOF\n".encode())
+    return len(pages)
+
+
+class _StoryStream(list):
+    """
+    Story alimentée à la demande par un générateur
+
+    ReportLab consomme la story par l'avant (lecture, suppression,
+    réinsertion des éléments coupés) : la liste est réapprovisionnée par
+    lots quand elle se vide de moitié, elle ne contient jamais le rapport
+    entier.
+    """
+
+    def __init__(self, source: Iterable, lot: int):
+        super().__init__()
+        self._source = iter(source)
+        self._lot = lot
+        self._tires = 0
+        self._remplir()
+
+    def _remplir(self):
+        if self._source is None or list.__len__(self) > self._lot // 2:
+            return
+        manque = self._lot - list.__len__(self)
+        lot = list(itertools.islice(self._source, manque))
+        self._tires += len(lot)
+        self.extend(lot)
+        if len(lot) < manque:
+            self._source = None
+
+    def consumed(self) -> int:
+        """Nombre d'éléments déjà mis en page"""
+        return self._tires - list.__len__(self)
+
+    def __len__(self):
+        self._remplir()
+        return list.__len__(self)
+
+    def __getitem__(self, index):
+        self._remplir()
+        return list.__getitem__(self, index)
+
+
+# Caches partagés par le processus, indexés par dossier
+_caches: Dict[Optional[str], ReportCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_report_cache(directory: Optional[str] = None) -> ReportCache:
+    """Cache partagé par le processus pour un dossier (None : mémoire seule)"""
+    with _caches_lock:
+        cache = _caches.get(directory)
+        if cache is None:
+            cache = _caches[directory] = ReportCache(directory)
+        return cache
+
 
 class PDFGenerator:
-    def __init__(self):
-        """Initialise le générateur PDF"""
+    def __init__(self, progress: Optional[Callable[[float], None]] = None, cache: Optional[ReportCache] = None):
+        """
+        Initialise le générateur PDF
+
+        Args:
+            progress: Fonction appelée avec l'avancement de la mise en page (0 à 1)
+            cache: Cache des rapports ; un rapport dont les données n'ont pas changé n'est pas refait
+        """
         self.styles = getSampleStyleSheet()
+        self.progress = progress
+        self.cache = cache
         self._setup_custom_styles()
     
     def _setup_custom_styles(self):
@@ -53,6 +399,14 @@ class PDFGenerator:
             alignment=TA_LEFT
         ))
         
+        # Style des cellules de tableaux détaillés
+        self.styles.add(ParagraphStyle(
+            name='TableCell',
+            parent=self.styles['Normal'],
+            fontSize=8,
+            leading=10
+        ))
+        
         # Style pour le pied de page
         self.styles.add(ParagraphStyle(
             name='Footer',
@@ -61,8 +415,42 @@ class PDFGenerator:
             textColor=colors.grey,
             alignment=TA_CENTER
         ))
+
+    def _from_cache(self, cle: Optional[str]) -> Optional[bytes]:
+        """Rapport déjà généré pour ces données (avancement signalé comme terminé), ou None"""
+        if cle is None:
+            return None
+        pdf_data = self.cache.get(cle)
+        if pdf_data is not None and self.progress is not None:
+            self.progress(1.0)
+        return pdf_data
+
+    def _build(self, doc: SimpleDocTemplate, story: Iterable, estimation: Optional[int] = None):
+        """
+        Construit le document en signalant l'avancement, si un suivi est demandé
+        
+        Une story fournie par un générateur est consommée par lots de
+        FLOWABLES_PAR_LOT éléments : seuls les éléments du lot en cours sont
+        gardés, pas ceux de tout le rapport. Les pages déjà produites restent
+        dans le document en construction.
+        """
+        if not isinstance(story, list):
+            story = _StoryStream(story, FLOWABLES_PAR_LOT)
+        if self.progress is not None:
+            total = [max(estimation or 1, 1)]
+
+            def suivre(etape, valeur):
+                if etape == 'SIZE_EST' and estimation is None:
+                    total[0] = max(valeur, 1)
+                elif etape == 'PROGRESS':
+                    fait = story.consumed() if isinstance(story, _StoryStream) else valeur
+                    self.progress(min(fait / total[0], 1.0))
+
+            doc.setProgressCallBack(suivre)
+        doc.build(story)
     
-    def generate_conformity_report(self, stats: Dict, criteres: List[Dict], filename: str = None) -> bytes:
+    def generate_conformity_report(self, stats: Dict, criteres: List[Dict], filename: str = None,
+                                   detail: bool = False) -> bytes:
         """
         Génère un rapport de conformité complet
         
@@ -70,34 +458,165 @@ class PDFGenerator:
             stats: Statistiques de conformité
             criteres: Liste des critères
             filename: Nom du fichier (optionnel)
+            detail: Ajouter l'annexe détaillant chaque critère et son commentaire
         
         Returns:
             Contenu PDF en bytes
         """
+        cle = self._conformity_key(stats, criteres, detail)
+        pdf_data = self._from_cache(cle)
+        if pdf_data is not None:
+            return pdf_data
+        
         buffer = io.BytesIO()
-        doc = SimpleDocTemplate(
-            buffer,
+        self._build_conformity(buffer, stats, criteres, detail)
+        pdf_data = buffer.getvalue()
+        buffer.close()
+        
+        if self.cache is not None:
+            self.cache.put(cle, pdf_data)
+        
+        return pdf_data
+
+    def write_conformity_report(self, stats: Dict, criteres: List[Dict], path: str, detail: bool = False) -> int:
+        """
+        Écrit le rapport de conformité directement dans un fichier
+        
+        Pour les gros rapports (annexe détaillée de milliers de critères),
+        ReportLab garde en mémoire toutes les pages du document qu'il
+        construit : l'annexe est donc mise en page par parties de
+        TABLEAUX_PAR_PARTIE tableaux, chacune dans son fichier temporaire,
+        puis les parties sont assemblées sur disque (voir join_pdfs). La
+        mémoire utilisée ne dépend que de la taille d'une partie.
+        
+        Returns:
+            Taille du fichier (octets)
+        """
+        cle = self._conformity_key(stats, criteres, detail)
+        if cle is not None and self.cache.copy_to(cle, path):
+            if self.progress is not None:
+                self.progress(1.0)
+            return os.path.getsize(path)
+        
+        temporaire = f"{path}.{os.getpid()}.tmp"
+        dossier = tempfile.mkdtemp(prefix="parties_", dir=os.path.dirname(os.path.abspath(path)))
+        suivi = self.progress
+        try:
+            parties = list(self._conformity_parts(stats, criteres, detail))
+            if len(parties) == 1:
+                self._build(self._document(temporaire), parties[0], ELEMENTS_SYNTHESE)
+            else:
+                chemins = []
+                for i, partie in enumerate(parties):
+                    if suivi is not None:
+                        # Avancement global : chaque partie compte pour une part égale
+                        self.progress = lambda fraction, i=i: suivi((i + fraction) / len(parties))
+                    chemins.append(os.path.join(dossier, f"partie_{i:05d}.pdf"))
+                    self._build(self._document(chemins[-1]), partie,
+                                ELEMENTS_SYNTHESE if i == 0 else TABLEAUX_PAR_PARTIE)
+                join_pdfs(chemins, temporaire)
+            os.replace(temporaire, path)
+        finally:
+            self.progress = suivi
+            shutil.rmtree(dossier, ignore_errors=True)
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        
+        if self.cache is not None:
+            self.cache.put_file(cle, path)
+        return os.path.getsize(path)
+
+    def _conformity_key(self, stats: Dict, criteres: List[Dict], detail: bool) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return report_fingerprint('conformite_detaille' if detail else 'conformite', stats=stats, criteres=criteres)
+
+    @staticmethod
+    def _document(output) -> SimpleDocTemplate:
+        """Document A4 du rapport de conformité (ou d'une de ses parties)"""
+        return SimpleDocTemplate(
+            output,
             pagesize=A4,
             rightMargin=2*cm,
             leftMargin=2*cm,
             topMargin=2*cm,
-            bottomMargin=2*cm
+            bottomMargin=2*cm,
+            pageCompression=1
         )
+
+    def _build_conformity(self, output, stats: Dict, criteres: List[Dict], detail: bool):
+        """Met en page le rapport de conformité dans `output` (chemin ou fichier binaire)"""
+        # Ordre de grandeur du nombre d'éléments, pour le suivi de l'avancement
+        estimation = ELEMENTS_SYNTHESE
+        if detail:
+            estimation += -(-len(criteres) // LIGNES_PAR_TABLEAU)
+        self._build(self._document(output), self._conformity_story(stats, criteres, detail), estimation)
+
+    def _conformity_story(self, stats: Dict, criteres: List[Dict], detail: bool) -> Iterator:
+        """Éléments du rapport de conformité, produits à la demande"""
+        date_rapport = datetime.now().strftime('%d/%m/%Y à %H:%M')
+        yield from self._conformity_summary(stats, criteres, date_rapport)
         
-        story = []
+        # Annexe : détail de tous les critères, produit au fil de la mise en page
+        if detail:
+            yield PageBreak()
+            yield Paragraph("ANNEXE : DÉTAIL DES CRITÈRES", self.styles['CustomSubtitle'])
+            yield from self._criteria_detail_tables(criteres)
+            yield Spacer(1, 1*cm)
         
+        yield from self._conformity_footer(date_rapport)
+
+    def _conformity_parts(self, stats: Dict, criteres: List[Dict], detail: bool) -> Iterator[Iterator]:
+        """
+        Story du rapport de conformité découpée en parties mises en page séparément
+
+        La synthèse forme la première partie ; l'annexe suit par tranches de
+        TABLEAUX_PAR_PARTIE tableaux, chaque partie commençant une page.
+        """
+        date_rapport = datetime.now().strftime('%d/%m/%Y à %H:%M')
+        tableaux = -(-len(criteres) // LIGNES_PAR_TABLEAU) if detail else 0
+        if not tableaux:
+            yield itertools.chain(self._conformity_summary(stats, criteres, date_rapport),
+                                  self._conformity_footer(date_rapport))
+            return
+        yield self._conformity_summary(stats, criteres, date_rapport)
+        
+        detail_tables = self._criteria_detail_tables(criteres)
+        nombre = -(-tableaux // TABLEAUX_PAR_PARTIE)
+        for i in range(nombre):
+            partie = itertools.islice(detail_tables, TABLEAUX_PAR_PARTIE)
+            if i == 0:
+                partie = itertools.chain(
+                    [Paragraph("ANNEXE : DÉTAIL DES CRITÈRES", self.styles['CustomSubtitle'])], partie)
+            if i == nombre - 1:
+                partie = itertools.chain(partie, [Spacer(1, 1*cm)], self._conformity_footer(date_rapport))
+            yield partie
+
+    def _conformity_footer(self, date_rapport: str) -> Iterator:
+        """Pied du rapport de conformité"""
+        yield Paragraph("_" * 80, self.styles['Footer'])
+        yield Paragraph(
+            f"Rapport généré par Sécurité 360 - {date_rapport}",
+            self.styles['Footer']
+        )
+        yield Paragraph(
+            "Document confidentiel - ISO 27001",
+            self.styles['Footer']
+        )
+
+    def _conformity_summary(self, stats: Dict, criteres: List[Dict], date_rapport: str) -> Iterator:
+        """Synthèse du rapport de conformité (résumé, catégories, non-conformités, recommandations)"""
         # En-tête du rapport
-        story.append(Paragraph("RAPPORT DE CONFORMITÉ ISO 27001", self.styles['CustomTitle']))
-        story.append(Spacer(1, 0.5*cm))
+        yield Paragraph("RAPPORT DE CONFORMITÉ ISO 27001", self.styles['CustomTitle'])
+        yield Spacer(1, 0.5*cm)
         
         # Informations générales
-        date_rapport = datetime.now().strftime('%d/%m/%Y à %H:%M')
-        story.append(Paragraph(f"<b>Date du rapport:</b> {date_rapport}", self.styles['CustomBody']))
-        story.append(Paragraph(f"<b>Système:</b> Sécurité 360", self.styles['CustomBody']))
-        story.append(Spacer(1, 1*cm))
+        yield Paragraph(f"<b>Date du rapport:</b> {date_rapport}", self.styles['CustomBody'])
+        yield Paragraph(f"<b>Système:</b> Sécurité 360", self.styles['CustomBody'])
+        yield Spacer(1, 1*cm)
         
         # Résumé exécutif
-        story.append(Paragraph("RÉSUMÉ EXÉCUTIF", self.styles['CustomSubtitle']))
+        yield Paragraph("RÉSUMÉ EXÉCUTIF", self.styles['CustomSubtitle'])
         
         taux_conformite = stats.get('taux_conformite', 0)
         total = stats.get('total', 0)
@@ -127,11 +646,11 @@ class PDFGenerator:
             ('FONTNAME', (0, 1), (0, -1), 'Helvetica-Bold'),
         ]))
         
-        story.append(summary_table)
-        story.append(Spacer(1, 1*cm))
+        yield summary_table
+        yield Spacer(1, 1*cm)
         
         # Analyse par catégorie
-        story.append(Paragraph("ANALYSE PAR CATÉGORIE", self.styles['CustomSubtitle']))
+        yield Paragraph("ANALYSE PAR CATÉGORIE", self.styles['CustomSubtitle'])
         
         categories = {}
         for critere in criteres:
@@ -171,11 +690,11 @@ class PDFGenerator:
             ('ALIGN', (0, 1), (0, -1), 'LEFT'),
         ]))
         
-        story.append(cat_table)
-        story.append(PageBreak())
+        yield cat_table
+        yield PageBreak()
         
         # Détail des critères non conformes
-        story.append(Paragraph("CRITÈRES NON CONFORMES", self.styles['CustomSubtitle']))
+        yield Paragraph("CRITÈRES NON CONFORMES", self.styles['CustomSubtitle'])
         
         non_conformes = [c for c in criteres if c['statut'] == 'Non conforme']
         
@@ -201,14 +720,14 @@ class PDFGenerator:
                 ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
             ]))
             
-            story.append(nc_table)
+            yield nc_table
         else:
-            story.append(Paragraph("Aucun critère non conforme. Félicitations!", self.styles['CustomBody']))
+            yield Paragraph("Aucun critère non conforme. Félicitations!", self.styles['CustomBody'])
         
-        story.append(Spacer(1, 1*cm))
+        yield Spacer(1, 1*cm)
         
         # Recommandations
-        story.append(Paragraph("RECOMMANDATIONS", self.styles['CustomSubtitle']))
+        yield Paragraph("RECOMMANDATIONS", self.styles['CustomSubtitle'])
         
         if taux_conformite < 50:
             recommandation = "Le taux de conformité est critique. Il est impératif de mettre en place un plan d'action prioritaire pour traiter les critères non conformes."
@@ -217,8 +736,8 @@ class PDFGenerator:
         else:
             recommandation = "Le taux de conformité est bon. Continuez les efforts pour maintenir et améliorer ce niveau."
         
-        story.append(Paragraph(recommandation, self.styles['CustomBody']))
-        story.append(Spacer(1, 0.5*cm))
+        yield Paragraph(recommandation, self.styles['CustomBody'])
+        yield Spacer(1, 0.5*cm)
         
         recommendations = [
             "Établir un calendrier de revue des critères non conformes",
@@ -229,28 +748,35 @@ class PDFGenerator:
         ]
         
         for rec in recommendations:
-            story.append(Paragraph(f"• {rec}", self.styles['CustomBody']))
-        
-        story.append(Spacer(1, 2*cm))
-        
-        # Pied de page
-        story.append(Paragraph("_" * 80, self.styles['Footer']))
-        story.append(Paragraph(
-            f"Rapport généré par Sécurité 360 - {date_rapport}",
-            self.styles['Footer']
-        ))
-        story.append(Paragraph(
-            "Document confidentiel - ISO 27001",
-            self.styles['Footer']
-        ))
+            yield Paragraph(f"• {rec}", self.styles['CustomBody'])
         
-        # Construction du PDF
-        doc.build(story)
-        
-        pdf_data = buffer.getvalue()
-        buffer.close()
-        
-        return pdf_data
+        yield Spacer(1, 2*cm)
+
+    def _criteria_detail_tables(self, criteres: List[Dict]) -> Iterator[Table]:
+        """Un tableau par tranche de LIGNES_PAR_TABLEAU critères, construit au moment d'être mis en page"""
+        cellule = self.styles['TableCell']
+        style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e40af')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, -1), 8),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+        ])
+        entete = ['Code', 'Critère', 'Statut', 'Commentaire']
+        lignes = []
+        for critere in criteres:
+            lignes.append([
+                critere['code'],
+                Paragraph(escape(critere['titre']), cellule),
+                Paragraph(escape(critere['statut'] or ''), cellule),
+                Paragraph(escape(critere.get('commentaire') or ''), cellule)
+            ])
+            if len(lignes) == LIGNES_PAR_TABLEAU:
+                yield Table([entete] + lignes, colWidths=[1.5*cm, 6*cm, 3.5*cm, 6*cm], repeatRows=1, style=style)
+                lignes = []
+        if lignes:
+            yield Table([entete] + lignes, colWidths=[1.5*cm, 6*cm, 3.5*cm, 6*cm], repeatRows=1, style=style)
     
     def generate_audit_report(self, audit: Dict, criteres: List[Dict]) -> bytes:
         """
@@ -263,6 +789,11 @@ class PDFGenerator:
         Returns:
             Contenu PDF en bytes
         """
+        cle = report_fingerprint('audit', audit.get('id'), audit=audit, criteres=criteres) if self.cache is not None else None
+        pdf_data = self._from_cache(cle)
+        if pdf_data is not None:
+            return pdf_data
+        
         buffer = io.BytesIO()
         doc = SimpleDocTemplate(
             buffer,
@@ -297,9 +828,12 @@ class PDFGenerator:
         story.append(Paragraph("RÉSULTATS DÉTAILLÉS", self.styles['CustomSubtitle']))
         
         # Construction du PDF
-        doc.build(story)
+        self._build(doc, story)
         
         pdf_data = buffer.getvalue()
         buffer.close()
         
+        if self.cache is not None:
+            self.cache.put(cle, pdf_data)
+        
         return pdf_data
\ No newline at end of file
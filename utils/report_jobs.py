@@ -0,0 +1,376 @@
+"""
+File de génération des rapports PDF
+Les rapports sont mis en page dans un pool de processus ; l'état des
+demandes (statut, avancement) est enregistré dans la table rapports_jobs
+et les PDF terminés sont conservés sur disque
+"""
+
+import multiprocessing
+import os
+import threading
+import time
+import uuid
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor, wait as attendre
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timedelta
+from typing import Dict, IO, List, Optional
+
+from utils.pdf_generator import PDFGenerator, get_report_cache, report_fingerprint
+
+# Nombre de processus de génération : la mise en page ReportLab occupe un cœur par rapport
+WORKERS = os.cpu_count() or 2
+
+# Durée de conservation des rapports générés
+DELAI_CONSERVATION = timedelta(days=7)
+
+# Écart minimal d'avancement transmis par les processus (évite d'écrire en base à chaque élément)
+PAS_AVANCEMENT = 0.02
+
+# Types de rapports pris en charge
+TYPES = {
+    'conformite': "Rapport de conformité global",
+    'conformite_detaille': "Rapport de conformité détaillé",
+    'audit': "Rapport d'audit",
+}
+
+EN_ATTENTE = 'en_attente'
+EN_COURS = 'en_cours'
+TERMINE = 'termine'
+ECHEC = 'echec'
+
+
+class ReportError(Exception):
+    """Demande de rapport invalide ou rapport indisponible"""
+
+
+def report_dir(db) -> str:
+    """Dossier des rapports générés : « rapports » à côté du fichier de base"""
+    base = os.getcwd() if db.db_path == ':memory:' else os.path.dirname(os.path.abspath(db.db_path))
+    return os.path.join(base, "rapports")
+
+
+def download_name(job: Dict) -> str:
+    """Nom de fichier proposé au téléchargement d'un rapport"""
+    horodatage = datetime.strptime(job['date_demande'], '%Y-%m-%d %H:%M:%S').strftime('%Y%m%d_%H%M%S')
+    if job['type'] == 'audit':
+        return f"rapport_audit_{job['audit_id']}_{horodatage}.pdf"
+    return f"rapport_{job['type']}_{horodatage}.pdf"
+
+
+# File d'avancement, transmise aux processus du pool à leur démarrage
+_avancement = None
+
+
+def _init_worker(file_avancement):
+    global _avancement
+    _avancement = file_avancement
+
+
+def render(job_id: str, type_rapport: str, donnees: Dict, chemin: str, cache: Optional[str] = None) -> int:
+    """
+    Met en page un rapport et l'écrit dans `chemin` (exécuté dans un processus du pool)
+
+    L'avancement est envoyé au processus principal par la file reçue à
+    l'initialisation du processus. Le rapport est mis dans le cache
+    `cache` (dossier partagé par les processus) s'il est fourni.
+
+    Returns:
+        Taille du PDF (octets)
+    """
+    dernier = [-1.0]
+
+    def signaler(fraction: float):
+        if _avancement is not None and (fraction - dernier[0] >= PAS_AVANCEMENT or fraction >= 1.0):
+            dernier[0] = fraction
+            _avancement.put((job_id, fraction))
+
+    signaler(0.0)
+    generateur = PDFGenerator(progress=signaler, cache=get_report_cache(cache) if cache else None)
+    if type_rapport != 'audit':
+        # Annexe mise en page par parties assemblées sur disque : la mémoire du
+        # processus ne dépend pas de la taille du rapport
+        return generateur.write_conformity_report(donnees['stats'], donnees['criteres'], chemin,
+                                                  detail=type_rapport == 'conformite_detaille')
+
+    pdf = generateur.generate_audit_report(donnees['audit'], donnees['criteres'])
+    temporaire = f"{chemin}.{os.getpid()}.tmp"
+    with open(temporaire, 'wb') as fichier:
+        fichier.write(pdf)
+    os.replace(temporaire, chemin)
+    return len(pdf)
+
+
+class ReportQueue:
+    """
+    File des demandes de rapports PDF
+
+    submit() enregistre la demande et rend la main immédiatement : la page
+    suit l'avancement par status() et sert le PDF par open() une fois la
+    demande terminée. Les données du rapport sont lues à la demande (le
+    rapport reflète l'état au moment du clic), la mise en page se fait dans
+    un processus « spawn » pour ne pas bloquer les sessions Streamlit.
+    Un rapport déjà produit pour les mêmes données est repris du cache
+    sans repasser par le pool.
+    """
+
+    def __init__(self, db, directory: Optional[str] = None, workers: int = WORKERS):
+        self.db = db
+        self.directory = directory or report_dir(db)
+        self.workers = workers
+        self.cache = get_report_cache(os.path.join(self.directory, "cache"))
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._file = None
+        self._lock = threading.Lock()
+        self._en_cours: Dict[str, Future] = {}
+
+    def _pool(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            contexte = multiprocessing.get_context('spawn')
+            self._file = contexte.SimpleQueue()
+            self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=contexte,
+                                                 initializer=_init_worker, initargs=(self._file,))
+            threading.Thread(target=self._suivre_avancement, args=(self._file,),
+                             name="rapports-avancement", daemon=True).start()
+        return self._executor
+
+    def _suivre_avancement(self, file_avancement):
+        while True:
+            message = file_avancement.get()
+            if message is None:
+                return
+            job_id, fraction = message
+            try:
+                self.db.set_report_job_progress(job_id, fraction)
+            except Exception:
+                # L'avancement est indicatif : une base momentanément verrouillée ne doit pas arrêter le suivi
+                pass
+
+    def _donnees(self, type_rapport: str, audit_id: Optional[int]) -> Dict:
+        if type_rapport == 'audit':
+            audit = self.db.get_audit_by_id(audit_id) if audit_id is not None else None
+            if audit is None:
+                raise ReportError(f"Audit introuvable : {audit_id}")
+            return {'audit': audit, 'criteres': self.db.get_all_criteres()}
+        return {'stats': self.db.get_conformity_stats(), 'criteres': self.db.get_all_criteres()}
+
+    def submit(self, type_rapport: str, audit_id: Optional[int] = None,
+               demande_par: Optional[str] = None) -> str:
+        """
+        Demande la génération d'un rapport
+
+        Une demande identique encore en attente ou en cours pour le même
+        utilisateur est réutilisée (double clic, onglet rechargé).
+
+        Args:
+            type_rapport: 'conformite', 'conformite_detaille' ou 'audit'
+            audit_id: Audit concerné (rapport d'audit)
+            demande_par: Utilisateur
+
+        Returns:
+            Identifiant de la demande
+        """
+        if type_rapport not in TYPES:
+            raise ReportError(f"Type de rapport inconnu : {type_rapport}")
+        existante = self.db.find_active_report_job(type_rapport, audit_id, demande_par)
+        if existante is not None and existante['id'] in self._en_cours:
+            return existante['id']
+        donnees = self._donnees(type_rapport, audit_id)
+        return self._planifier(type_rapport, audit_id, donnees, demande_par)
+
+    def submit_batch(self, audit_ids: Optional[List[int]] = None, demande_par: Optional[str] = None) -> str:
+        """
+        Demande les rapports de plusieurs audits (tous par défaut), générés en parallèle
+
+        Chaque audit est une demande à part entière, avec son propre
+        avancement ; les demandes sont réparties sur les processus du pool.
+        L'archive ZIP du lot est produite par bundle() une fois le lot terminé.
+
+        Returns:
+            Identifiant du lot
+        """
+        if audit_ids is None:
+            audit_ids = [audit['id'] for audit in self.db.iter_audits()]
+        audits = [audit for audit in map(self.db.get_audit_by_id, audit_ids) if audit is not None]
+        if not audits:
+            raise ReportError("Aucun audit à inclure dans le lot")
+        # Critères lus une seule fois pour tout le lot
+        criteres = self.db.get_all_criteres()
+        lot = uuid.uuid4().hex
+        for audit in audits:
+            self._planifier('audit', audit['id'], {'audit': audit, 'criteres': criteres}, demande_par, lot)
+        return lot
+
+    def _planifier(self, type_rapport: str, audit_id: Optional[int], donnees: Dict,
+                   demande_par: Optional[str], lot: Optional[str] = None) -> str:
+        job_id = uuid.uuid4().hex
+        self.db.create_report_job(job_id, type_rapport, audit_id, demande_par, lot)
+        os.makedirs(self.directory, exist_ok=True)
+        chemin = os.path.join(self.directory, f"{job_id}.pdf")
+        if self.cache.copy_to(report_fingerprint(type_rapport, audit_id, **donnees), chemin):
+            self.db.finish_report_job(job_id, chemin, os.path.getsize(chemin))
+        else:
+            self._lancer(job_id, type_rapport, donnees)
+        return job_id
+
+    def _lancer(self, job_id: str, type_rapport: str, donnees: Dict):
+        os.makedirs(self.directory, exist_ok=True)
+        chemin = os.path.join(self.directory, f"{job_id}.pdf")
+        with self._lock:
+            future = self._pool().submit(render, job_id, type_rapport, donnees, chemin, self.cache.directory)
+            self._en_cours[job_id] = future
+        future.add_done_callback(lambda f: self._terminer(job_id, chemin, f))
+
+    def _terminer(self, job_id: str, chemin: str, future: Future):
+        try:
+            taille = future.result()
+            self.db.finish_report_job(job_id, chemin, taille)
+        except BrokenProcessPool:
+            # Processus tué (mémoire, arrêt) : pool recréé à la prochaine demande
+            with self._lock:
+                if self._executor is not None:
+                    self._file.put(None)
+                    self._executor = None
+            self.db.finish_report_job(job_id, erreur="Processus de génération interrompu, relancez la demande")
+        except Exception as e:
+            self.db.finish_report_job(job_id, erreur=f"{type(e).__name__}: {e}")
+        finally:
+            with self._lock:
+                self._en_cours.pop(job_id, None)
+
+    def resume_interrupted(self) -> int:
+        """Relance les demandes interrompues par un arrêt du serveur ; retourne leur nombre"""
+        relancees = 0
+        for job in self.db.get_interrupted_report_jobs():
+            if job['id'] in self._en_cours:
+                continue
+            try:
+                donnees = self._donnees(job['type'], job['audit_id'])
+            except ReportError as e:
+                self.db.finish_report_job(job['id'], erreur=str(e))
+                continue
+            self.db.reset_report_job(job['id'])
+            self._lancer(job['id'], job['type'], donnees)
+            relancees += 1
+        return relancees
+
+    def status(self, job_id: str) -> Optional[Dict]:
+        """État d'une demande (statut, progression, chemin, erreur...) ou None"""
+        return self.db.get_report_job(job_id)
+
+    def batch(self, lot: str) -> List[Dict]:
+        """Demandes d'un lot (une par audit), avec leur avancement"""
+        return self.db.get_report_batch(lot)
+
+    def bundle(self, lot: str) -> str:
+        """
+        Regroupe les rapports d'un lot terminé dans une archive ZIP sur disque
+
+        Les PDF sont copiés un à un dans l'archive, par blocs et sans
+        recompression ; les audits en échec sont listés dans erreurs.txt.
+        L'archive n'est produite qu'une fois par lot.
+
+        Returns:
+            Chemin de l'archive
+        """
+        jobs = self.db.get_report_batch(lot)
+        if not jobs:
+            raise ReportError(f"Lot inconnu ou expiré : {lot}")
+        if any(job['statut'] in (EN_ATTENTE, EN_COURS) for job in jobs):
+            raise ReportError("Lot en cours de génération")
+        chemin = os.path.join(self.directory, f"lot_{lot}.zip")
+        if os.path.exists(chemin):
+            return chemin
+
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        try:
+            with zipfile.ZipFile(temporaire, 'w', zipfile.ZIP_STORED, allowZip64=True) as archive:
+                erreurs = []
+                for job in jobs:
+                    if job['statut'] == TERMINE and os.path.exists(job['chemin']):
+                        archive.write(job['chemin'], download_name(job))
+                    else:
+                        erreurs.append(f"Audit {job['audit_id']} : {job['erreur'] or 'rapport expiré'}")
+                if erreurs:
+                    archive.writestr("erreurs.txt", "\n".join(erreurs) + "\n")
+            os.replace(temporaire, chemin)
+        finally:
+            if os.path.exists(temporaire):
+                os.remove(temporaire)
+        return chemin
+
+    def jobs(self, demande_par: Optional[str] = None, limit: int = 20) -> List[Dict]:
+        """Demandes les plus récentes, de la plus récente à la plus ancienne"""
+        return self.db.get_report_jobs(demande_par, limit)
+
+    def open(self, job_id: str) -> IO[bytes]:
+        """Ouvre le PDF d'une demande terminée en lecture binaire"""
+        job = self.db.get_report_job(job_id)
+        if job is None or job['statut'] != TERMINE:
+            raise ReportError("Rapport pas encore disponible")
+        try:
+            return open(job['chemin'], 'rb')
+        except FileNotFoundError:
+            raise ReportError("Rapport expiré, relancez la génération")
+
+    def purge_expired(self, delai: timedelta = DELAI_CONSERVATION) -> int:
+        """Supprime les demandes closes depuis plus de `delai` et leurs PDF ; retourne leur nombre"""
+        limite = (datetime.now() - delai).strftime('%Y-%m-%d %H:%M:%S')
+        expirees = self.db.get_expired_report_jobs(limite)
+        for job in expirees:
+            if job['chemin']:
+                try:
+                    os.remove(job['chemin'])
+                except FileNotFoundError:
+                    pass
+            self.db.delete_report_job(job['id'])
+        # Archives des lots produites avant le délai
+        seuil = time.time() - delai.total_seconds()
+        if os.path.isdir(self.directory):
+            for entree in os.scandir(self.directory):
+                if entree.name.startswith("lot_") and entree.name.endswith(".zip") and entree.stat().st_mtime < seuil:
+                    os.remove(entree.path)
+        return len(expirees)
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Attend la fin des demandes en cours et de leur enregistrement ; False si le délai expire"""
+        limite = None if timeout is None else time.monotonic() + timeout
+        while True:
+            with self._lock:
+                futures = list(self._en_cours.values())
+            if not futures:
+                return True
+            restant = None if limite is None else limite - time.monotonic()
+            if restant is not None and restant <= 0:
+                return False
+            attendre(futures, timeout=0.05 if restant is None else min(restant, 0.05))
+
+    def shutdown(self):
+        """Arrête le pool après les demandes en cours"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+            self._file.put(None)
+
+
+# Files partagées par le processus, indexées par dossier de rapports
+_queues: Dict[str, ReportQueue] = {}
+_queues_lock = threading.Lock()
+
+
+def get_report_queue(db) -> ReportQueue:
+    """
+    File partagée par le processus pour la base donnée
+
+    À la création, les demandes interrompues par un redémarrage sont
+    relancées et les rapports expirés supprimés.
+    """
+    directory = report_dir(db)
+    with _queues_lock:
+        queue = _queues.get(directory)
+        if queue is None or queue.db is not db:
+            queue = ReportQueue(db, directory)
+            _queues[directory] = queue
+            queue.purge_expired()
+            queue.resume_interrupted()
+        return queue
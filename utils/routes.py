@@ -0,0 +1,478 @@
+"""
+Routes HTTP servies à côté des pages Streamlit (voir serveur.py)
+Les fichiers volumineux (preuves, rapports) sont envoyés en flux, bloc par
+bloc depuis le disque, avec reprise (en-tête Range, réponses 206), et reçus
+du navigateur par morceaux reprenables (UploadSpool) : ils ne passent ni par
+la mémoire de la session ni par la connexion WebSocket.
+L'accès se fait par un ticket à durée limitée, émis par une page pour
+l'utilisateur connecté et lié au client (adresse IP, navigateur).
+Le cookie de session (HttpOnly) est posé par la route /api/session contre un
+code d'activation à usage unique : le jeton n'apparaît jamais dans l'URL
+"""
+
+import hashlib
+import os
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import IO, Callable, Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+from utils.sessions import SESSION_COOKIE, client_fingerprint, token_hash
+
+# Préfixe des routes (les chemins /_stcore/, /media/... sont réservés à Streamlit)
+PREFIXE = "/api"
+
+# Durée de validité d'un ticket de téléchargement
+DUREE_TICKET = timedelta(hours=1)
+
+# Durée de validité d'un ticket de téléversement (un gros fichier peut prendre des heures)
+DUREE_TELEVERSEMENT = timedelta(hours=12)
+
+# Durée de validité d'un code d'activation du cookie de session
+DUREE_ACTIVATION = timedelta(minutes=5)
+
+# Taille maximale du corps JSON d'ouverture d'un téléversement
+TAILLE_JSON_MAX = 16 * 1024
+
+# Nombre de tickets gardés en mémoire (les plus anciens sont oubliés au-delà)
+TICKETS_MAX = 4096
+
+# Taille des blocs lus et envoyés
+BLOC = 1024 * 1024
+
+# Adresses de bouclage : Streamlit les présente comme « pas d'adresse » (st.context.ip_address)
+_BOUCLAGE = {"127.0.0.1", "::1"}
+
+# Les routes sont servies (application lancée par serveur.py)
+_actives = False
+
+
+class RangeNotSatisfiable(Exception):
+    """Plage demandée hors du fichier"""
+
+
+def parse_range(entete: Optional[str], taille: int) -> Optional[Tuple[int, int]]:
+    """
+    Plage d'octets demandée par un en-tête Range
+
+    Seules les plages simples sont prises en charge ; une demande de
+    plusieurs plages reçoit le fichier entier (permis par la RFC 9110).
+
+    Args:
+        entete: Valeur de l'en-tête Range (ex: 'bytes=0-1023', 'bytes=-500')
+        taille: Taille du fichier
+
+    Returns:
+        (début, fin) inclus, ou None pour envoyer le fichier entier ;
+        lève RangeNotSatisfiable si la plage est hors du fichier
+    """
+    if not entete:
+        return None
+    unite, _, plage = entete.partition("=")
+    if unite.strip().lower() != "bytes" or "," in plage:
+        return None
+    debut, tiret, fin = plage.strip().partition("-")
+    if not tiret:
+        return None
+    try:
+        if not debut:
+            # Suffixe : les N derniers octets
+            longueur = int(fin)
+            if longueur <= 0 or taille == 0:
+                raise RangeNotSatisfiable(plage)
+            return max(0, taille - longueur), taille - 1
+        debut = int(debut)
+        fin = int(fin) if fin else taille - 1
+    except ValueError:
+        return None
+    if debut >= taille:
+        raise RangeNotSatisfiable(plage)
+    if debut < 0 or debut > fin:
+        return None
+    return debut, min(fin, taille - 1)
+
+
+def iter_file(fichier: IO[bytes], debut: int, longueur: int, bloc: int = BLOC):
+    """Lit `longueur` octets depuis `debut` par blocs, puis ferme le fichier"""
+    try:
+        fichier.seek(debut)
+        while longueur > 0:
+            donnees = fichier.read(min(bloc, longueur))
+            if not donnees:
+                break
+            longueur -= len(donnees)
+            yield donnees
+    finally:
+        fichier.close()
+
+
+def content_disposition(nom: str) -> str:
+    """En-tête Content-Disposition d'un téléchargement (nom non ASCII selon la RFC 6266)"""
+    ascii_nom = nom.encode('ascii', 'replace').decode('ascii').replace('?', '_').replace('"', '_')
+    return f"attachment; filename=\"{ascii_nom}\"; filename*=UTF-8''{quote(nom, safe='')}"
+
+
+def request_client(request) -> str:
+    """Identité du client d'une requête HTTP, calculée comme celle de la session Streamlit"""
+    ip = request.client.host if request.client else None
+    return client_fingerprint(None if ip in _BOUCLAGE else ip, request.headers.get("user-agent"))
+
+
+def script_client() -> str:
+    """Identité du client de la session Streamlit en cours (voir Auth._client)"""
+    import streamlit as st
+
+    ip = getattr(st.context, "ip_address", None)
+    return client_fingerprint(ip if isinstance(ip, str) else None, st.context.headers.get("User-Agent"))
+
+
+class TicketStore:
+    """Tickets d'accès en mémoire : empreinte (ticket, client) -> objet et expiration"""
+
+    def __init__(self, taille_max: int = TICKETS_MAX):
+        self.taille_max = taille_max
+        self._tickets: "OrderedDict[str, Tuple[Dict, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def issue(self, objet: Dict, client: str, duree: timedelta = DUREE_TICKET) -> str:
+        """Émet un ticket pour `objet`, valable pour ce client seulement"""
+        ticket = secrets.token_urlsafe(32)
+        with self._lock:
+            self._tickets[token_hash(ticket, client)] = (objet, datetime.now() + duree)
+            while len(self._tickets) > self.taille_max:
+                self._tickets.popitem(last=False)
+        return ticket
+
+    def get(self, ticket: str, client: str) -> Optional[Dict]:
+        """Objet d'un ticket valide pour ce client, ou None"""
+        cle = token_hash(ticket, client)
+        with self._lock:
+            entree = self._tickets.get(cle)
+            if entree is None:
+                return None
+            if entree[1] <= datetime.now():
+                del self._tickets[cle]
+                return None
+            return entree[0]
+
+    def pop(self, ticket: str, client: str) -> Optional[Dict]:
+        """Comme get, mais le ticket ne sert qu'une fois"""
+        objet = self.get(ticket, client)
+        if objet is not None:
+            with self._lock:
+                self._tickets.pop(token_hash(ticket, client), None)
+        return objet
+
+
+# Tickets partagés par le processus (pages et routes tournent dans le même serveur)
+_tickets = TicketStore()
+_televersements = TicketStore()
+_activations = TicketStore()
+
+
+def routes_enabled() -> bool:
+    """Indique si les routes sont servies (sinon les pages gardent les boutons Streamlit)"""
+    return _actives
+
+
+def _session_ticket(store: TicketStore, cle: str, fabriquer: Callable[[], Dict],
+                    duree: timedelta) -> Tuple[str, Dict]:
+    """
+    Ticket de la session en cours pour `cle`, et son objet
+
+    Le ticket est mémorisé dans la session et réémis à mi-vie : un rerun
+    n'en crée pas de nouveau.
+    """
+    import streamlit as st
+
+    tickets = st.session_state.setdefault('_tickets_routes', {})
+    entree = tickets.get(cle)
+    if entree is None or entree[2] - datetime.now() < duree / 2:
+        objet = fabriquer()
+        entree = (store.issue(objet, script_client(), duree), objet, datetime.now() + duree)
+        tickets[cle] = entree
+    return entree[0], entree[1]
+
+
+def forget_ticket(cle: str):
+    """Oublie le ticket de la session pour `cle` (le suivant en émettra un nouveau)"""
+    import streamlit as st
+
+    st.session_state.get('_tickets_routes', {}).pop(cle, None)
+
+
+def download_url(cle: str, ouvrir: Callable[[], IO[bytes]], nom: str,
+                 type_mime: Optional[str] = None) -> str:
+    """
+    Lien de téléchargement en flux pour le client de la session en cours
+
+    Args:
+        cle: Identité du fichier (ex: 'preuve:<empreinte>')
+        ouvrir: Ouvre le fichier en lecture binaire (appelé à chaque requête)
+        nom: Nom proposé au téléchargement
+        type_mime: Type MIME envoyé
+    """
+    ticket, _ = _session_ticket(
+        _tickets, f"telechargement:{cle}",
+        lambda: {'ouvrir': ouvrir, 'nom': nom, 'type_mime': type_mime or "application/octet-stream"},
+        DUREE_TICKET)
+    return f"{PREFIXE}/telechargement/{ticket}/{quote(nom, safe='')}"
+
+
+def upload_object(db, depose_par: Optional[str], types: Optional[List[str]] = None) -> Dict:
+    """Objet d'un ticket de téléversement : le fichier reçu y est déposé sous 'fichier'"""
+    from utils.uploads import UploadSpool
+
+    return {'spool': UploadSpool(db), 'depose_par': depose_par,
+            'types': [t.lower().lstrip('.') for t in types] if types else None, 'fichier': None}
+
+
+def upload_url(cle: str, db, depose_par: Optional[str], types: Optional[List[str]] = None) -> Tuple[str, Dict]:
+    """
+    Adresse de téléversement par morceaux pour le client de la session en cours
+
+    Returns:
+        (adresse, objet du ticket) ; objet['fichier'] reçoit la référence, le
+        nom et la taille du fichier une fois le téléversement terminé
+    """
+    ticket, objet = _session_ticket(_televersements, f"televersement:{cle}",
+                                    lambda: upload_object(db, depose_par, types), DUREE_TELEVERSEMENT)
+    return f"{PREFIXE}/televersement/{ticket}", objet
+
+
+def session_cookie_code(token: str, duree: timedelta) -> str:
+    """
+    Code d'activation du cookie de session pour le client de la session en cours
+
+    Le navigateur l'échange contre le cookie (POST /api/session) : le jeton
+    lui-même ne passe ni par l'URL ni par la page.
+    """
+    return _activations.issue({'token': token, 'max_age': int(duree.total_seconds())},
+                              script_client(), DUREE_ACTIVATION)
+
+
+def _https(request) -> bool:
+    """Requête reçue en HTTPS, directement ou derrière un proxy"""
+    return request.url.scheme == "https" or request.headers.get("x-forwarded-proto", "").lower() == "https"
+
+
+async def session_cookie(request):
+    """
+    POST /api/session : pose le cookie de session contre un code d'activation (corps de la requête)
+    DELETE /api/session : retire le cookie (déconnexion)
+    """
+    from starlette.responses import Response
+
+    if request.method == "DELETE":
+        reponse = Response(status_code=204)
+        reponse.delete_cookie(SESSION_COOKIE, path="/", secure=_https(request), httponly=True, samesite="strict")
+        return reponse
+    code = (await request.body())[:TAILLE_JSON_MAX].decode('ascii', 'replace').strip()
+    objet = _activations.pop(code, request_client(request)) if code else None
+    if objet is None:
+        return Response("Code expiré ou invalide", status_code=404, media_type="text/plain")
+    reponse = Response(status_code=204, headers={'Cache-Control': "no-store"})
+    reponse.set_cookie(SESSION_COOKIE, objet['token'], max_age=objet['max_age'], path="/",
+                       secure=_https(request), httponly=True, samesite="strict")
+    return reponse
+
+
+async def telecharger(request):
+    """GET/HEAD /api/telechargement/{ticket}/{nom} : fichier entier ou plage (206)"""
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import Response, StreamingResponse
+
+    objet = _tickets.get(request.path_params['ticket'], request_client(request))
+    if objet is None:
+        return Response("Lien expiré ou invalide", status_code=404, media_type="text/plain")
+    try:
+        fichier = await run_in_threadpool(objet['ouvrir'])
+    except Exception:
+        # Fichier purgé ou rapport expiré depuis l'émission du ticket
+        return Response("Fichier introuvable", status_code=404, media_type="text/plain")
+
+    etat = os.fstat(fichier.fileno())
+    taille = etat.st_size
+    etag = f'"{taille:x}-{etat.st_mtime_ns:x}"'
+    entetes = {
+        'Accept-Ranges': "bytes",
+        'ETag': etag,
+        'Content-Disposition': content_disposition(objet['nom']),
+        'Cache-Control': "private, no-cache",
+    }
+    plage = None
+    if_range = request.headers.get("if-range")
+    if if_range is None or if_range == etag:
+        try:
+            plage = parse_range(request.headers.get("range"), taille)
+        except RangeNotSatisfiable:
+            fichier.close()
+            return Response(status_code=416, headers={**entetes, 'Content-Range': f"bytes */{taille}"})
+
+    debut, fin = plage if plage else (0, taille - 1)
+    longueur = fin - debut + 1
+    entetes['Content-Length'] = str(longueur)
+    if plage:
+        entetes['Content-Range'] = f"bytes {debut}-{fin}/{taille}"
+    statut = 206 if plage else 200
+    if request.method == "HEAD":
+        fichier.close()
+        return Response(status_code=statut, headers=entetes, media_type=objet['type_mime'])
+    return StreamingResponse(iter_file(fichier, debut, longueur), status_code=statut,
+                             headers=entetes, media_type=objet['type_mime'])
+
+
+def _erreur(message: str, statut: int = 400):
+    from starlette.responses import JSONResponse
+
+    return JSONResponse({'erreur': message}, status_code=statut)
+
+
+def _televersement(request) -> Optional[Dict]:
+    """Objet du ticket de téléversement de la requête, pour ce client"""
+    return _televersements.get(request.path_params['ticket'], request_client(request))
+
+
+def _upload_of(objet: Dict, upload_id: str) -> Dict:
+    """Téléversement en cours de l'utilisateur du ticket ; lève EvidenceError sinon"""
+    from utils.evidence import EvidenceError
+
+    upload = objet['spool'].status(upload_id)
+    if upload['depose_par'] != objet['depose_par']:
+        raise EvidenceError(f"Téléversement inconnu ou expiré : {upload_id}")
+    return upload
+
+
+async def televersement_debut(request):
+    """
+    POST /api/televersement/{ticket} : ouvre ou reprend un téléversement
+
+    Corps JSON : nom, taille, type_mime, id (téléversement à reprendre,
+    mémorisé par le navigateur). Réponse : id, recu (octets déjà reçus),
+    taille et morceau (taille maximale d'un morceau).
+    """
+    import json
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse
+    from utils.evidence import EvidenceError
+    from utils.uploads import CHUNK_SIZE
+
+    objet = _televersement(request)
+    if objet is None:
+        return _erreur("Lien expiré : rechargez la page", 404)
+    corps = await request.body()
+    if len(corps) > TAILLE_JSON_MAX:
+        return _erreur("Requête trop volumineuse", 413)
+    try:
+        donnees = json.loads(corps)
+        nom = os.path.basename(str(donnees['nom']))
+        taille = int(donnees['taille'])
+    except (ValueError, KeyError, TypeError):
+        return _erreur("Requête invalide")
+    extension = os.path.splitext(nom)[1].lower().lstrip('.')
+    if objet['types'] and extension not in objet['types']:
+        return _erreur(f"Type de fichier non accepté ({', '.join(objet['types'])})")
+
+    def ouvrir():
+        spool = objet['spool']
+        upload = spool.resume(donnees['id'], nom, taille, objet['depose_par']) if donnees.get('id') else None
+        return upload or spool.start(nom, taille, type_mime=donnees.get('type_mime') or None,
+                                     depose_par=objet['depose_par'])
+
+    try:
+        upload = await run_in_threadpool(ouvrir)
+    except EvidenceError as e:
+        return _erreur(str(e))
+    return JSONResponse({'id': upload['id'], 'recu': upload['recu'], 'taille': upload['taille'],
+                         'morceau': CHUNK_SIZE})
+
+
+async def televersement_morceau(request):
+    """
+    PUT /api/televersement/{ticket}/{upload_id}?offset=N : écrit un morceau
+
+    Le corps est le morceau (au plus CHUNK_SIZE octets) ; l'en-tête
+    X-Morceau-Sha256, s'il est présent, est vérifié avant écriture.
+    Réponse : recu (position du prochain morceau attendu).
+    """
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse
+    from utils.evidence import EvidenceError
+    from utils.uploads import CHUNK_SIZE
+
+    objet = _televersement(request)
+    if objet is None:
+        return _erreur("Lien expiré : rechargez la page", 404)
+    try:
+        offset = int(request.query_params['offset'])
+        longueur = int(request.headers['content-length'])
+    except (KeyError, ValueError):
+        return _erreur("Position ou longueur du morceau manquante")
+    if longueur > CHUNK_SIZE:
+        return _erreur(f"Morceau trop volumineux (maximum {CHUNK_SIZE} octets)", 413)
+
+    # Le corps est lu au fil de l'eau et borné : une longueur annoncée fausse ne le fait pas déborder
+    morceau = bytearray()
+    async for bloc in request.stream():
+        morceau += bloc
+        if len(morceau) > longueur:
+            return _erreur("Morceau plus long que sa longueur annoncée")
+    empreinte = request.headers.get("x-morceau-sha256")
+    if empreinte and hashlib.sha256(morceau).hexdigest() != empreinte.lower():
+        return _erreur("Morceau corrompu pendant l'envoi : renvoyez-le")
+
+    def ecrire():
+        upload_id = request.path_params['upload_id']
+        _upload_of(objet, upload_id)
+        return objet['spool'].write_chunk(upload_id, offset, bytes(morceau))
+
+    try:
+        recu = await run_in_threadpool(ecrire)
+    except EvidenceError as e:
+        return _erreur(str(e))
+    return JSONResponse({'recu': recu})
+
+
+async def televersement_fin(request):
+    """
+    POST /api/televersement/{ticket}/{upload_id}/fin : vérifie le fichier et le fait entrer dans le magasin
+
+    La référence est déposée dans l'objet du ticket, où la page la reprend
+    à l'enregistrement du formulaire.
+    """
+    from starlette.concurrency import run_in_threadpool
+    from starlette.responses import JSONResponse
+    from utils.evidence import EvidenceError
+
+    objet = _televersement(request)
+    if objet is None:
+        return _erreur("Lien expiré : rechargez la page", 404)
+
+    def terminer():
+        upload = _upload_of(objet, request.path_params['upload_id'])
+        ref = objet['spool'].finish(upload['id'])
+        return {'ref': ref, 'nom': upload['nom'], 'taille': upload['taille']}
+
+    try:
+        fichier = await run_in_threadpool(terminer)
+    except EvidenceError as e:
+        return _erreur(str(e))
+    objet['fichier'] = fichier
+    return JSONResponse(fichier)
+
+
+def routes() -> List:
+    """Routes à passer à st.App (voir serveur.py) ; active les transferts de fichiers et le cookie de session"""
+    from starlette.routing import Route
+
+    global _actives
+    _actives = True
+    return [
+        Route(f"{PREFIXE}/telechargement/{{ticket}}/{{nom}}", telecharger, methods=["GET", "HEAD"]),
+        Route(f"{PREFIXE}/televersement/{{ticket}}", televersement_debut, methods=["POST"]),
+        Route(f"{PREFIXE}/televersement/{{ticket}}/{{upload_id}}", televersement_morceau, methods=["PUT"]),
+        Route(f"{PREFIXE}/televersement/{{ticket}}/{{upload_id}}/fin", televersement_fin, methods=["POST"]),
+        Route(f"{PREFIXE}/session", session_cookie, methods=["POST", "DELETE"]),
+    ]
@@ -0,0 +1,211 @@
+"""
+Sessions de connexion persistantes
+Un jeton aléatoire par navigateur (cookie HttpOnly, voir utils/routes.py), enregistré
+sous une empreinte liée au client (adresse IP, navigateur) dans un magasin
+de sessions ; un cache LRU en mémoire évite une lecture du magasin à chaque
+restauration
+"""
+
+import hashlib
+import secrets
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Dict, Optional, Tuple
+
+# Cookie portant le jeton de session
+SESSION_COOKIE = "securite360_session"
+
+# Ancien paramètre d'URL du jeton : retiré de l'URL et révoqué s'il est encore présent
+SESSION_PARAM = "session"
+
+# Durée de validité d'une session
+DUREE_SESSION = timedelta(hours=24)
+
+# Nombre de sessions gardées dans le cache en mémoire
+CACHE_TAILLE = 1024
+
+# Intervalle minimal entre deux purges des sessions expirées
+INTERVALLE_PURGE = timedelta(minutes=10)
+
+_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+
+def client_fingerprint(ip: Optional[str], user_agent: Optional[str]) -> str:
+    """Identité du client à laquelle une session est liée"""
+    return f"{ip or ''}|{user_agent or ''}"
+
+
+def token_hash(token: str, client: str = "") -> str:
+    """
+    Empreinte d'un jeton pour un client : seule forme sous laquelle il est enregistré
+
+    Le même jeton présenté par un autre client (autre adresse, autre
+    navigateur) donne une autre empreinte et ne retrouve donc pas la session.
+    """
+    return hashlib.sha256(f"{token}\n{client}".encode('utf-8')).hexdigest()
+
+
+class SessionStore(ABC):
+    """Magasin de sessions : empreinte de jeton -> (utilisateur, expiration)"""
+
+    @abstractmethod
+    def put(self, cle: str, user_id: int, expiration: datetime):
+        """Enregistre une session"""
+
+    @abstractmethod
+    def get(self, cle: str) -> Optional[Tuple[int, datetime]]:
+        """Session enregistrée sous `cle` (expirée ou non), ou None"""
+
+    @abstractmethod
+    def delete(self, cle: str):
+        """Supprime une session"""
+
+    @abstractmethod
+    def sweep(self, maintenant: datetime) -> int:
+        """Supprime les sessions expirées ; retourne leur nombre"""
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions dans la table sessions de la base (clé primaire = empreinte du jeton)"""
+
+    def __init__(self, db):
+        self.db = db
+
+    def put(self, cle: str, user_id: int, expiration: datetime):
+        self.db.save_session(cle, user_id, expiration.strftime(_FORMAT))
+
+    def get(self, cle: str) -> Optional[Tuple[int, datetime]]:
+        session = self.db.get_session(cle)
+        if session is None:
+            return None
+        return session['user_id'], datetime.strptime(session['date_expiration'], _FORMAT)
+
+    def delete(self, cle: str):
+        self.db.delete_session(cle)
+
+    def sweep(self, maintenant: datetime) -> int:
+        return self.db.delete_expired_sessions(maintenant.strftime(_FORMAT))
+
+
+class LRUSessionStore(SessionStore):
+    """
+    Cache LRU en mémoire devant un autre magasin
+
+    Les sessions lues ou créées par ce processus sont servies sans accès
+    au magasin ; une déconnexion passe par le cache, qui reste donc
+    cohérent pour le processus (le serveur Streamlit en a un seul).
+    """
+
+    def __init__(self, store: SessionStore, taille: int = CACHE_TAILLE):
+        self.store = store
+        self.taille = taille
+        self._cache: "OrderedDict[str, Tuple[int, datetime]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _memoriser(self, cle: str, session: Tuple[int, datetime]):
+        with self._lock:
+            self._cache[cle] = session
+            self._cache.move_to_end(cle)
+            while len(self._cache) > self.taille:
+                self._cache.popitem(last=False)
+
+    def put(self, cle: str, user_id: int, expiration: datetime):
+        self.store.put(cle, user_id, expiration)
+        self._memoriser(cle, (user_id, expiration))
+
+    def get(self, cle: str) -> Optional[Tuple[int, datetime]]:
+        with self._lock:
+            session = self._cache.get(cle)
+            if session is not None:
+                self._cache.move_to_end(cle)
+                return session
+        session = self.store.get(cle)
+        if session is not None:
+            self._memoriser(cle, session)
+        return session
+
+    def delete(self, cle: str):
+        with self._lock:
+            self._cache.pop(cle, None)
+        self.store.delete(cle)
+
+    def sweep(self, maintenant: datetime) -> int:
+        with self._lock:
+            for cle in [cle for cle, (_, expiration) in self._cache.items() if expiration <= maintenant]:
+                del self._cache[cle]
+        return self.store.sweep(maintenant)
+
+
+class SessionManager:
+    """
+    Jetons de session : création, restauration, révocation et purge périodique des sessions expirées
+
+    Chaque opération reçoit l'identité du client (client_fingerprint) :
+    une session n'est retrouvée que depuis le client qui l'a ouverte.
+    """
+
+    def __init__(self, store: SessionStore, duree: timedelta = DUREE_SESSION,
+                 intervalle_purge: timedelta = INTERVALLE_PURGE, db=None):
+        self.store = store
+        # Base dont proviennent les sessions (None pour un autre magasin)
+        self.db = db
+        self.duree = duree
+        self.intervalle_purge = intervalle_purge
+        self._derniere_purge: Optional[datetime] = None
+
+    def create(self, user_id: int, duree: Optional[timedelta] = None, client: str = "") -> str:
+        """
+        Ouvre une session pour un utilisateur depuis un client
+
+        Returns:
+            Jeton à transmettre au navigateur (jamais enregistré tel quel)
+        """
+        self._purger_si_necessaire()
+        token = secrets.token_urlsafe(32)
+        self.store.put(token_hash(token, client), user_id, datetime.now() + (duree or self.duree))
+        return token
+
+    def resolve(self, token: Optional[str], client: str = "") -> Optional[int]:
+        """Utilisateur de la session `token` de ce client, ou None si elle est inconnue ou expirée"""
+        if not token:
+            return None
+        cle = token_hash(token, client)
+        session = self.store.get(cle)
+        if session is None:
+            return None
+        user_id, expiration = session
+        if expiration <= datetime.now():
+            self.store.delete(cle)
+            return None
+        return user_id
+
+    def revoke(self, token: Optional[str], client: str = ""):
+        """Ferme une session (déconnexion)"""
+        if token:
+            self.store.delete(token_hash(token, client))
+
+    def sweep(self) -> int:
+        """Supprime les sessions expirées ; retourne leur nombre"""
+        self._derniere_purge = datetime.now()
+        return self.store.sweep(self._derniere_purge)
+
+    def _purger_si_necessaire(self):
+        if self._derniere_purge is None or datetime.now() - self._derniere_purge >= self.intervalle_purge:
+            self.sweep()
+
+
+# Gestionnaires partagés par le processus, indexés par fichier de base
+_managers: Dict[str, SessionManager] = {}
+_managers_lock = threading.Lock()
+
+
+def get_session_manager(db) -> SessionManager:
+    """Gestionnaire de sessions partagé par le processus : table sessions, avec cache LRU"""
+    with _managers_lock:
+        manager = _managers.get(db.db_path)
+        if manager is None or manager.db is not db:
+            manager = SessionManager(LRUSessionStore(SQLiteSessionStore(db)), db=db)
+            _managers[db.db_path] = manager
+        return manager
@@ -0,0 +1,249 @@
+"""
+Téléversements par morceaux, reprenables, vers le magasin de preuves
+Les morceaux sont écrits dans un spool sur disque ; le fichier complet est
+vérifié (taille, SHA-256) puis déplacé atomiquement dans le magasin
+"""
+
+import hashlib
+import os
+import threading
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, IO, List, Optional
+
+from utils.evidence import EvidenceStore, EvidenceError, BLOC, evidence_dir
+
+# Taille des morceaux envoyés par ingest()
+CHUNK_SIZE = 8 * 1024 * 1024
+
+# Taille maximale d'un téléversement par morceaux (octets)
+TAILLE_MAX = 2 * 1024 * 1024 * 1024
+
+# Durée après laquelle un téléversement inactif est abandonné
+DELAI_ABANDON = timedelta(days=2)
+
+# Verrous par téléversement (écritures d'un même téléversement sérialisées dans le processus)
+_verrous: Dict[str, threading.Lock] = {}
+_verrous_lock = threading.Lock()
+
+
+def _verrou(upload_id: str) -> threading.Lock:
+    with _verrous_lock:
+        return _verrous.setdefault(upload_id, threading.Lock())
+
+
+def drop_dir(db) -> str:
+    """Dossier de dépôt des fichiers volumineux (copiés sur le serveur hors navigateur)"""
+    return os.path.join(os.path.dirname(evidence_dir(db)), "depot")
+
+
+def list_drop_files(db) -> List[Dict]:
+    """Fichiers présents dans le dossier de dépôt (nom, chemin, taille), par nom"""
+    dossier = drop_dir(db)
+    if not os.path.isdir(dossier):
+        return []
+    fichiers = []
+    for nom in sorted(os.listdir(dossier)):
+        chemin = os.path.join(dossier, nom)
+        if os.path.isfile(chemin) and not nom.startswith('.'):
+            fichiers.append({'nom': nom, 'chemin': chemin, 'taille': os.path.getsize(chemin)})
+    return fichiers
+
+
+class UploadSpool:
+    """
+    Téléversements reprenables : start -> write_chunk (n fois) -> finish
+
+    L'état (octets reçus) est enregistré dans la table televersements : un
+    téléversement interrompu, y compris par un redémarrage, reprend à
+    l'octet près. Un morceau déjà reçu est ignoré, un morceau qui laisserait
+    un trou est refusé.
+    """
+
+    def __init__(self, db, store: Optional[EvidenceStore] = None):
+        self.db = db
+        self.store = store or EvidenceStore(db)
+        # Le spool est sur le même système de fichiers que le magasin (renommage atomique)
+        self.root = os.path.join(self.store.root, "spool")
+
+    def _spool_path(self, upload_id: str) -> str:
+        return os.path.join(self.root, f"{upload_id}.part")
+
+    def _same_prefix(self, upload_id: str, source: IO[bytes], longueur: int) -> bool:
+        """Compare les `longueur` premiers octets du spool à ceux du fichier source"""
+        source.seek(0)
+        with open(self._spool_path(upload_id), 'rb') as spool:
+            while longueur > 0:
+                attendu = spool.read(min(BLOC, longueur))
+                if not attendu or source.read(len(attendu)) != attendu:
+                    return False
+                longueur -= len(attendu)
+        return True
+
+    def start(self, nom: str, taille: int, sha256: Optional[str] = None, type_mime: Optional[str] = None,
+              depose_par: Optional[str] = None, taille_max: int = TAILLE_MAX,
+              source: Optional[IO[bytes]] = None) -> Dict:
+        """
+        Ouvre un téléversement, ou reprend celui déjà commencé pour le même fichier
+
+        Un même nom et une même taille ne suffisent pas à reconnaître le même
+        fichier : la reprise exige l'empreinte attendue (vérifiée à la fin),
+        ou le fichier source dont le début doit être identique aux octets
+        déjà reçus. Sinon, le téléversement interrompu est abandonné.
+
+        Args:
+            nom: Nom du fichier
+            taille: Taille totale annoncée (octets)
+            sha256: Empreinte attendue (vérifiée à la fin si fournie)
+            type_mime: Type MIME déclaré
+            depose_par: Utilisateur
+            taille_max: Taille maximale acceptée
+            source: Fichier source (positionnable), pour vérifier les octets déjà reçus
+
+        Returns:
+            Téléversement (id, recu = octets déjà reçus...)
+        """
+        if taille < 0 or taille > taille_max:
+            raise EvidenceError(f"Fichier trop volumineux (maximum {taille_max // (1024 * 1024)} Mo)")
+        sha256 = sha256.lower() if sha256 else None
+        nom = os.path.basename(nom)
+        upload = self.db.find_upload(nom, taille, sha256, depose_par)
+        if upload is not None and os.path.exists(self._spool_path(upload['id'])):
+            recu = self._received(upload)
+            if sha256 or recu == 0 or (source is not None and self._same_prefix(upload['id'], source, recu)):
+                return upload
+        if upload is not None:
+            self.abort(upload['id'])
+
+        os.makedirs(self.root, exist_ok=True)
+        upload_id = uuid.uuid4().hex
+        open(self._spool_path(upload_id), 'wb').close()
+        self.db.create_upload(upload_id, nom, taille, sha256, type_mime, depose_par)
+        return self.db.get_upload(upload_id)
+
+    def _received(self, upload: Dict) -> int:
+        """Octets reçus ; le spool fait foi s'il est plus court que l'état enregistré (écriture interrompue)"""
+        recu = min(upload['recu'], os.path.getsize(self._spool_path(upload['id'])))
+        if recu != upload['recu'] and self.db.advance_upload(upload['id'], upload['recu'], recu):
+            upload['recu'] = recu
+        return recu
+
+    def resume(self, upload_id: str, nom: str, taille: int, depose_par: Optional[str] = None) -> Optional[Dict]:
+        """
+        Reprend un téléversement par son identifiant (mémorisé par le navigateur)
+
+        L'identifiant n'est accepté que pour le même fichier (nom, taille) et
+        le même utilisateur ; sinon None, et un nouveau téléversement est à
+        ouvrir par start().
+        """
+        upload = self.db.get_upload(upload_id)
+        if (upload is None or (upload['nom'], upload['taille'], upload['depose_par'])
+                != (os.path.basename(nom), taille, depose_par)
+                or not os.path.exists(self._spool_path(upload_id))):
+            return None
+        self._received(upload)
+        return upload
+
+    def status(self, upload_id: str) -> Dict:
+        """État d'un téléversement ; lève EvidenceError s'il est inconnu"""
+        upload = self.db.get_upload(upload_id)
+        if upload is None:
+            raise EvidenceError(f"Téléversement inconnu ou expiré : {upload_id}")
+        return upload
+
+    def write_chunk(self, upload_id: str, offset: int, data: bytes) -> int:
+        """
+        Écrit un morceau à la position `offset`
+
+        Returns:
+            Nombre total d'octets reçus (position du prochain morceau attendu)
+        """
+        with _verrou(upload_id):
+            upload = self.status(upload_id)
+            recu = upload['recu']
+            if offset > recu:
+                raise EvidenceError(f"Morceau hors séquence : position {offset}, {recu} octets reçus")
+            fin = offset + len(data)
+            if fin > upload['taille']:
+                raise EvidenceError("Le morceau dépasse la taille annoncée du fichier")
+            if fin <= recu:
+                return recu
+
+            with open(self._spool_path(upload_id), 'r+b') as spool:
+                spool.seek(recu)
+                spool.write(memoryview(data)[recu - offset:])
+                spool.flush()
+                os.fsync(spool.fileno())
+            if not self.db.advance_upload(upload_id, recu, fin):
+                raise EvidenceError("Téléversement modifié par une autre session")
+            return fin
+
+    def finish(self, upload_id: str) -> str:
+        """
+        Vérifie le fichier reçu et le fait entrer dans le magasin de preuves
+
+        Returns:
+            Référence 'sha256:<empreinte>'
+        """
+        with _verrou(upload_id):
+            upload = self.status(upload_id)
+            chemin = self._spool_path(upload_id)
+            if upload['recu'] != upload['taille']:
+                raise EvidenceError(f"Téléversement incomplet : {upload['recu']} / {upload['taille']} octets")
+
+            empreinte = hashlib.sha256()
+            with open(chemin, 'rb') as spool:
+                for bloc in iter(lambda: spool.read(BLOC), b""):
+                    empreinte.update(bloc)
+            sha256 = empreinte.hexdigest()
+            if upload['sha256_attendu'] and sha256 != upload['sha256_attendu']:
+                self.abort(upload_id)
+                raise EvidenceError("Somme de contrôle incorrecte : le fichier reçu est corrompu, téléversement annulé")
+
+            ref = self.store.adopt(chemin, sha256, upload['taille'], upload['nom'],
+                                   upload['type_mime'], upload['depose_par'])
+            self.db.delete_upload(upload_id)
+        with _verrous_lock:
+            _verrous.pop(upload_id, None)
+        return ref
+
+    def abort(self, upload_id: str):
+        """Abandonne un téléversement et libère son spool"""
+        try:
+            os.remove(self._spool_path(upload_id))
+        except FileNotFoundError:
+            pass
+        self.db.delete_upload(upload_id)
+
+    def purge_stale(self, delai: timedelta = DELAI_ABANDON) -> int:
+        """Abandonne les téléversements inactifs depuis plus de `delai` ; retourne leur nombre"""
+        limite = (datetime.now() - delai).strftime('%Y-%m-%d %H:%M:%S')
+        ids = self.db.get_stale_uploads(limite)
+        for upload_id in ids:
+            self.abort(upload_id)
+        return len(ids)
+
+    def ingest(self, fileobj: IO[bytes], nom: str, taille: int, sha256: Optional[str] = None,
+               type_mime: Optional[str] = None, depose_par: Optional[str] = None,
+               chunk_size: int = CHUNK_SIZE, progress: Optional[Callable[[float], None]] = None) -> str:
+        """
+        Téléverse un fichier local (dossier de dépôt, fichier Streamlit...) morceau par morceau
+
+        Reprend là où un appel précédent pour le même fichier s'est arrêté
+        (début du fichier identique aux octets déjà reçus) : seuls les octets
+        manquants sont envoyés. Le fichier doit pouvoir se positionner (seek).
+
+        Returns:
+            Référence 'sha256:<empreinte>'
+        """
+        upload = self.start(nom, taille, sha256, type_mime, depose_par, source=fileobj)
+        recu = upload['recu']
+        fileobj.seek(recu)
+        while recu < taille:
+            morceau = fileobj.read(min(chunk_size, taille - recu))
+            if not morceau:
+                raise EvidenceError(f"Fichier source tronqué : {recu} / {taille} octets")
+            recu = self.write_chunk(upload['id'], recu, morceau)
+            if progress and taille:
+                progress(recu / taille)
+        return self.finish(upload['id'])